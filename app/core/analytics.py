@@ -8,70 +8,19 @@ Módulo de interpretación estructural:
 - Etiquetado estructural de riesgo
 """
 
-import json
 import pandas as pd
 from datetime import datetime, timedelta
-from core.db import get_db
+from core.eventos_df import cargar_eventos_df, COLUMNAS_ANALISIS
 
 
 # ===========================================================
 # 1. Cargar eventos como DataFrame
 # ===========================================================
-def _get_eventos_df():
-    """Obtiene eventos desde la vista eventos (sin JOIN problemático)"""
-    with get_db() as db:
-        rows = db.execute("""
-            SELECT 
-                e.evento_id, 
-                e.entidad_id, 
-                e.tipo_evento, 
-                e.metadata,
-                e.actor, 
-                e.dispositivo, 
-                e.timestamp_servidor,
-                e.hash_actual,
-                '' AS tipo_entidad,
-                '{}' AS atributos
-            FROM eventos e
-            ORDER BY e.timestamp_servidor DESC
-        """).fetchall()
-
-    if not rows:
-        return pd.DataFrame()
-
-    data = []
-    for r in rows:
-        metadata = json.loads(r["metadata"]) if r["metadata"] else {}
-        
-        # Extraer nombre e identificador del metadata
-        nombre = metadata.get("nombre", "N/A")
-        identificador = (atributos.get("identificador") or 
-                        atributos.get("placa") or 
-                        atributos.get("folio") or "N/A")
-
-        data.append({
-            "evento_id": r["evento_id"],
-            "entidad_id": r["entidad_id"],
-            "tipo_evento": r["tipo_evento"],
-            "nombre": nombre,
-            "identificador": identificador,
-            "tipo_entidad": r["tipo_entidad"],
-            "actor": r["actor"],
-            "dispositivo": r["dispositivo"],
-            "hora": metadata.get("hora", ""),
-            "fecha": metadata.get("fecha", ""),
-            "timestamp": r["timestamp_servidor"],
-            "motivo_rechazo": metadata.get("motivo_rechazo", ""),
-            "hash": r["hash_actual"]
-        })
-
-    df = pd.DataFrame(data)
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-    df["hora_int"] = pd.to_numeric(df["hora"].str.slice(0, 2), errors="coerce")
-
-    return df
+def _get_eventos_df(desde=None, hasta=None, condominio_id=None):
+    """Eventos con las columnas del análisis (ver core/eventos_df.py)"""
+    return cargar_eventos_df(
+        COLUMNAS_ANALISIS, desde=desde, hasta=hasta, condominio_id=condominio_id
+    )
 
 
 # ===========================================================
@@ -191,8 +140,8 @@ def etiquetar_eventos(df):
 # ===========================================================
 # 5. Resumen estructural de analítica
 # ===========================================================
-def resumen_analitico():
-    df = _get_eventos_df()
+def resumen_analitico(desde=None, hasta=None, condominio_id=None):
+    df = _get_eventos_df(desde, hasta, condominio_id)
 
     if df.empty:
         return {
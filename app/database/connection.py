@@ -1,10 +1,15 @@
 """
 Database connection manager para FastAPI
 Configuración de SQLAlchemy engine y sessions
+
+Los routers usan el engine async (asyncpg / aiosqlite) con get_async_db;
+el engine sync queda para init_db() y scripts fuera de FastAPI.
 """
 
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 import toml
@@ -35,6 +40,16 @@ def get_database_url():
 # Configuración de PostgreSQL
 DATABASE_URL = get_database_url()
 
+# Pool del engine async: las requests esperan la BD sin ocupar un hilo,
+# así que el límite de concurrencia por worker es este pool
+ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '20'))
+ASYNC_MAX_OVERFLOW = int(os.getenv('ASYNC_MAX_OVERFLOW', '30'))
+# Sentencias preparadas cacheadas por conexión asyncpg (0 con pgbouncer en modo transacción)
+ASYNC_STATEMENT_CACHE = int(os.getenv('ASYNC_STATEMENT_CACHE', '100'))
+
+# Parámetros de libpq que asyncpg no acepta en la URL
+_PARAMETROS_SOLO_LIBPQ = ("channel_binding", "connect_timeout", "options", "target_session_attrs")
+
 # Crear engine
 engine = create_engine(
     DATABASE_URL,
@@ -48,6 +63,49 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def get_async_database_url(url=None):
+    """
+    DATABASE_URL con driver async: asyncpg para PostgreSQL, aiosqlite para SQLite.
+
+    sslmode (libpq) pasa a ssl, que es como lo recibe asyncpg.
+    """
+    url = make_url(url or DATABASE_URL)
+    backend = url.get_backend_name()
+
+    if backend in ("postgresql", "postgres"):
+        query = {k: v for k, v in url.query.items() if k not in _PARAMETROS_SOLO_LIBPQ}
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+
+    return url
+
+
+def crear_async_engine(url=None):
+    """Engine async para la URL dada (default: DATABASE_URL)"""
+    url = get_async_database_url(url)
+    if url.get_backend_name() == "sqlite":
+        return create_async_engine(url, echo=False)
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_pre_ping=True,
+        pool_size=ASYNC_POOL_SIZE,
+        max_overflow=ASYNC_MAX_OVERFLOW,
+        connect_args={"prepared_statement_cache_size": ASYNC_STATEMENT_CACHE}
+    )
+
+
+async_engine = crear_async_engine()
+
+# expire_on_commit=False: tras el commit la respuesta se serializa con los
+# atributos ya cargados, sin una consulta implícita (no permitida en async)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
 def init_db():
     """Inicializar base de datos (crear tablas si no existen)"""
     Base.metadata.create_all(bind=engine)
@@ -66,6 +124,20 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency async para FastAPI
+    Proporciona una AsyncSession por request y la cierra automáticamente
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def cerrar_async_engine():
+    """Cierra las conexiones del pool async (shutdown de la API)"""
+    await async_engine.dispose()
+
+
 @contextmanager
 def get_db_context():
     """Context manager para uso fuera de FastAPI"""
@@ -10,7 +10,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import time
 
-from app.database.connection import init_db
+from app.database.connection import init_db, cerrar_async_engine
+from core.bitacora import iniciar_bitacora, cerrar_bitacora
 from app.routers import msp_router, condominio_router
 
 
@@ -33,6 +34,11 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Error inicializando DB: {e}")
     
+    # Recuperar bitácora de una ejecución que terminó sin escribirla
+    recuperados = iniciar_bitacora()
+    if recuperados:
+        print(f"✅ {recuperados} registros de bitácora recuperados del respaldo")
+    
     print("✅ API lista para recibir requests")
     print("📖 Documentación: http://localhost:8000/docs")
     print("="*60 + "\n")
@@ -42,6 +48,16 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("\n" + "="*60)
     print("🛑 Cerrando AX-S API")
+    
+    # Escribir la bitácora que quedó en cola
+    try:
+        cerrar_bitacora()
+        print("✅ Bitácora pendiente escrita")
+    except Exception as e:
+        print(f"⚠️  Error escribiendo bitácora pendiente: {e}")
+    
+    # Cerrar el pool de conexiones async
+    await cerrar_async_engine()
     print("="*60 + "\n")
 
 
@@ -3,11 +3,12 @@ Router de Condominio - Endpoints FastAPI
 Manejo de requests HTTP para Condominios
 """
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db
 from app.schemas.condominio import (
     CondominioCreate,
     CondominioUpdate,
@@ -15,6 +16,7 @@ from app.schemas.condominio import (
     CondominioListResponse
 )
 from app.services import condominio_service
+from app.utils.etag import respuesta_con_etag
 
 router = APIRouter(prefix="/condominio", tags=["Condominios"])
 
@@ -26,9 +28,9 @@ router = APIRouter(prefix="/condominio", tags=["Condominios"])
     summary="Crear un nuevo Condominio",
     description="Registra un nuevo condominio bajo un MSP"
 )
-def create_condominio(
+async def create_condominio(
     data: CondominioCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear un nuevo Condominio
@@ -38,40 +40,109 @@ def create_condominio(
     - **nombre**: Nombre del condominio
     - **total_unidades**: Número de casas/unidades
     """
-    return condominio_service.crear_condominio(db, data)
+    return await condominio_service.crear_condominio(db, data)
 
 
 @router.get(
     "/listar",
     response_model=CondominioListResponse,
     summary="Listar Condominios",
-    description="Obtiene listado de condominios con paginación y filtros"
+    description="Obtiene listado de condominios con paginación por cursor y filtros"
 )
-def list_condominios(
+async def list_condominios(
     msp_id: Optional[str] = Query(None, description="Filtrar por MSP (scope multi-tenant)"),
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="siguiente_cursor de la página anterior"),
+    skip: int = Query(0, ge=0, description="Paginación por OFFSET (obsoleta, usar cursor)"),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db)
+    incluir_total: bool = Query(True, description="Incluir el total (cacheado unos segundos)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar Condominios con filtros
     
     - **msp_id**: Filtrar por MSP (multi-tenant scope)
     - **estado**: Filtrar por estado
-    - **skip**: Paginación
+    - **cursor**: Paginación keyset - pasar el siguiente_cursor recibido
+    - **skip**: Paginación por OFFSET, solo sin cursor
     - **limit**: Máximo de registros
+    - **incluir_total**: false evita el conteo
+    """
+    siguiente_cursor = None
+    if skip and not cursor:
+        condominios = await condominio_service.listar_condominios(
+            db,
+            msp_id=msp_id,
+            estado=estado,
+            skip=skip,
+            limit=limit
+        )
+    else:
+        condominios, siguiente_cursor = await condominio_service.listar_condominios_cursor(
+            db,
+            msp_id=msp_id,
+            estado=estado,
+            cursor=cursor,
+            limit=limit
+        )
+    
+    total = None
+    if incluir_total:
+        total = await condominio_service.contar_condominios_cacheado(db, msp_id=msp_id, estado=estado)
+    
+    return CondominioListResponse(total=total, condominios=condominios, siguiente_cursor=siguiente_cursor)
+
+
+@router.get(
+    "/exportar",
+    summary="Exportar Condominios (NDJSON)",
+    description="Todos los condominios del filtro en streaming, un JSON por línea"
+)
+async def export_condominios(
+    msp_id: Optional[str] = Query(None, description="Filtrar por MSP (scope multi-tenant)"),
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Exportar Condominios como NDJSON
+    
+    - Un CondominioResponse por línea
+    - Se lee por lotes con el mismo cursor que /listar, sin cargar todo en memoria
     """
-    condominios = condominio_service.listar_condominios(
+    return StreamingResponse(
+        condominio_service.exportar_condominios(db, msp_id=msp_id, estado=estado),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.get(
+    "/estadisticas",
+    summary="Estadísticas de la flota de Condominios",
+    description="Estadísticas de todos los condominios de un MSP (o de todos) en una consulta, con ETag"
+)
+async def get_condominios_stats(
+    request: Request,
+    msp_id: Optional[str] = Query(None, description="Filtrar por MSP (sin filtro: todos, super admin)"),
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Estadísticas de varios Condominios a la vez
+    
+    - Mismos campos que /{condominio_id}/estadisticas por condominio
+    - Paginado por condominio_id
+    - Responde 304 si el ETag coincide con If-None-Match
+    """
+    estadisticas = await condominio_service.obtener_estadisticas_flota(
         db,
         msp_id=msp_id,
         estado=estado,
         skip=skip,
         limit=limit
     )
-    total = condominio_service.contar_condominios(db, msp_id=msp_id, estado=estado)
-    
-    return CondominioListResponse(total=total, condominios=condominios)
+    return respuesta_con_etag(request, estadisticas)
 
 
 @router.get(
@@ -80,16 +151,16 @@ def list_condominios(
     summary="Obtener Condominio por ID",
     description="Consulta los detalles de un condominio específico"
 )
-def get_condominio(
+async def get_condominio(
     condominio_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener un Condominio por su identificador
     
     - **condominio_id**: Identificador del condominio
     """
-    return condominio_service.obtener_condominio(db, condominio_id)
+    return await condominio_service.obtener_condominio(db, condominio_id)
 
 
 @router.put(
@@ -98,17 +169,17 @@ def get_condominio(
     summary="Actualizar Condominio",
     description="Modifica los datos de un condominio existente"
 )
-def update_condominio(
+async def update_condominio(
     condominio_id: str,
     data: CondominioUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualizar un Condominio
     
     - Solo se actualizan los campos proporcionados
     """
-    return condominio_service.actualizar_condominio(db, condominio_id, data)
+    return await condominio_service.actualizar_condominio(db, condominio_id, data)
 
 
 @router.delete(
@@ -116,16 +187,16 @@ def update_condominio(
     summary="Eliminar Condominio",
     description="Marca un condominio como inactivo (soft delete)"
 )
-def delete_condominio(
+async def delete_condominio(
     condominio_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Eliminar un Condominio (soft delete)
     
     - No se permite si tiene residencias activas
     """
-    return condominio_service.eliminar_condominio(db, condominio_id)
+    return await condominio_service.eliminar_condominio(db, condominio_id)
 
 
 @router.get(
@@ -133,9 +204,9 @@ def delete_condominio(
     summary="Estadísticas del Condominio",
     description="Obtiene métricas y estadísticas de un condominio"
 )
-def get_condominio_stats(
+async def get_condominio_stats(
     condominio_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener estadísticas de un Condominio
@@ -145,4 +216,4 @@ def get_condominio_stats(
     - Visitantes activos
     - Accesos del día
     """
-    return condominio_service.obtener_estadisticas_condominio(db, condominio_id)
+    return await condominio_service.obtener_estadisticas_condominio(db, condominio_id)
@@ -3,11 +3,12 @@ Router de MSP - Endpoints FastAPI
 Manejo de requests HTTP para MSPs
 """
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db
 from app.schemas.msp import (
     MSPCreate,
     MSPUpdate,
@@ -15,6 +16,7 @@ from app.schemas.msp import (
     MSPListResponse
 )
 from app.services import msp_service
+from app.utils.etag import respuesta_con_etag
 
 router = APIRouter(prefix="/msp", tags=["MSP - Managed Service Providers"])
 
@@ -26,9 +28,9 @@ router = APIRouter(prefix="/msp", tags=["MSP - Managed Service Providers"])
     summary="Crear un nuevo MSP",
     description="Registra un nuevo Managed Service Provider en el sistema"
 )
-def create_msp(
+async def create_msp(
     data: MSPCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear un nuevo MSP
@@ -38,32 +40,82 @@ def create_msp(
     - **plan**: basic, professional, enterprise
     - **max_condominios**: Límite de condominios permitidos
     """
-    return msp_service.crear_msp(db, data)
+    return await msp_service.crear_msp(db, data)
 
 
 @router.get(
     "/listar",
     response_model=MSPListResponse,
     summary="Listar MSPs",
-    description="Obtiene listado de MSPs con paginación y filtros"
+    description="Obtiene listado de MSPs con paginación por cursor y filtros"
 )
-def list_msps(
-    skip: int = Query(0, ge=0, description="Número de registros a saltar"),
+async def list_msps(
+    cursor: Optional[str] = Query(None, description="siguiente_cursor de la página anterior"),
+    skip: int = Query(0, ge=0, description="Paginación por OFFSET (obsoleta, usar cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
     estado: Optional[str] = Query(None, description="Filtrar por estado: activo, suspendido, inactivo"),
-    db: Session = Depends(get_db)
+    incluir_total: bool = Query(True, description="Incluir el total (cacheado unos segundos)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar MSPs con paginación
     
-    - **skip**: Paginación - registros a saltar
+    - **cursor**: Paginación keyset - pasar el siguiente_cursor recibido
+    - **skip**: Paginación por OFFSET, solo sin cursor
     - **limit**: Paginación - máximo de registros
     - **estado**: Filtro opcional por estado
+    - **incluir_total**: false evita el conteo
     """
-    msps = msp_service.listar_msps(db, skip=skip, limit=limit, estado=estado)
-    total = msp_service.contar_msps(db, estado=estado)
+    siguiente_cursor = None
+    if skip and not cursor:
+        msps = await msp_service.listar_msps(db, skip=skip, limit=limit, estado=estado)
+    else:
+        msps, siguiente_cursor = await msp_service.listar_msps_cursor(db, cursor=cursor, limit=limit, estado=estado)
     
-    return MSPListResponse(total=total, msps=msps)
+    total = await msp_service.contar_msps_cacheado(db, estado=estado) if incluir_total else None
+    
+    return MSPListResponse(total=total, msps=msps, siguiente_cursor=siguiente_cursor)
+
+
+@router.get(
+    "/exportar",
+    summary="Exportar MSPs (NDJSON)",
+    description="Todos los MSPs del filtro en streaming, un JSON por línea"
+)
+async def export_msps(
+    estado: Optional[str] = Query(None, description="Filtrar por estado: activo, suspendido, inactivo"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Exportar MSPs como NDJSON
+    
+    - Un MSPResponse por línea
+    - Se lee por lotes con el mismo cursor que /listar, sin cargar todo en memoria
+    """
+    return StreamingResponse(msp_service.exportar_msps(db, estado=estado), media_type="application/x-ndjson")
+
+
+@router.get(
+    "/estadisticas",
+    summary="Estadísticas de todos los MSPs",
+    description="Estadísticas de todos los MSPs en una consulta, con paginación y ETag (super admin)"
+)
+async def get_msps_stats(
+    request: Request,
+    estado: Optional[str] = Query(None, description="Filtrar por estado: activo, suspendido, inactivo"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Estadísticas de varios MSPs a la vez
+    
+    - Mismos campos que /{msp_id}/estadisticas por MSP
+    - Paginado por msp_id
+    - Responde 304 si el ETag coincide con If-None-Match
+    """
+    estadisticas = await msp_service.obtener_estadisticas_msps(db, estado=estado, skip=skip, limit=limit)
+    return respuesta_con_etag(request, estadisticas)
 
 
 @router.get(
@@ -72,16 +124,16 @@ def list_msps(
     summary="Obtener MSP por ID",
     description="Consulta los detalles de un MSP específico"
 )
-def get_msp(
+async def get_msp(
     msp_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener un MSP por su identificador único
     
     - **msp_id**: Identificador del MSP (ej: msp_telcel_001)
     """
-    return msp_service.obtener_msp(db, msp_id)
+    return await msp_service.obtener_msp(db, msp_id)
 
 
 @router.put(
@@ -90,10 +142,10 @@ def get_msp(
     summary="Actualizar MSP",
     description="Modifica los datos de un MSP existente"
 )
-def update_msp(
+async def update_msp(
     msp_id: str,
     data: MSPUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualizar un MSP existente
@@ -101,7 +153,7 @@ def update_msp(
     - Solo se actualizan los campos proporcionados
     - Los demás campos permanecen sin cambios
     """
-    return msp_service.actualizar_msp(db, msp_id, data)
+    return await msp_service.actualizar_msp(db, msp_id, data)
 
 
 @router.delete(
@@ -109,9 +161,9 @@ def update_msp(
     summary="Eliminar MSP",
     description="Marca un MSP como inactivo (soft delete)"
 )
-def delete_msp(
+async def delete_msp(
     msp_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Eliminar un MSP (soft delete)
@@ -119,7 +171,7 @@ def delete_msp(
     - Cambia el estado a 'inactivo'
     - No se permite si tiene condominios activos
     """
-    return msp_service.eliminar_msp(db, msp_id)
+    return await msp_service.eliminar_msp(db, msp_id)
 
 
 @router.get(
@@ -127,9 +179,9 @@ def delete_msp(
     summary="Estadísticas del MSP",
     description="Obtiene métricas y estadísticas de un MSP"
 )
-def get_msp_stats(
+async def get_msp_stats(
     msp_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtener estadísticas de un MSP
@@ -139,4 +191,4 @@ def get_msp_stats(
     - Condominios disponibles
     - Total de usuarios
     """
-    return msp_service.obtener_estadisticas_msp(db, msp_id)
+    return await msp_service.obtener_estadisticas_msp(db, msp_id)
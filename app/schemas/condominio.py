@@ -78,5 +78,6 @@ class CondominioResponse(BaseModel):
 
 class CondominioListResponse(BaseModel):
     """Schema para listado de Condominios"""
-    total: int
+    total: Optional[int] = None  # None si se pidió sin total
     condominios: list[CondominioResponse]
+    siguiente_cursor: Optional[str] = None  # None en la última página
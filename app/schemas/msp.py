@@ -68,5 +68,6 @@ class MSPResponse(BaseModel):
 
 class MSPListResponse(BaseModel):
     """Schema para listado de MSPs"""
-    total: int
+    total: Optional[int] = None  # None si se pidió sin total
     msps: list[MSPResponse]
+    siguiente_cursor: Optional[str] = None  # None en la última página
@@ -3,16 +3,31 @@ Servicio de Condominio - Lógica de negocio pura
 Manejo de operaciones CRUD para Condominios
 """
 
-from sqlalchemy.orm import Session
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
 from core.db_exo import CondominioExo, MSPExo
-from app.schemas.condominio import CondominioCreate, CondominioUpdate
+from app.schemas.condominio import CondominioCreate, CondominioUpdate, CondominioResponse
+from app.utils.paginacion import exportar_ndjson, pagina_keyset, total_cacheado
+
+# Vida (s) de las estadísticas cacheadas por condominio (0 = sin cache)
+ESTADISTICAS_CACHE_TTL = float(os.getenv('ESTADISTICAS_CACHE_TTL', '10'))
+
+# condominio_id -> (expira_en monotonic, estadísticas)
+_cache_estadisticas: dict = {}
 
+# (msp_id, estado) -> (expira_en monotonic, total) de listar_condominios
+_cache_totales: dict = {}
 
-def crear_condominio(db: Session, data: CondominioCreate) -> CondominioExo:
+
+async def crear_condominio(db: AsyncSession, data: CondominioCreate) -> CondominioExo:
     """
     Crear un nuevo Condominio
     
@@ -27,7 +42,7 @@ def crear_condominio(db: Session, data: CondominioCreate) -> CondominioExo:
         HTTPException: Si el condominio ya existe o MSP no existe
     """
     # Validar que el MSP exista
-    msp = db.query(MSPExo).filter_by(msp_id=data.msp_id).first()
+    msp = await db.scalar(select(MSPExo).filter_by(msp_id=data.msp_id))
     if not msp:
         raise HTTPException(
             status_code=404,
@@ -35,7 +50,9 @@ def crear_condominio(db: Session, data: CondominioCreate) -> CondominioExo:
         )
     
     # Validar límite de condominios del MSP
-    total_condominios = db.query(CondominioExo).filter_by(msp_id=data.msp_id).count()
+    total_condominios = await db.scalar(
+        select(func.count()).select_from(CondominioExo).filter_by(msp_id=data.msp_id)
+    )
     if total_condominios >= msp.max_condominios:
         raise HTTPException(
             status_code=400,
@@ -43,7 +60,7 @@ def crear_condominio(db: Session, data: CondominioCreate) -> CondominioExo:
         )
     
     # Validar si el condominio ya existe
-    existing = db.query(CondominioExo).filter_by(condominio_id=data.condominio_id).first()
+    existing = await db.scalar(select(CondominioExo).filter_by(condominio_id=data.condominio_id))
     if existing:
         raise HTTPException(
             status_code=400,
@@ -73,25 +90,42 @@ def crear_condominio(db: Session, data: CondominioCreate) -> CondominioExo:
         )
         
         db.add(new_condo)
-        db.commit()
-        db.refresh(new_condo)
+        await db.commit()
+        await db.refresh(new_condo)
+        _cache_totales.clear()
         
         return new_condo
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Error de integridad: {str(e)}")
 
 
-def listar_condominios(
-    db: Session,
+def _consulta_condominios(msp_id: Optional[str] = None, estado: Optional[str] = None):
+    """select(CondominioExo) con los filtros de los listados"""
+    query = select(CondominioExo)
+    
+    if msp_id:
+        query = query.where(CondominioExo.msp_id == msp_id)
+    
+    if estado:
+        query = query.where(CondominioExo.estado == estado)
+    
+    return query
+
+
+async def listar_condominios(
+    db: AsyncSession,
     msp_id: Optional[str] = None,
     estado: Optional[str] = None,
     skip: int = 0,
     limit: int = 100
 ) -> List[CondominioExo]:
     """
-    Listar condominios con filtros y paginación
+    Listar condominios con filtros y paginación por OFFSET
+    
+    Se mantiene por compatibilidad; listar_condominios_cursor no se vuelve
+    más lento en páginas profundas.
     
     Args:
         db: Sesión de base de datos
@@ -101,37 +135,83 @@ def listar_condominios(
         limit: Número máximo de registros
         
     Returns:
-        List[CondominioExo]: Lista de condominios
+        List[CondominioExo]: Lista de condominios en orden (created_at, condominio_id)
     """
-    query = db.query(CondominioExo)
-    
-    if msp_id:
-        query = query.filter(CondominioExo.msp_id == msp_id)
-    
-    if estado:
-        query = query.filter(CondominioExo.estado == estado)
+    query = _consulta_condominios(msp_id, estado).order_by(
+        CondominioExo.created_at, CondominioExo.condominio_id
+    )
+    return list(await db.scalars(query.offset(skip).limit(limit)))
+
+
+async def listar_condominios_cursor(
+    db: AsyncSession,
+    msp_id: Optional[str] = None,
+    estado: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[CondominioExo], Optional[str]]:
+    """
+    Listar condominios con paginación keyset sobre (created_at, condominio_id)
     
-    return query.offset(skip).limit(limit).all()
+    Args:
+        db: Sesión de base de datos
+        msp_id: Filtrar por MSP (scope multi-tenant)
+        estado: Filtrar por estado
+        cursor: siguiente_cursor de la página anterior (None = primera página)
+        limit: Número máximo de registros
+        
+    Returns:
+        (condominios, siguiente_cursor); siguiente_cursor es None en la última página
+    """
+    return await pagina_keyset(
+        db, _consulta_condominios(msp_id, estado),
+        CondominioExo.created_at, CondominioExo.condominio_id,
+        cursor, limit
+    )
 
 
-def contar_condominios(
-    db: Session,
+def exportar_condominios(
+    db: AsyncSession,
+    msp_id: Optional[str] = None,
+    estado: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """Todos los condominios del filtro como NDJSON (un CondominioResponse por línea)"""
+    return exportar_ndjson(
+        db, _consulta_condominios(msp_id, estado),
+        CondominioExo.created_at, CondominioExo.condominio_id,
+        CondominioResponse
+    )
+
+
+async def contar_condominios(
+    db: AsyncSession,
     msp_id: Optional[str] = None,
     estado: Optional[str] = None
 ) -> int:
     """Contar total de condominios con filtros"""
-    query = db.query(CondominioExo)
+    query = select(func.count()).select_from(CondominioExo)
     
     if msp_id:
-        query = query.filter(CondominioExo.msp_id == msp_id)
+        query = query.where(CondominioExo.msp_id == msp_id)
     
     if estado:
-        query = query.filter(CondominioExo.estado == estado)
+        query = query.where(CondominioExo.estado == estado)
     
-    return query.count()
+    return await db.scalar(query)
+
+
+async def contar_condominios_cacheado(
+    db: AsyncSession,
+    msp_id: Optional[str] = None,
+    estado: Optional[str] = None
+) -> int:
+    """contar_condominios reutilizado LISTADO_TOTAL_TTL segundos (para los listados)"""
+    return await total_cacheado(
+        _cache_totales, (msp_id, estado), lambda: contar_condominios(db, msp_id=msp_id, estado=estado)
+    )
 
 
-def obtener_condominio(db: Session, condominio_id: str) -> CondominioExo:
+async def obtener_condominio(db: AsyncSession, condominio_id: str) -> CondominioExo:
     """
     Obtener un condominio por su ID
     
@@ -145,7 +225,7 @@ def obtener_condominio(db: Session, condominio_id: str) -> CondominioExo:
     Raises:
         HTTPException: Si no se encuentra
     """
-    condo = db.query(CondominioExo).filter_by(condominio_id=condominio_id).first()
+    condo = await db.scalar(select(CondominioExo).filter_by(condominio_id=condominio_id))
     
     if not condo:
         raise HTTPException(
@@ -156,8 +236,8 @@ def obtener_condominio(db: Session, condominio_id: str) -> CondominioExo:
     return condo
 
 
-def actualizar_condominio(
-    db: Session,
+async def actualizar_condominio(
+    db: AsyncSession,
     condominio_id: str,
     data: CondominioUpdate
 ) -> CondominioExo:
@@ -172,7 +252,7 @@ def actualizar_condominio(
     Returns:
         CondominioExo: Condominio actualizado
     """
-    condo = obtener_condominio(db, condominio_id)
+    condo = await obtener_condominio(db, condominio_id)
     
     update_data = data.model_dump(exclude_unset=True)
     
@@ -185,15 +265,17 @@ def actualizar_condominio(
         setattr(condo, field, value)
     
     try:
-        db.commit()
-        db.refresh(condo)
+        await db.commit()
+        await db.refresh(condo)
+        invalidar_estadisticas(condominio_id)
+        _cache_totales.clear()
         return condo
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Error de integridad: {str(e)}")
 
 
-def eliminar_condominio(db: Session, condominio_id: str) -> dict:
+async def eliminar_condominio(db: AsyncSession, condominio_id: str) -> dict:
     """
     Eliminar un condominio (soft delete)
     
@@ -204,14 +286,16 @@ def eliminar_condominio(db: Session, condominio_id: str) -> dict:
     Returns:
         dict: Mensaje de confirmación
     """
-    condo = obtener_condominio(db, condominio_id)
+    condo = await obtener_condominio(db, condominio_id)
     
     # Verificar si tiene residencias activas
     from core.db_exo import ResidenciaExo
-    residencias_activas = db.query(ResidenciaExo).filter_by(
-        condominio_id=condominio_id,
-        estado="activo"
-    ).count()
+    residencias_activas = await db.scalar(
+        select(func.count()).select_from(ResidenciaExo).filter_by(
+            condominio_id=condominio_id,
+            estado="activo"
+        )
+    )
     
     if residencias_activas > 0:
         raise HTTPException(
@@ -221,15 +305,22 @@ def eliminar_condominio(db: Session, condominio_id: str) -> dict:
     
     # Soft delete
     condo.estado = "inactivo"
-    db.commit()
+    await db.commit()
+    invalidar_estadisticas(condominio_id)
+    _cache_totales.clear()
     
     return {"message": f"Condominio '{condominio_id}' marcado como inactivo"}
 
 
-def obtener_estadisticas_condominio(db: Session, condominio_id: str) -> dict:
+async def obtener_estadisticas_condominio(db: AsyncSession, condominio_id: str) -> dict:
     """
     Obtener estadísticas de un condominio
     
+    Todos los contadores salen de una sola consulta (subconsultas escalares
+    sobre los índices por condominio_id) y el resultado se cachea
+    ESTADISTICAS_CACHE_TTL segundos por condominio, porque el portal de
+    administración consulta este endpoint en ciclo para cientos de condominios.
+    
     Args:
         db: Sesión de base de datos
         condominio_id: Identificador del condominio
@@ -237,48 +328,151 @@ def obtener_estadisticas_condominio(db: Session, condominio_id: str) -> dict:
     Returns:
         dict: Estadísticas del condominio
     """
-    condo = obtener_condominio(db, condominio_id)
+    en_cache = _cache_estadisticas.get(condominio_id)
+    if en_cache and time.monotonic() < en_cache[0]:
+        return dict(en_cache[1])
+    
+    fila = (await db.execute(_consulta_estadisticas(condominio_id))).first()
+    if not fila:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Condominio con condominio_id '{condominio_id}' no encontrado"
+        )
     
+    estadisticas = {"condominio_id": condominio_id, **fila._asdict()}
+    if ESTADISTICAS_CACHE_TTL > 0:
+        _cache_estadisticas[condominio_id] = (time.monotonic() + ESTADISTICAS_CACHE_TTL, estadisticas)
+    return dict(estadisticas)
+
+
+def _consulta_estadisticas(condominio_id: str):
+    """SELECT del condominio con un contador por subconsulta escalar"""
     from core.db_exo import ResidenciaExo, ResidenteExo, VisitanteExo, AccesoExo
-    from datetime import datetime, timedelta
-    
-    # Contar residencias
-    total_residencias = db.query(ResidenciaExo).filter_by(
-        condominio_id=condominio_id
-    ).count()
-    
-    # Contar residentes
-    residencias_ids = [r.residencia_id for r in db.query(ResidenciaExo).filter_by(
-        condominio_id=condominio_id
-    ).all()]
-    
-    total_residentes = 0
-    if residencias_ids:
-        total_residentes = db.query(ResidenteExo).filter(
-            ResidenteExo.residencia_id.in_(residencias_ids)
-        ).count()
-    
-    # Contar visitantes activos
-    visitantes_activos = db.query(VisitanteExo).filter_by(
-        condominio_id=condominio_id,
-        estado="activo"
-    ).count()
-    
-    # Accesos hoy
+    
+    def contar(modelo, *condiciones):
+        return select(func.count()).select_from(modelo).where(*condiciones).scalar_subquery()
+    
     hoy = datetime.now().date()
-    accesos_hoy = db.query(AccesoExo).filter(
-        AccesoExo.condominio_id == condominio_id,
-        AccesoExo.timestamp >= hoy
-    ).count()
+    return select(
+        CondominioExo.nombre,
+        CondominioExo.msp_id,
+        CondominioExo.total_unidades,
+        contar(ResidenciaExo, ResidenciaExo.condominio_id == condominio_id).label("total_residencias"),
+        contar(
+            ResidenteExo.__table__.join(
+                ResidenciaExo.__table__, ResidenteExo.residencia_id == ResidenciaExo.residencia_id
+            ),
+            ResidenciaExo.condominio_id == condominio_id
+        ).label("total_residentes"),
+        contar(
+            VisitanteExo, VisitanteExo.condominio_id == condominio_id, VisitanteExo.estado == "activo"
+        ).label("visitantes_activos"),
+        contar(
+            AccesoExo, AccesoExo.condominio_id == condominio_id, AccesoExo.timestamp >= hoy
+        ).label("accesos_hoy"),
+        CondominioExo.estado,
+    ).where(CondominioExo.condominio_id == condominio_id)
+
+
+async def obtener_estadisticas_flota(
+    db: AsyncSession,
+    msp_id: Optional[str] = None,
+    estado: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> dict:
+    """
+    Estadísticas de todos los condominios (de un MSP o de la flota completa)
+    
+    Una sola consulta: la página de condominios más un GROUP BY por
+    contador, restringido a los condominios de la página, en lugar de
+    llamar obtener_estadisticas_condominio por cada uno.
+    
+    Args:
+        db: Sesión de base de datos
+        msp_id: Filtrar por MSP (None = todos, para super admins)
+        estado: Filtrar por estado del condominio
+        skip: Número de condominios a saltar (orden por condominio_id)
+        limit: Número máximo de condominios
+        
+    Returns:
+        dict: total, skip, limit y las estadísticas de cada condominio con
+        la misma forma que obtener_estadisticas_condominio
+    """
+    filas = (await db.execute(_consulta_estadisticas_flota(msp_id, estado, skip, limit))).all()
+    
+    if filas:
+        total = filas[0].total
+    else:
+        total = await contar_condominios(db, msp_id=msp_id, estado=estado) if skip else 0
     
     return {
-        "condominio_id": condominio_id,
-        "nombre": condo.nombre,
-        "msp_id": condo.msp_id,
-        "total_unidades": condo.total_unidades,
-        "total_residencias": total_residencias,
-        "total_residentes": total_residentes,
-        "visitantes_activos": visitantes_activos,
-        "accesos_hoy": accesos_hoy,
-        "estado": condo.estado
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "condominios": [
+            {campo: valor for campo, valor in fila._asdict().items() if campo != "total"}
+            for fila in filas
+        ]
     }
+
+
+def _consulta_estadisticas_flota(msp_id: Optional[str], estado: Optional[str], skip: int, limit: int):
+    """Página de condominios (CTE) unida a un conteo agrupado por contador"""
+    from core.db_exo import ResidenciaExo, ResidenteExo, VisitanteExo, AccesoExo
+    
+    pagina = select(
+        CondominioExo.condominio_id,
+        CondominioExo.nombre,
+        CondominioExo.msp_id,
+        CondominioExo.total_unidades,
+        CondominioExo.estado,
+        func.count().over().label("total")
+    )
+    if msp_id:
+        pagina = pagina.where(CondominioExo.msp_id == msp_id)
+    if estado:
+        pagina = pagina.where(CondominioExo.estado == estado)
+    pagina = pagina.order_by(CondominioExo.condominio_id).offset(skip).limit(limit).cte("pagina")
+    
+    def por_condominio(columna, origen, *condiciones):
+        return select(columna.label("condominio_id"), func.count().label("n")).select_from(origen).where(
+            columna.in_(select(pagina.c.condominio_id)), *condiciones
+        ).group_by(columna).subquery()
+    
+    hoy = datetime.now().date()
+    contadores = {
+        "total_residencias": por_condominio(ResidenciaExo.condominio_id, ResidenciaExo),
+        "total_residentes": por_condominio(
+            ResidenciaExo.condominio_id,
+            ResidenteExo.__table__.join(
+                ResidenciaExo.__table__, ResidenteExo.residencia_id == ResidenciaExo.residencia_id
+            )
+        ),
+        "visitantes_activos": por_condominio(
+            VisitanteExo.condominio_id, VisitanteExo, VisitanteExo.estado == "activo"
+        ),
+        "accesos_hoy": por_condominio(AccesoExo.condominio_id, AccesoExo, AccesoExo.timestamp >= hoy),
+    }
+    
+    consulta = select(
+        pagina.c.condominio_id,
+        pagina.c.nombre,
+        pagina.c.msp_id,
+        pagina.c.total_unidades,
+        *(func.coalesce(conteo.c.n, 0).label(nombre) for nombre, conteo in contadores.items()),
+        pagina.c.estado,
+        pagina.c.total
+    ).select_from(pagina)
+    for conteo in contadores.values():
+        consulta = consulta.outerjoin(conteo, conteo.c.condominio_id == pagina.c.condominio_id)
+    
+    return consulta.order_by(pagina.c.condominio_id)
+
+
+def invalidar_estadisticas(condominio_id: Optional[str] = None):
+    """Descarta las estadísticas cacheadas de un condominio (o de todos)"""
+    if condominio_id is None:
+        _cache_estadisticas.clear()
+    else:
+        _cache_estadisticas.pop(condominio_id, None)
@@ -3,16 +3,21 @@ Servicio de MSP - Lógica de negocio pura
 Manejo de operaciones CRUD para MSPs
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
 from core.db_exo import MSPExo
-from app.schemas.msp import MSPCreate, MSPUpdate
+from app.schemas.msp import MSPCreate, MSPUpdate, MSPResponse
+from app.utils.paginacion import exportar_ndjson, pagina_keyset, total_cacheado
 
+# estado -> (expira_en monotonic, total) de listar_msps
+_cache_totales: dict = {}
 
-def crear_msp(db: Session, data: MSPCreate) -> MSPExo:
+
+async def crear_msp(db: AsyncSession, data: MSPCreate) -> MSPExo:
     """
     Crear un nuevo MSP
     
@@ -27,7 +32,7 @@ def crear_msp(db: Session, data: MSPCreate) -> MSPExo:
         HTTPException: Si el MSP ya existe
     """
     # Validar si ya existe
-    existing = db.query(MSPExo).filter_by(msp_id=data.msp_id).first()
+    existing = await db.scalar(select(MSPExo).filter_by(msp_id=data.msp_id))
     if existing:
         raise HTTPException(
             status_code=400,
@@ -54,24 +59,38 @@ def crear_msp(db: Session, data: MSPCreate) -> MSPExo:
         )
         
         db.add(new_msp)
-        db.commit()
-        db.refresh(new_msp)
+        await db.commit()
+        await db.refresh(new_msp)
+        _cache_totales.clear()
         
         return new_msp
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Error de integridad: {str(e)}")
 
 
-def listar_msps(
-    db: Session,
+def _consulta_msps(estado: Optional[str] = None):
+    """select(MSPExo) con los filtros de los listados"""
+    query = select(MSPExo)
+    
+    if estado:
+        query = query.where(MSPExo.estado == estado)
+    
+    return query
+
+
+async def listar_msps(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
     estado: Optional[str] = None
 ) -> List[MSPExo]:
     """
-    Listar MSPs con paginación y filtros
+    Listar MSPs con paginación por OFFSET y filtros
+    
+    Se mantiene por compatibilidad; listar_msps_cursor no se vuelve más
+    lento en páginas profundas.
     
     Args:
         db: Sesión de base de datos
@@ -80,25 +99,52 @@ def listar_msps(
         estado: Filtrar por estado (activo, suspendido, inactivo)
         
     Returns:
-        List[MSPExo]: Lista de MSPs
+        List[MSPExo]: Lista de MSPs en orden (created_at, msp_id)
     """
-    query = db.query(MSPExo)
-    
-    if estado:
-        query = query.filter(MSPExo.estado == estado)
+    query = _consulta_msps(estado).order_by(MSPExo.created_at, MSPExo.msp_id)
+    return list(await db.scalars(query.offset(skip).limit(limit)))
+
+
+async def listar_msps_cursor(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    estado: Optional[str] = None
+) -> Tuple[List[MSPExo], Optional[str]]:
+    """
+    Listar MSPs con paginación keyset sobre (created_at, msp_id)
     
-    return query.offset(skip).limit(limit).all()
+    Args:
+        db: Sesión de base de datos
+        cursor: siguiente_cursor de la página anterior (None = primera página)
+        limit: Número máximo de registros a retornar
+        estado: Filtrar por estado (activo, suspendido, inactivo)
+        
+    Returns:
+        (msps, siguiente_cursor); siguiente_cursor es None en la última página
+    """
+    return await pagina_keyset(db, _consulta_msps(estado), MSPExo.created_at, MSPExo.msp_id, cursor, limit)
 
 
-def contar_msps(db: Session, estado: Optional[str] = None) -> int:
+def exportar_msps(db: AsyncSession, estado: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Todos los MSPs del filtro como NDJSON (un MSPResponse por línea)"""
+    return exportar_ndjson(db, _consulta_msps(estado), MSPExo.created_at, MSPExo.msp_id, MSPResponse)
+
+
+async def contar_msps(db: AsyncSession, estado: Optional[str] = None) -> int:
     """Contar total de MSPs"""
-    query = db.query(MSPExo)
+    query = select(func.count()).select_from(MSPExo)
     if estado:
-        query = query.filter(MSPExo.estado == estado)
-    return query.count()
+        query = query.where(MSPExo.estado == estado)
+    return await db.scalar(query)
+
 
+async def contar_msps_cacheado(db: AsyncSession, estado: Optional[str] = None) -> int:
+    """contar_msps reutilizado LISTADO_TOTAL_TTL segundos (para los listados)"""
+    return await total_cacheado(_cache_totales, estado, lambda: contar_msps(db, estado=estado))
 
-def obtener_msp(db: Session, msp_id: str) -> MSPExo:
+
+async def obtener_msp(db: AsyncSession, msp_id: str) -> MSPExo:
     """
     Obtener un MSP por su ID
     
@@ -112,7 +158,7 @@ def obtener_msp(db: Session, msp_id: str) -> MSPExo:
     Raises:
         HTTPException: Si no se encuentra el MSP
     """
-    msp = db.query(MSPExo).filter_by(msp_id=msp_id).first()
+    msp = await db.scalar(select(MSPExo).filter_by(msp_id=msp_id))
     
     if not msp:
         raise HTTPException(
@@ -123,7 +169,7 @@ def obtener_msp(db: Session, msp_id: str) -> MSPExo:
     return msp
 
 
-def actualizar_msp(db: Session, msp_id: str, data: MSPUpdate) -> MSPExo:
+async def actualizar_msp(db: AsyncSession, msp_id: str, data: MSPUpdate) -> MSPExo:
     """
     Actualizar un MSP existente
     
@@ -138,7 +184,7 @@ def actualizar_msp(db: Session, msp_id: str, data: MSPUpdate) -> MSPExo:
     Raises:
         HTTPException: Si no se encuentra el MSP
     """
-    msp = obtener_msp(db, msp_id)
+    msp = await obtener_msp(db, msp_id)
     
     # Actualizar solo los campos proporcionados
     update_data = data.model_dump(exclude_unset=True)
@@ -152,15 +198,16 @@ def actualizar_msp(db: Session, msp_id: str, data: MSPUpdate) -> MSPExo:
         setattr(msp, field, value)
     
     try:
-        db.commit()
-        db.refresh(msp)
+        await db.commit()
+        await db.refresh(msp)
+        _cache_totales.clear()
         return msp
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Error de integridad: {str(e)}")
 
 
-def eliminar_msp(db: Session, msp_id: str) -> dict:
+async def eliminar_msp(db: AsyncSession, msp_id: str) -> dict:
     """
     Eliminar un MSP (soft delete cambiando estado a 'inactivo')
     
@@ -174,14 +221,16 @@ def eliminar_msp(db: Session, msp_id: str) -> dict:
     Raises:
         HTTPException: Si no se encuentra el MSP o tiene condominios activos
     """
-    msp = obtener_msp(db, msp_id)
+    msp = await obtener_msp(db, msp_id)
     
     # Verificar si tiene condominios activos
     from core.db_exo import CondominioExo
-    condominios_activos = db.query(CondominioExo).filter_by(
-        msp_id=msp_id,
-        estado="activo"
-    ).count()
+    condominios_activos = await db.scalar(
+        select(func.count()).select_from(CondominioExo).filter_by(
+            msp_id=msp_id,
+            estado="activo"
+        )
+    )
     
     if condominios_activos > 0:
         raise HTTPException(
@@ -191,12 +240,13 @@ def eliminar_msp(db: Session, msp_id: str) -> dict:
     
     # Soft delete
     msp.estado = "inactivo"
-    db.commit()
+    await db.commit()
+    _cache_totales.clear()
     
     return {"message": f"MSP '{msp_id}' marcado como inactivo"}
 
 
-def obtener_estadisticas_msp(db: Session, msp_id: str) -> dict:
+async def obtener_estadisticas_msp(db: AsyncSession, msp_id: str) -> dict:
     """
     Obtener estadísticas de un MSP
     
@@ -207,19 +257,25 @@ def obtener_estadisticas_msp(db: Session, msp_id: str) -> dict:
     Returns:
         dict: Estadísticas del MSP
     """
-    msp = obtener_msp(db, msp_id)
+    msp = await obtener_msp(db, msp_id)
     
     from core.db_exo import CondominioExo, UsuarioExo
     
     # Contar condominios
-    total_condominios = db.query(CondominioExo).filter_by(msp_id=msp_id).count()
-    condominios_activos = db.query(CondominioExo).filter_by(
-        msp_id=msp_id,
-        estado="activo"
-    ).count()
+    total_condominios = await db.scalar(
+        select(func.count()).select_from(CondominioExo).filter_by(msp_id=msp_id)
+    )
+    condominios_activos = await db.scalar(
+        select(func.count()).select_from(CondominioExo).filter_by(
+            msp_id=msp_id,
+            estado="activo"
+        )
+    )
     
     # Contar usuarios
-    total_usuarios = db.query(UsuarioExo).filter_by(msp_id=msp_id).count()
+    total_usuarios = await db.scalar(
+        select(func.count()).select_from(UsuarioExo).filter_by(msp_id=msp_id)
+    )
     
     return {
         "msp_id": msp_id,
@@ -232,3 +288,87 @@ def obtener_estadisticas_msp(db: Session, msp_id: str) -> dict:
         "total_usuarios": total_usuarios,
         "estado": msp.estado
     }
+
+
+async def obtener_estadisticas_msps(
+    db: AsyncSession,
+    estado: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> dict:
+    """
+    Estadísticas de todos los MSPs (vista de super admin)
+    
+    Una sola consulta con los conteos de condominios y usuarios agrupados
+    por msp_id para la página de MSPs, en lugar de obtener_estadisticas_msp
+    por cada uno.
+    
+    Args:
+        db: Sesión de base de datos
+        estado: Filtrar por estado del MSP
+        skip: Número de MSPs a saltar (orden por msp_id)
+        limit: Número máximo de MSPs
+        
+    Returns:
+        dict: total, skip, limit y las estadísticas de cada MSP con la misma
+        forma que obtener_estadisticas_msp
+    """
+    from core.db_exo import CondominioExo, UsuarioExo
+    
+    pagina = select(
+        MSPExo.msp_id,
+        MSPExo.nombre,
+        MSPExo.plan,
+        MSPExo.max_condominios,
+        MSPExo.estado,
+        func.count().over().label("total")
+    )
+    if estado:
+        pagina = pagina.where(MSPExo.estado == estado)
+    pagina = pagina.order_by(MSPExo.msp_id).offset(skip).limit(limit).cte("pagina")
+    en_pagina = select(pagina.c.msp_id)
+    
+    condominios = select(
+        CondominioExo.msp_id,
+        func.count().label("total"),
+        func.count().filter(CondominioExo.estado == "activo").label("activos")
+    ).where(CondominioExo.msp_id.in_(en_pagina)).group_by(CondominioExo.msp_id).subquery()
+    usuarios = select(
+        UsuarioExo.msp_id,
+        func.count().label("total")
+    ).where(UsuarioExo.msp_id.in_(en_pagina)).group_by(UsuarioExo.msp_id).subquery()
+    
+    total_condominios = func.coalesce(condominios.c.total, 0)
+    consulta = select(
+        pagina.c.msp_id,
+        pagina.c.nombre,
+        pagina.c.plan,
+        pagina.c.max_condominios,
+        total_condominios.label("total_condominios"),
+        func.coalesce(condominios.c.activos, 0).label("condominios_activos"),
+        (pagina.c.max_condominios - total_condominios).label("condominios_disponibles"),
+        func.coalesce(usuarios.c.total, 0).label("total_usuarios"),
+        pagina.c.estado,
+        pagina.c.total
+    ).select_from(pagina).outerjoin(
+        condominios, condominios.c.msp_id == pagina.c.msp_id
+    ).outerjoin(
+        usuarios, usuarios.c.msp_id == pagina.c.msp_id
+    ).order_by(pagina.c.msp_id)
+    
+    filas = (await db.execute(consulta)).all()
+    
+    if filas:
+        total = filas[0].total
+    else:
+        total = await contar_msps(db, estado=estado) if skip else 0
+    
+    return {
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "msps": [
+            {campo: valor for campo, valor in fila._asdict().items() if campo != "total"}
+            for fila in filas
+        ]
+    }
@@ -0,0 +1,38 @@
+"""
+ETag para respuestas JSON de la API
+Los clientes que consultan en ciclo reciben 304 si nada cambió
+"""
+
+import hashlib
+import json
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def respuesta_con_etag(request: Request, contenido) -> Response:
+    """
+    Serializa el contenido y responde con su ETag
+
+    El ETag es el hash del cuerpo JSON; si coincide con If-None-Match se
+    responde 304 sin cuerpo.
+
+    Args:
+        request: Request entrante (para If-None-Match)
+        contenido: Datos serializables a JSON
+
+    Returns:
+        Response: 200 con cuerpo y ETag, o 304
+    """
+    cuerpo = json.dumps(
+        jsonable_encoder(contenido), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    etag = f'"{hashlib.blake2b(cuerpo, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    etiquetas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+    if etag in etiquetas or "*" in etiquetas:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
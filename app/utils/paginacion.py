@@ -0,0 +1,144 @@
+"""
+Paginación keyset (por cursor) y exportación NDJSON para los listados de la API
+Cada página filtra por el último (created_at, id) visto en lugar de saltar
+filas con OFFSET, así que su costo no crece con la profundidad
+"""
+
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Filas por consulta al exportar un listado completo como NDJSON
+API_LOTE_EXPORTACION = int(os.getenv('API_LOTE_EXPORTACION', '500'))
+
+# Vida (s) del total cacheado de cada listado (0 = COUNT(*) en cada página)
+LISTADO_TOTAL_TTL = float(os.getenv('LISTADO_TOTAL_TTL', '30'))
+
+
+def codificar_cursor(fecha, identificador: str) -> str:
+    """(created_at, id) de la última fila -> cursor opaco para la siguiente página"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.isoformat()
+    crudo = json.dumps([fecha, identificador], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, str]:
+    """Cursor opaco -> (created_at, id); 400 si no es un cursor válido"""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        fecha, identificador = json.loads(crudo)
+        if not isinstance(fecha, str) or not isinstance(identificador, str):
+            raise ValueError(cursor)
+        return fecha, identificador
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def _columna_fecha(db: AsyncSession, columna):
+    """
+    Expresión de created_at para ordenar y comparar
+
+    SQLite guarda created_at como texto (CURRENT_TIMESTAMP, sin
+    microsegundos) y lo compara como texto: ahí el cursor lleva el valor tal
+    como está guardado. En PostgreSQL es la columna timestamptz.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return type_coerce(columna, String)
+    return columna
+
+
+async def pagina_keyset(
+    db: AsyncSession,
+    consulta,
+    columna_fecha,
+    columna_id,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List, Optional[str]]:
+    """
+    Una página de `consulta` (un select de entidades) en orden (created_at, id)
+
+    Args:
+        db: Sesión de base de datos
+        consulta: select(Modelo) con los filtros ya aplicados
+        columna_fecha: Columna created_at del modelo
+        columna_id: Identificador exógeno único del modelo (desempate)
+        cursor: siguiente_cursor de la página anterior (None = primera)
+        limit: Máximo de filas
+
+    Returns:
+        (entidades, siguiente_cursor); siguiente_cursor es None en la última página
+    """
+    fecha = _columna_fecha(db, columna_fecha)
+    consulta = consulta.add_columns(fecha.label("cursor_fecha"), columna_id.label("cursor_id"))
+
+    if cursor:
+        valor_fecha, valor_id = decodificar_cursor(cursor)
+        if fecha is columna_fecha:
+            try:
+                valor_fecha = datetime.fromisoformat(valor_fecha)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+        consulta = consulta.where(tuple_(fecha, columna_id) > (valor_fecha, valor_id))
+
+    # Una fila de más indica si hay otra página sin contar
+    filas = (await db.execute(consulta.order_by(fecha, columna_id).limit(limit + 1))).all()
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = codificar_cursor(filas[-1].cursor_fecha, filas[-1].cursor_id)
+    return [fila[0] for fila in filas], siguiente
+
+
+async def exportar_ndjson(
+    db: AsyncSession,
+    consulta,
+    columna_fecha,
+    columna_id,
+    esquema
+) -> AsyncIterator[bytes]:
+    """
+    Todas las filas de `consulta` como NDJSON, por lotes keyset
+
+    Pensado para StreamingResponse: cierra la sesión al terminar, porque la
+    dependencia que la abrió ya salió cuando empieza el streaming.
+
+    Args:
+        esquema: Schema Pydantic de respuesta para serializar cada entidad
+    """
+    cursor = None
+    try:
+        while True:
+            entidades, cursor = await pagina_keyset(
+                db, consulta, columna_fecha, columna_id, cursor, API_LOTE_EXPORTACION
+            )
+            if entidades:
+                yield "".join(
+                    esquema.model_validate(entidad).model_dump_json() + "\n" for entidad in entidades
+                ).encode("utf-8")
+            # El identity map no debe crecer con todo el listado
+            db.expunge_all()
+            if not cursor:
+                break
+    finally:
+        await db.close()
+
+
+async def total_cacheado(cache: dict, clave, contar: Callable[[], Awaitable[int]]) -> int:
+    """COUNT(*) de un listado, reutilizado LISTADO_TOTAL_TTL segundos por filtro"""
+    en_cache = cache.get(clave)
+    if en_cache and time.monotonic() < en_cache[0]:
+        return en_cache[1]
+    total = await contar()
+    if LISTADO_TOTAL_TTL > 0:
+        cache[clave] = (time.monotonic() + LISTADO_TOTAL_TTL, total)
+    return total
@@ -0,0 +1,154 @@
+"""
+benchmark_api.py
+Carga concurrente sobre la API: capa async (AsyncSession/asyncpg) contra la
+ruta síncrona anterior (Session en el threadpool de FastAPI)
+
+Uso:
+    python benchmark_api.py --url postgresql://... --concurrencia 200 --peticiones 5000
+
+Las requests se sirven en proceso (httpx.ASGITransport), así que se mide la
+capa de datos y no la red. Las cifras representativas son con PostgreSQL:
+sobre SQLite ambas rutas terminan serializadas por el archivo.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Query
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from core.db_exo import Base, CondominioExo, MSPExo
+from app.database.connection import DATABASE_URL, crear_async_engine, get_async_db
+from app.main import app as app_async
+
+MSP_ID = "msp_benchmark"
+
+
+def _crear_engine_sync(url: str):
+    """Engine síncrono con la configuración previa a la capa async"""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url, pool_pre_ping=True, pool_size=5, max_overflow=10)
+
+
+def _app_sync(sesiones: sessionmaker) -> FastAPI:
+    """Los mismos endpoints de lectura con def + Session, como antes de la capa async"""
+    app = FastAPI()
+
+    def get_db():
+        db = sesiones()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/msp/{msp_id}")
+    def get_msp(msp_id: str, db: Session = Depends(get_db)):
+        msp = db.query(MSPExo).filter(MSPExo.msp_id == msp_id).first()
+        if not msp:
+            raise HTTPException(status_code=404)
+        return {"msp_id": msp.msp_id, "nombre": msp.nombre}
+
+    @app.get("/condominio/listar")
+    def list_condominios(
+        msp_id: str,
+        skip: int = Query(0),
+        limit: int = Query(100),
+        db: Session = Depends(get_db)
+    ):
+        query = db.query(CondominioExo).filter(CondominioExo.msp_id == msp_id)
+        condominios = query.order_by(CondominioExo.created_at.desc()).offset(skip).limit(limit).all()
+        return {"total": query.count(), "items": [c.condominio_id for c in condominios]}
+
+    return app
+
+
+def _sembrar(sesiones: sessionmaker, condominios: int):
+    """Un MSP con N condominios para las lecturas"""
+    with sesiones() as db:
+        if db.scalar(select(func.count()).select_from(MSPExo).filter_by(msp_id=MSP_ID)):
+            return
+        db.add(MSPExo(msp_id=MSP_ID, nombre="MSP Benchmark", max_condominios=condominios))
+        db.add_all([
+            CondominioExo(condominio_id=f"condo_benchmark_{i}", msp_id=MSP_ID, nombre=f"Condominio {i}")
+            for i in range(condominios)
+        ])
+        db.commit()
+
+
+async def _carga(app: FastAPI, concurrencia: int, peticiones: int) -> dict:
+    """Lanza `peticiones` GET alternando endpoints con a lo más `concurrencia` en vuelo"""
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, errores = [], 0
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 limits=limites, timeout=None) as cliente:
+        async def una(i: int):
+            nonlocal errores
+            async with semaforo:
+                inicio = time.perf_counter()
+                if i % 2:
+                    r = await cliente.get("/condominio/listar", params={"msp_id": MSP_ID, "limit": 20})
+                else:
+                    r = await cliente.get(f"/msp/{MSP_ID}")
+                latencias.append(time.perf_counter() - inicio)
+                if r.status_code != 200:
+                    errores += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*[una(i) for i in range(peticiones)])
+        duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "rps": peticiones / duracion,
+        "p50_ms": statistics.median(latencias) * 1000,
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000,
+        "errores": errores,
+    }
+
+
+async def main(url: str, concurrencia: int, peticiones: int, condominios: int):
+    engine_sync = _crear_engine_sync(url)
+    sesiones_sync = sessionmaker(bind=engine_sync, autocommit=False, autoflush=False)
+    Base.metadata.create_all(engine_sync)
+    _sembrar(sesiones_sync, condominios)
+
+    engine_async = crear_async_engine(url)
+    sesiones_async = async_sessionmaker(engine_async, expire_on_commit=False, autoflush=False)
+
+    async def get_db_benchmark():
+        async with sesiones_async() as db:
+            yield db
+
+    app_async.dependency_overrides[get_async_db] = get_db_benchmark
+
+    print(f"📊 {peticiones} requests, concurrencia {concurrencia}, {url.split('@')[-1]}")
+    try:
+        for nombre, app in (("sync ", _app_sync(sesiones_sync)), ("async", app_async)):
+            await _carga(app, min(concurrencia, 10), min(peticiones, 100))  # calentamiento
+            r = await _carga(app, concurrencia, peticiones)
+            print(f"   {nombre}: {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  "
+                  f"p95 {r['p95_ms']:7.1f} ms  errores {r['errores']}")
+    finally:
+        app_async.dependency_overrides.clear()
+        await engine_async.dispose()
+        engine_sync.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga sync vs async de la API")
+    parser.add_argument("--url", default=os.getenv("BENCHMARK_DATABASE_URL", DATABASE_URL),
+                        help="URL de la base (se crean las tablas y un MSP de prueba)")
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=4000)
+    parser.add_argument("--condominios", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrencia, args.peticiones, args.condominios))
@@ -5,8 +5,9 @@ Exportaciones del core AUP-EXO
 
 from .db import get_db, init_db
 from .orquestador import OrquestadorAccesos
-from .motor_reglas import evaluar_reglas
+from .motor_reglas import evaluar_reglas, evaluar_reglas_batch
 from .hashing import hash_evento, hash_entidad, verificar_cadena_integridad
+from .merkle import obtener_prueba_inclusion
 from .roles import RoleManager, Permisos
 from .contexto import ContextoManager
 from .evidencia import enviar_a_recordia
@@ -16,9 +17,11 @@ __all__ = [
     "init_db",
     "OrquestadorAccesos",
     "evaluar_reglas",
+    "evaluar_reglas_batch",
     "hash_evento",
     "hash_entidad",
     "verificar_cadena_integridad",
+    "obtener_prueba_inclusion",
     "RoleManager",
     "Permisos",
     "ContextoManager",
@@ -30,8 +33,9 @@ __author__ = "Accesos Residencial Team"
 
 from core.db import get_db, init_db
 from core.orquestador import OrquestadorAccesos
-from core.motor_reglas import evaluar_reglas
+from core.motor_reglas import evaluar_reglas, evaluar_reglas_batch
 from core.hashing import hash_evento, hash_entidad
+from core.merkle import obtener_prueba_inclusion
 from core.roles import RoleManager, Permisos
 
 __all__ = [
@@ -39,8 +43,10 @@ __all__ = [
     'init_db',
     'OrquestadorAccesos',
     'evaluar_reglas',
+    'evaluar_reglas_batch',
     'hash_evento',
     'hash_entidad',
+    'obtener_prueba_inclusion',
     'RoleManager',
     'Permisos'
 ]
@@ -0,0 +1,355 @@
+"""
+core/agregados.py
+Agregados de eventos por condominio/día/hora/tipo mantenidos al anexar
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+from core.db import get_db, asegurar_columnas, PostgresConnectionWrapper, COLUMNAS_CADENA_EVENTOS
+
+# Clave de los eventos sin condominio (las llaves primarias no admiten NULL)
+SIN_CONDOMINIO = ""
+
+
+_SQL_AGREGADOS_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS eventos_por_hora (
+        condominio_id TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        hora INTEGER NOT NULL,
+        tipo_evento TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (condominio_id, fecha, hora, tipo_evento)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rechazos_por_motivo (
+        condominio_id TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        motivo TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (condominio_id, fecha, motivo)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_eventos_por_hora_insert
+    AFTER INSERT ON eventos
+    WHEN DATE(NEW.timestamp_servidor) IS NOT NULL
+    BEGIN
+        INSERT INTO eventos_por_hora (condominio_id, fecha, hora, tipo_evento, total)
+        VALUES (
+            COALESCE(NEW.condominio_id, ''),
+            DATE(NEW.timestamp_servidor),
+            CAST(strftime('%H', NEW.timestamp_servidor) AS INTEGER),
+            NEW.tipo_evento,
+            1
+        )
+        ON CONFLICT (condominio_id, fecha, hora, tipo_evento) DO UPDATE SET total = total + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_eventos_por_hora_delete
+    AFTER DELETE ON eventos
+    WHEN DATE(OLD.timestamp_servidor) IS NOT NULL
+    BEGIN
+        UPDATE eventos_por_hora SET total = total - 1
+        WHERE condominio_id = COALESCE(OLD.condominio_id, '')
+          AND fecha = DATE(OLD.timestamp_servidor)
+          AND hora = CAST(strftime('%H', OLD.timestamp_servidor) AS INTEGER)
+          AND tipo_evento = OLD.tipo_evento;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_rechazos_por_motivo_insert
+    AFTER INSERT ON eventos
+    WHEN NEW.tipo_evento = 'rechazo' AND DATE(NEW.timestamp_servidor) IS NOT NULL
+    BEGIN
+        INSERT INTO rechazos_por_motivo (condominio_id, fecha, motivo, total)
+        VALUES (
+            COALESCE(NEW.condominio_id, ''),
+            DATE(NEW.timestamp_servidor),
+            COALESCE(CASE WHEN json_valid(NEW.metadata)
+                          THEN json_extract(NEW.metadata, '$.motivo_rechazo') END, ''),
+            1
+        )
+        ON CONFLICT (condominio_id, fecha, motivo) DO UPDATE SET total = total + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_rechazos_por_motivo_delete
+    AFTER DELETE ON eventos
+    WHEN OLD.tipo_evento = 'rechazo' AND DATE(OLD.timestamp_servidor) IS NOT NULL
+    BEGIN
+        UPDATE rechazos_por_motivo SET total = total - 1
+        WHERE condominio_id = COALESCE(OLD.condominio_id, '')
+          AND fecha = DATE(OLD.timestamp_servidor)
+          AND motivo = COALESCE(CASE WHEN json_valid(OLD.metadata)
+                                     THEN json_extract(OLD.metadata, '$.motivo_rechazo') END, '');
+    END
+    """,
+]
+
+_SQL_AGREGADOS_PG = [
+    """
+    CREATE TABLE IF NOT EXISTS eventos_por_hora (
+        condominio_id VARCHAR(100) NOT NULL,
+        fecha DATE NOT NULL,
+        hora SMALLINT NOT NULL,
+        tipo_evento VARCHAR(50) NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (condominio_id, fecha, hora, tipo_evento)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rechazos_por_motivo (
+        condominio_id VARCHAR(100) NOT NULL,
+        fecha DATE NOT NULL,
+        motivo TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (condominio_id, fecha, motivo)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION motivo_rechazo_evento(metadata TEXT)
+    RETURNS TEXT AS $$
+    BEGIN
+        RETURN COALESCE(metadata::jsonb->>'motivo_rechazo', '');
+    EXCEPTION WHEN others THEN
+        RETURN '';
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION actualizar_agregados_eventos()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        fila eventos%ROWTYPE;
+        delta INTEGER;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            fila := NEW;
+            delta := 1;
+        ELSE
+            fila := OLD;
+            delta := -1;
+        END IF;
+
+        IF fila.timestamp_servidor IS NULL THEN
+            RETURN fila;
+        END IF;
+
+        INSERT INTO eventos_por_hora (condominio_id, fecha, hora, tipo_evento, total)
+        VALUES (COALESCE(fila.condominio_id, ''), fila.timestamp_servidor::date,
+                EXTRACT(HOUR FROM fila.timestamp_servidor)::smallint, fila.tipo_evento, delta)
+        ON CONFLICT (condominio_id, fecha, hora, tipo_evento)
+        DO UPDATE SET total = eventos_por_hora.total + delta;
+
+        IF fila.tipo_evento = 'rechazo' THEN
+            INSERT INTO rechazos_por_motivo (condominio_id, fecha, motivo, total)
+            VALUES (COALESCE(fila.condominio_id, ''), fila.timestamp_servidor::date,
+                    motivo_rechazo_evento(fila.metadata), delta)
+            ON CONFLICT (condominio_id, fecha, motivo)
+            DO UPDATE SET total = rechazos_por_motivo.total + delta;
+        END IF;
+
+        RETURN fila;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_agregados_eventos ON eventos",
+    """
+    CREATE TRIGGER trg_agregados_eventos
+        AFTER INSERT OR DELETE ON eventos
+        FOR EACH ROW
+        EXECUTE FUNCTION actualizar_agregados_eventos()
+    """,
+]
+
+
+def asegurar_agregados_eventos(db):
+    """
+    Crea eventos_por_hora (condominio, fecha, hora, tipo_evento) -> total y
+    rechazos_por_motivo (condominio, fecha, motivo) -> total, con los
+    triggers que los mantienen en cada INSERT/DELETE de eventos.
+
+    La primera vez los llena desde los eventos existentes. Es idempotente.
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        existe = db.execute("SELECT to_regclass('eventos_por_hora') AS t").fetchone()["t"]
+        if existe:
+            return
+        sentencias = _SQL_AGREGADOS_PG
+    else:
+        existe = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'eventos_por_hora'"
+        ).fetchone()
+        asegurar_columnas(db, "eventos", COLUMNAS_CADENA_EVENTOS)
+        sentencias = _SQL_AGREGADOS_SQLITE
+
+    for sql in sentencias:
+        db.execute(sql)
+
+    if not existe:
+        sumar_a_agregados(db)
+
+
+def sumar_a_agregados(db, filtro: str = "1 = 1", params=()):
+    """
+    Suma a los agregados los eventos que cumplen `filtro` (WHERE sobre
+    eventos). Los llena la primera vez y compensa los triggers de DELETE
+    cuando se archivan eventos (ver core/archivo.py).
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        fecha_sql = "timestamp_servidor::date"
+        hora_sql = "EXTRACT(HOUR FROM timestamp_servidor)::smallint"
+        motivo_sql = "motivo_rechazo_evento(metadata)"
+    else:
+        fecha_sql = "DATE(timestamp_servidor)"
+        hora_sql = "CAST(strftime('%H', timestamp_servidor) AS INTEGER)"
+        motivo_sql = (
+            "COALESCE(CASE WHEN json_valid(metadata) "
+            "THEN json_extract(metadata, '$.motivo_rechazo') END, '')"
+        )
+
+    db.execute(f"""
+        INSERT INTO eventos_por_hora (condominio_id, fecha, hora, tipo_evento, total)
+        SELECT COALESCE(condominio_id, ''), {fecha_sql}, {hora_sql}, tipo_evento, COUNT(*)
+        FROM eventos
+        WHERE {fecha_sql} IS NOT NULL AND ({filtro})
+        GROUP BY COALESCE(condominio_id, ''), {fecha_sql}, {hora_sql}, tipo_evento
+        ON CONFLICT (condominio_id, fecha, hora, tipo_evento)
+        DO UPDATE SET total = eventos_por_hora.total + excluded.total
+    """, params)
+    db.execute(f"""
+        INSERT INTO rechazos_por_motivo (condominio_id, fecha, motivo, total)
+        SELECT COALESCE(condominio_id, ''), {fecha_sql}, {motivo_sql}, COUNT(*)
+        FROM eventos
+        WHERE tipo_evento = 'rechazo' AND {fecha_sql} IS NOT NULL AND ({filtro})
+        GROUP BY COALESCE(condominio_id, ''), {fecha_sql}, {motivo_sql}
+        ON CONFLICT (condominio_id, fecha, motivo)
+        DO UPDATE SET total = rechazos_por_motivo.total + excluded.total
+    """, params)
+
+
+_agregados_listos = None
+_lock_agregados = threading.Lock()
+
+
+def _agregados_disponibles(db) -> bool:
+    """True si existen los agregados (se aseguran una vez por proceso)"""
+    global _agregados_listos
+    if _agregados_listos is None:
+        with _lock_agregados:
+            if _agregados_listos is None:
+                try:
+                    asegurar_agregados_eventos(db)
+                    _agregados_listos = True
+                except Exception as e:
+                    print(f"⚠️ Agregados de eventos no disponibles: {e}")
+                    _agregados_listos = False
+    return _agregados_listos
+
+
+def _filtros(condominio_id: Optional[str], desde: Optional[str], hasta: Optional[str]):
+    filtros, params = ["total <> 0"], []
+    if condominio_id is not None:
+        filtros.append("condominio_id = ?")
+        params.append(condominio_id)
+    if desde:
+        filtros.append("fecha >= ?")
+        params.append(desde)
+    if hasta:
+        filtros.append("fecha <= ?")
+        params.append(hasta)
+    return " AND ".join(filtros), params
+
+
+def _consultar(sql: str, params) -> List[Dict]:
+    with get_db() as db:
+        if not _agregados_disponibles(db):
+            return []
+        filas = db.execute(sql, params).fetchall()
+    return [
+        {k: (str(v) if k == "fecha" and v is not None else v) for k, v in dict(fila).items()}
+        for fila in filas
+    ]
+
+
+def eventos_por_dia(
+    condominio_id: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None
+) -> List[Dict]:
+    """[{fecha, tipo_evento, total}] (condominio_id None = todos)"""
+    where, params = _filtros(condominio_id, desde, hasta)
+    return _consultar(f"""
+        SELECT fecha, tipo_evento, SUM(total) AS total
+        FROM eventos_por_hora
+        WHERE {where}
+        GROUP BY fecha, tipo_evento
+        ORDER BY fecha
+    """, params)
+
+
+def eventos_por_hora(
+    condominio_id: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None
+) -> List[Dict]:
+    """[{hora, tipo_evento, total}] sumando todas las fechas del rango"""
+    where, params = _filtros(condominio_id, desde, hasta)
+    return _consultar(f"""
+        SELECT hora, tipo_evento, SUM(total) AS total
+        FROM eventos_por_hora
+        WHERE {where}
+        GROUP BY hora, tipo_evento
+        ORDER BY hora
+    """, params)
+
+
+def rechazos_por_motivo(
+    condominio_id: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None
+) -> List[Dict]:
+    """[{motivo, total}] de mayor a menor"""
+    where, params = _filtros(condominio_id, desde, hasta)
+    return _consultar(f"""
+        SELECT motivo, SUM(total) AS total
+        FROM rechazos_por_motivo
+        WHERE {where}
+        GROUP BY motivo
+        ORDER BY total DESC
+    """, params)
+
+
+def eventos_por_entidad(
+    tipo_evento: Optional[str] = None,
+    minimo: int = 1,
+    limite: int = 10,
+    desde: Optional[str] = None
+) -> List[Dict]:
+    """
+    [{entidad_id, total}] de mayor a menor, desde el contador visitas_diarias
+    (entidad/día/tipo, mantenido por trigger en core/db.py)
+    """
+    filtros, params = ["1 = 1"], []
+    if tipo_evento:
+        filtros.append("tipo_evento = ?")
+        params.append(tipo_evento)
+    if desde:
+        filtros.append("fecha >= ?")
+        params.append(desde)
+
+    with get_db() as db:
+        filas = db.execute(f"""
+            SELECT entidad_id, SUM(total) AS total
+            FROM visitas_diarias
+            WHERE {' AND '.join(filtros)}
+            GROUP BY entidad_id
+            HAVING SUM(total) >= ?
+            ORDER BY total DESC
+            LIMIT ?
+        """, (*params, minimo, limite)).fetchall()
+    return [dict(fila) for fila in filas]
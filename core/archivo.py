@@ -0,0 +1,473 @@
+"""
+core/archivo.py
+Archivo histórico en Parquet (por condominio/mes) de eventos y ledger_exo
+
+Los meses cerrados se mueven de la tabla viva a archivos Parquet en
+ARCHIVO_DIR/<tabla>/condominio_id=<id>/mes=<YYYY-MM>/. Cada archivo se
+registra en archivo_particiones en la misma transacción que borra sus
+filas de la tabla viva, así que una fila está en un solo lado: un archivo
+que no llegó al manifiesto (corte a medias) simplemente no se lee.
+
+Al archivar eventos, esa misma transacción adelanta el inicio vivo de la
+cadena (core/verificacion.py), para que la verificación completa empiece
+en el primer eslabón que sigue en la tabla.
+
+Uso:
+    python -m core.archivo                    # archiva lo anterior a ARCHIVO_MESES_VIVOS
+    python -m core.archivo --meses-vivos 12
+"""
+
+import argparse
+import functools
+import operator
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from core.db import get_db, transaccion, sumar_visitas_diarias, PostgresConnectionWrapper
+from core.agregados import sumar_a_agregados
+from core.cadena import CADENA_GLOBAL, filtro_condominio
+from core.eventos_df import COLUMNAS_EVENTOS, expresiones_eventos
+
+# Directorio raíz del archivo (un subdirectorio por tabla)
+ARCHIVO_DIR = os.getenv('ARCHIVO_DIR', 'data/archivo')
+# Meses cerrados que se quedan en la tabla viva además del mes en curso
+ARCHIVO_MESES_VIVOS = int(os.getenv('ARCHIVO_MESES_VIVOS', '3'))
+
+# Filas borradas por sentencia al mover una partición
+_LOTE_BORRADO = 500
+
+
+@dataclass(frozen=True)
+class TablaArchivable:
+    """Tabla viva cuyas filas de meses cerrados se mueven al archivo"""
+    nombre: str
+    clave: str
+    columna_tiempo: str
+    # Columnas de COLUMNAS_EVENTOS que se calculan al archivar (no se
+    # vuelve a parsear metadata al consultar el archivo)
+    derivadas: Tuple[str, ...] = ()
+
+
+TABLAS_ARCHIVABLES = {
+    "eventos": TablaArchivable(
+        "eventos", "evento_id", "timestamp_servidor",
+        ("nombre", "identificador", "hora", "fecha", "motivo_rechazo")
+    ),
+    "ledger_exo": TablaArchivable("ledger_exo", "ledger_id", "timestamp"),
+}
+
+# Columnas de core/eventos_df.py que en el archivo conservan el nombre de la tabla
+_COLUMNAS_ARCHIVO_EVENTOS = {"timestamp": "timestamp_servidor", "hash": "hash_actual"}
+
+_SQL_PARTICIONES = [
+    """
+    CREATE TABLE IF NOT EXISTS archivo_particiones (
+        archivo TEXT PRIMARY KEY,
+        tabla TEXT NOT NULL,
+        condominio_id TEXT NOT NULL,
+        mes TEXT NOT NULL,
+        filas INTEGER NOT NULL,
+        archivado_en TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_archivo_particiones
+    ON archivo_particiones(tabla, condominio_id, mes)
+    """,
+]
+
+
+def asegurar_archivo(db):
+    """Crea el manifiesto archivo_particiones. Es idempotente."""
+    for sql in _SQL_PARTICIONES:
+        db.execute(sql)
+
+
+_manifiesto_listo = None
+_lock_manifiesto = threading.Lock()
+
+
+def _manifiesto_disponible(db) -> bool:
+    """True si existe el manifiesto (se asegura una vez por proceso)"""
+    global _manifiesto_listo
+    if _manifiesto_listo is None:
+        with _lock_manifiesto:
+            if _manifiesto_listo is None:
+                try:
+                    asegurar_archivo(db)
+                    _manifiesto_listo = True
+                except Exception as e:
+                    print(f"⚠️ Archivo histórico no disponible: {e}")
+                    _manifiesto_listo = False
+    return _manifiesto_listo
+
+
+def _tabla_existe(db, nombre: str) -> bool:
+    if isinstance(db, PostgresConnectionWrapper):
+        return db.execute("SELECT to_regclass(?) AS t", (nombre,)).fetchone()["t"] is not None
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).fetchone() is not None
+
+
+# ---------------------------------------------------------
+# Meses
+# ---------------------------------------------------------
+def frontera_archivo(meses_vivos: int = ARCHIVO_MESES_VIVOS, hoy: Optional[date] = None) -> str:
+    """Primer día (ISO) del mes más antiguo que se queda vivo; lo anterior se archiva"""
+    hoy = hoy or date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - meses_vivos
+    return date(indice // 12, indice % 12 + 1, 1).isoformat()
+
+
+def _rango_mes(mes: str) -> Tuple[str, str]:
+    """'2025-03' -> ('2025-03-01', '2025-04-01')"""
+    anio, numero = int(mes[:4]), int(mes[5:7])
+    siguiente = date(anio + numero // 12, numero % 12 + 1, 1)
+    return f"{mes}-01", siguiente.isoformat()
+
+
+def _mes_sql(db, columna: str) -> str:
+    if isinstance(db, PostgresConnectionWrapper):
+        return f"to_char({columna}, 'YYYY-MM')"
+    return f"strftime('%Y-%m', {columna})"
+
+
+# ---------------------------------------------------------
+# Archivado
+# ---------------------------------------------------------
+def _limites_cadenas() -> Dict[Optional[str], int]:
+    """
+    Última secuencia archivable de cada cadena de eventos.
+
+    Solo se archiva lo que la verificación ya cubrió (su punto de control),
+    lo que ya tiene bloque Merkle sellado y nunca la cabeza: así la
+    verificación reanudada, el sellado y el siguiente append no necesitan
+    las filas que salen de la tabla viva.
+    """
+    from core.merkle import MERKLE_BLOQUE, ultima_secuencia_sellada
+    from core.verificacion import obtener_punto_control
+
+    with get_db() as db:
+        cabezas = db.execute("""
+            SELECT condominio_id, MAX(secuencia) AS cabeza FROM eventos
+            WHERE secuencia IS NOT NULL
+            GROUP BY condominio_id
+        """).fetchall()
+
+    limites = {}
+    for fila in cabezas:
+        condominio_id = fila["condominio_id"]
+        punto = obtener_punto_control(condominio_id or CADENA_GLOBAL)
+        if not punto:
+            continue
+        limite = min(punto["secuencia"], fila["cabeza"] - 1)
+        if MERKLE_BLOQUE > 0:
+            limite = min(limite, ultima_secuencia_sellada(condominio_id))
+        if limite > 0:
+            limites[condominio_id] = limite
+    return limites
+
+
+def _alcances(tabla: TablaArchivable, frontera: str) -> List[Tuple[Optional[str], str, tuple]]:
+    """(condominio_id, WHERE, params) de las filas archivables de cada condominio"""
+    if tabla.nombre == "eventos":
+        alcances = []
+        for condominio_id, limite in _limites_cadenas().items():
+            filtro, params = filtro_condominio(condominio_id)
+            alcances.append((
+                condominio_id,
+                f"{filtro} AND (secuencia IS NULL OR secuencia <= ?)",
+                (*params, limite)
+            ))
+        return alcances
+
+    with get_db() as db:
+        filas = db.execute(f"""
+            SELECT DISTINCT condominio_id FROM {tabla.nombre}
+            WHERE {tabla.columna_tiempo} < ?
+        """, (frontera,)).fetchall()
+    return [(f["condominio_id"], *filtro_condominio(f["condominio_id"])) for f in filas]
+
+
+def _tabla_arrow(filas) -> pa.Table:
+    """Filas (sqlite3.Row o dict de psycopg2) -> tabla Arrow con los tipos inferidos"""
+    nombres = list(filas[0].keys())
+    if isinstance(filas[0], dict):
+        columnas = [[fila[nombre] for fila in filas] for nombre in nombres]
+    else:
+        columnas = [list(columna) for columna in zip(*filas)]
+    return pa.table({nombre: pa.array(columna) for nombre, columna in zip(nombres, columnas)})
+
+
+def _archivar_particion(
+    tabla: TablaArchivable,
+    condominio_id: Optional[str],
+    mes: str,
+    filtro: str,
+    params: tuple
+) -> Optional[Dict]:
+    """Escribe un condominio/mes en Parquet y lo borra de la tabla viva"""
+    from core.verificacion import registrar_inicio_archivado
+
+    inicio, fin = _rango_mes(mes)
+    where = f"{filtro} AND {tabla.columna_tiempo} >= ? AND {tabla.columna_tiempo} < ?"
+    params = (*params, inicio, fin)
+
+    with get_db() as db:
+        derivadas = ""
+        if tabla.derivadas:
+            expresiones = expresiones_eventos(db)
+            derivadas = "".join(f", {expresiones[c]} AS {c}" for c in tabla.derivadas)
+        filas = db.execute(f"""
+            SELECT e.*{derivadas} FROM {tabla.nombre} e
+            WHERE {where}
+            ORDER BY e.{tabla.columna_tiempo}
+        """, params).fetchall()
+    if not filas:
+        return None
+
+    datos = _tabla_arrow(filas)
+    clave = condominio_id if condominio_id is not None else CADENA_GLOBAL
+    archivo = os.path.join(
+        tabla.nombre, f"condominio_id={quote(clave, safe='')}", f"mes={mes}",
+        f"{uuid.uuid4().hex}.parquet"
+    )
+    ruta = os.path.join(ARCHIVO_DIR, archivo)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    pq.write_table(datos, ruta + ".tmp", compression="zstd")
+    os.replace(ruta + ".tmp", ruta)
+
+    ids = datos.column(tabla.clave).to_pylist()
+    try:
+        with transaccion() as db:
+            es_eventos = tabla.nombre == "eventos"
+            hay_visitas = es_eventos and _tabla_existe(db, "visitas_diarias")
+            hay_agregados = es_eventos and _tabla_existe(db, "eventos_por_hora")
+
+            for i in range(0, len(ids), _LOTE_BORRADO):
+                lote = ids[i:i + _LOTE_BORRADO]
+                en_lote = f"{tabla.clave} IN ({', '.join('?' for _ in lote)})"
+                # Los triggers de DELETE descuentan estas filas de los
+                # contadores; sumarlas antes conserva los totales históricos
+                if hay_visitas:
+                    sumar_visitas_diarias(db, en_lote, lote)
+                if hay_agregados:
+                    sumar_a_agregados(db, en_lote, lote)
+                db.execute(f"DELETE FROM {tabla.nombre} WHERE {en_lote}", lote)
+
+            if es_eventos:
+                encadenados = [
+                    (secuencia, hash_actual) for secuencia, hash_actual in zip(
+                        datos.column("secuencia").to_pylist(), datos.column("hash_actual").to_pylist()
+                    ) if secuencia is not None
+                ]
+                if encadenados:
+                    secuencia, hash_actual = max(encadenados)
+                    registrar_inicio_archivado(db, clave, secuencia + 1, hash_actual)
+
+            db.execute("""
+                INSERT INTO archivo_particiones
+                    (archivo, tabla, condominio_id, mes, filas, archivado_en)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (archivo, tabla.nombre, clave, mes, len(ids), datetime.now().isoformat()))
+    except Exception:
+        os.remove(ruta)
+        raise
+
+    return {"tabla": tabla.nombre, "condominio_id": clave, "mes": mes, "filas": len(ids), "archivo": archivo}
+
+
+def archivar(
+    tablas: Sequence[str] = tuple(TABLAS_ARCHIVABLES),
+    meses_vivos: int = ARCHIVO_MESES_VIVOS,
+    hoy: Optional[date] = None
+) -> Dict:
+    """
+    Mueve al archivo Parquet los meses cerrados de las tablas vivas.
+
+    Se archiva todo lo anterior a frontera_archivo(meses_vivos); cada
+    condominio/mes es una partición que se confirma por separado, así que
+    el proceso se puede interrumpir y volver a correr. Un mes que recibe
+    filas tardías después de archivado gana otro archivo en la misma
+    partición.
+
+    Returns:
+        dict con frontera, filas (total movidas) y particiones (una por archivo escrito)
+    """
+    frontera = frontera_archivo(meses_vivos, hoy)
+    resumen = {"frontera": frontera, "filas": 0, "particiones": []}
+
+    for nombre in tablas:
+        tabla = TABLAS_ARCHIVABLES[nombre]
+        with get_db() as db:
+            asegurar_archivo(db)
+            if not _tabla_existe(db, nombre):
+                continue
+            mes_sql = _mes_sql(db, tabla.columna_tiempo)
+
+        for condominio_id, filtro, params in _alcances(tabla, frontera):
+            with get_db() as db:
+                meses = [
+                    fila["mes"] for fila in db.execute(f"""
+                        SELECT DISTINCT {mes_sql} AS mes FROM {nombre}
+                        WHERE {filtro} AND {tabla.columna_tiempo} < ?
+                        ORDER BY mes
+                    """, (*params, frontera)).fetchall()
+                    if fila["mes"]
+                ]
+            for mes in meses:
+                particion = _archivar_particion(tabla, condominio_id, mes, filtro, params)
+                if particion:
+                    resumen["particiones"].append(particion)
+                    resumen["filas"] += particion["filas"]
+
+    return resumen
+
+
+# ---------------------------------------------------------
+# Consulta
+# ---------------------------------------------------------
+def particiones(
+    tabla: str = "eventos",
+    condominio_id: Optional[str] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None
+) -> List[Dict]:
+    """Particiones archivadas que pueden tener filas en [desde, hasta), de la más reciente a la más antigua"""
+    filtros, params = ["tabla = ?"], [tabla]
+    if condominio_id is not None:
+        filtros.append("condominio_id = ?")
+        params.append(condominio_id)
+    if desde:
+        filtros.append("mes >= ?")
+        params.append(desde[:7])
+    if hasta:
+        filtros.append("mes <= ?")
+        params.append(hasta[:7])
+
+    with get_db() as db:
+        if not _manifiesto_disponible(db):
+            return []
+        filas = db.execute(f"""
+            SELECT * FROM archivo_particiones
+            WHERE {' AND '.join(filtros)}
+            ORDER BY mes DESC, archivo
+        """, params).fetchall()
+    return [dict(fila) for fila in filas]
+
+
+def _escalar(texto: str, tipo: pa.DataType):
+    """Límite ISO comparable con la columna de tiempo (texto en SQLite, timestamp en PostgreSQL)"""
+    if not pa.types.is_timestamp(tipo):
+        return texto
+    valor = pd.Timestamp(texto)
+    if tipo.tz and valor.tzinfo is None:
+        valor = valor.tz_localize(tipo.tz)
+    elif not tipo.tz and valor.tzinfo is not None:
+        valor = valor.tz_convert(None)
+    return pa.scalar(valor, type=tipo)
+
+
+def leer_archivo(
+    tabla: str = "eventos",
+    columnas: Optional[Sequence[str]] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    condominio_id: Optional[str] = None,
+    filtro: Optional[ds.Expression] = None
+) -> Optional[pa.Table]:
+    """
+    Filas archivadas como tabla Arrow.
+
+    Solo abre las particiones del condominio y meses del rango, y de cada
+    archivo lee solo las columnas pedidas y las filas que pasan el rango
+    de tiempo y `filtro`.
+
+    Returns:
+        Tabla con `columnas` (nulas si un archivo no las tiene), o None si
+        ninguna partición cubre el rango
+    """
+    columna_tiempo = TABLAS_ARCHIVABLES[tabla].columna_tiempo
+    partes = []
+    for particion in particiones(tabla, condominio_id, desde, hasta):
+        dataset = ds.dataset(os.path.join(ARCHIVO_DIR, particion["archivo"]), format="parquet")
+        tipo_tiempo = dataset.schema.field(columna_tiempo).type
+
+        condiciones = []
+        if desde:
+            condiciones.append(ds.field(columna_tiempo) >= _escalar(desde, tipo_tiempo))
+        if hasta:
+            condiciones.append(ds.field(columna_tiempo) < _escalar(hasta, tipo_tiempo))
+        if filtro is not None:
+            condiciones.append(filtro)
+
+        nombres = list(columnas) if columnas else dataset.schema.names
+        leida = dataset.to_table(
+            columns=[c for c in nombres if c in dataset.schema.names],
+            filter=functools.reduce(operator.and_, condiciones) if condiciones else None
+        )
+        for nombre in nombres:
+            if nombre not in leida.column_names:
+                leida = leida.append_column(nombre, pa.nulls(leida.num_rows))
+        partes.append(leida.select(nombres))
+
+    if not partes:
+        return None
+    return pa.concat_tables(partes, promote_options="permissive")
+
+
+def eventos_archivados(
+    columnas: Sequence[str],
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    condominio_id: Optional[str] = None,
+    tipos_evento: Optional[Sequence[str]] = None
+) -> Optional[pa.Table]:
+    """
+    Eventos archivados con las columnas y tipos de core/eventos_df.py, del
+    más reciente al más antiguo (None si el rango no toca el archivo).
+    """
+    fuente = list(dict.fromkeys(
+        [_COLUMNAS_ARCHIVO_EVENTOS.get(c, c) for c in columnas if c != "tipo_entidad"]
+        + ["timestamp_servidor"]
+    ))
+    filtro = ds.field("tipo_evento").isin(list(tipos_evento)) if tipos_evento else None
+    leida = leer_archivo("eventos", fuente, desde, hasta, condominio_id, filtro)
+    if leida is None:
+        return None
+
+    leida = leida.sort_by([("timestamp_servidor", "descending")])
+    resultado = {}
+    for nombre in columnas:
+        if nombre == "tipo_entidad":
+            resultado[nombre] = pa.array([""] * leida.num_rows, type=pa.string())
+            continue
+        columna = leida.column(_COLUMNAS_ARCHIVO_EVENTOS.get(nombre, nombre))
+        tipo = COLUMNAS_EVENTOS[nombre]
+        resultado[nombre] = columna.cast(tipo) if tipo is not None else columna
+    return pa.table(resultado)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archiva en Parquet los meses cerrados")
+    parser.add_argument("--tablas", nargs="+", default=list(TABLAS_ARCHIVABLES), help="Tablas a archivar")
+    parser.add_argument("--meses-vivos", type=int, default=ARCHIVO_MESES_VIVOS,
+                        help="Meses cerrados que se quedan en la tabla viva")
+    args = parser.parse_args()
+
+    resumen = archivar(args.tablas, args.meses_vivos)
+    for particion in resumen["particiones"]:
+        print(f"📦 {particion['tabla']} {particion['condominio_id']} {particion['mes']}: "
+              f"{particion['filas']} filas")
+    print(f"✅ {resumen['filas']} filas archivadas (anteriores a {resumen['frontera']})")
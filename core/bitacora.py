@@ -0,0 +1,365 @@
+"""
+core/bitacora.py
+Bitácora de auditoría con escritura asíncrona por lotes
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional
+
+from core.db import get_db, en_transaccion, insertar_lote
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candados, no se recuperan respaldos de otros procesos
+    fcntl = None
+
+# Encolar la bitácora fuera de transacciones (false = INSERT síncrono como antes)
+BITACORA_ASINCRONA = os.getenv('BITACORA_ASINCRONA', 'true').lower() in ('1', 'true', 'yes', 'on')
+# Registros en cola que disparan una escritura
+BITACORA_LOTE = int(os.getenv('BITACORA_LOTE', '200'))
+# Segundos máximos que un registro espera en cola
+BITACORA_INTERVALO = float(os.getenv('BITACORA_INTERVALO', '1.0'))
+# Prefijo del respaldo en disco de lo encolado y aún no escrito, un archivo
+# por proceso ('' = sin respaldo)
+BITACORA_RESPALDO = os.getenv('BITACORA_RESPALDO', 'data/bitacora_pendiente.jsonl')
+
+COLUMNAS_BITACORA = (
+    "tabla", "operacion", "registro_id",
+    "datos_anteriores", "datos_nuevos",
+    "usuario_id", "timestamp"
+)
+
+
+def fila_bitacora(
+    tabla: str,
+    operacion: str,
+    registro_id: str,
+    datos_anteriores: Any,
+    datos_nuevos: Any,
+    usuario_id: str
+) -> tuple:
+    """Fila de bitácora (en el orden de COLUMNAS_BITACORA) con timestamp de ahora"""
+    return (
+        tabla,
+        operacion,
+        registro_id,
+        json.dumps(datos_anteriores) if datos_anteriores else None,
+        json.dumps(datos_nuevos),
+        usuario_id,
+        datetime.now().isoformat()
+    )
+
+
+class EscritorBitacora:
+    """
+    Cola en memoria de registros de bitácora que un hilo escribe por lotes.
+
+    Se escribe cuando la cola llega a `tamano_lote` registros o cuando pasan
+    `intervalo` segundos, con un solo INSERT multi-fila (insertar_lote). Cada
+    registro se agrega antes a un respaldo propio del proceso
+    (`archivo_respaldo`.<pid>-<token>, JSON por línea) protegido por un
+    candado (flock sobre <prefijo>.lock) mientras el proceso vive: si muere
+    antes de escribir, recuperar_respaldo() de otro proceso reclama sus
+    archivos al arrancar. Un lote que falla vuelve a la cola y su respaldo
+    se conserva hasta que se escriba.
+
+    La entrega es al-menos-una-vez: si el proceso muere entre el COMMIT de un
+    lote y el borrado de su respaldo, ese lote se vuelve a insertar.
+    """
+
+    def __init__(
+        self,
+        tamano_lote: int = BITACORA_LOTE,
+        intervalo: float = BITACORA_INTERVALO,
+        archivo_respaldo: Optional[str] = BITACORA_RESPALDO
+    ):
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.archivo_respaldo = archivo_respaldo or None
+        self.escritos = 0
+        self.lotes = 0
+        self._cola: List[tuple] = []
+        self._respaldo = None
+        # Respaldos rotados cuyos registros aún no se confirman en la BD
+        self._respaldos_en_vuelo: List[str] = []
+        # Identidad de los respaldos: se renueva en un proceso hijo (fork)
+        self._pid = None
+        self._prefijo = None
+        self._candado = None
+        self._lock = threading.Lock()
+        self._lock_vaciado = threading.Lock()
+        self._hay_trabajo = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    @property
+    def pendientes(self) -> int:
+        """Registros en cola sin escribir"""
+        return len(self._cola)
+
+    def registrar(self, *args, **kwargs):
+        """Encola un registro (mismos argumentos que fila_bitacora)"""
+        fila = fila_bitacora(*args, **kwargs)
+        with self._lock:
+            self._escribir_respaldo(fila)
+            self._cola.append(fila)
+            lleno = len(self._cola) >= self.tamano_lote
+        self._asegurar_hilo()
+        if lleno:
+            self._hay_trabajo.set()
+
+    def vaciar(self) -> int:
+        """
+        Escribe en la BD todo lo encolado.
+
+        Returns:
+            Registros escritos
+        """
+        with self._lock_vaciado:
+            with self._lock:
+                filas, self._cola = self._cola, []
+                self._rotar_respaldo()
+                respaldos = list(self._respaldos_en_vuelo)
+            if not filas:
+                return 0
+
+            try:
+                with get_db() as db:
+                    insertar_lote(db, "bitacora", COLUMNAS_BITACORA, filas)
+            except Exception as e:
+                with self._lock:
+                    self._cola[:0] = filas
+                print(f"⚠️ Error escribiendo bitácora ({len(filas)} registros en cola): {e}")
+                return 0
+
+            with self._lock:
+                self._respaldos_en_vuelo = [
+                    r for r in self._respaldos_en_vuelo if r not in respaldos
+                ]
+            for ruta in respaldos:
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+            self.escritos += len(filas)
+            self.lotes += 1
+            return len(filas)
+
+    def cerrar(self):
+        """Detiene el hilo y escribe lo pendiente (llamar al apagar el proceso)"""
+        self._detener.set()
+        self._hay_trabajo.set()
+        hilo = self._hilo
+        if hilo is not None and hilo is not threading.current_thread():
+            hilo.join(timeout=max(self.intervalo, 1.0) * 5)
+        self.vaciar()
+        with self._lock:
+            if self._respaldo is not None:
+                self._respaldo.close()
+                self._respaldo = None
+            # Sin nada pendiente el candado sobra; si quedó algo, otro
+            # proceso lo reclama cuando este termine
+            if not self._cola and not self._respaldos_en_vuelo:
+                self._soltar_candado()
+        self._detener.clear()
+
+    def recuperar_respaldo(self) -> int:
+        """
+        Inserta los registros que quedaron en respaldos de procesos que ya
+        no existen. Llamar al arrancar, antes de encolar.
+
+        Un respaldo se reclama solo si su candado está libre (el proceso
+        dueño murió); se renombra como respaldo en vuelo de este proceso,
+        así que si este también muere a medias, otro lo vuelve a reclamar.
+
+        Returns:
+            Registros recuperados
+        """
+        if self.archivo_respaldo is None:
+            return 0
+        if fcntl is None:
+            print("⚠️ Sin fcntl no se recuperan respaldos de bitácora de otros procesos")
+            return 0
+
+        with self._lock:
+            if self._respaldo is not None or self._cola:
+                raise RuntimeError("recuperar_respaldo() debe llamarse antes de encolar registros")
+            propio = self._identidad()
+            reclamados = []
+            for candado in glob.glob(f"{glob.escape(self.archivo_respaldo)}.*.lock"):
+                prefijo = candado[:-len(".lock")]
+                if prefijo != propio:
+                    reclamados += self._reclamar(prefijo, candado)
+
+        recuperados = 0
+        for ruta in sorted(reclamados, key=os.path.getmtime):
+            with open(ruta, encoding="utf-8") as f:
+                filas = [tuple(json.loads(linea)) for linea in f if linea.strip()]
+            if filas:
+                with get_db() as db:
+                    recuperados += insertar_lote(db, "bitacora", COLUMNAS_BITACORA, filas)
+            os.remove(ruta)
+        return recuperados
+
+    def _identidad(self) -> str:
+        """Prefijo de los respaldos de este proceso, con su candado tomado"""
+        if self._pid != os.getpid():
+            # Tras un fork, archivo y candado heredados son del proceso padre
+            self._pid = os.getpid()
+            self._prefijo = f"{self.archivo_respaldo}.{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._respaldo = None
+            self._respaldos_en_vuelo = []
+            self._candado = None
+        if self._candado is None:
+            directorio = os.path.dirname(self.archivo_respaldo)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            # Se bloquea antes de quedar visible: nadie lo ve libre mientras vive
+            temporal = f"{self._prefijo}.lock.tmp"
+            self._candado = open(temporal, "w")
+            if fcntl is not None:
+                fcntl.flock(self._candado, fcntl.LOCK_EX)
+            os.replace(temporal, f"{self._prefijo}.lock")
+        return self._prefijo
+
+    def _soltar_candado(self):
+        if self._candado is None:
+            return
+        try:
+            os.remove(f"{self._prefijo}.lock")
+        except OSError:
+            pass
+        self._candado.close()
+        self._candado = None
+
+    def _reclamar(self, prefijo: str, candado: str) -> List[str]:
+        """Respaldos de un proceso muerto, renombrados como en vuelo de este proceso"""
+        try:
+            archivo_candado = open(candado, "a")
+        except OSError:
+            return []
+        try:
+            try:
+                fcntl.flock(archivo_candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return []  # el dueño sigue vivo
+
+            rutas = []
+            for ruta in [prefijo, *glob.glob(f"{glob.escape(prefijo)}.*.enviando")]:
+                destino = f"{self._prefijo}.{uuid.uuid4().hex[:8]}.enviando"
+                try:
+                    os.replace(ruta, destino)
+                except FileNotFoundError:
+                    continue
+                rutas.append(destino)
+            os.remove(candado)
+            return rutas
+        finally:
+            archivo_candado.close()
+
+    def _escribir_respaldo(self, fila: tuple):
+        if self.archivo_respaldo is None:
+            return
+        ruta = self._identidad()
+        if self._respaldo is None:
+            self._respaldo = open(ruta, "a", encoding="utf-8")
+        self._respaldo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        # Al sistema operativo: sobrevive a la muerte del proceso
+        self._respaldo.flush()
+
+    def _rotar_respaldo(self):
+        """Aparta el respaldo actual para el lote que se va a escribir"""
+        if self._respaldo is None or self._pid != os.getpid():
+            return
+        self._respaldo.close()
+        self._respaldo = None
+        ruta = f"{self._prefijo}.{uuid.uuid4().hex[:8]}.enviando"
+        os.replace(self._prefijo, ruta)
+        self._respaldos_en_vuelo.append(ruta)
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            if self._hilo is None:
+                # Lo encolado no se pierde en una salida normal del proceso
+                atexit.register(self.cerrar)
+            self._hilo = threading.Thread(target=self._ciclo, name="bitacora", daemon=True)
+            self._hilo.start()
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            self._hay_trabajo.wait(self.intervalo)
+            self._hay_trabajo.clear()
+            if self._cola:
+                self.vaciar()
+
+
+# Instancia del proceso
+escritor_bitacora = EscritorBitacora()
+
+_iniciada = False
+_lock_inicio = threading.Lock()
+
+
+def registrar_bitacora(
+    tabla: str,
+    operacion: str,
+    registro_id: str,
+    datos_anteriores: Any,
+    datos_nuevos: Any,
+    usuario_id: str
+):
+    """
+    Registra una operación en la bitácora de auditoría.
+
+    Dentro de transaccion() el INSERT va en la misma transacción (se revierte
+    con ella); fuera, se encola en escritor_bitacora salvo que
+    BITACORA_ASINCRONA esté desactivada.
+    """
+    if BITACORA_ASINCRONA and not en_transaccion():
+        escritor_bitacora.registrar(
+            tabla, operacion, registro_id, datos_anteriores, datos_nuevos, usuario_id
+        )
+        return
+
+    with get_db() as db:
+        insertar_lote(db, "bitacora", COLUMNAS_BITACORA, [
+            fila_bitacora(tabla, operacion, registro_id, datos_anteriores, datos_nuevos, usuario_id)
+        ])
+
+
+def iniciar_bitacora() -> int:
+    """
+    Arranque de la bitácora asíncrona (una vez por proceso): recupera el
+    respaldo de una ejecución anterior. El vaciado al salir lo registra el
+    escritor con atexit al encolar su primer registro.
+
+    Returns:
+        Registros recuperados del respaldo
+    """
+    global _iniciada
+
+    with _lock_inicio:
+        if _iniciada:
+            return 0
+        _iniciada = True
+        try:
+            return escritor_bitacora.recuperar_respaldo()
+        except Exception as e:
+            print(f"⚠️ No se pudo recuperar el respaldo de bitácora: {e}")
+            return 0
+
+
+def cerrar_bitacora():
+    """Escribe lo pendiente de la bitácora (apagado de Streamlit/FastAPI)"""
+    escritor_bitacora.cerrar()
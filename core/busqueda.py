@@ -0,0 +1,299 @@
+"""
+core/busqueda.py
+Índice de búsqueda de entidades (FTS5 trigram en SQLite, pg_trgm en PostgreSQL)
+"""
+
+import sqlite3
+import threading
+import unicodedata
+from typing import List, Optional
+
+from core.db import get_db, PostgresConnectionWrapper
+
+# Campos de atributos que se indexan; placa, identificador y teléfono se
+# indexan también compactos (sin guiones/espacios) para encontrar "ABC123"
+# aunque se haya capturado "ABC-123"
+CAMPOS_BUSQUEDA = ("nombre", "identificador", "placa", "folio", "telefono")
+
+# Tokenizers FTS5 en orden de preferencia: trigram con remove_diacritics
+# requiere SQLite >= 3.45 y trigram solo >= 3.34; sin ninguno se busca con LIKE
+TOKENIZADORES_FTS = ("trigram remove_diacritics 1", "trigram")
+
+
+# ---------------------------------------------------------
+# SQLite: tabla FTS5 sombra mantenida por triggers
+# ---------------------------------------------------------
+def _texto_sqlite(fila: str) -> str:
+    """Expresión SQL del texto buscable de una fila de entidades (fila = 'NEW.', 'OLD.' o '')"""
+    def campo(nombre):
+        return f"COALESCE(json_extract({fila}atributos, '$.{nombre}'), '')"
+
+    def compacto(nombre):
+        return f"REPLACE(REPLACE(REPLACE(REPLACE({campo(nombre)}, '-', ''), ' ', ''), '(', ''), ')', '')"
+
+    partes = [f"{fila}entidad_id", f"{fila}tipo"]
+    partes += [campo(nombre) for nombre in CAMPOS_BUSQUEDA]
+    partes += [compacto(nombre) for nombre in ("identificador", "placa", "telefono")]
+    texto = " || ' ' || ".join(partes)
+    return f"""
+        CASE WHEN json_valid({fila}atributos) AND json_type({fila}atributos) = 'object'
+             THEN {texto}
+             ELSE {fila}entidad_id || ' ' || {fila}tipo
+        END
+    """
+
+
+_SQL_TABLA_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entidades_busqueda USING fts5(
+        entidad_id UNINDEXED,
+        texto,
+        tokenize = '{tokenizador}'
+    )
+"""
+
+_SQL_BUSQUEDA_SQLITE = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_entidades_busqueda_insert
+    AFTER INSERT ON entidades
+    BEGIN
+        INSERT INTO entidades_busqueda (entidad_id, texto)
+        VALUES (NEW.entidad_id, {_texto_sqlite('NEW.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_entidades_busqueda_update
+    AFTER UPDATE OF entidad_id, tipo, atributos ON entidades
+    BEGIN
+        DELETE FROM entidades_busqueda WHERE entidad_id = OLD.entidad_id;
+        INSERT INTO entidades_busqueda (entidad_id, texto)
+        VALUES (NEW.entidad_id, {_texto_sqlite('NEW.')});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_entidades_busqueda_delete
+    AFTER DELETE ON entidades
+    BEGIN
+        DELETE FROM entidades_busqueda WHERE entidad_id = OLD.entidad_id;
+    END
+    """,
+]
+
+
+# ---------------------------------------------------------
+# PostgreSQL: índice GIN pg_trgm sobre una función del texto buscable
+# ---------------------------------------------------------
+_SQL_BUSQUEDA_PG = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION texto_busqueda_entidad(entidad_id TEXT, tipo TEXT, atributos TEXT)
+    RETURNS TEXT AS $$
+    DECLARE
+        a JSONB;
+    BEGIN
+        BEGIN
+            a := atributos::jsonb;
+        EXCEPTION WHEN others THEN
+            a := '{}'::jsonb;
+        END;
+        IF a IS NULL OR jsonb_typeof(a) <> 'object' THEN
+            a := '{}'::jsonb;
+        END IF;
+        RETURN translate(lower(concat_ws(' ',
+            entidad_id, tipo,
+            a->>'nombre', a->>'identificador', a->>'placa', a->>'folio', a->>'telefono',
+            translate(a->>'identificador', '- ()', ''),
+            translate(a->>'placa', '- ()', ''),
+            translate(a->>'telefono', '- ()', '')
+        )), 'áéíóúüñàèìòù', 'aeiouunaeiou');
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_entidades_busqueda ON entidades
+    USING gin (texto_busqueda_entidad(entidad_id, tipo, atributos) gin_trgm_ops)
+    """,
+]
+
+
+def _crear_tabla_fts(db) -> bool:
+    """Crea entidades_busqueda con el primer tokenizer que soporte este SQLite"""
+    error = None
+    for tokenizador in TOKENIZADORES_FTS:
+        try:
+            db.execute(_SQL_TABLA_FTS.format(tokenizador=tokenizador))
+            return True
+        except sqlite3.OperationalError as e:
+            error = e
+    print(f"⚠️ FTS5 trigram no disponible en SQLite {sqlite3.sqlite_version}, se busca con LIKE: {error}")
+    return False
+
+
+def _quita_diacriticos(db) -> bool:
+    """True si la tabla FTS5 indexa sin acentos (remove_diacritics)"""
+    fila = db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'entidades_busqueda'"
+    ).fetchone()
+    return fila is not None and "remove_diacritics 1" in fila["sql"]
+
+
+def asegurar_busqueda_entidades(db) -> bool:
+    """
+    Crea el índice de búsqueda de entidades. En SQLite es una tabla FTS5
+    (tokenizer trigram) mantenida por triggers en cada INSERT/UPDATE/DELETE
+    de entidades; la primera vez la llena con las entidades existentes. En
+    PostgreSQL es un índice GIN pg_trgm sobre texto_busqueda_entidad().
+    Es idempotente.
+
+    Returns:
+        False si este SQLite no tiene FTS5 trigram (la búsqueda usa LIKE)
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        for sql in _SQL_BUSQUEDA_PG:
+            db.execute(sql)
+        return True
+
+    existe = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entidades_busqueda'"
+    ).fetchone()
+    if not existe and not _crear_tabla_fts(db):
+        return False
+    for sql in _SQL_BUSQUEDA_SQLITE:
+        db.execute(sql)
+
+    if not existe:
+        db.execute(f"""
+            INSERT INTO entidades_busqueda (entidad_id, texto)
+            SELECT entidad_id, {_texto_sqlite('')} FROM entidades
+        """)
+    return True
+
+
+_indice_listo = None
+# En SQLite: el índice FTS5 se creó con remove_diacritics
+_indice_sin_acentos = True
+_lock_indice = threading.Lock()
+
+
+def _indice_disponible(db) -> bool:
+    """True si existe el índice de búsqueda (se asegura una vez por proceso)"""
+    global _indice_listo, _indice_sin_acentos
+    if _indice_listo is None:
+        with _lock_indice:
+            if _indice_listo is None:
+                try:
+                    listo = asegurar_busqueda_entidades(db)
+                    if listo and not isinstance(db, PostgresConnectionWrapper):
+                        _indice_sin_acentos = _quita_diacriticos(db)
+                    _indice_listo = listo
+                except Exception as e:
+                    print(f"⚠️ Índice de búsqueda no disponible, se busca con LIKE: {e}")
+                    _indice_listo = False
+    return _indice_listo
+
+
+# ---------------------------------------------------------
+# Búsqueda
+# ---------------------------------------------------------
+def normalizar_busqueda(texto: str) -> str:
+    """Minúsculas y sin acentos (la misma forma con que se indexa)"""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).strip()
+
+
+def _patron_like(palabra: str) -> str:
+    escapada = palabra.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escapada}%"
+
+
+def buscar_entidades(
+    texto: str,
+    msp_id: Optional[str] = None,
+    condominio_id: Optional[str] = None,
+    limite: int = 20
+) -> List[dict]:
+    """
+    Busca entidades activas cuyo id, tipo, nombre, identificador, placa,
+    folio o teléfono contenga todas las palabras de `texto`.
+
+    Cada palabra se busca como subcadena sobre el índice (trigramas), así
+    que no recorre la tabla ni el JSON de atributos. Palabras de menos de
+    3 caracteres no tienen trigramas y se filtran con LIKE sobre los
+    candidatos.
+
+    Returns:
+        Filas de entidades (dict) más recientes primero
+    """
+    palabras = normalizar_busqueda(texto).split()
+    if not palabras:
+        return []
+
+    filtros = ["e.estado = 'activo'"]
+    params: list = []
+    if msp_id:
+        filtros.append("e.msp_id = ?")
+        params.append(msp_id)
+    if condominio_id:
+        filtros.append("e.condominio_id = ?")
+        params.append(condominio_id)
+
+    with get_db() as db:
+        if not _indice_disponible(db):
+            return _buscar_sin_indice(db, texto, filtros, params, limite)
+
+        if isinstance(db, PostgresConnectionWrapper):
+            desde = "entidades e"
+            for palabra in palabras:
+                filtros.append(
+                    "texto_busqueda_entidad(e.entidad_id, e.tipo, e.atributos) LIKE ? ESCAPE '\\'"
+                )
+                params.append(_patron_like(palabra))
+        else:
+            desde = "entidades_busqueda b JOIN entidades e ON e.entidad_id = b.entidad_id"
+            if not _indice_sin_acentos:
+                # trigram sin remove_diacritics: los acentos deben coincidir
+                palabras = texto.lower().split()
+            largas = [p for p in palabras if len(p) >= 3]
+            if largas:
+                filtros.append("entidades_busqueda MATCH ?")
+                params.append(" ".join('"' + p.replace('"', '""') + '"' for p in largas))
+            for palabra in palabras:
+                if len(palabra) < 3:
+                    filtros.append("b.texto LIKE ? ESCAPE '\\'")
+                    params.append(_patron_like(palabra))
+
+        filas = db.execute(f"""
+            SELECT e.* FROM {desde}
+            WHERE {' AND '.join(filtros)}
+            ORDER BY e.fecha_creacion DESC
+            LIMIT ?
+        """, (*params, limite)).fetchall()
+
+    return [dict(fila) for fila in filas]
+
+
+def _buscar_sin_indice(db, texto, filtros, params, limite) -> List[dict]:
+    """Búsqueda original: LIKE sobre el JSON crudo (recorre la tabla)"""
+    patron = f"%{texto}%"
+    filas = db.execute(f"""
+        SELECT e.* FROM entidades e
+        WHERE {' AND '.join(filtros)}
+          AND (e.entidad_id LIKE ? OR e.tipo LIKE ? OR e.atributos LIKE ?)
+        ORDER BY e.fecha_creacion DESC
+        LIMIT ?
+    """, (*params, patron, patron, patron, limite)).fetchall()
+    return [dict(fila) for fila in filas]
+
+
+def reconstruir_indice_busqueda():
+    """Vuelve a generar el índice desde entidades (SQLite; en PostgreSQL REINDEX)"""
+    with get_db() as db:
+        if isinstance(db, PostgresConnectionWrapper):
+            db.execute("REINDEX INDEX idx_entidades_busqueda")
+            return
+        if not asegurar_busqueda_entidades(db):
+            return
+        db.execute("DELETE FROM entidades_busqueda")
+        db.execute(f"""
+            INSERT INTO entidades_busqueda (entidad_id, texto)
+            SELECT entidad_id, {_texto_sqlite('')} FROM entidades
+        """)
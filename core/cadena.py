@@ -0,0 +1,324 @@
+"""
+core/cadena.py
+Cadenas hash de eventos por condominio, con cabeza en memoria y appends serializados
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from core.db import (
+    get_db,
+    transaccion,
+    al_terminar_transaccion,
+    asegurar_columnas,
+    asegurar_indice_cadena,
+    COLUMNAS_CADENA_EVENTOS,
+)
+from core.hashing import generar_hash_cadena
+
+# Cada cuántos appends se ancla el conjunto de cadenas (0 = desactivado)
+CADENA_ANCLA_CADA = int(os.getenv('CADENA_ANCLA_CADA', '0'))
+
+# Clave de la cadena sin condominio (eventos legacy / single-tenant)
+CADENA_GLOBAL = "_global"
+
+_tablas_migradas = set()
+_lock_migracion = threading.Lock()
+
+
+def _asegurar_esquema(db, tabla: str):
+    """Agrega hash_previo/secuencia/condominio_id y el índice único una vez por proceso"""
+    with _lock_migracion:
+        if tabla not in _tablas_migradas:
+            asegurar_columnas(db, tabla, COLUMNAS_CADENA_EVENTOS)
+            asegurar_indice_cadena(db, tabla)
+            _tablas_migradas.add(tabla)
+
+
+def filtro_condominio(condominio_id: Optional[str]) -> Tuple[str, tuple]:
+    """WHERE de una cadena (NULL no es comparable con =)"""
+    if condominio_id is None:
+        return "condominio_id IS NULL", ()
+    return "condominio_id = ?", (condominio_id,)
+
+
+@dataclass
+class Eslabon:
+    """Posición reservada en la cadena para el siguiente evento"""
+    hash_prev: Optional[str]
+    secuencia: int
+    condominio_id: Optional[str] = None
+    hash_actual: Optional[str] = None
+
+
+class CadenaEventos:
+    """
+    Mantiene en memoria el último hash de la cadena de eventos de un condominio.
+
+    Cada append toma la cabeza en O(1) en lugar de consultar la tabla, y los
+    appends se serializan con un lock para que dos eventos nunca encadenen
+    sobre el mismo hash previo. El orden de la cadena lo fija la columna
+    secuencia (evento_id no sirve: su prefijo depende del tipo de evento).
+
+    La cabeza se recupera de la base de datos la primera vez que se usa y
+    cada vez que un append falla o su transacción se revierte.
+
+    El lock es por proceso. Entre procesos, el índice único de
+    (condominio_id, secuencia) hace fallar el INSERT de un escritor con la
+    cabeza desactualizada; el append se revierte y la cabeza se relee.
+    """
+
+    def __init__(self, condominio_id: Optional[str] = None, tabla: str = "eventos"):
+        self.condominio_id = condominio_id
+        self.tabla = tabla
+        self._lock = threading.RLock()
+        self._cabeza: Optional[str] = None
+        self._secuencia = 0
+        self._cargada = False
+
+    def cargar_cabeza(self) -> Tuple[Optional[str], int]:
+        """Lee de la base de datos el último eslabón (hash, secuencia)"""
+        filtro, params = filtro_condominio(self.condominio_id)
+
+        with self._lock, get_db() as db:
+            _asegurar_esquema(db, self.tabla)
+
+            ultimo = db.execute(f"""
+                SELECT hash_actual, secuencia FROM {self.tabla}
+                WHERE {filtro} AND secuencia IS NOT NULL
+                ORDER BY secuencia DESC LIMIT 1
+            """, params).fetchone()
+
+            if ultimo is None:
+                # Eventos previos a la columna secuencia: el más reciente
+                ultimo = db.execute(f"""
+                    SELECT hash_actual, 0 AS secuencia FROM {self.tabla}
+                    WHERE {filtro}
+                    ORDER BY timestamp_servidor DESC LIMIT 1
+                """, params).fetchone()
+
+            if ultimo:
+                self._cabeza = ultimo["hash_actual"]
+                self._secuencia = ultimo["secuencia"] or 0
+            else:
+                self._cabeza = None
+                self._secuencia = 0
+
+            self._cargada = True
+            return self._cabeza, self._secuencia
+
+    def invalidar(self):
+        """Obliga a releer la cabeza de la base de datos en el siguiente append"""
+        with self._lock:
+            self._cargada = False
+
+    @property
+    def cabeza(self) -> Tuple[Optional[str], int]:
+        """(hash, secuencia) del último eslabón confirmado"""
+        with self._lock:
+            if not self._cargada:
+                self.cargar_cabeza()
+            return self._cabeza, self._secuencia
+
+    @contextmanager
+    def anexar(self):
+        """
+        Reserva el siguiente eslabón de la cadena.
+
+        El bloque debe calcular el hash, insertar el evento y asignar
+        eslabon.hash_actual. El append corre dentro de transaccion() (se une a
+        la del hilo si ya existe) y el lock se conserva hasta su COMMIT o
+        ROLLBACK, para que nadie encadene sobre un evento que aún puede
+        revertirse. Tomar siempre primero la transacción y luego el lock
+        evita el interbloqueo con el lock de escritura de SQLite.
+
+        Example:
+            >>> with cadena.anexar() as eslabon:
+            ...     evento_hash, _ = generar_hash_cadena(eslabon.hash_prev, data, ts)
+            ...     db.execute("INSERT INTO eventos ...")
+            ...     eslabon.hash_actual = evento_hash
+        """
+        with transaccion():
+            self._lock.acquire()
+            al_terminar_transaccion(self._terminar_transaccion)
+            try:
+                if not self._cargada:
+                    self.cargar_cabeza()
+
+                eslabon = Eslabon(
+                    hash_prev=self._cabeza,
+                    secuencia=self._secuencia + 1,
+                    condominio_id=self.condominio_id
+                )
+                yield eslabon
+
+                if eslabon.hash_actual is None:
+                    raise ValueError("El append no asignó hash_actual al eslabón")
+
+                self._cabeza = eslabon.hash_actual
+                self._secuencia = eslabon.secuencia
+            except BaseException:
+                self._cargada = False
+                raise
+
+    def _terminar_transaccion(self, exito: bool):
+        """Libera el lock del append al confirmar/revertir la transacción"""
+        if not exito:
+            self._cargada = False
+        self._lock.release()
+
+
+class CadenasEventos:
+    """
+    Una cadena hash independiente por condominio_id.
+
+    Los appends de condominios distintos no comparten cabeza ni lock, así que
+    en PostgreSQL corren en paralelo (SQLite de todos modos serializa las
+    escrituras) y la verificación se puede repartir por condominio. Los
+    eventos sin condominio siguen en la cadena global de siempre.
+
+    Opcionalmente, cada `ancla_cada` appends se registra en anclas_cadena un
+    hash que encadena las cabezas de todas las cadenas, para que ninguna se
+    pueda reescribir por separado sin romper el ancla.
+
+    Cada vez que una cadena completa un bloque de `bloque_merkle` eventos se
+    sella su raíz Merkle en merkle_checkpoints (ver core/merkle.py).
+    """
+
+    def __init__(
+        self,
+        tabla: str = "eventos",
+        ancla_cada: int = CADENA_ANCLA_CADA,
+        bloque_merkle: Optional[int] = None
+    ):
+        self.tabla = tabla
+        self.ancla_cada = ancla_cada
+        self.bloque_merkle = bloque_merkle
+        self._cadenas: Dict[Optional[str], CadenaEventos] = {}
+        self._lock = threading.Lock()
+        self._lock_ancla = threading.Lock()
+        self._appends_sin_ancla = 0
+
+    @property
+    def bloque_merkle(self) -> int:
+        """Eventos por bloque Merkle sellado al anexar (None = core.merkle.MERKLE_BLOQUE)"""
+        if self._bloque_merkle is None:
+            # Se lee al usarse: core.merkle importa este módulo
+            from core.merkle import MERKLE_BLOQUE
+            return MERKLE_BLOQUE
+        return self._bloque_merkle
+
+    @bloque_merkle.setter
+    def bloque_merkle(self, valor: Optional[int]):
+        self._bloque_merkle = valor
+
+    def cadena(self, condominio_id: Optional[str] = None) -> CadenaEventos:
+        """Cadena del condominio (la crea en el primer uso)"""
+        with self._lock:
+            cadena = self._cadenas.get(condominio_id)
+            if cadena is None:
+                cadena = CadenaEventos(condominio_id, self.tabla)
+                self._cadenas[condominio_id] = cadena
+            return cadena
+
+    @contextmanager
+    def anexar(self, condominio_id: Optional[str] = None):
+        """Reserva el siguiente eslabón en la cadena del condominio (ver CadenaEventos.anexar)"""
+        with self.cadena(condominio_id).anexar() as eslabon:
+            yield eslabon
+
+            if self.ancla_cada > 0 and self._toca_anclar():
+                al_terminar_transaccion(self._anclar_al_confirmar)
+
+            if self.bloque_merkle > 0 and eslabon.secuencia % self.bloque_merkle == 0:
+                al_terminar_transaccion(
+                    lambda exito: self._sellar_al_confirmar(condominio_id, exito)
+                )
+
+    def invalidar(self):
+        """Invalida la cabeza en memoria de todas las cadenas"""
+        with self._lock:
+            cadenas = list(self._cadenas.values())
+        for cadena in cadenas:
+            cadena.invalidar()
+
+    def _toca_anclar(self) -> bool:
+        with self._lock:
+            self._appends_sin_ancla += 1
+            if self._appends_sin_ancla >= self.ancla_cada:
+                self._appends_sin_ancla = 0
+                return True
+            return False
+
+    def _anclar_al_confirmar(self, exito: bool):
+        if exito:
+            self.anclar()
+
+    def _sellar_al_confirmar(self, condominio_id: Optional[str], exito: bool):
+        if exito:
+            from core.merkle import sellar_bloques
+
+            sellar_bloques(condominio_id, self.bloque_merkle)
+
+    def cabezas_en_bd(self) -> Dict[str, Dict]:
+        """{condominio_id | CADENA_GLOBAL: {"hash", "secuencia"}} de cada cadena"""
+        with get_db() as db:
+            filas = db.execute(f"""
+                SELECT e.condominio_id, e.hash_actual, e.secuencia
+                FROM {self.tabla} e
+                JOIN (
+                    SELECT condominio_id, MAX(secuencia) AS secuencia
+                    FROM {self.tabla}
+                    WHERE secuencia IS NOT NULL
+                    GROUP BY condominio_id
+                ) m ON e.secuencia = m.secuencia
+                   AND (e.condominio_id = m.condominio_id
+                        OR (e.condominio_id IS NULL AND m.condominio_id IS NULL))
+            """).fetchall()
+
+        return {
+            (fila["condominio_id"] or CADENA_GLOBAL): {
+                "hash": fila["hash_actual"],
+                "secuencia": fila["secuencia"]
+            }
+            for fila in filas
+        }
+
+    def anclar(self) -> Dict:
+        """
+        Registra un ancla sobre las cabezas actuales de todas las cadenas.
+
+        Returns:
+            Dict con hash_ancla, hash_previo, cabezas y timestamp
+        """
+        with self._lock_ancla, transaccion() as db:
+            cabezas = self.cabezas_en_bd()
+            previa = db.execute("""
+                SELECT hash_ancla FROM anclas_cadena
+                ORDER BY ancla_id DESC LIMIT 1
+            """).fetchone()
+            hash_previo = previa["hash_ancla"] if previa else None
+
+            timestamp = datetime.now().isoformat()
+            hash_ancla, _ = generar_hash_cadena(hash_previo, {"cabezas": cabezas}, timestamp)
+
+            db.execute("""
+                INSERT INTO anclas_cadena (hash_ancla, hash_previo, cabezas, timestamp)
+                VALUES (?, ?, ?, ?)
+            """, (hash_ancla, hash_previo, json.dumps(cabezas, sort_keys=True), timestamp))
+
+        return {
+            "hash_ancla": hash_ancla,
+            "hash_previo": hash_previo,
+            "cabezas": cabezas,
+            "timestamp": timestamp
+        }
+
+
+# Instancia del proceso
+cadenas_eventos = CadenasEventos()
@@ -0,0 +1,142 @@
+"""
+core/coincidencia_placas.py
+Coincidencia aproximada de placas tolerante a errores de OCR
+"""
+
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, List, Set, Tuple
+
+# Caracteres que la cámara/OCR confunde entre sí. Cada grupo se reduce a un
+# representante, así que una lectura con solo confusiones de este tipo tiene
+# la misma forma canónica que la placa real
+GRUPOS_CONFUSION = (
+    "0ODQ",
+    "1IL",
+    "2Z",
+    "5S",
+    "6G",
+    "8B",
+)
+
+# Costo de sustituir un carácter por otro de su mismo grupo (1.0 = error común)
+COSTO_CONFUSION = 0.25
+
+_CANONICO = {c: grupo[0] for grupo in GRUPOS_CONFUSION for c in grupo}
+
+
+def compactar(placa: str) -> str:
+    """Mayúsculas, solo letras y dígitos ('abc-12 34' -> 'ABC1234')"""
+    return "".join(c for c in placa.upper() if c.isalnum())
+
+
+def canonica(compacta: str) -> str:
+    """Forma canónica: cada carácter confundible se reemplaza por su grupo"""
+    return "".join(_CANONICO.get(c, c) for c in compacta)
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Distancia de edición (inserción, borrado y sustitución cuestan 1)"""
+    if len(a) < len(b):
+        a, b = b, a
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + (ca != cb)
+            ))
+        anterior = actual
+    return anterior[-1]
+
+
+def distancia_ocr(a: str, b: str) -> float:
+    """Distancia de edición donde sustituir caracteres confundibles cuesta COSTO_CONFUSION"""
+    anterior = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        actual = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sustitucion = 0.0
+            elif _CANONICO.get(ca, ca) == _CANONICO.get(cb, cb):
+                sustitucion = COSTO_CONFUSION
+            else:
+                sustitucion = 1.0
+            actual.append(min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + sustitucion
+            ))
+        anterior = actual
+    return anterior[-1]
+
+
+def _variantes(texto: str, max_ediciones: int) -> Set[str]:
+    """El texto y todas sus variantes con hasta max_ediciones caracteres borrados"""
+    variantes = {texto}
+    for borrados in range(1, min(max_ediciones, len(texto)) + 1):
+        for posiciones in combinations(range(len(texto)), borrados):
+            variantes.add("".join(c for i, c in enumerate(texto) if i not in posiciones))
+    return variantes
+
+
+class IndiceAproximado:
+    """
+    Índice de borrados (estilo SymSpell) sobre la forma canónica de las placas.
+
+    Dos placas a distancia de edición <= k comparten alguna variante con
+    hasta k caracteres borrados, así que los candidatos salen de unos
+    cuantos accesos a dict sin importar cuántas placas haya; luego se
+    verifican con levenshtein y se ordenan con distancia_ocr. Las
+    confusiones de GRUPOS_CONFUSION no cuentan como edición.
+    """
+
+    def __init__(self, max_ediciones: int = 1):
+        self.max_ediciones = max_ediciones
+        self._por_variante: Dict[str, Set[str]] = defaultdict(set)
+        self._canonicas: Dict[str, str] = {}
+
+    def __len__(self):
+        return len(self._canonicas)
+
+    def agregar(self, placa: str):
+        """Agrega una placa (se indexa por su forma compacta)"""
+        compacta = compactar(placa)
+        if not compacta or compacta in self._canonicas:
+            return
+        forma = canonica(compacta)
+        self._canonicas[compacta] = forma
+        for variante in _variantes(forma, self.max_ediciones):
+            self._por_variante[variante].add(compacta)
+
+    def candidatos(self, lectura: str) -> List[Tuple[str, float]]:
+        """
+        Placas (forma compacta) a hasta max_ediciones de la lectura.
+
+        Returns:
+            [(placa_compacta, distancia_ocr)] de menor a mayor distancia
+        """
+        compacta = compactar(lectura)
+        if not compacta:
+            return []
+        forma = canonica(compacta)
+
+        vistos = set()
+        for variante in _variantes(forma, self.max_ediciones):
+            vistos.update(self._por_variante.get(variante, ()))
+
+        resultado = [
+            (placa, distancia_ocr(compacta, placa))
+            for placa in vistos
+            if levenshtein(forma, self._canonicas[placa]) <= self.max_ediciones
+        ]
+        resultado.sort(key=lambda par: (par[1], par[0]))
+        return resultado
+
+
+def confianza(lectura: str, placa: str, distancia: float) -> float:
+    """1.0 para coincidencia exacta, baja con la distancia relativa a la longitud"""
+    largo = max(len(compactar(lectura)), len(compactar(placa)), 1)
+    return round(max(0.0, 1.0 - distancia / largo), 3)
@@ -2,188 +2,807 @@
 core/db.py
 Gestión de base de datos estructural AUP-EXO
 Soporta SQLite (desarrollo) y PostgreSQL (producción)
+
+La configuración del backend se resuelve una sola vez al importar el módulo
+y las conexiones PostgreSQL se reutilizan desde un pool por proceso.
 """
 
 import sqlite3
 import json
 import os
+import socket
+import threading
+import time
+import uuid
 from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+except ImportError:
+    # psycopg2 no instalado: solo SQLite disponible
+    psycopg2 = None
+    RealDictCursor = object
+
 # Cargar variables de entorno
 load_dotenv()
 
 DB_PATH = "data/accesos.sqlite"
 DB_MODE = os.getenv('DB_MODE', 'sqlite')  # 'sqlite' o 'postgres'
 
-@contextmanager
-def get_db():
+# Pool de conexiones PostgreSQL
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_PING_SEGUNDOS = float(os.getenv('DB_POOL_PING_SEGUNDOS', '30'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+
+# ---------------------------------------------------------
+# Pool de conexiones
+# ---------------------------------------------------------
+class PoolConexiones:
     """
-    Context manager para conexiones de base de datos.
-    
-    Estrategia:
-    1. Si DB_MODE=postgres → usa database/pg_connection.py
-    2. Si DB_MODE=sqlite → usa SQLite local
-    3. Si está en Streamlit Cloud → detecta DATABASE_URL en secrets
+    Pool thread-safe de conexiones con verificación de salud.
+
+    - Reutiliza la conexión más reciente (LIFO) para mantenerla caliente
+    - Descarta conexiones cerradas y hace ping a las que llevan tiempo ociosas
+    - Limita el total de conexiones abiertas a max_conexiones
     """
-    use_postgres = False
-    conn = None
-    
-    # Opción 1: Streamlit Cloud con secrets individuales (PG_HOST, PG_DATABASE, etc.)
-    try:
-        import streamlit as st
-        print(f"🔍 DEBUG: Streamlit detectado, hasattr secrets: {hasattr(st, 'secrets')}")
-        if hasattr(st, 'secrets'):
-            print(f"🔍 DEBUG: Secrets disponibles: {list(st.secrets.keys())}")
-            db_mode = st.secrets.get('DB_MODE', '')
-            if db_mode in ['postgres', 'postgresql']:
-                import psycopg2
-                from psycopg2.extras import RealDictCursor
-                import socket
-                
-                print(f"🔍 DEBUG: Intentando conectar a PostgreSQL...")
-                print(f"   Host: {st.secrets.get('PG_HOST', 'N/A')}")
-                print(f"   Database: {st.secrets.get('PG_DATABASE', 'N/A')}")
-                
-                # Forzar IPv4 (fix para Streamlit Cloud)
-                original_getaddrinfo = socket.getaddrinfo
-                def getaddrinfo_ipv4_only(host, port, family=0, type=0, proto=0, flags=0):
-                    return original_getaddrinfo(host, port, socket.AF_INET, type, proto, flags)
-                socket.getaddrinfo = getaddrinfo_ipv4_only
-                
-                try:
-                    conn = psycopg2.connect(
-                        host=st.secrets['PG_HOST'],
-                        database=st.secrets['PG_DATABASE'],
-                        user=st.secrets['PG_USER'],
-                        password=st.secrets['PG_PASSWORD'],
-                        port=int(st.secrets.get('PG_PORT', 5432))
-                    )
-                    # Forzar autocommit para evitar estados de transacción que bloqueen SELECT posteriores
-                    try:
-                        conn.autocommit = True
-                        print("🔧 DEBUG: autocommit habilitado (secrets)")
-                    except Exception as ac_err:
-                        print(f"⚠️  No se pudo habilitar autocommit: {ac_err}")
-                    use_postgres = True
-                    print("✅ Conectado a PostgreSQL via Streamlit secrets")
-                finally:
-                    socket.getaddrinfo = original_getaddrinfo
-    except Exception as e:
-        print(f"⚠️  Error en Opción 1: {e}")
-        pass
-    
-    # Opción 2: Streamlit Cloud con DATABASE_URL
-    if not conn:
+
+    def __init__(self, fabrica, max_conexiones=10, verificar=None,
+                 ping_segundos=30.0, timeout=10.0):
+        """
+        Args:
+            fabrica: Callable sin argumentos que abre una conexión nueva
+            max_conexiones: Máximo de conexiones prestadas + ociosas
+            verificar: Callable(conn) -> bool para health check (opcional)
+            ping_segundos: Tiempo ocioso tras el cual se verifica la conexión
+            timeout: Segundos a esperar por una conexión libre
+        """
+        self._fabrica = fabrica
+        self._verificar = verificar
+        self._ping_segundos = ping_segundos
+        self._timeout = timeout
+        self._libres = []
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(max_conexiones)
+        self.max_conexiones = max_conexiones
+        self.estadisticas = {
+            "creadas": 0,
+            "reutilizadas": 0,
+            "descartadas": 0
+        }
+
+    def adquirir(self):
+        """Obtiene una conexión sana del pool (o abre una nueva)"""
+        if not self._cupos.acquire(timeout=self._timeout):
+            raise TimeoutError(
+                f"Pool de conexiones agotado ({self.max_conexiones} en uso)"
+            )
+        try:
+            while True:
+                with self._lock:
+                    item = self._libres.pop() if self._libres else None
+
+                if item is None:
+                    conn = self._fabrica()
+                    self.estadisticas["creadas"] += 1
+                    return conn
+
+                conn, ultimo_uso = item
+                if self._es_saludable(conn, ultimo_uso):
+                    self.estadisticas["reutilizadas"] += 1
+                    return conn
+                self._cerrar(conn)
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def liberar(self, conn, descartar=False):
+        """Devuelve una conexión al pool (o la cierra si está dañada)"""
+        try:
+            if descartar or getattr(conn, "closed", False):
+                self._cerrar(conn)
+            else:
+                with self._lock:
+                    self._libres.append((conn, time.monotonic()))
+        finally:
+            self._cupos.release()
+
+    def cerrar_todo(self):
+        """Cierra las conexiones ociosas (las prestadas se cierran al liberarse)"""
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for conn, _ in libres:
+            self._cerrar(conn)
+
+    @property
+    def ociosas(self):
+        return len(self._libres)
+
+    def _es_saludable(self, conn, ultimo_uso):
+        if getattr(conn, "closed", False):
+            return False
+        if self._verificar and time.monotonic() - ultimo_uso >= self._ping_segundos:
+            return self._verificar(conn)
+        return True
+
+    def _cerrar(self, conn):
+        self.estadisticas["descartadas"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# ---------------------------------------------------------
+# Resolución de configuración (una sola vez por proceso)
+# ---------------------------------------------------------
+def _resolver_config_db():
+    """
+    Determina el backend de base de datos.
+
+    Estrategia (misma prioridad que antes, evaluada una sola vez):
+    1. Streamlit secrets con DB_MODE=postgres y PG_HOST, PG_DATABASE, etc.
+    2. Streamlit secrets con DATABASE_URL
+    3. DB_MODE=postgres en .env (database/pg_connection.py)
+    4. Fallback a SQLite (desarrollo)
+    """
+    if psycopg2 is not None:
+        # Opción 1 y 2: Streamlit Cloud
         try:
             import streamlit as st
-            if hasattr(st, 'secrets') and 'DATABASE_URL' in st.secrets:
-                import psycopg2
-                from psycopg2.extras import RealDictCursor
-                import socket
-                
-                print(f"🔍 DEBUG: Conectando via DATABASE_URL")
-                
-                # Forzar IPv4
-                original_getaddrinfo = socket.getaddrinfo
-                def getaddrinfo_ipv4_only(host, port, family=0, type=0, proto=0, flags=0):
-                    return original_getaddrinfo(host, port, socket.AF_INET, type, proto, flags)
-                socket.getaddrinfo = getaddrinfo_ipv4_only
-                
-                try:
-                    conn = psycopg2.connect(st.secrets['DATABASE_URL'])
-                    try:
-                        conn.autocommit = True
-                        print("🔧 DEBUG: autocommit habilitado (DATABASE_URL)")
-                    except Exception as ac_err:
-                        print(f"⚠️  No se pudo habilitar autocommit: {ac_err}")
-                    use_postgres = True
-                    print("✅ Conectado a PostgreSQL via DATABASE_URL")
-                finally:
-                    socket.getaddrinfo = original_getaddrinfo
+            if hasattr(st, 'secrets'):
+                if st.secrets.get('DB_MODE', '') in ['postgres', 'postgresql']:
+                    print("✅ Backend PostgreSQL resuelto via Streamlit secrets")
+                    return {
+                        "motor": "postgres",
+                        "origen": "secrets",
+                        "parametros": {
+                            "host": st.secrets['PG_HOST'],
+                            "database": st.secrets['PG_DATABASE'],
+                            "user": st.secrets['PG_USER'],
+                            "password": st.secrets['PG_PASSWORD'],
+                            "port": int(st.secrets.get('PG_PORT', 5432))
+                        },
+                        # Autocommit evita estados de transacción que bloqueen SELECT posteriores
+                        "autocommit": True
+                    }
+                if 'DATABASE_URL' in st.secrets:
+                    print("✅ Backend PostgreSQL resuelto via DATABASE_URL")
+                    return {
+                        "motor": "postgres",
+                        "origen": "database_url",
+                        "parametros": {"dsn": st.secrets['DATABASE_URL']},
+                        "autocommit": True
+                    }
         except Exception as e:
-            print(f"⚠️  Error en Opción 2: {e}")
-            pass
-    
-    # Opción 3: Variable de entorno DB_MODE (desarrollo local)
-    if not conn and DB_MODE == 'postgres':
+            print(f"⚠️  Streamlit secrets no disponibles: {e}")
+
+        # Opción 3: Variable de entorno DB_MODE (desarrollo local)
+        if DB_MODE == 'postgres':
+            try:
+                from database.pg_connection import get_pg_config
+                print("✅ Backend PostgreSQL resuelto via .env local")
+                return {
+                    "motor": "postgres",
+                    "origen": "env",
+                    "parametros": get_pg_config(),
+                    "autocommit": False
+                }
+            except Exception as e:
+                print(f"⚠️  Error leyendo configuración PostgreSQL: {e}")
+
+    # Opción 4: SQLite
+    print("📌 Usando SQLite (desarrollo local)")
+    return {"motor": "sqlite", "origen": "sqlite"}
+
+
+_config_db = _resolver_config_db()
+_pool_pg = None
+# Estado del backend PostgreSQL: None (sin probar), "postgres" (ya entregó
+# una conexión) o "sqlite" (nunca conectó y el proceso quedó en SQLite)
+_backend_activo = None
+_pool_lock = threading.Lock()
+_estado_hilo = threading.local()
+
+# Orden de la cadena hash de eventos (ver core.cadena)
+COLUMNAS_CADENA_EVENTOS = {
+    "hash_previo": "TEXT",
+    "secuencia": "INTEGER",
+    "condominio_id": "TEXT",
+}
+
+
+def obtener_config_db():
+    """Retorna la configuración de backend resuelta al importar el módulo"""
+    return _config_db
+
+
+def _host_ipv4(parametros):
+    """
+    Resuelve el host a IPv4 (fix para Streamlit Cloud).
+    libpq resuelve DNS por su cuenta, así que se pasa la IP como hostaddr
+    y el nombre original se conserva para TLS/SNI.
+    """
+    host = parametros.get("host")
+    port = parametros.get("port") or 5432
+    if not host and parametros.get("dsn"):
+        dsn_info = psycopg2.extensions.parse_dsn(parametros["dsn"])
+        host = dsn_info.get("host")
+        port = dsn_info.get("port") or port
+    if not host or host.startswith("/"):
+        return None
+    try:
+        info = socket.getaddrinfo(host, int(port), socket.AF_INET, socket.SOCK_STREAM)
+        return info[0][4][0] if info else None
+    except (OSError, ValueError):
+        return None
+
+
+def _crear_conexion_pg():
+    """Abre una conexión física nueva a PostgreSQL (solo en fallos del pool)"""
+    parametros = dict(_config_db["parametros"])
+    hostaddr = _host_ipv4(parametros)
+    if hostaddr:
+        parametros["hostaddr"] = hostaddr
+
+    dsn = parametros.pop("dsn", None)
+    conn = psycopg2.connect(dsn, **parametros) if dsn else psycopg2.connect(**parametros)
+
+    if _config_db.get("autocommit"):
         try:
-            from database.pg_connection import get_pg
-            conn = get_pg()
-            use_postgres = True
-            print("✅ Conectado a PostgreSQL via .env local")
+            conn.autocommit = True
+        except Exception as ac_err:
+            print(f"⚠️  No se pudo habilitar autocommit: {ac_err}")
+    return conn
+
+
+def _verificar_conexion_pg(conn):
+    """Health check ligero antes de reutilizar una conexión ociosa"""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        if not conn.autocommit:
+            conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _obtener_pool():
+    global _pool_pg
+    if _pool_pg is None:
+        with _pool_lock:
+            if _pool_pg is None:
+                _pool_pg = PoolConexiones(
+                    _crear_conexion_pg,
+                    max_conexiones=DB_POOL_MAX,
+                    verificar=_verificar_conexion_pg,
+                    ping_segundos=DB_POOL_PING_SEGUNDOS,
+                    timeout=DB_POOL_TIMEOUT
+                )
+    return _pool_pg
+
+
+def estadisticas_pool():
+    """Métricas del pool PostgreSQL (vacío si se usa SQLite)"""
+    if _pool_pg is None:
+        return {}
+    return {
+        **_pool_pg.estadisticas,
+        "ociosas": _pool_pg.ociosas,
+        "max_conexiones": _pool_pg.max_conexiones
+    }
+
+
+def cerrar_conexiones():
+    """Cierra el pool PostgreSQL (shutdown de la aplicación)"""
+    global _pool_pg
+    with _pool_lock:
+        pool, _pool_pg = _pool_pg, None
+    if pool is not None:
+        pool.cerrar_todo()
+
+
+# ---------------------------------------------------------
+# Compatibilidad de queries SQLite → PostgreSQL
+# ---------------------------------------------------------
+class _CursorCompat(RealDictCursor):
+    """Cursor dict que convierte placeholders ? a %s"""
+
+    def execute(self, query, params=None):
+        query = query.replace('?', '%s')
+        if params:
+            return super().execute(query, params)
+        return super().execute(query)
+
+    def executemany(self, query, params_seq):
+        return super().executemany(query.replace('?', '%s'), params_seq)
+
+
+class PostgresConnectionWrapper:
+    """Expone una conexión psycopg2 con la API de sqlite3 usada en el código"""
+
+    def __init__(self, pg_conn):
+        self._conn = pg_conn
+
+    def cursor(self):
+        return self._conn.cursor(cursor_factory=_CursorCompat)
+
+    def execute(self, query, params=None):
+        cur = self.cursor()
+        cur.execute(query, params)
+        return cur
+
+    def executemany(self, query, params_seq):
+        cur = self.cursor()
+        cur.executemany(query, params_seq)
+        return cur
+
+    def execute_values(self, query, filas, page_size=1000):
+        """INSERT ... VALUES %s con muchas filas por sentencia (psycopg2.extras)"""
+        from psycopg2.extras import execute_values
+
+        cur = self._conn.cursor()
+        execute_values(cur, query, filas, page_size=page_size)
+        return cur
+
+    def cursor_servidor(self, nombre, tamano_lote=2000):
+        """Cursor con nombre (del lado del servidor): trae tamano_lote filas por viaje"""
+        cur = self._conn.cursor(name=nombre, cursor_factory=_CursorCompat, withhold=True)
+        cur.itersize = tamano_lote
+        return cur
+
+    @property
+    def autocommit(self):
+        return self._conn.autocommit
+
+    @autocommit.setter
+    def autocommit(self, valor):
+        self._conn.autocommit = valor
+
+    def commit(self):
+        return self._conn.commit()
+
+    def rollback(self):
+        return self._conn.rollback()
+
+    def close(self):
+        return self._conn.close()
+
+
+def iterar_filas(db, query, params=(), tamano_lote=2000):
+    """
+    Itera el resultado de una consulta sin cargarlo completo en memoria.
+
+    En PostgreSQL usa un cursor del lado del servidor (WITH HOLD, sobrevive
+    a los COMMIT de la misma conexión); en SQLite lee con fetchmany.
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        cur = db.cursor_servidor(f"iter_{uuid.uuid4().hex}", tamano_lote)
+        try:
+            cur.execute(query, params)
+            yield from cur
+        finally:
+            cur.close()
+        return
+
+    cur = db.execute(query, params)
+    try:
+        while True:
+            filas = cur.fetchmany(tamano_lote)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        cur.close()
+
+
+def insertar_lote(db, tabla, columnas, filas, tamano_pagina=1000):
+    """
+    Inserta muchas filas con pocas sentencias: VALUES multi-fila en
+    PostgreSQL (un viaje por página) y executemany en SQLite.
+
+    Returns:
+        Número de filas enviadas
+    """
+    filas = list(filas)
+    if not filas:
+        return 0
+
+    lista_columnas = ", ".join(columnas)
+    if isinstance(db, PostgresConnectionWrapper):
+        db.execute_values(
+            f"INSERT INTO {tabla} ({lista_columnas}) VALUES %s", filas, page_size=tamano_pagina
+        )
+    else:
+        marcas = ", ".join("?" for _ in columnas)
+        db.executemany(f"INSERT INTO {tabla} ({lista_columnas}) VALUES ({marcas})", filas)
+    return len(filas)
+
+
+# ---------------------------------------------------------
+# Conexiones
+# ---------------------------------------------------------
+def _abrir_conexion():
+    """
+    Abre una conexión lista para usarse.
+
+    El fallback a SQLite solo aplica si PostgreSQL nunca pudo conectar en
+    este proceso, y entonces es definitivo (no se alternan backends). Con
+    PostgreSQL ya en uso, un pool agotado o una caída se propagan.
+
+    Returns:
+        (conn, liberar) donde liberar(descartar=False) la devuelve al pool o la cierra
+
+    Raises:
+        TimeoutError: Si el pool PostgreSQL está agotado
+    """
+    global _backend_activo
+    if _config_db["motor"] == "postgres" and _backend_activo != "sqlite":
+        try:
+            pool = _obtener_pool()
+            pg_conn = pool.adquirir()
+        except TimeoutError:
+            raise
         except Exception as e:
-            print(f"⚠️  Error conectando PostgreSQL: {e}")
+            if _backend_activo == "postgres":
+                raise
+            print(f"⚠️  Error conectando PostgreSQL ({_config_db['origen']}): {e}")
             print("📌 Fallback a SQLite...")
-    
-    # Opción 4: Fallback a SQLite (desarrollo)
-    if not conn:
-        conn = sqlite3.connect(DB_PATH if Path(DB_PATH).exists() else "axs_v2.db")
-        conn.row_factory = sqlite3.Row
-        print("📌 Usando SQLite (desarrollo local)")
-    
+            _backend_activo = "sqlite"
+        else:
+            _backend_activo = "postgres"
+
+            def liberar(descartar=False):
+                pool.liberar(pg_conn, descartar=descartar)
+            return PostgresConnectionWrapper(pg_conn), liberar
+
+    conn = sqlite3.connect(DB_PATH if Path(DB_PATH).exists() else "axs_v2.db")
+    conn.row_factory = sqlite3.Row
+
+    def cerrar(descartar=False):
+        conn.close()
+    return conn, cerrar
+
+
+@contextmanager
+def get_db():
+    """
+    Context manager para conexiones de base de datos.
+
+    Cada bloque es una unidad de commit/rollback. Dentro de
+    conexion_compartida() reutiliza la conexión del hilo actual en lugar
+    de abrir otra; dentro de transaccion() además difiere el commit.
+    """
+    compartida = getattr(_estado_hilo, "conexion", None)
+    if compartida is not None and getattr(_estado_hilo, "transaccional", False):
+        # El COMMIT/ROLLBACK lo hace quien abrió la unidad de trabajo
+        yield compartida
+        return
+
+    if compartida is not None:
+        try:
+            yield compartida
+            compartida.commit()
+        except Exception as e:
+            compartida.rollback()
+            raise e
+        return
+
+    conn, liberar = _abrir_conexion()
+    descartar = False
     try:
-        # Wrapper para compatibilidad de queries
-        if use_postgres:
-            # Crear cursor con dict factory
-            from psycopg2.extras import RealDictCursor
-            
-            # Wrapper del método cursor() para que siempre use RealDictCursor
-            original_cursor_method = conn.cursor
-            def cursor_with_dict():
-                cur = original_cursor_method(cursor_factory=RealDictCursor)
-                # Agregar wrapper al execute del cursor para convertir ? a %s
-                original_cur_execute = cur.execute
-                def execute_compat(query, params=None):
-                    query = query.replace('?', '%s')
-                    if params:
-                        return original_cur_execute(query, params)
-                    return original_cur_execute(query)
-                cur.execute = execute_compat
-                return cur
-            
-            # Crear wrapper de conexión para compatibilidad
-            class PostgresConnectionWrapper:
-                def __init__(self, pg_conn):
-                    self._conn = pg_conn
-                
-                def cursor(self):
-                    return cursor_with_dict()
-                
-                def execute(self, query, params=None):
-                    cur = self.cursor()
-                    query = query.replace('?', '%s')
-                    if params:
-                        cur.execute(query, params)
-                    else:
-                        cur.execute(query)
-                    return cur
-                
-                def commit(self):
-                    return self._conn.commit()
-                
-                def rollback(self):
-                    return self._conn.rollback()
-                
-                def close(self):
-                    return self._conn.close()
-            
-            conn = PostgresConnectionWrapper(conn)
-        
         yield conn
-        
+
         # IMPORTANTE: Commit para ambos tipos de BD
         conn.commit()
-        
+
     except Exception as e:
-        if hasattr(conn, 'rollback'):
+        try:
             conn.rollback()
+        except Exception:
+            # Conexión dañada: no regresarla al pool
+            descartar = True
         raise e
     finally:
-        if conn:
-            conn.close()
+        liberar(descartar=descartar)
+
+
+@contextmanager
+def conexion_compartida():
+    """
+    Comparte una sola conexión entre todas las llamadas a get_db() del hilo.
+
+    Pensado para una petición/decisión de acceso completa: evaluar reglas,
+    registrar evento y bitácora cuestan un solo checkout del pool.
+    Es reentrante: si ya hay una conexión compartida se reutiliza.
+
+    Example:
+        >>> with conexion_compartida():
+        ...     orq.procesar_acceso(entidad_id, metadata, actor)
+    """
+    if getattr(_estado_hilo, "conexion", None) is not None:
+        yield _estado_hilo.conexion
+        return
+
+    conn, liberar = _abrir_conexion()
+    _estado_hilo.conexion = conn
+    descartar = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            descartar = True
+        raise e
+    finally:
+        _estado_hilo.conexion = None
+        liberar(descartar=descartar)
+
+
+@contextmanager
+def transaccion():
+    """
+    Unidad de trabajo: todas las llamadas a get_db() del hilo comparten una
+    conexión y se confirman con un solo COMMIT al salir (ROLLBACK si falla).
+
+    En PostgreSQL desactiva temporalmente autocommit; en SQLite abre la
+    transacción con BEGIN IMMEDIATE para tomar el lock de escritura desde
+    la primera lectura. Es reentrante.
+
+    Example:
+        >>> with transaccion():
+        ...     orq.registrar_acceso(...)   # evento + bitácora atómicos
+    """
+    if getattr(_estado_hilo, "transaccional", False):
+        yield _estado_hilo.conexion
+        return
+
+    with conexion_compartida() as conn:
+        # Confirmar lo pendiente antes de cambiar de modo
+        conn.commit()
+
+        autocommit_previo = None
+        if isinstance(conn, PostgresConnectionWrapper):
+            autocommit_previo = conn.autocommit
+            conn.autocommit = False
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+
+        _estado_hilo.transaccional = True
+        _estado_hilo.al_terminar = []
+        exito = False
+        try:
+            yield conn
+            conn.commit()
+            exito = True
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            _estado_hilo.transaccional = False
+            pendientes, _estado_hilo.al_terminar = _estado_hilo.al_terminar, []
+            if autocommit_previo:
+                try:
+                    conn.autocommit = autocommit_previo
+                except Exception:
+                    pass
+            for callback in pendientes:
+                try:
+                    callback(exito)
+                except Exception as e:
+                    print(f"⚠️ Error en callback de fin de transacción: {e}")
+
+
+def en_transaccion():
+    """True si el hilo actual está dentro de transaccion()"""
+    return getattr(_estado_hilo, "transaccional", False)
+
+
+def al_terminar_transaccion(callback):
+    """
+    Registra callback(exito: bool) para cuando termine la transacción del hilo.
+
+    Se invoca después del COMMIT (exito=True) o del ROLLBACK (exito=False),
+    en orden de registro. Fuera de transaccion() se invoca de inmediato con
+    exito=True, porque cada get_db() ya confirmó su propio bloque.
+    """
+    if en_transaccion():
+        _estado_hilo.al_terminar.append(callback)
+    else:
+        callback(True)
+
+
+def asegurar_indice_cadena(db, tabla="eventos"):
+    """
+    Índices UNIQUE de la cadena hash: (condominio_id, secuencia) y, como dos
+    NULL no chocan en un UNIQUE, secuencia en la cadena global. Un escritor
+    con la cabeza en memoria desactualizada (otro proceso ya anexó) falla al
+    insertar y recarga la cabeza en lugar de duplicar la secuencia.
+
+    Reemplaza el índice no único de versiones anteriores. Si la tabla ya
+    tiene secuencias repetidas lo conserva y avisa (verificar_cadenas las
+    reporta).
+    """
+    nombre = f"idx_{tabla}_cadena"
+    if isinstance(db, PostgresConnectionWrapper):
+        fila = db.execute("""
+            SELECT indexdef AS definicion FROM pg_indexes
+            WHERE schemaname = current_schema() AND indexname = ?
+        """, (nombre,)).fetchone()
+    else:
+        fila = db.execute(
+            "SELECT sql AS definicion FROM sqlite_master WHERE type = 'index' AND name = ?", (nombre,)
+        ).fetchone()
+    if fila is not None and "UNIQUE" in (fila["definicion"] or "").upper():
+        return
+
+    repetida = db.execute(f"""
+        SELECT condominio_id, secuencia FROM {tabla}
+        WHERE secuencia IS NOT NULL
+        GROUP BY condominio_id, secuencia HAVING COUNT(*) > 1
+        LIMIT 1
+    """).fetchone()
+    if repetida is not None:
+        print(f"⚠️ {tabla} tiene secuencias repetidas (cadena {repetida['condominio_id']}, "
+              f"secuencia {repetida['secuencia']}): se conserva el índice no único")
+        db.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla}(condominio_id, secuencia)")
+        return
+
+    db.execute(f"DROP INDEX IF EXISTS {nombre}")
+    db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {nombre} ON {tabla}(condominio_id, secuencia)")
+    db.execute(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {nombre}_global ON {tabla}(secuencia)
+        WHERE condominio_id IS NULL AND secuencia IS NOT NULL
+    """)
+
+
+def asegurar_columnas(db, tabla, columnas):
+    """
+    Agrega a una tabla existente las columnas que le falten (migración idempotente).
+
+    Args:
+        db: Conexión de get_db()
+        tabla: Nombre de la tabla
+        columnas: Dict {nombre: tipo SQL}
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        for nombre, tipo in columnas.items():
+            db.execute(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {nombre} {tipo}")
+        return
+
+    existentes = {fila[1] for fila in db.execute(f"PRAGMA table_info({tabla})").fetchall()}
+    for nombre, tipo in columnas.items():
+        if nombre not in existentes:
+            db.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}")
+
+
+_SQL_VISITAS_DIARIAS_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS visitas_diarias (
+        entidad_id TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        tipo_evento TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (entidad_id, fecha, tipo_evento)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_visitas_diarias_insert
+    AFTER INSERT ON eventos
+    WHEN NEW.entidad_id IS NOT NULL AND DATE(NEW.timestamp_servidor) IS NOT NULL
+    BEGIN
+        INSERT INTO visitas_diarias (entidad_id, fecha, tipo_evento, total)
+        VALUES (NEW.entidad_id, DATE(NEW.timestamp_servidor), NEW.tipo_evento, 1)
+        ON CONFLICT (entidad_id, fecha, tipo_evento) DO UPDATE SET total = total + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_visitas_diarias_delete
+    AFTER DELETE ON eventos
+    WHEN OLD.entidad_id IS NOT NULL
+    BEGIN
+        UPDATE visitas_diarias SET total = total - 1
+        WHERE entidad_id = OLD.entidad_id
+          AND fecha = DATE(OLD.timestamp_servidor)
+          AND tipo_evento = OLD.tipo_evento;
+    END
+    """,
+]
+
+_SQL_VISITAS_DIARIAS_PG = [
+    """
+    CREATE TABLE IF NOT EXISTS visitas_diarias (
+        entidad_id VARCHAR(100) NOT NULL,
+        fecha DATE NOT NULL,
+        tipo_evento VARCHAR(50) NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (entidad_id, fecha, tipo_evento)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION actualizar_visitas_diarias()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            IF NEW.entidad_id IS NOT NULL AND NEW.timestamp_servidor IS NOT NULL THEN
+                INSERT INTO visitas_diarias (entidad_id, fecha, tipo_evento, total)
+                VALUES (NEW.entidad_id, NEW.timestamp_servidor::date, NEW.tipo_evento, 1)
+                ON CONFLICT (entidad_id, fecha, tipo_evento)
+                DO UPDATE SET total = visitas_diarias.total + 1;
+            END IF;
+            RETURN NEW;
+        END IF;
+        UPDATE visitas_diarias SET total = total - 1
+        WHERE entidad_id = OLD.entidad_id
+          AND fecha = OLD.timestamp_servidor::date
+          AND tipo_evento = OLD.tipo_evento;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_visitas_diarias ON eventos",
+    """
+    CREATE TRIGGER trg_visitas_diarias
+        AFTER INSERT OR DELETE ON eventos
+        FOR EACH ROW
+        EXECUTE FUNCTION actualizar_visitas_diarias()
+    """,
+]
+
+
+def asegurar_visitas_diarias(db):
+    """
+    Crea el contador visitas_diarias (entidad_id, fecha, tipo_evento) -> total
+    y los triggers que lo mantienen en cada INSERT/DELETE de eventos.
+
+    La primera vez lo llena desde los eventos existentes. Es idempotente.
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        existe = db.execute("SELECT to_regclass('visitas_diarias') AS t").fetchone()["t"]
+        if existe:
+            return
+        sentencias = _SQL_VISITAS_DIARIAS_PG
+    else:
+        existe = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'visitas_diarias'"
+        ).fetchone()
+        sentencias = _SQL_VISITAS_DIARIAS_SQLITE
+
+    for sql in sentencias:
+        db.execute(sql)
+
+    if not existe:
+        sumar_visitas_diarias(db)
+
+
+def sumar_visitas_diarias(db, filtro: str = "1 = 1", params=()):
+    """
+    Suma a visitas_diarias los eventos que cumplen `filtro` (WHERE sobre
+    eventos). Llena el contador la primera vez y compensa el trigger de
+    DELETE cuando se archivan eventos (ver core/archivo.py).
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        fecha_sql = "timestamp_servidor::date"
+    else:
+        fecha_sql = "DATE(timestamp_servidor)"
+
+    db.execute(f"""
+        INSERT INTO visitas_diarias (entidad_id, fecha, tipo_evento, total)
+        SELECT entidad_id, {fecha_sql}, tipo_evento, COUNT(*)
+        FROM eventos
+        WHERE entidad_id IS NOT NULL AND {fecha_sql} IS NOT NULL AND ({filtro})
+        GROUP BY entidad_id, {fecha_sql}, tipo_evento
+        ON CONFLICT (entidad_id, fecha, tipo_evento)
+        DO UPDATE SET total = visitas_diarias.total + excluded.total
+    """, params)
 
 
 def init_db():
@@ -233,9 +852,14 @@ def init_db():
                 origen TEXT,
                 contexto TEXT,
                 recibo_recordia TEXT,
+                hash_previo TEXT,
+                secuencia INTEGER,
+                condominio_id TEXT,
                 FOREIGN KEY(entidad_id) REFERENCES entidades(entidad_id)
             )
         """)
+        # Bases creadas antes de hash_previo/secuencia/condominio_id
+        asegurar_columnas(db, "eventos", COLUMNAS_CADENA_EVENTOS)
         
         # Tabla de políticas (motor de reglas)
         # DISEÑO AUP-EXO: Políticas parametrizadas
@@ -314,11 +938,44 @@ def init_db():
             )
         """)
         
+        # Anclas entre cadenas: hash sobre las cabezas de todas las cadenas
+        # por condominio (core.cadena.CadenasEventos.anclar)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS anclas_cadena (
+                ancla_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash_ancla TEXT NOT NULL,
+                hash_previo TEXT,
+                cabezas TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        """)
+        
+        # Contador diario de eventos por entidad (límites de visitas en O(1))
+        asegurar_visitas_diarias(db)
+
+        # Índice de búsqueda de entidades (FTS5 trigram)
+        from core.busqueda import asegurar_busqueda_entidades
+        asegurar_busqueda_entidades(db)
+
+        # Índice de placas normalizadas (escaneo en caseta)
+        from core.placas import asegurar_indice_placas
+        asegurar_indice_placas(db)
+
+        # Agregados de eventos por condominio/día/hora/tipo (dashboard)
+        from core.agregados import asegurar_agregados_eventos
+        asegurar_agregados_eventos(db)
+
+        # Manifiesto del archivo Parquet de meses cerrados
+        from core.archivo import asegurar_archivo
+        asegurar_archivo(db)
+        
         # Índices para performance
         db.execute("CREATE INDEX IF NOT EXISTS idx_entidades_tipo ON entidades(tipo)")
         db.execute("CREATE INDEX IF NOT EXISTS idx_eventos_timestamp ON eventos(timestamp_servidor)")
         db.execute("CREATE INDEX IF NOT EXISTS idx_eventos_entidad ON eventos(entidad_id)")
         db.execute("CREATE INDEX IF NOT EXISTS idx_eventos_tipo ON eventos(tipo_evento)")
+        asegurar_indice_cadena(db)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_eventos_recibo ON eventos(recibo_recordia)")
         db.execute("CREATE INDEX IF NOT EXISTS idx_politicas_estado ON politicas(estado)")
         db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_rol ON usuarios(rol)")
         
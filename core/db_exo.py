@@ -6,18 +6,84 @@ Gestión de conexiones y queries con contexto jerárquico
 import sqlite3
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Iterable
+import io
 import os
+import re
+import threading
+import time
 from contextlib import contextmanager
+from itertools import islice
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
 from core.exo_hierarchy import ContextoUsuario, ControlAccesoExo
+from core.db import (
+    PoolConexiones, _verificar_conexion_pg,
+    DB_POOL_MAX, DB_POOL_PING_SEGUNDOS, DB_POOL_TIMEOUT
+)
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Columnas de ledger_exo que llena la aplicación (id y defaults los pone la BD)
+COLUMNAS_LEDGER = (
+    "ledger_id", "usuario_id", "msp_id", "condominio_id",
+    "accion", "entidad", "entidad_id", "detalle",
+    "ip_origen", "user_agent", "timestamp"
+)
+
+
+# Sentencias preparadas por conexión PostgreSQL antes de un DEALLOCATE ALL
+EXO_MAX_PREPARADAS = int(os.getenv('EXO_MAX_PREPARADAS', '200'))
+
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class _ConexionExo(psycopg2.extensions.connection):
+    """Conexión psycopg2 que recuerda sus sentencias preparadas en el servidor"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas: Dict[str, str] = {}
+
+
+def _a_parametros_pg(query: str) -> str:
+    """Placeholders de psycopg2 (%s) -> parámetros posicionales de PREPARE ($1, $2...)"""
+    posicion = 0
+    
+    def reemplazar(coincidencia):
+        nonlocal posicion
+        if coincidencia.group() == "%%":
+            return "%"
+        posicion += 1
+        return f"${posicion}"
+    
+    return re.sub(r"%%|%s", reemplazar, query)
+
+
+def _ejecutar_preparada(conn: _ConexionExo, cursor, query: str, params: Tuple):
+    """
+    Ejecuta query con PREPARE/EXECUTE, preparándola una vez por conexión
+    
+    Las conexiones del pool sobreviven entre llamadas, así que las
+    siguientes ejecuciones del mismo texto reutilizan el plan del servidor.
+    """
+    nombre = conn.preparadas.get(query)
+    if nombre is None:
+        if len(conn.preparadas) >= EXO_MAX_PREPARADAS:
+            cursor.execute("DEALLOCATE ALL")
+            conn.preparadas.clear()
+        nombre = f"exo_{len(conn.preparadas) + 1}"
+        cursor.execute(f"PREPARE {nombre} AS {_a_parametros_pg(query)}")
+        conn.preparadas[query] = nombre
+    
+    if params:
+        cursor.execute(f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {nombre}")
+
 
 class DatabaseExo:
     """Manager de base de datos con soporte multi-tenant AUP-EXO"""
@@ -35,6 +101,9 @@ class DatabaseExo:
         
         self.db_type = db_type
         self.db_path = "data/axs_exo.db" if db_type == "sqlite" else None
+        self.marcador = "?" if db_type == "sqlite" else "%s"
+        self._pool = None
+        self._pool_lock = threading.Lock()
         
         # PostgreSQL config - Primero intentar DATABASE_URL, luego variables separadas
         database_url = os.getenv("DATABASE_URL")
@@ -54,33 +123,78 @@ class DatabaseExo:
                 "password": os.getenv("PG_PASSWORD", ""),
             }
     
+    def _conectar_pg(self):
+        """Abre una conexión física a PostgreSQL (la usa el pool)"""
+        if self.database_url:
+            return psycopg2.connect(
+                self.database_url, connection_factory=_ConexionExo, cursor_factory=RealDictCursor
+            )
+        return psycopg2.connect(**self.pg_config, connection_factory=_ConexionExo, cursor_factory=RealDictCursor)
+    
+    def _obtener_pool(self) -> PoolConexiones:
+        """Pool de conexiones PostgreSQL, para que las sentencias preparadas se reutilicen"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = PoolConexiones(
+                        self._conectar_pg,
+                        max_conexiones=DB_POOL_MAX,
+                        verificar=_verificar_conexion_pg,
+                        ping_segundos=DB_POOL_PING_SEGUNDOS,
+                        timeout=DB_POOL_TIMEOUT
+                    )
+        return self._pool
+    
     @contextmanager
     def get_connection(self):
         """Context manager para obtener conexión a la base de datos"""
         if self.db_type == "sqlite":
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
-        else:
-            # PostgreSQL: usar URL o config dict
-            if self.database_url:
-                conn = psycopg2.connect(self.database_url, cursor_factory=RealDictCursor)
-            else:
-                conn = psycopg2.connect(**self.pg_config, cursor_factory=RealDictCursor)
-        
+            
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.close()
+            return
+        
+        # PostgreSQL: conexión prestada por el pool
+        pool = self._obtener_pool()
+        conn = pool.adquirir()
+        descartar = False
         try:
             yield conn
             conn.commit()
         except Exception as e:
-            conn.rollback()
+            try:
+                conn.rollback()
+                # PREPARE no es transaccional: tras un error se parte de cero
+                # para que el registro de preparadas no diverja del servidor
+                if conn.preparadas:
+                    conn.cursor().execute("DEALLOCATE ALL")
+                    conn.commit()
+                    conn.preparadas.clear()
+            except Exception:
+                descartar = True
             raise e
         finally:
-            conn.close()
+            pool.liberar(conn, descartar=descartar)
+    
+    def cerrar_conexiones(self):
+        """Cierra las conexiones ociosas del pool PostgreSQL"""
+        if self._pool is not None:
+            self._pool.cerrar_todo()
     
     def execute_query(
         self,
         query: str,
         params: Optional[Tuple] = None,
-        fetch: str = "all"
+        fetch: str = "all",
+        preparar: bool = False
     ) -> Optional[List[Dict[str, Any]]]:
         """
         Ejecuta una query SQL
@@ -89,6 +203,8 @@ class DatabaseExo:
             query: Query SQL a ejecutar
             params: Parámetros para la query
             fetch: "all", "one", o "none"
+            preparar: En PostgreSQL, ejecutar como sentencia preparada en el
+                servidor (para queries calientes con texto estable)
         
         Returns:
             Resultados de la query o None
@@ -97,7 +213,9 @@ class DatabaseExo:
             cursor = conn.cursor()
             
             # Ejecutar con o sin parámetros
-            if params:
+            if preparar and self.db_type != "sqlite":
+                _ejecutar_preparada(conn, cursor, query, tuple(params or ()))
+            elif params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
@@ -136,29 +254,37 @@ class DatabaseExo:
             usuario: Contexto del usuario
             tabla: Nombre de la tabla
             columnas: Columnas a seleccionar
-            condiciones_extra: Condiciones WHERE adicionales
+            condiciones_extra: Condiciones WHERE adicionales, con placeholders
+                (self.marcador) para sus valores
             params: Parámetros para las condiciones extra
             limit: Límite de resultados
         
         Returns:
             Lista de registros como diccionarios
         """
-        # Obtener filtro jerárquico
-        where_jerarquico = ControlAccesoExo.obtener_where_clause(usuario)
+        if not _IDENTIFICADOR.match(tabla):
+            raise ValueError(f"Nombre de tabla inválido: {tabla!r}")
+        
+        # Obtener filtro jerárquico (con parámetros, mismo texto para todos los tenants)
+        where_jerarquico, params_jerarquicos = ControlAccesoExo.obtener_filtro_parametrizado(
+            usuario, marcador=self.marcador
+        )
         
         # Combinar condiciones
         if condiciones_extra:
-            where_clause = f"{where_jerarquico} AND {condiciones_extra}"
+            where_clause = f"{where_jerarquico} AND ({condiciones_extra})"
         else:
             where_clause = where_jerarquico
+        params_query = params_jerarquicos + tuple(params or ())
         
         # Construir query
         query = f"SELECT {columnas} FROM {tabla} WHERE {where_clause}"
         
         if limit:
-            query += f" LIMIT {limit}"
+            query += f" LIMIT {self.marcador}"
+            params_query += (int(limit),)
         
-        return self.execute_query(query, params, fetch="all")
+        return self.execute_query(query, params_query, fetch="all", preparar=True)
     
     def insertar_con_contexto(
         self,
@@ -306,6 +432,107 @@ class DatabaseExo:
         )
         
         self.execute_query(query, params, fetch="none")
+    
+    def registrar_auditoria_lote(
+        self,
+        registros: Iterable[Dict[str, Any]],
+        usuario: Optional[ContextoUsuario] = None,
+        tamano_lote: int = 5000
+    ) -> Dict[str, Any]:
+        """
+        Ingesta masiva de registros en el ledger de auditoría
+        
+        En PostgreSQL usa COPY FROM STDIN por bloques de tamano_lote filas;
+        en SQLite, executemany. Todo va en una sola transacción: o entran
+        todos los registros o ninguno. Los registros se consumen en streaming,
+        así que el iterable puede ser un generador sobre un archivo.
+        
+        Args:
+            registros: Dicts con accion, entidad y opcionalmente ledger_id,
+                usuario_id, msp_id, condominio_id, entidad_id, detalle,
+                ip_origen, user_agent y timestamp
+            usuario: Contexto por defecto para usuario_id/msp_id/condominio_id
+            tamano_lote: Filas por bloque enviado
+        
+        Returns:
+            Dict con filas, segundos, filas_por_segundo y metodo
+        """
+        inicio = time.perf_counter()
+        filas = (self._fila_ledger(registro, usuario) for registro in registros)
+        total = 0
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if self.db_type == "sqlite":
+                metodo = "executemany"
+                query = f"""
+                INSERT INTO ledger_exo ({", ".join(COLUMNAS_LEDGER)})
+                VALUES ({", ".join(["?"] * len(COLUMNAS_LEDGER))})
+                """
+                while True:
+                    bloque = list(islice(filas, tamano_lote))
+                    if not bloque:
+                        break
+                    cursor.executemany(query, bloque)
+                    total += len(bloque)
+            else:
+                metodo = "copy"
+                query = f"""
+                COPY ledger_exo ({", ".join(COLUMNAS_LEDGER)})
+                FROM STDIN WITH (FORMAT csv, NULL '\\N')
+                """
+                while True:
+                    bloque = list(islice(filas, tamano_lote))
+                    if not bloque:
+                        break
+                    buffer = io.StringIO()
+                    for fila in bloque:
+                        buffer.write(",".join(_valor_csv(valor) for valor in fila))
+                        buffer.write("\n")
+                    buffer.seek(0)
+                    cursor.copy_expert(query, buffer)
+                    total += len(bloque)
+        
+        segundos = time.perf_counter() - inicio
+        return {
+            "filas": total,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(total / segundos, 1) if segundos > 0 else 0.0,
+            "metodo": metodo
+        }
+    
+    def _fila_ledger(
+        self,
+        registro: Dict[str, Any],
+        usuario: Optional[ContextoUsuario]
+    ) -> Tuple:
+        """Fila de ledger_exo (orden de COLUMNAS_LEDGER) con valores por defecto"""
+        if not registro.get("accion") or not registro.get("entidad"):
+            raise ValueError(f"Registro de ledger sin accion/entidad: {registro}")
+        
+        # generar_id usa 8 hex: en lotes de millones chocaría con el UNIQUE
+        ledger_id = registro.get("ledger_id") or f"LED-{datetime.now():%Y%m%d}-{uuid.uuid4().hex}"
+        
+        return (
+            ledger_id,
+            registro.get("usuario_id", usuario.usuario_id if usuario else None),
+            registro.get("msp_id", usuario.msp_id if usuario else None),
+            registro.get("condominio_id", usuario.condominio_id if usuario else None),
+            registro["accion"],
+            registro["entidad"],
+            registro.get("entidad_id"),
+            registro.get("detalle", ""),
+            registro.get("ip_origen", ""),
+            registro.get("user_agent", ""),
+            registro.get("timestamp") or datetime.now().isoformat()
+        )
+
+
+def _valor_csv(valor: Any) -> str:
+    """Campo para COPY en formato CSV: NULL sin comillas, lo demás entre comillas"""
+    if valor is None:
+        return "\\N"
+    return '"' + str(valor).replace('"', '""') + '"'
 
 
 # Instancia global
@@ -321,7 +548,7 @@ db_exo = DatabaseExo(db_type=os.getenv("DB_TYPE", "postgresql"))
 # ========================================
 
 try:
-    from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+    from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
     from sqlalchemy.sql import func
     from sqlalchemy.ext.declarative import declarative_base
     from sqlalchemy.dialects.postgresql import JSON
@@ -368,6 +595,11 @@ try:
         created_at = Column(DateTime(timezone=True), server_default=func.now())
         updated_at = Column(DateTime(timezone=True), onupdate=func.now())
         
+        # Paginación keyset de /msp/listar
+        __table_args__ = (
+            Index("idx_msps_exo_keyset", "created_at", "msp_id"),
+        )
+        
         def __repr__(self):
             return f"<MSPExo(msp_id={self.msp_id}, nombre={self.nombre}, plan={self.plan})>"
     
@@ -404,6 +636,12 @@ try:
         created_at = Column(DateTime(timezone=True), server_default=func.now())
         updated_at = Column(DateTime(timezone=True), onupdate=func.now())
         
+        # Paginación keyset de /condominio/listar, con y sin filtro por MSP
+        __table_args__ = (
+            Index("idx_condominios_exo_keyset", "created_at", "condominio_id"),
+            Index("idx_condominios_exo_msp_keyset", "msp_id", "created_at", "condominio_id"),
+        )
+        
         def __repr__(self):
             return f"<CondominioExo(condominio_id={self.condominio_id}, nombre={self.nombre}, msp={self.msp_id})>"
     
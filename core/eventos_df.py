@@ -0,0 +1,226 @@
+"""
+core/eventos_df.py
+Carga de eventos como DataFrame (respaldado por Arrow) para dashboard y analítica
+"""
+
+import threading
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+
+from core.db import get_db, PostgresConnectionWrapper
+
+# Columnas que puede pedir un llamador -> tipo Arrow (None = el de la base:
+# texto en SQLite, timestamptz en PostgreSQL)
+COLUMNAS_EVENTOS = {
+    "evento_id": pa.string(),
+    "entidad_id": pa.string(),
+    "condominio_id": pa.string(),
+    "tipo_evento": pa.string(),
+    "nombre": pa.string(),
+    "identificador": pa.string(),
+    "tipo_entidad": pa.string(),
+    "actor": pa.string(),
+    "dispositivo": pa.string(),
+    "hora": pa.string(),
+    "fecha": pa.string(),
+    "timestamp": None,
+    "motivo_rechazo": pa.string(),
+    "hash": pa.string(),
+}
+
+# Columnas del análisis (modulos/analitica.py y app/core/analytics.py): lo
+# que usan comparación, anomalías y etiquetado, más el id y el motivo
+COLUMNAS_ANALISIS = [
+    "evento_id", "entidad_id", "tipo_evento", "nombre", "hora", "fecha", "timestamp", "motivo_rechazo"
+]
+
+
+def _campo_sqlite(campo: str) -> str:
+    return f"CASE WHEN json_valid(e.metadata) THEN CAST(json_extract(e.metadata, '$.{campo}') AS TEXT) END"
+
+
+def _campo_pg(campo: str) -> str:
+    return f"campo_metadata(e.metadata, '{campo}')"
+
+
+def _expresiones(campo_metadata) -> dict:
+    """Expresión SQL de cada columna; los campos de metadata se extraen en la consulta"""
+    return {
+        "evento_id": "e.evento_id",
+        "entidad_id": "e.entidad_id",
+        "condominio_id": "e.condominio_id",
+        "tipo_evento": "e.tipo_evento",
+        "nombre": f"COALESCE({campo_metadata('nombre')}, 'N/A')",
+        "identificador": (
+            f"COALESCE({campo_metadata('identificador')}, {campo_metadata('placa')}, "
+            f"{campo_metadata('folio')}, 'N/A')"
+        ),
+        "tipo_entidad": "''",
+        "actor": "e.actor",
+        "dispositivo": "e.dispositivo",
+        "hora": f"COALESCE({campo_metadata('hora')}, '')",
+        "fecha": f"COALESCE({campo_metadata('fecha')}, '')",
+        "timestamp": "e.timestamp_servidor",
+        "motivo_rechazo": f"COALESCE({campo_metadata('motivo_rechazo')}, '')",
+        "hash": "e.hash_actual",
+    }
+
+
+_EXPRESIONES_SQLITE = _expresiones(_campo_sqlite)
+_EXPRESIONES_PG = _expresiones(_campo_pg)
+
+# En PostgreSQL metadata es TEXT: un JSON inválido no debe tumbar la consulta
+_SQL_CAMPO_METADATA_PG = """
+    CREATE OR REPLACE FUNCTION campo_metadata(metadata TEXT, campo TEXT)
+    RETURNS TEXT AS $$
+    BEGIN
+        RETURN metadata::jsonb->>campo;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+_funcion_pg_lista = False
+_lock_funcion = threading.Lock()
+
+
+def _asegurar_funcion_pg(db):
+    """Crea campo_metadata() una vez por proceso"""
+    global _funcion_pg_lista
+    if not _funcion_pg_lista:
+        with _lock_funcion:
+            if not _funcion_pg_lista:
+                db.execute(_SQL_CAMPO_METADATA_PG)
+                _funcion_pg_lista = True
+
+
+def expresiones_eventos(db) -> dict:
+    """Expresión SQL (sobre eventos e) de cada columna de COLUMNAS_EVENTOS para la conexión"""
+    if isinstance(db, PostgresConnectionWrapper):
+        _asegurar_funcion_pg(db)
+        return _EXPRESIONES_PG
+    return _EXPRESIONES_SQLITE
+
+
+def _columnas_de(filas, nombres):
+    """Filas (sqlite3.Row o dict de psycopg2) -> listas por columna"""
+    if not filas:
+        return [[] for _ in nombres]
+    if isinstance(filas[0], dict):
+        return [[fila[nombre] for fila in filas] for nombre in nombres]
+    return [list(columna) for columna in zip(*filas)]
+
+
+def cargar_eventos_df(
+    columnas: Optional[Sequence[str]] = None,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    condominio_id: Optional[str] = None,
+    tipos_evento: Optional[Iterable[str]] = None,
+    limite: Optional[int] = None,
+    convertir_fechas: bool = True,
+    incluir_archivo: bool = True
+) -> pd.DataFrame:
+    """
+    Eventos como DataFrame con columnas respaldadas por Arrow.
+
+    El rango de fechas (sobre timestamp_servidor, indexado), el condominio y
+    los tipos de evento se filtran en SQL; solo se seleccionan las columnas
+    pedidas y hora/fecha/motivo_rechazo se extraen del JSON de metadata en
+    la misma consulta, sin json.loads por fila.
+
+    Los meses ya movidos al archivo Parquet (core/archivo.py) se leen de
+    ahí con los mismos filtros y se unen a los de la tabla viva.
+
+    Args:
+        columnas: Subconjunto de COLUMNAS_EVENTOS (None = todas)
+        desde: Fecha/hora ISO inicial incluida
+        hasta: Fecha/hora ISO final excluida
+        condominio_id: Filtrar por condominio
+        tipos_evento: Filtrar por tipo de evento
+        limite: Máximo de eventos (los más recientes)
+        convertir_fechas: Si True, timestamp y fecha pasan a timestamp y se
+            agrega hora_int (como espera modulos/analitica.py)
+        incluir_archivo: Si False, solo la tabla viva
+
+    Returns:
+        DataFrame ordenado del evento más reciente al más antiguo
+    """
+    columnas = list(columnas or COLUMNAS_EVENTOS)
+    desconocidas = [c for c in columnas if c not in COLUMNAS_EVENTOS]
+    if desconocidas:
+        raise ValueError(f"Columnas de eventos desconocidas: {desconocidas}")
+
+    filtros, params = [], []
+    if desde:
+        filtros.append("e.timestamp_servidor >= ?")
+        params.append(desde)
+    if hasta:
+        filtros.append("e.timestamp_servidor < ?")
+        params.append(hasta)
+    if condominio_id:
+        filtros.append("e.condominio_id = ?")
+        params.append(condominio_id)
+    if tipos_evento:
+        tipos_evento = list(tipos_evento)
+        filtros.append(f"e.tipo_evento IN ({', '.join('?' for _ in tipos_evento)})")
+        params.extend(tipos_evento)
+
+    with get_db() as db:
+        expresiones = expresiones_eventos(db)
+        seleccion = ", ".join(f"{expresiones[c]} AS {c}" for c in columnas)
+        sql = f"SELECT {seleccion} FROM eventos e"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY e.timestamp_servidor DESC"
+        if limite:
+            sql += " LIMIT ?"
+            params.append(limite)
+
+        filas = db.execute(sql, params).fetchall()
+
+    valores = _columnas_de(filas, columnas)
+    tabla = pa.table({
+        nombre: pa.array(columna, type=COLUMNAS_EVENTOS[nombre])
+        for nombre, columna in zip(columnas, valores)
+    })
+    # Con el límite cubierto por la tabla viva no hace falta el archivo:
+    # los meses archivados son anteriores a lo vivo salvo eventos tardíos
+    if incluir_archivo and not (limite and tabla.num_rows >= limite):
+        from core.archivo import eventos_archivados
+
+        archivados = eventos_archivados(columnas, desde, hasta, condominio_id, tipos_evento)
+        if archivados is not None and archivados.num_rows:
+            tabla = _unir_con_archivo(tabla, archivados, limite)
+
+    df = tabla.to_pandas(types_mapper=pd.ArrowDtype)
+
+    if convertir_fechas:
+        for nombre in ("timestamp", "fecha"):
+            if nombre in df and pa.types.is_string(df[nombre].dtype.pyarrow_dtype):
+                df[nombre] = _a_timestamp(df[nombre])
+        if "hora" in df:
+            df["hora_int"] = pd.to_numeric(df["hora"].str.slice(0, 2), errors="coerce")
+
+    return df
+
+
+def _unir_con_archivo(vivos: pa.Table, archivados: pa.Table, limite: Optional[int]) -> pa.Table:
+    """Eventos vivos + archivados, del más reciente al más antiguo si se pidió timestamp"""
+    if not vivos.num_rows:
+        tabla = archivados
+    else:
+        tabla = pa.concat_tables([vivos, archivados.cast(vivos.schema)])
+        if "timestamp" in tabla.column_names:
+            tabla = tabla.sort_by([("timestamp", "descending")])
+    return tabla.slice(0, limite) if limite else tabla
+
+
+def _a_timestamp(serie: pd.Series) -> pd.Series:
+    """Texto ISO -> timestamp Arrow (valores inválidos quedan nulos)"""
+    convertida = pd.to_datetime(serie, errors="coerce", format="ISO8601")
+    zona = getattr(convertida.dt, "tz", None)
+    return convertida.astype(pd.ArrowDtype(pa.timestamp("us", tz=str(zona) if zona else None)))
@@ -10,7 +10,7 @@ Niveles:
 """
 
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from dataclasses import dataclass
 
 
@@ -198,30 +198,62 @@ class ControlAccesoExo:
         return filtros
     
     @staticmethod
-    def obtener_where_clause(usuario: ContextoUsuario, alias_tabla: str = "") -> str:
+    def obtener_filtro_parametrizado(
+        usuario: ContextoUsuario,
+        alias_tabla: str = "",
+        marcador: str = "?"
+    ) -> Tuple[str, Tuple[Any, ...]]:
         """
-        Genera cláusula WHERE SQL según el contexto del usuario
+        Genera la cláusula WHERE jerárquica con parámetros ligados
+        
+        El texto depende solo del nivel del usuario, no de sus IDs: todos
+        los tenants del mismo nivel comparten la misma sentencia SQL (y su
+        plan preparado en PostgreSQL).
         
         Args:
             usuario: Contexto del usuario
             alias_tabla: Alias de la tabla (ej: "a" para "a.msp_id")
+            marcador: Placeholder del driver ("?" en sqlite3, "%s" en psycopg2)
         
         Returns:
-            Cláusula WHERE sin el "WHERE" inicial
+            (cláusula WHERE sin el "WHERE" inicial, parámetros en orden)
         """
         if usuario.es_super_admin:
-            return "1=1"  # Sin restricciones
+            return "1=1", ()
         
         prefix = f"{alias_tabla}." if alias_tabla else ""
         conditions = []
+        params = []
         
         if usuario.msp_id:
-            conditions.append(f"{prefix}msp_id = '{usuario.msp_id}'")
+            conditions.append(f"{prefix}msp_id = {marcador}")
+            params.append(usuario.msp_id)
         
         if usuario.condominio_id:
-            conditions.append(f"{prefix}condominio_id = '{usuario.condominio_id}'")
+            conditions.append(f"{prefix}condominio_id = {marcador}")
+            params.append(usuario.condominio_id)
         
-        return " AND ".join(conditions) if conditions else "1=1"
+        return (" AND ".join(conditions) if conditions else "1=1"), tuple(params)
+    
+    @staticmethod
+    def obtener_where_clause(usuario: ContextoUsuario, alias_tabla: str = "") -> str:
+        """
+        Genera cláusula WHERE SQL según el contexto del usuario
+        
+        Con los valores en el texto, para mostrar o depurar; para ejecutar
+        usar obtener_filtro_parametrizado.
+        
+        Args:
+            usuario: Contexto del usuario
+            alias_tabla: Alias de la tabla (ej: "a" para "a.msp_id")
+        
+        Returns:
+            Cláusula WHERE sin el "WHERE" inicial
+        """
+        clausula, params = ControlAccesoExo.obtener_filtro_parametrizado(usuario, alias_tabla)
+        partes = clausula.split("?")
+        literales = ["'" + str(valor).replace("'", "''") + "'" for valor in params]
+        return "".join(parte + literal for parte, literal in zip(partes, literales + [""]))
 
 
 class PermisoExo(Enum):
@@ -5,18 +5,117 @@ Sistema de hashing estructural para trazabilidad AUP-EXO
 
 import hashlib
 import json
+import os
+import re
 from datetime import datetime
 from typing import Dict, Any
 
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# ---------------------------------------------------------
+# Codificación canónica
+# ---------------------------------------------------------
+# Forma canónica de todos los hashes: json.dumps(sort_keys=True,
+# ensure_ascii=False) con los separadores por defecto, en UTF-8. Un byte
+# distinto cambia el hash de toda la cadena, así que cualquier backend
+# debe producir exactamente el mismo texto.
+_codificador_json = json.JSONEncoder(sort_keys=True, ensure_ascii=False)
+
+# ujson escribe 1e-7 donde json escribe 1e-07 (único caso conocido en que difieren)
+_EXPONENTE_CORTO = re.compile(r"\de-\d(?!\d)")
+
+# Casos borde que un backend debe reproducir byte a byte para usarse
+_MUESTRAS_CANONICAS = [
+    {"b": 1, "a": [1, 2.5, None, True, False], "c": {"z": "ñ/\"\\\n\t\u0001", "y": "😀"}},
+    {"flotantes": [0.1, 1e16, 1e-10, 123456789.12345679, -0.0, 5e-324], "entero": 2 ** 70},
+    {2: "dos", 1: "uno"},
+    [],
+    "",
+]
+
+
+def _canonico_json(data) -> str:
+    return _codificador_json.encode(data)
+
+
+def _canonico_ujson(data) -> str:
+    try:
+        texto = ujson.dumps(
+            data,
+            sort_keys=True,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            separators=(", ", ": "),
+            allow_nan=False,
+            reject_bytes=True
+        )
+    except (TypeError, ValueError, OverflowError):
+        # NaN/Infinity, tipos no soportados: json decide (o lanza el error de siempre)
+        return _canonico_json(data)
+    if _EXPONENTE_CORTO.search(texto):
+        return _canonico_json(data)
+    return texto
+
+
+_BACKENDS_CANONICOS = {"json": _canonico_json}
+if ujson is not None:
+    _BACKENDS_CANONICOS["ujson"] = _canonico_ujson
+
+
+def _backend_compatible(codificar) -> bool:
+    try:
+        return all(codificar(m) == _canonico_json(m) for m in _MUESTRAS_CANONICAS)
+    except Exception:
+        return False
+
+
+def usar_backend_canonico(nombre: str = "auto") -> str:
+    """
+    Elige el codificador de la forma canónica ("auto", "json" o "ujson").
+
+    "auto" usa ujson si está instalado y reproduce byte a byte las muestras
+    canónicas; si no, json de la biblioteca estándar.
+
+    Returns:
+        Nombre del backend activo
+    """
+    global _canonico, _backend_canonico
+
+    if nombre == "auto":
+        nombre = "ujson" if "ujson" in _BACKENDS_CANONICOS else "json"
+        if not _backend_compatible(_BACKENDS_CANONICOS[nombre]):
+            nombre = "json"
+    elif nombre not in _BACKENDS_CANONICOS:
+        raise ValueError(f"Backend JSON no disponible: {nombre}")
+
+    _canonico = _BACKENDS_CANONICOS[nombre]
+    _backend_canonico = nombre
+    return nombre
+
+
+def backend_canonico() -> str:
+    """Nombre del backend con el que se está codificando"""
+    return _backend_canonico
+
+
+def codificar_canonico(data) -> bytes:
+    """Bytes exactos (JSON canónico en UTF-8) sobre los que se calcula el hash"""
+    return _canonico(data).encode("utf-8")
+
+
+usar_backend_canonico(os.getenv("HASH_JSON_BACKEND", "auto"))
+
 
 def hash_evento(data: dict) -> str:
     """
     Genera hash SHA-256 de un evento
     Garantiza trazabilidad e inmutabilidad
     """
-    # Ordenar keys para consistencia
-    cadena = json.dumps(data, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(cadena.encode("utf-8")).hexdigest()
+    return hashlib.sha256(codificar_canonico(data)).hexdigest()
 
 
 def hash_entidad(entidad_data: dict) -> str:
@@ -30,8 +129,7 @@ def hash_entidad(entidad_data: dict) -> str:
         if k not in ['fecha_actualizacion', 'updated_by', 'hash_prev', 'hash_actual']
     }
     
-    cadena = json.dumps(data_limpia, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(cadena.encode("utf-8")).hexdigest()
+    return hashlib.sha256(codificar_canonico(data_limpia)).hexdigest()
 
 
 def verificar_hash(data: dict, hash_esperado: str) -> bool:
@@ -68,6 +166,47 @@ def generar_hash_cadena(
     return hash_actual, data_completa
 
 
+def _texto_timestamp(valor) -> str:
+    """
+    Timestamp tal como se encadenó (isoformat local). PostgreSQL regresa
+    TIMESTAMPTZ como datetime con zona: se quita para recuperar el texto.
+    """
+    if isinstance(valor, datetime):
+        return valor.replace(tzinfo=None).isoformat()
+    return valor
+
+
+def datos_evento_desde_fila(fila) -> tuple[dict, str]:
+    """
+    Reconstruye desde una fila de eventos el evento_data y el timestamp que
+    OrquestadorAccesos.registrar_acceso pasó a generar_hash_cadena.
+
+    Returns:
+        (evento_data, timestamp_servidor)
+    """
+    metadata = fila["metadata"]
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata) if metadata else {}
+
+    timestamp_servidor = _texto_timestamp(fila["timestamp_servidor"])
+    evento_data = {
+        "entidad_id": fila["entidad_id"],
+        "tipo_evento": fila["tipo_evento"],
+        "metadata": metadata,
+        "timestamp_servidor": timestamp_servidor,
+        "actor": fila["actor"],
+        "dispositivo": fila["dispositivo"]
+    }
+    return evento_data, timestamp_servidor
+
+
+def recalcular_hash_fila(fila, hash_prev: str | None) -> str:
+    """Recalcula el hash encadenado de una fila de eventos"""
+    evento_data, timestamp_servidor = datos_evento_desde_fila(fila)
+    hash_actual, _ = generar_hash_cadena(hash_prev, evento_data, timestamp_servidor)
+    return hash_actual
+
+
 def hash_evidencia(archivo_bytes: bytes, metadata: dict = None) -> str:
     """
     Genera hash de archivo de evidencia (foto, documento)
@@ -125,45 +264,43 @@ def validar_cadena_hash(eventos: list[dict]) -> tuple[bool, str]:
     return True, "Cadena válida"
 
 
-def verificar_cadena_integridad() -> dict:
+def verificar_cadena_integridad(
+    condominio_id=None,
+    todas: bool | None = None,
+    reanudar: bool = True,
+    trabajadores: int | None = None,
+    **opciones
+) -> dict:
     """
-    Verifica la integridad de toda la cadena de eventos en la base de datos
-    
+    Verifica la integridad de las cadenas de eventos en la base de datos.
+
+    Recorre cada cadena en orden de secuencia con un cursor en streaming,
+    recalcula generar_hash_cadena por fila y comprueba el enlace con el
+    evento anterior. Con reanudar=True parte del último punto de control
+    (solo verifica eventos nuevos); reanudar=False hace la auditoría completa.
+
+    Args:
+        condominio_id: Cadena a verificar si todas=False (None = global)
+        todas: Verificar todas las cadenas (una por condominio). Por omisión
+            solo si no se indicó condominio_id
+        reanudar: Continuar desde el punto de control guardado
+        trabajadores: Procesos para recalcular hashes en paralelo por segmentos
+            (None = VERIFICACION_TRABAJADORES del entorno, 1 = sin pool)
+        **opciones: tamano_lote, guardar_cada (ver core.verificacion)
+
     Returns:
-        dict con 'integra', 'total_eventos', 'primer_corrupto', 'detalles'
+        dict con 'integra', 'total_eventos', 'primer_corrupto', 'detalles',
+        'segundos' y 'eventos_por_segundo'
     """
-    from core.db import get_db
-    
-    with get_db() as conn:
-        cursor = conn.execute("SELECT * FROM eventos ORDER BY id ASC")
-        columns = [desc[0] for desc in cursor.description]
-        eventos = [dict(zip(columns, row)) for row in cursor.fetchall()]
-    
-    if not eventos:
-        return {
-            'integra': True,
-            'total_eventos': 0,
-            'detalles': 'No hay eventos que verificar'
-        }
-    
-    for i in range(1, len(eventos)):
-        evento_actual = eventos[i]
-        evento_prev = eventos[i-1]
-        
-        # Verificar encadenamiento
-        if evento_actual.get('hash_previo') != evento_prev.get('hash'):
-            return {
-                'integra': False,
-                'total_eventos': len(eventos),
-                'primer_corrupto': evento_actual['id'],
-                'detalles': f"Ruptura en cadena: evento {evento_actual['id']} no está encadenado correctamente"
-            }
-    
-    return {
-        'integra': True,
-        'total_eventos': len(eventos),
-        'detalles': f'Cadena verificada correctamente ({len(eventos)} eventos)'
-    }
+    from core.verificacion import verificar_cadena, verificar_cadenas
+
+    if trabajadores is not None:
+        opciones["trabajadores"] = trabajadores
+    if todas is None:
+        todas = condominio_id is None
+    if todas:
+        return verificar_cadenas(reanudar=reanudar, **opciones)
+    return verificar_cadena(condominio_id, reanudar=reanudar, **opciones)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,303 @@
+"""
+core/merkle.py
+Checkpoints Merkle sobre bloques de la cadena de eventos y pruebas de inclusión
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.db import get_db
+from core.cadena import CADENA_GLOBAL, filtro_condominio
+
+# Eventos por bloque sellado (0 = no sellar automáticamente al anexar)
+MERKLE_BLOQUE = int(os.getenv('MERKLE_BLOQUE', '1024'))
+
+# Prefijos de dominio (RFC 6962): una hoja nunca se confunde con un nodo interno
+_PREFIJO_HOJA = b"\x00"
+_PREFIJO_NODO = b"\x01"
+
+
+# ---------------------------------------------------------
+# Árbol
+# ---------------------------------------------------------
+def hash_hoja(hash_evento: str) -> str:
+    """Hoja del árbol para el hash_actual de un evento"""
+    return hashlib.sha256(_PREFIJO_HOJA + bytes.fromhex(hash_evento)).hexdigest()
+
+
+def _hash_nodo(izquierdo: str, derecho: str) -> str:
+    return hashlib.sha256(
+        _PREFIJO_NODO + bytes.fromhex(izquierdo) + bytes.fromhex(derecho)
+    ).hexdigest()
+
+
+def _subir_nivel(nivel: List[str]) -> List[str]:
+    # Un nodo sin pareja sube tal cual (no se duplica: evita raíces iguales
+    # para listas de hojas distintas)
+    siguiente = [_hash_nodo(nivel[i], nivel[i + 1]) for i in range(0, len(nivel) - 1, 2)]
+    if len(nivel) % 2:
+        siguiente.append(nivel[-1])
+    return siguiente
+
+
+def raiz_merkle(hashes_eventos: List[str]) -> str:
+    """Raíz Merkle de una lista ordenada de hashes de eventos"""
+    if not hashes_eventos:
+        raise ValueError("No se puede calcular la raíz de un bloque vacío")
+    nivel = [hash_hoja(h) for h in hashes_eventos]
+    while len(nivel) > 1:
+        nivel = _subir_nivel(nivel)
+    return nivel[0]
+
+
+def ruta_inclusion(hashes_eventos: List[str], indice: int) -> List[Dict]:
+    """
+    Hermanos desde la hoja `indice` hasta la raíz.
+
+    Returns:
+        [{"lado": "izquierda" | "derecha", "hash": ...}, ...]
+    """
+    nivel = [hash_hoja(h) for h in hashes_eventos]
+    ruta = []
+    while len(nivel) > 1:
+        if indice % 2:
+            ruta.append({"lado": "izquierda", "hash": nivel[indice - 1]})
+        elif indice + 1 < len(nivel):
+            ruta.append({"lado": "derecha", "hash": nivel[indice + 1]})
+        nivel = _subir_nivel(nivel)
+        indice //= 2
+    return ruta
+
+
+def verificar_ruta(hash_evento: str, ruta: List[Dict], raiz: str) -> bool:
+    """Comprueba una prueba de inclusión sin acceso a la base de datos"""
+    actual = hash_hoja(hash_evento)
+    for paso in ruta:
+        if paso["lado"] == "izquierda":
+            actual = _hash_nodo(paso["hash"], actual)
+        else:
+            actual = _hash_nodo(actual, paso["hash"])
+    return actual == raiz
+
+
+# ---------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------
+def _asegurar_tabla(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS merkle_checkpoints (
+            cadena TEXT NOT NULL,
+            secuencia_inicio INTEGER NOT NULL,
+            secuencia_fin INTEGER NOT NULL,
+            raiz TEXT NOT NULL,
+            hojas INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            PRIMARY KEY (cadena, secuencia_inicio)
+        )
+    """)
+
+
+def _hashes_archivados(condominio_id, inicio, fin) -> Dict[int, str]:
+    """{secuencia: hash_actual} de los eventos de [inicio, fin] movidos al archivo Parquet"""
+    import pyarrow.dataset as ds
+    from core.archivo import leer_archivo
+
+    tabla = leer_archivo(
+        "eventos", ["secuencia", "hash_actual"],
+        condominio_id=condominio_id or CADENA_GLOBAL,
+        filtro=(ds.field("secuencia") >= inicio) & (ds.field("secuencia") <= fin)
+    )
+    if tabla is None:
+        return {}
+    return dict(zip(tabla.column("secuencia").to_pylist(), tabla.column("hash_actual").to_pylist()))
+
+
+def _hashes_rango(db, condominio_id, inicio, fin) -> List[str]:
+    """hash_actual de los eventos con secuencia en [inicio, fin], o [] si hay huecos"""
+    filtro, params = filtro_condominio(condominio_id)
+    filas = db.execute(f"""
+        SELECT secuencia, hash_actual FROM eventos
+        WHERE {filtro} AND secuencia BETWEEN ? AND ?
+        ORDER BY secuencia
+    """, (*params, inicio, fin)).fetchall()
+    hashes = {f["secuencia"]: f["hash_actual"] for f in filas}
+    if len(hashes) < fin - inicio + 1:
+        # Un bloque sellado puede estar (en parte) en el archivo Parquet
+        hashes = {**_hashes_archivados(condominio_id, inicio, fin), **hashes}
+    if sorted(hashes) != list(range(inicio, fin + 1)):
+        return []
+    return [hashes[secuencia] for secuencia in range(inicio, fin + 1)]
+
+
+def _evento_archivado(evento_id: str) -> Optional[Dict]:
+    """Columnas de la prueba de inclusión de un evento movido al archivo Parquet"""
+    import pyarrow.dataset as ds
+    from core.archivo import leer_archivo
+
+    tabla = leer_archivo(
+        "eventos", ["evento_id", "condominio_id", "secuencia", "hash_actual"],
+        filtro=ds.field("evento_id") == evento_id
+    )
+    if tabla is None or not tabla.num_rows:
+        return None
+    return tabla.slice(0, 1).to_pylist()[0]
+
+
+def sellar_bloques(condominio_id: Optional[str] = None, tamano_bloque: int = MERKLE_BLOQUE) -> List[Dict]:
+    """
+    Sella los bloques completos de una cadena que aún no tienen checkpoint.
+
+    Cada bloque cubre `tamano_bloque` secuencias consecutivas a partir del
+    último bloque sellado. Si falta un evento en el rango (cadena dañada) se
+    deja de sellar: un checkpoint nunca cubre una cadena con huecos.
+
+    Returns:
+        Lista de checkpoints creados
+    """
+    if tamano_bloque <= 0:
+        raise ValueError("tamano_bloque debe ser mayor que cero")
+
+    clave = condominio_id or CADENA_GLOBAL
+    filtro, params = filtro_condominio(condominio_id)
+    nuevos = []
+
+    with get_db() as db:
+        _asegurar_tabla(db)
+        ultimo = db.execute("""
+            SELECT MAX(secuencia_fin) AS fin FROM merkle_checkpoints WHERE cadena = ?
+        """, (clave,)).fetchone()["fin"] or 0
+        cabeza = db.execute(f"""
+            SELECT MAX(secuencia) AS secuencia FROM eventos WHERE {filtro}
+        """, params).fetchone()["secuencia"] or 0
+
+        inicio = ultimo + 1
+        while inicio + tamano_bloque - 1 <= cabeza:
+            fin = inicio + tamano_bloque - 1
+            hashes = _hashes_rango(db, condominio_id, inicio, fin)
+            if not hashes:
+                break
+
+            checkpoint = {
+                "cadena": clave,
+                "secuencia_inicio": inicio,
+                "secuencia_fin": fin,
+                "raiz": raiz_merkle(hashes),
+                "hojas": len(hashes),
+                "timestamp": datetime.now().isoformat()
+            }
+            db.execute("""
+                INSERT INTO merkle_checkpoints
+                    (cadena, secuencia_inicio, secuencia_fin, raiz, hojas, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cadena, secuencia_inicio) DO NOTHING
+            """, tuple(checkpoint.values()))
+            nuevos.append(checkpoint)
+            inicio = fin + 1
+
+    return nuevos
+
+
+def sellar_todas(tamano_bloque: int = MERKLE_BLOQUE) -> Dict[str, List[Dict]]:
+    """Sella los bloques pendientes de todas las cadenas"""
+    with get_db() as db:
+        condominios = [
+            fila["condominio_id"] for fila in db.execute("""
+                SELECT DISTINCT condominio_id FROM eventos WHERE secuencia IS NOT NULL
+            """).fetchall()
+        ]
+    return {
+        (condominio_id or CADENA_GLOBAL): sellar_bloques(condominio_id, tamano_bloque)
+        for condominio_id in condominios
+    }
+
+
+def ultima_secuencia_sellada(condominio_id: Optional[str] = None) -> int:
+    """Secuencia final del último bloque sellado de una cadena (0 si no hay)"""
+    with get_db() as db:
+        _asegurar_tabla(db)
+        fila = db.execute("""
+            SELECT MAX(secuencia_fin) AS fin FROM merkle_checkpoints WHERE cadena = ?
+        """, (condominio_id or CADENA_GLOBAL,)).fetchone()
+    return fila["fin"] or 0
+
+
+def listar_checkpoints(condominio_id: Optional[str] = None) -> List[Dict]:
+    """Checkpoints de una cadena en orden de secuencia"""
+    with get_db() as db:
+        _asegurar_tabla(db)
+        filas = db.execute("""
+            SELECT * FROM merkle_checkpoints WHERE cadena = ?
+            ORDER BY secuencia_inicio
+        """, (condominio_id or CADENA_GLOBAL,)).fetchall()
+    return [dict(fila) for fila in filas]
+
+
+# ---------------------------------------------------------
+# Pruebas de inclusión
+# ---------------------------------------------------------
+def obtener_prueba_inclusion(evento_id: str) -> Optional[Dict]:
+    """
+    Prueba de que un evento está incluido en un bloque sellado.
+
+    Solo lee los hashes del bloque del evento (no recorre la cadena); la
+    ruta tiene log2(tamaño del bloque) pasos y se puede comprobar fuera del
+    sistema con verificar_ruta(hash_evento, ruta, raiz).
+
+    Returns:
+        Dict con evento_id, cadena, secuencia, hash_evento, indice, ruta,
+        raiz, secuencia_inicio, secuencia_fin y valida; None si el evento no
+        existe o su bloque aún no se sella. Los eventos archivados se
+        buscan en el archivo Parquet.
+    """
+    with get_db() as db:
+        _asegurar_tabla(db)
+        evento = db.execute("""
+            SELECT evento_id, condominio_id, secuencia, hash_actual
+            FROM eventos WHERE evento_id = ?
+        """, (evento_id,)).fetchone()
+        if not evento:
+            evento = _evento_archivado(evento_id)
+        if not evento or evento["secuencia"] is None:
+            return None
+
+        clave = evento["condominio_id"] or CADENA_GLOBAL
+        checkpoint = db.execute("""
+            SELECT * FROM merkle_checkpoints
+            WHERE cadena = ? AND secuencia_inicio <= ? AND secuencia_fin >= ?
+        """, (clave, evento["secuencia"], evento["secuencia"])).fetchone()
+        if not checkpoint:
+            return None
+
+        hashes = _hashes_rango(
+            db, evento["condominio_id"],
+            checkpoint["secuencia_inicio"], checkpoint["secuencia_fin"]
+        )
+
+    indice = evento["secuencia"] - checkpoint["secuencia_inicio"]
+    ruta = ruta_inclusion(hashes, indice) if hashes else []
+
+    return {
+        "evento_id": evento["evento_id"],
+        "cadena": clave,
+        "secuencia": evento["secuencia"],
+        "hash_evento": evento["hash_actual"],
+        "indice": indice,
+        "ruta": ruta,
+        "raiz": checkpoint["raiz"],
+        "secuencia_inicio": checkpoint["secuencia_inicio"],
+        "secuencia_fin": checkpoint["secuencia_fin"],
+        "sellado": checkpoint["timestamp"],
+        # Falla si el bloque se alteró después de sellarse
+        "valida": bool(hashes) and verificar_ruta(evento["hash_actual"], ruta, checkpoint["raiz"])
+    }
+
+
+def prueba_inclusion_por_recibo(recibo_recordia: str) -> Optional[Dict]:
+    """Prueba de inclusión del evento asociado a un recibo de Recordia"""
+    with get_db() as db:
+        fila = db.execute(
+            "SELECT evento_id FROM eventos WHERE recibo_recordia = ?", (recibo_recordia,)
+        ).fetchone()
+    return obtener_prueba_inclusion(fila["evento_id"]) if fila else None
@@ -5,8 +5,44 @@ Evalúa si una entidad puede acceder según las políticas configuradas.
 """
 
 import json
-from datetime import datetime, time
-from core.db import get_db
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from core.db import get_db, asegurar_visitas_diarias
+
+# Parámetros por consulta IN (...) en las lecturas por lote (límite de SQLite: 999)
+LOTE_IN = 500
+
+# Segundos que vive un plan compilado aunque nadie incremente la versión
+# (cambios hechos por otro proceso o por SQL directo). 0 = sin expiración.
+POLITICAS_PLAN_TTL = float(os.getenv('POLITICAS_PLAN_TTL', '30'))
+
+
+@lru_cache(maxsize=4096)
+def _parsear_minuto(hora_str):
+    try:
+        t = datetime.strptime(hora_str, "%H:%M")
+    except Exception:
+        return None
+    return t.hour * 60 + t.minute
+
+
+def _minuto_del_dia(hora_str):
+    """'HH:MM' -> minutos desde medianoche, o None si el formato no es válido"""
+    if not isinstance(hora_str, str):
+        return None
+    return _parsear_minuto(hora_str)
+
+
+def _rango_contiene(minuto, desde, hasta):
+    """Rango [desde, hasta] en minutos del día; puede cruzar medianoche"""
+    if desde <= hasta:
+        return desde <= minuto <= hasta
+    return minuto >= desde or minuto <= hasta
 
 
 def _hora_en_rango(hora_str, desde_str, hasta_str):
@@ -14,36 +50,64 @@ def _hora_en_rango(hora_str, desde_str, hasta_str):
     Verifica si una hora está dentro de un rango [desde, hasta].
     Formato esperado: 'HH:MM'
     """
-    try:
-        h = datetime.strptime(hora_str, "%H:%M").time()
-        desde = datetime.strptime(desde_str, "%H:%M").time()
-        hasta = datetime.strptime(hasta_str, "%H:%M").time()
-    except Exception:
-        # Si hay error de formato, no bloqueamos por horario
+    h = _minuto_del_dia(hora_str)
+    desde = _minuto_del_dia(desde_str)
+    hasta = _minuto_del_dia(hasta_str)
+
+    # Si hay error de formato, no bloqueamos por horario
+    if h is None or desde is None or hasta is None:
         return True
 
-    # Caso simple sin pasar por medianoche
-    if desde <= hasta:
-        return desde <= h <= hasta
-    # Caso donde el rango cruza medianoche
-    return h >= desde or h <= hasta
+    return _rango_contiene(h, desde, hasta)
+
+
+_conteo_visitas_listo = None
+_lock_conteo = threading.Lock()
+
+
+def _conteo_visitas_disponible(db) -> bool:
+    """True si existe el contador visitas_diarias (se asegura una vez por proceso)"""
+    global _conteo_visitas_listo
+    if _conteo_visitas_listo is None:
+        with _lock_conteo:
+            if _conteo_visitas_listo is None:
+                try:
+                    asegurar_visitas_diarias(db)
+                    _conteo_visitas_listo = True
+                except Exception as e:
+                    print(f"⚠️ Contador visitas_diarias no disponible, se cuenta sobre eventos: {e}")
+                    _conteo_visitas_listo = False
+    return _conteo_visitas_listo
 
 
 def _contar_visitas_hoy(entidad_id, fecha_str):
     """
     Cuenta cuántas veces ha tenido eventos de 'entrada' la entidad
     en la fecha indicada (YYYY-MM-DD).
+
+    Lee una sola fila de visitas_diarias (mantenida por trigger en cada
+    INSERT/DELETE de eventos) en lugar de recorrer eventos con DATE().
     """
+    fecha = _clave_fecha(fecha_str)
+    if fecha is None:
+        return 0
+
     with get_db() as db:
-        rows = db.execute("""
-            SELECT COUNT(*) as total
-            FROM eventos
-            WHERE entidad_id = ?
-              AND tipo_evento = 'entrada'
-              AND DATE(timestamp_servidor) = DATE(?)
-        """, (entidad_id, fecha_str)).fetchone()
+        if _conteo_visitas_disponible(db):
+            row = db.execute("""
+                SELECT total FROM visitas_diarias
+                WHERE entidad_id = ? AND fecha = ? AND tipo_evento = 'entrada'
+            """, (entidad_id, fecha)).fetchone()
+        else:
+            row = db.execute("""
+                SELECT COUNT(*) as total
+                FROM eventos
+                WHERE entidad_id = ?
+                  AND tipo_evento = 'entrada'
+                  AND DATE(timestamp_servidor) = DATE(?)
+            """, (entidad_id, fecha)).fetchone()
 
-    return rows["total"] if rows else 0
+    return row["total"] if row else 0
 
 
 def _obtener_entidad(entidad_id):
@@ -54,6 +118,83 @@ def _obtener_entidad(entidad_id):
     return dict(row) if row else None
 
 
+def _en_lotes(valores, tamano=LOTE_IN):
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def _obtener_entidades(entidad_ids: Iterable[str]) -> Dict[str, Dict]:
+    """{entidad_id: fila} con una consulta por cada LOTE_IN ids"""
+    entidades = {}
+    with get_db() as db:
+        for lote in _en_lotes(set(entidad_ids)):
+            marcas = ", ".join("?" for _ in lote)
+            rows = db.execute(
+                f"SELECT * FROM entidades WHERE entidad_id IN ({marcas})", lote
+            ).fetchall()
+            for row in rows:
+                entidades[row["entidad_id"]] = dict(row)
+    return entidades
+
+
+def _clave_fecha(fecha_str) -> Optional[str]:
+    """'YYYY-MM-DD' de una fecha o datetime ISO; None si no es válida"""
+    try:
+        return datetime.strptime(str(fecha_str)[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _contar_visitas_bulk(pares: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+    """
+    Entradas por (entidad_id, 'YYYY-MM-DD') para muchos pares a la vez.
+
+    Lee visitas_diarias por lotes de entidades dentro del rango de fechas
+    pedido (o agrupa eventos por día si el contador no está disponible).
+    """
+    fechas_por_entidad = {}
+    for entidad_id, fecha in pares:
+        clave = _clave_fecha(fecha)
+        if clave:
+            fechas_por_entidad.setdefault(entidad_id, set()).add(clave)
+    if not fechas_por_entidad:
+        return {}
+
+    todas = set().union(*fechas_por_entidad.values())
+    desde = min(todas)
+    hasta = max(todas)
+    hasta_excl = (datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    conteos = {}
+    with get_db() as db:
+        usar_contador = _conteo_visitas_disponible(db)
+        for lote in _en_lotes(fechas_por_entidad):
+            marcas = ", ".join("?" for _ in lote)
+            if usar_contador:
+                rows = db.execute(f"""
+                    SELECT entidad_id, fecha, total
+                    FROM visitas_diarias
+                    WHERE tipo_evento = 'entrada'
+                      AND fecha >= ? AND fecha <= ?
+                      AND entidad_id IN ({marcas})
+                """, [desde, hasta, *lote]).fetchall()
+            else:
+                rows = db.execute(f"""
+                    SELECT entidad_id, DATE(timestamp_servidor) AS fecha, COUNT(*) AS total
+                    FROM eventos
+                    WHERE tipo_evento = 'entrada'
+                      AND timestamp_servidor >= ? AND timestamp_servidor < ?
+                      AND entidad_id IN ({marcas})
+                    GROUP BY entidad_id, DATE(timestamp_servidor)
+                """, [desde, hasta_excl, *lote]).fetchall()
+            for row in rows:
+                clave = (row["entidad_id"], str(row["fecha"]))
+                if clave[1] in fechas_por_entidad.get(clave[0], ()):
+                    conteos[clave] = row["total"]
+    return conteos
+
+
 def _obtener_politicas_activas():
     with get_db() as db:
         rows = db.execute("""
@@ -64,24 +205,204 @@ def _obtener_politicas_activas():
     return [dict(r) for r in rows]
 
 
-def evaluar_reglas(entidad_id, metadata):
+# ---------------------------------------------------------
+# Plan compilado de políticas
+# ---------------------------------------------------------
+@dataclass(frozen=True)
+class ReglaCompilada:
+    """Política activa con sus condiciones ya parseadas"""
+    politica_id: str
+    nombre: str
+    aplicable_a: Optional[str]
+    tipo_entidad: Optional[str]
+    # Rangos en minutos del día; None = sin restricción (o formato inválido)
+    restriccion_horario: Optional[Tuple[int, int]]
+    horario: Optional[Tuple[int, int]]
+    max_visitas_dia: Any
+    requiere_autorizacion: bool
+    lista_negra: bool
+    # Motivos de rechazo pre-formateados
+    motivo_restriccion: str
+    motivo_horario: str
+
+    def aplica_a(self, tipo_entidad) -> bool:
+        if self.aplicable_a != "global" and self.aplicable_a != tipo_entidad:
+            return False
+        return not self.tipo_entidad or self.tipo_entidad == tipo_entidad
+
+
+def _rango_compilado(desde_str, hasta_str):
+    desde = _minuto_del_dia(desde_str)
+    hasta = _minuto_del_dia(hasta_str)
+    if desde is None or hasta is None:
+        return None
+    return (desde, hasta)
+
+
+def _compilar_regla(pol) -> Optional[ReglaCompilada]:
+    """Parsea una fila de politicas; None si no puede aplicarse nunca"""
+    try:
+        condiciones_raw = pol.get("condiciones", "{}")
+        if isinstance(condiciones_raw, (dict, list)):
+            # Políticas hipotéticas (simulación) con condiciones ya como objeto
+            condiciones = condiciones_raw
+        else:
+            condiciones = json.loads(condiciones_raw) if condiciones_raw else {}
+    except json.JSONDecodeError:
+        # Si la política tiene JSON roto, la ignoramos
+        return None
+
+    # Lista de condiciones - tomar la primera si existe
+    if isinstance(condiciones, list):
+        if not condiciones:
+            return None
+        condiciones = condiciones[0]
+
+    if not isinstance(condiciones, dict):
+        return None
+
+    nombre = pol["nombre"]
+
+    restriccion = None
+    restriccion_horario = condiciones.get("restriccion_horario")
+    if isinstance(restriccion_horario, dict):
+        restriccion = _rango_compilado(
+            restriccion_horario.get("desde", "00:00"),
+            restriccion_horario.get("hasta", "23:59")
+        )
+
+    horario = None
+    hora_inicio = hora_fin = None
+    if condiciones.get("tipo") == "horario":
+        hora_inicio = condiciones.get("hora_inicio", "00:00")
+        hora_fin = condiciones.get("hora_fin", "23:59")
+        horario = _rango_compilado(hora_inicio, hora_fin)
+
+    return ReglaCompilada(
+        politica_id=pol.get("politica_id"),
+        nombre=nombre,
+        aplicable_a=pol.get("aplicable_a", "global"),
+        tipo_entidad=condiciones.get("tipo_entidad"),
+        restriccion_horario=restriccion,
+        horario=horario,
+        max_visitas_dia=condiciones.get("max_visitas_dia"),
+        requiere_autorizacion=bool(condiciones.get("requiere_autorizacion")),
+        lista_negra=condiciones.get("tipo") == "lista_negra",
+        motivo_restriccion=f"Horario restringido por política '{nombre}'.",
+        motivo_horario=f"Horario restringido por política '{nombre}' ({hora_inicio}-{hora_fin}).",
+    )
+
+
+class PlanPoliticas:
+    """
+    Políticas activas compiladas, en orden de prioridad y agrupadas por el
+    tipo de entidad al que aplican. Inmutable: se reemplaza completo al
+    recompilar, así que se puede leer desde varios hilos sin lock.
     """
-    Evalúa las políticas activas para la entidad y contexto dados.
 
-    Devuelve:
-        {
-            "permitido": True/False,
-            "motivo": str o None,
-            "politica_aplicada": str o None
+    def __init__(self, reglas, version: int):
+        self.reglas = tuple(reglas)
+        self.version = version
+        self.compilado_en = time.monotonic()
+
+        # Reglas que aplican a cualquier tipo (aplicable_a global sin tipo_entidad)
+        self._generales = tuple(
+            r for r in self.reglas
+            if r.aplicable_a == "global" and not r.tipo_entidad
+        )
+
+        tipos = {r.aplicable_a for r in self.reglas} | {r.tipo_entidad for r in self.reglas}
+        tipos -= {None, "global"}
+        self._por_tipo = {
+            tipo: tuple(r for r in self.reglas if r.aplica_a(tipo))
+            for tipo in tipos
         }
+
+    def reglas_para(self, tipo_entidad):
+        """Reglas aplicables a un tipo de entidad, en orden de prioridad"""
+        return self._por_tipo.get(tipo_entidad, self._generales)
+
+    def vigente(self, version: int) -> bool:
+        if self.version != version:
+            return False
+        if POLITICAS_PLAN_TTL <= 0:
+            return True
+        return time.monotonic() - self.compilado_en < POLITICAS_PLAN_TTL
+
+
+_version_politicas = 0
+_plan: Optional[PlanPoliticas] = None
+_lock_plan = threading.Lock()
+
+
+def invalidar_politicas():
+    """
+    Incrementa la versión de las políticas para que el siguiente
+    evaluar_reglas recompile el plan. La llaman crear_politica,
+    actualizar_politica y cambiar_estado_politica.
+    """
+    global _version_politicas
+    with _lock_plan:
+        _version_politicas += 1
+
+
+def compilar_politicas(version: int = 0, politicas: Optional[List[Dict]] = None) -> PlanPoliticas:
+    """
+    Compila políticas en un PlanPoliticas.
+
+    Args:
+        version: Versión con la que queda marcado el plan
+        politicas: Filas de politicas a compilar, tratadas como activas y
+            ordenadas por prioridad (default: las activas de la BD). Sirve
+            para simular: politicas=_obtener_politicas_activas() + [nueva]
+    """
+    if politicas is None:
+        politicas = _obtener_politicas_activas()
+    else:
+        politicas = sorted(politicas, key=lambda pol: pol.get("prioridad", 5))
+
+    reglas = []
+    for pol in politicas:
+        regla = _compilar_regla(pol)
+        if regla is not None:
+            reglas.append(regla)
+    return PlanPoliticas(reglas, version)
+
+
+def obtener_plan_politicas() -> PlanPoliticas:
+    """Plan vigente; solo consulta la tabla politicas si cambió la versión o expiró"""
+    global _plan
+    plan = _plan
+    if plan is not None and plan.vigente(_version_politicas):
+        return plan
+
+    with _lock_plan:
+        if _plan is None or not _plan.vigente(_version_politicas):
+            _plan = compilar_politicas(_version_politicas)
+        return _plan
+
+
+def _resultado(permitido, motivo=None, politica_aplicada=None):
+    return {
+        "permitido": permitido,
+        "motivo": motivo,
+        "politica_aplicada": politica_aplicada
+    }
+
+
+def evaluar_con_plan(plan: PlanPoliticas, entidad_id, entidad, metadata, contar_visitas=None) -> Dict:
+    """
+    Evalúa una entidad contra un plan ya compilado (sin leer políticas de la BD).
+
+    Args:
+        plan: PlanPoliticas
+        entidad_id: ID de la entidad
+        entidad: Fila de entidades como dict (None si no existe)
+        metadata: Contexto del acceso (hora, fecha, autorizado, ...)
+        contar_visitas: fn(entidad_id, fecha) -> int (default: _contar_visitas_hoy)
     """
-    entidad = _obtener_entidad(entidad_id)
     if not entidad:
-        return {
-            "permitido": False,
-            "motivo": "Entidad no encontrada.",
-            "politica_aplicada": None
-        }
+        return _resultado(False, "Entidad no encontrada.")
 
     # Parsear atributos JSON de la entidad
     try:
@@ -92,103 +413,128 @@ def evaluar_reglas(entidad_id, metadata):
     tipo_entidad = entidad.get("tipo")
     fecha = metadata.get("fecha", datetime.now().strftime("%Y-%m-%d"))
     hora = metadata.get("hora", datetime.now().strftime("%H:%M"))
+    minuto = _minuto_del_dia(hora)
+    contar_visitas = contar_visitas or _contar_visitas_hoy
+    visitas_hoy = None
 
-    politicas = _obtener_politicas_activas()
+    for regla in plan.reglas_para(tipo_entidad):
+        # Restricción de horario (minuto None = formato inválido, no bloquea)
+        if (regla.restriccion_horario and minuto is not None
+                and not _rango_contiene(minuto, *regla.restriccion_horario)):
+            return _resultado(False, regla.motivo_restriccion, regla.nombre)
 
-    # Si no hay políticas, permitimos por defecto
-    if not politicas:
-        return {
-            "permitido": True,
-            "motivo": None,
-            "politica_aplicada": None
-        }
+        # Horario alternativo (tipo: horario con hora_inicio/hora_fin)
+        if (regla.horario and minuto is not None
+                and not _rango_contiene(minuto, *regla.horario)):
+            return _resultado(False, regla.motivo_horario, regla.nombre)
 
-    for pol in politicas:
-        try:
-            condiciones_raw = pol.get("condiciones", "{}")
-            condiciones = json.loads(condiciones_raw) if condiciones_raw else {}
-        except json.JSONDecodeError:
-            # Si la política tiene JSON roto, la ignoramos
-            continue
-
-        # Si condiciones es una lista, convertir a dict para compatibilidad
-        if isinstance(condiciones, list):
-            # Lista de condiciones - tomar la primera si existe
-            if condiciones and len(condiciones) > 0:
-                condiciones = condiciones[0]
-            else:
-                continue
-        
-        # 1) Filtro por aplicable_a
-        aplicable_a = pol.get("aplicable_a", "global")
-        if aplicable_a != "global":
-            # Si la política es específica de un tipo, verificar
-            if aplicable_a != tipo_entidad:
-                continue  # Esta política no aplica a este tipo
-
-        # 2) Filtro por tipo_entidad en condiciones (soporte legacy)
-        tipo_objetivo = condiciones.get("tipo_entidad")
-        if tipo_objetivo and tipo_objetivo != tipo_entidad:
-            continue  # Esta política no aplica a este tipo
-
-        # 3) Restricción de horario
-        restriccion_horario = condiciones.get("restriccion_horario")
-        if restriccion_horario:
-            desde = restriccion_horario.get("desde", "00:00")
-            hasta = restriccion_horario.get("hasta", "23:59")
-            if not _hora_en_rango(hora, desde, hasta):
-                return {
-                    "permitido": False,
-                    "motivo": f"Horario restringido por política '{pol['nombre']}'.",
-                    "politica_aplicada": pol["nombre"]
-                }
-
-        # 4) Horario alternativo (tipo: horario con hora_inicio/hora_fin)
-        if condiciones.get("tipo") == "horario":
-            hora_inicio = condiciones.get("hora_inicio", "00:00")
-            hora_fin = condiciones.get("hora_fin", "23:59")
-            if not _hora_en_rango(hora, hora_inicio, hora_fin):
-                return {
-                    "permitido": False,
-                    "motivo": f"Horario restringido por política '{pol['nombre']}' ({hora_inicio}-{hora_fin}).",
-                    "politica_aplicada": pol["nombre"]
-                }
-
-        # 5) Límite de visitas por día
-        max_visitas_dia = condiciones.get("max_visitas_dia")
-        if max_visitas_dia is not None:
-            visitas_hoy = _contar_visitas_hoy(entidad_id, fecha)
-            if visitas_hoy >= max_visitas_dia:
-                return {
-                    "permitido": False,
-                    "motivo": f"Límite de visitas diarias alcanzado ({visitas_hoy}/{max_visitas_dia}) por política '{pol['nombre']}'.",
-                    "politica_aplicada": pol["nombre"]
-                }
-
-        # 6) Requiere autorización
-        requiere_aut = condiciones.get("requiere_autorizacion")
-        if requiere_aut:
-            # Verificar si viene autorizado en metadata
-            if not metadata.get("autorizado"):
-                return {
-                    "permitido": False,
-                    "motivo": f"Requiere autorización previa según política '{pol['nombre']}'.",
-                    "politica_aplicada": pol["nombre"]
-                }
-
-        # 7) Lista negra
-        if condiciones.get("tipo") == "lista_negra":
-            # Verificar si la entidad está marcada en lista negra
-            if atributos.get("lista_negra") or metadata.get("lista_negra"):
-                return {
-                    "permitido": False,
-                    "motivo": f"Entidad en lista negra según política '{pol['nombre']}'.",
-                    "politica_aplicada": pol["nombre"]
-                }
+        # Límite de visitas por día (se cuenta una sola vez por evaluación)
+        if regla.max_visitas_dia is not None:
+            if visitas_hoy is None:
+                visitas_hoy = contar_visitas(entidad_id, fecha)
+            if visitas_hoy >= regla.max_visitas_dia:
+                return _resultado(
+                    False,
+                    f"Límite de visitas diarias alcanzado ({visitas_hoy}/{regla.max_visitas_dia}) por política '{regla.nombre}'.",
+                    regla.nombre
+                )
+
+        # Requiere autorización previa en metadata
+        if regla.requiere_autorizacion and not metadata.get("autorizado"):
+            return _resultado(
+                False,
+                f"Requiere autorización previa según política '{regla.nombre}'.",
+                regla.nombre
+            )
+
+        # Lista negra
+        if regla.lista_negra and (atributos.get("lista_negra") or metadata.get("lista_negra")):
+            return _resultado(
+                False,
+                f"Entidad en lista negra según política '{regla.nombre}'.",
+                regla.nombre
+            )
 
     # Si ninguna política bloquea, se permite
-    return {
-        "permitido": True,
-        "motivo": None,
-        "politica_aplicada": None
-    }
+    return _resultado(True)
+
+
+def evaluar_reglas(entidad_id, metadata):
+    """
+    Evalúa las políticas activas para la entidad y contexto dados.
+
+    Las políticas se leen del plan compilado en memoria (ver
+    obtener_plan_politicas); solo la entidad y el conteo de visitas
+    se consultan en la BD.
+
+    Devuelve:
+        {
+            "permitido": True/False,
+            "motivo": str o None,
+            "politica_aplicada": str o None
+        }
+    """
+    entidad = _obtener_entidad(entidad_id)
+    if not entidad:
+        return _resultado(False, "Entidad no encontrada.")
+
+    return evaluar_con_plan(obtener_plan_politicas(), entidad_id, entidad, metadata)
+
+
+def evaluar_reglas_batch(
+    entidades: List[str],
+    metadatas,
+    plan: Optional[PlanPoliticas] = None,
+    acumular_visitas: bool = False
+) -> List[Dict]:
+    """
+    Evalúa muchos pares (entidad, contexto) en una sola pasada.
+
+    Las entidades se leen con una consulta por lote y las visitas diarias
+    se cuentan agrupadas, en lugar de 2-3 consultas por par. Pensado para
+    replay de bitácoras de caseta y simulaciones de políticas.
+
+    Args:
+        entidades: Lista de entidad_id
+        metadatas: Lista de metadata (misma longitud) o un dict para todos
+        plan: Plan a usar (default: el vigente). Para simular "¿y si esta
+            política estuviera activa?":
+            compilar_politicas(politicas=_obtener_politicas_activas() + [nueva])
+        acumular_visitas: Si True, cada entrada permitida cuenta como visita
+            para los pares siguientes del mismo lote (replay en orden)
+
+    Returns:
+        Lista de resultados con el formato de evaluar_reglas, en el mismo orden
+    """
+    if isinstance(metadatas, dict):
+        metadatas = [metadatas] * len(entidades)
+    if len(metadatas) != len(entidades):
+        raise ValueError("entidades y metadatas deben tener la misma longitud")
+
+    plan = plan or obtener_plan_politicas()
+    filas = _obtener_entidades(entidades)
+
+    visitas = {}
+    if any(regla.max_visitas_dia is not None for regla in plan.reglas):
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        visitas = _contar_visitas_bulk(
+            (entidad_id, metadata.get("fecha", hoy))
+            for entidad_id, metadata in zip(entidades, metadatas)
+            if entidad_id in filas
+        )
+
+    def contar_visitas(entidad_id, fecha):
+        return visitas.get((entidad_id, _clave_fecha(fecha)), 0)
+
+    resultados = []
+    for entidad_id, metadata in zip(entidades, metadatas):
+        resultado = evaluar_con_plan(
+            plan, entidad_id, filas.get(entidad_id), metadata, contar_visitas
+        )
+        if acumular_visitas and resultado["permitido"]:
+            fecha = _clave_fecha(metadata.get("fecha", datetime.now().strftime("%Y-%m-%d")))
+            clave = (entidad_id, fecha)
+            visitas[clave] = visitas.get(clave, 0) + 1
+        resultados.append(resultado)
+
+    return resultados
@@ -4,11 +4,16 @@ Motor central AUP-EXO - Coordina todo el flujo de accesos
 """
 
 import json
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, Any, Optional
-from core.db import get_db
+from core.db import get_db, conexion_compartida, transaccion
+from core.cadena import cadenas_eventos
+from core.bitacora import registrar_bitacora
 from core.hashing import hash_evento, hash_entidad, generar_hash_cadena
 from core.motor_reglas import evaluar_reglas
+from core.placas import sincronizar_placa
 from core.evidencia import enviar_a_recordia
 
 
@@ -18,8 +23,27 @@ class OrquestadorAccesos:
     Coordina: reglas, nodos, eventos, auditoría, evidencias
     """
     
-    def __init__(self, usuario_id: str = "system"):
+    def __init__(self, usuario_id: str = "system", unidad_trabajo: bool = False):
+        """
+        Args:
+            usuario_id: Usuario por defecto para auditoría
+            unidad_trabajo: Si True, procesar_acceso ejecuta reglas, lectura del
+                hash previo, insert del evento e insert de bitácora en una sola
+                transacción sobre una sola conexión
+        """
         self.usuario_id = usuario_id
+        self.unidad_trabajo = unidad_trabajo
+        # Tiempos (ms) por etapa del último procesar_acceso/registrar_acceso
+        self.tiempos_etapas: Dict[str, float] = {}
+    
+    @contextmanager
+    def _etapa(self, nombre: str):
+        """Mide la duración de una etapa del pipeline en tiempos_etapas"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos_etapas[nombre] = round((time.perf_counter() - inicio) * 1000, 3)
     
     def registrar_acceso(
         self,
@@ -28,7 +52,8 @@ class OrquestadorAccesos:
         metadata: dict,
         actor: str,
         dispositivo: str = "unknown",
-        evidencia_id: Optional[str] = None
+        evidencia_id: Optional[str] = None,
+        condominio_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Registra un evento de acceso completo
@@ -40,79 +65,95 @@ class OrquestadorAccesos:
             actor: Usuario que registra el evento
             dispositivo: Dispositivo desde donde se registra
             evidencia_id: ID de evidencia (foto, etc.)
+            condominio_id: Cadena hash donde se anexa el evento
+                (default: metadata["condominio_id"]; sin condominio va a la global)
         
         Returns:
             Dict con resultado del registro
         """
-        timestamp_servidor = datetime.now().isoformat()
+        condominio_id = condominio_id or metadata.get("condominio_id")
         
-        # Obtener último evento para encadenar hash
-        with get_db() as db:
-            ultimo_evento = db.execute("""
-                SELECT hash_actual FROM eventos
-                ORDER BY evento_id DESC LIMIT 1
-            """).fetchone()
+        # Reservar el siguiente eslabón en la cadena del condominio: cabeza en
+        # memoria y appends serializados por cadena (ver core.cadena)
+        inicio_cadena = time.perf_counter()
+        with cadenas_eventos.anexar(condominio_id) as eslabon:
+            self.tiempos_etapas["hash_previo"] = round(
+                (time.perf_counter() - inicio_cadena) * 1000, 3
+            )
+            hash_prev = eslabon.hash_prev
             
-            hash_prev = ultimo_evento['hash_actual'] if ultimo_evento else None
-        
-        # Preparar datos del evento
-        evento_data = {
-            "entidad_id": entidad_id,
-            "tipo_evento": tipo_evento,
-            "metadata": metadata,
-            "timestamp_servidor": timestamp_servidor,
-            "actor": actor,
-            "dispositivo": dispositivo
-        }
-        
-        # Generar hash encadenado
-        evento_hash, evento_completo = generar_hash_cadena(
-            hash_prev,
-            evento_data,
-            timestamp_servidor
-        )
-        
-        # FASE 3 - Integración EXO-Recordia
-        # Enviar a Recordia para trazabilidad jurídica externa
-        recibo_recordia = enviar_a_recordia(evento_hash, metadata)
-        
-        # Generar ID único para el evento
-        timestamp_str = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
-        evento_id = f"EVT_{tipo_evento[:3].upper()}_{timestamp_str}_{evento_hash[:8]}"
-        
-        # Insertar en base de datos
-        with get_db() as db:
-            db.execute("""
-                INSERT INTO eventos (
-                    evento_id, entidad_id, tipo_evento, metadata, evidencia_id,
-                    hash_actual, timestamp_servidor, timestamp_cliente,
-                    actor, dispositivo, origen, contexto, recibo_recordia
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                evento_id,
-                entidad_id,
-                tipo_evento,
-                json.dumps(metadata),
-                evidencia_id,
-                evento_hash,
-                timestamp_servidor,
-                metadata.get('timestamp_cliente'),
-                actor,
-                dispositivo,
-                metadata.get('origen', 'local'),
-                json.dumps(metadata.get('contexto', {})),
-                recibo_recordia
-            ))
+            # Dentro del lock para que el timestamp siga el orden de la cadena
+            timestamp_servidor = datetime.now().isoformat()
+            
+            # Preparar datos del evento
+            evento_data = {
+                "entidad_id": entidad_id,
+                "tipo_evento": tipo_evento,
+                "metadata": metadata,
+                "timestamp_servidor": timestamp_servidor,
+                "actor": actor,
+                "dispositivo": dispositivo
+            }
+            
+            # Generar hash encadenado
+            evento_hash, evento_completo = generar_hash_cadena(
+                hash_prev,
+                evento_data,
+                timestamp_servidor
+            )
+            
+            # FASE 3 - Integración EXO-Recordia
+            # Enviar a Recordia para trazabilidad jurídica externa. Hoy es un
+            # stub local que deriva el recibo del hash; si pasa a ser una
+            # llamada de red, diferirla con al_terminar_transaccion para que
+            # corra después del COMMIT y no retenga el lock de la cadena.
+            with self._etapa("recordia"):
+                recibo_recordia = enviar_a_recordia(evento_hash, metadata)
+            
+            # Generar ID único para el evento
+            timestamp_str = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+            evento_id = f"EVT_{tipo_evento[:3].upper()}_{timestamp_str}_{evento_hash[:8]}"
+            
+            # Insertar en base de datos
+            with self._etapa("insert_evento"), get_db() as db:
+                db.execute("""
+                    INSERT INTO eventos (
+                        evento_id, entidad_id, tipo_evento, metadata, evidencia_id,
+                        hash_actual, timestamp_servidor, timestamp_cliente,
+                        actor, dispositivo, origen, contexto, recibo_recordia,
+                        hash_previo, secuencia, condominio_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    evento_id,
+                    entidad_id,
+                    tipo_evento,
+                    json.dumps(metadata),
+                    evidencia_id,
+                    evento_hash,
+                    timestamp_servidor,
+                    metadata.get('timestamp_cliente'),
+                    actor,
+                    dispositivo,
+                    metadata.get('origen', 'local'),
+                    json.dumps(metadata.get('contexto', {})),
+                    recibo_recordia,
+                    hash_prev,
+                    eslabon.secuencia,
+                    condominio_id
+                ))
+            
+            eslabon.hash_actual = evento_hash
         
         # Registrar en bitácora
-        self._registrar_bitacora(
-            "eventos",
-            "INSERT",
-            str(evento_id),
-            None,
-            evento_completo,
-            actor
-        )
+        with self._etapa("bitacora"):
+            self._registrar_bitacora(
+                "eventos",
+                "INSERT",
+                str(evento_id),
+                None,
+                evento_completo,
+                actor
+            )
         
         return {
             "success": True,
@@ -135,19 +176,46 @@ class OrquestadorAccesos:
         
         Este es el método principal que debe llamarse desde la interfaz.
         
+        Con unidad_trabajo=True todo el flujo (reglas, hash previo, evento y
+        bitácora) se confirma en una sola transacción. Los tiempos por etapa
+        quedan en self.tiempos_etapas.
+        
         Returns:
             Si permitido: evento_hash (str)
             Si rechazado: {"status": "rechazado", "motivo": str, "politica": str}
         """
+        self.tiempos_etapas = {}
+        inicio = time.perf_counter()
+        
+        # Una sola conexión para toda la decisión (reglas + evento + bitácora)
+        contexto = transaccion() if self.unidad_trabajo else conexion_compartida()
+        try:
+            with contexto:
+                return self._procesar_acceso(
+                    entidad_id, metadata, actor, dispositivo, evidencia_id
+                )
+        finally:
+            self.tiempos_etapas["total"] = round((time.perf_counter() - inicio) * 1000, 3)
+    
+    def _procesar_acceso(
+        self,
+        entidad_id: str,
+        metadata: dict,
+        actor: str,
+        dispositivo: str,
+        evidencia_id: Optional[str]
+    ):
+        """Evalúa reglas y registra el evento (usa la conexión ya abierta)"""
         # Evaluar reglas de negocio
-        evaluacion = evaluar_reglas(entidad_id, metadata)
+        with self._etapa("reglas"):
+            evaluacion = evaluar_reglas(entidad_id, metadata)
         
         if not evaluacion['permitido']:
             # Acceso denegado - registrar rechazo
             metadata_rechazo = dict(metadata)
             metadata_rechazo["motivo_rechazo"] = evaluacion["motivo"]
             metadata_rechazo["evaluacion"] = evaluacion
-            
+        
             self.registrar_acceso(
                 entidad_id=entidad_id,
                 tipo_evento="rechazo",
@@ -156,7 +224,7 @@ class OrquestadorAccesos:
                 dispositivo=dispositivo,
                 evidencia_id=evidencia_id
             )
-            
+        
             return {
                 "status": "rechazado",
                 "motivo": evaluacion["motivo"],
@@ -240,6 +308,7 @@ class OrquestadorAccesos:
                 timestamp,
                 created_by or self.usuario_id
             ))
+            sincronizar_placa(db, entidad_id)
         
         # Registrar en bitácora
         self._registrar_bitacora(
@@ -303,6 +372,7 @@ class OrquestadorAccesos:
                 updated_by or self.usuario_id,
                 entidad_id
             ))
+            sincronizar_placa(db, entidad_id)
             
             # Bitácora
             self._registrar_bitacora(
@@ -351,23 +421,14 @@ class OrquestadorAccesos:
         datos_nuevos: Any,
         usuario_id: str
     ):
-        """Registra operación en bitácora de auditoría"""
-        with get_db() as db:
-            db.execute("""
-                INSERT INTO bitacora (
-                    tabla, operacion, registro_id,
-                    datos_anteriores, datos_nuevos,
-                    usuario_id, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                tabla,
-                operacion,
-                registro_id,
-                json.dumps(datos_anteriores) if datos_anteriores else None,
-                json.dumps(datos_nuevos),
-                usuario_id,
-                datetime.now().isoformat()
-            ))
+        """
+        Registra operación en bitácora de auditoría (ver core.bitacora): en
+        unidad de trabajo va en la misma transacción; fuera de ella se encola
+        y se escribe por lotes.
+        """
+        registrar_bitacora(
+            tabla, operacion, registro_id, datos_anteriores, datos_nuevos, usuario_id
+        )
 
 
 if __name__ == "__main__":
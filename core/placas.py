@@ -0,0 +1,407 @@
+"""
+core/placas.py
+Índice de placas normalizadas -> entidad, con búsqueda exacta en memoria
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from core.db import get_db, en_transaccion, al_terminar_transaccion, PostgresConnectionWrapper
+from core.utils import validar_placa_mexico
+from core.coincidencia_placas import IndiceAproximado, compactar, confianza
+
+# Cada cuántos segundos se traen del índice persistido los cambios hechos por
+# otros procesos (0 = en cada búsqueda)
+PLACAS_REFRESCO_SEGUNDOS = float(os.getenv('PLACAS_REFRESCO_SEGUNDOS', '2'))
+
+# Ediciones toleradas en la búsqueda aproximada, además de las confusiones
+# de OCR (0/O, 8/B, 1/I...) que no cuentan (ver core/coincidencia_placas.py)
+PLACAS_MAX_EDICIONES = int(os.getenv('PLACAS_MAX_EDICIONES', '1'))
+
+# Traslape al releer cambios: una transacción puede confirmar después de otra
+# con timestamp posterior y no debe quedar fuera del siguiente refresco
+_TRASLAPE_REFRESCO = timedelta(seconds=30)
+
+
+_SQL_INDICE_PLACAS_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS indice_placas (
+        placa TEXT PRIMARY KEY,
+        entidad_id TEXT NOT NULL,
+        lista_negra INTEGER NOT NULL DEFAULT 0,
+        motivo_lista_negra TEXT,
+        activo INTEGER NOT NULL DEFAULT 1,
+        actualizado TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_indice_placas_entidad ON indice_placas(entidad_id)",
+    "CREATE INDEX IF NOT EXISTS idx_indice_placas_actualizado ON indice_placas(actualizado)",
+]
+
+_SQL_INDICE_PLACAS_PG = [
+    """
+    CREATE TABLE IF NOT EXISTS indice_placas (
+        placa VARCHAR(20) PRIMARY KEY,
+        entidad_id VARCHAR(100) NOT NULL,
+        lista_negra INTEGER NOT NULL DEFAULT 0,
+        motivo_lista_negra TEXT,
+        activo INTEGER NOT NULL DEFAULT 1,
+        actualizado TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_indice_placas_entidad ON indice_placas(entidad_id)",
+    "CREATE INDEX IF NOT EXISTS idx_indice_placas_actualizado ON indice_placas(actualizado)",
+]
+
+
+def normalizar_placa(placa: Optional[str]) -> Optional[str]:
+    """Placa normalizada por validar_placa_mexico (None si no es una placa válida)"""
+    if not placa or not isinstance(placa, str):
+        return None
+    resultado = validar_placa_mexico(placa)
+    return resultado['placa_normalizada'] if resultado['valido'] else None
+
+
+def placa_de_entidad(tipo: str, atributos) -> Optional[str]:
+    """
+    Placa normalizada de una entidad: atributo placa, o el identificador
+    en vehículos (así los registra modulos/accesos.py)
+    """
+    if isinstance(atributos, str):
+        try:
+            atributos = json.loads(atributos)
+        except (json.JSONDecodeError, TypeError):
+            return None
+    if not isinstance(atributos, dict):
+        return None
+
+    placa = atributos.get('placa')
+    if not placa and tipo == 'vehiculo':
+        placa = atributos.get('identificador')
+    return normalizar_placa(placa)
+
+
+@dataclass
+class RegistroPlaca:
+    """Fila de indice_placas"""
+    placa: str
+    entidad_id: str
+    lista_negra: bool = False
+    motivo_lista_negra: Optional[str] = None
+    activo: bool = True
+    actualizado: str = ""
+
+    @classmethod
+    def desde_fila(cls, fila) -> "RegistroPlaca":
+        return cls(
+            placa=fila['placa'],
+            entidad_id=fila['entidad_id'],
+            lista_negra=bool(fila['lista_negra']),
+            motivo_lista_negra=fila['motivo_lista_negra'],
+            activo=bool(fila['activo']),
+            actualizado=fila['actualizado']
+        )
+
+
+def asegurar_indice_placas(db):
+    """
+    Crea indice_placas (placa normalizada -> entidad_id, lista negra) y la
+    primera vez lo llena desde las entidades existentes. Es idempotente.
+    """
+    if isinstance(db, PostgresConnectionWrapper):
+        existe = db.execute("SELECT to_regclass('indice_placas') AS t").fetchone()["t"]
+        sentencias = _SQL_INDICE_PLACAS_PG
+    else:
+        existe = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'indice_placas'"
+        ).fetchone()
+        sentencias = _SQL_INDICE_PLACAS_SQLITE
+
+    for sql in sentencias:
+        db.execute(sql)
+
+    if not existe:
+        # La normalización es de Python: se recorre la tabla una sola vez.
+        # Primero las inactivas, para que una placa repetida quede en la activa
+        filas = db.execute("""
+            SELECT entidad_id, tipo, atributos, estado FROM entidades
+            ORDER BY CASE WHEN estado = 'activo' THEN 1 ELSE 0 END, fecha_creacion
+        """).fetchall()
+        for fila in filas:
+            _guardar_registro(db, fila['entidad_id'], fila['tipo'], fila['atributos'], fila['estado'])
+
+
+def _guardar_registro(db, entidad_id, tipo, atributos, estado) -> list:
+    """
+    Escribe en indice_placas la placa actual de la entidad y desactiva las
+    placas que tenía antes.
+
+    Returns:
+        Registros escritos (para aplicarlos en memoria al confirmar)
+    """
+    placa = placa_de_entidad(tipo, atributos)
+    if isinstance(atributos, str):
+        try:
+            atributos = json.loads(atributos)
+        except (json.JSONDecodeError, TypeError):
+            atributos = {}
+    atributos = atributos if isinstance(atributos, dict) else {}
+    ahora = datetime.now().isoformat()
+
+    anteriores = db.execute("""
+        SELECT placa FROM indice_placas
+        WHERE entidad_id = ? AND activo = 1
+    """, (entidad_id,)).fetchall()
+
+    registros = []
+    for fila in anteriores:
+        if fila['placa'] != placa:
+            db.execute("""
+                UPDATE indice_placas SET activo = 0, actualizado = ?
+                WHERE placa = ? AND entidad_id = ?
+            """, (ahora, fila['placa'], entidad_id))
+            registros.append(RegistroPlaca(fila['placa'], entidad_id, activo=False, actualizado=ahora))
+
+    if placa:
+        registro = RegistroPlaca(
+            placa=placa,
+            entidad_id=entidad_id,
+            lista_negra=bool(atributos.get('lista_negra')),
+            motivo_lista_negra=atributos.get('motivo_lista_negra'),
+            activo=estado == 'activo',
+            actualizado=ahora
+        )
+        # Una placa compartida queda en la entidad activa: una entidad inactiva
+        # no le quita la fila a otra que la tiene activa
+        cur = db.execute("""
+            INSERT INTO indice_placas (placa, entidad_id, lista_negra, motivo_lista_negra, activo, actualizado)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (placa) DO UPDATE SET
+                entidad_id = excluded.entidad_id,
+                lista_negra = excluded.lista_negra,
+                motivo_lista_negra = excluded.motivo_lista_negra,
+                activo = excluded.activo,
+                actualizado = excluded.actualizado
+            WHERE indice_placas.entidad_id = excluded.entidad_id
+               OR indice_placas.activo = 0
+               OR excluded.activo = 1
+        """, (
+            registro.placa,
+            registro.entidad_id,
+            int(registro.lista_negra),
+            registro.motivo_lista_negra,
+            int(registro.activo),
+            registro.actualizado
+        ))
+        if cur.rowcount != 0:
+            registros.append(registro)
+
+    return registros
+
+
+class IndicePlacas:
+    """
+    Copia en memoria de indice_placas para el escaneo en caseta.
+
+    buscar() es un acceso a dict: no toca la base de datos salvo para traer,
+    cada PLACAS_REFRESCO_SEGUNDOS, las filas que otros procesos cambiaron
+    (por índice de actualizado). Las escrituras de este proceso se aplican
+    en memoria al confirmar su transacción.
+
+    buscar_aproximada() usa un IndiceAproximado que se construye en la
+    primera búsqueda aproximada y luego se mantiene junto con el dict.
+    """
+
+    def __init__(
+        self,
+        refresco_segundos: float = PLACAS_REFRESCO_SEGUNDOS,
+        max_ediciones: int = PLACAS_MAX_EDICIONES
+    ):
+        self.refresco_segundos = refresco_segundos
+        self.max_ediciones = max_ediciones
+        self._placas: Dict[str, RegistroPlaca] = {}
+        self._aproximado: Optional[IndiceAproximado] = None
+        self._por_compacta: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._marca = ""
+        self._ultimo_refresco = 0.0
+
+    def cargar(self):
+        """Lee el índice completo (lo crea si hace falta)"""
+        with get_db() as db:
+            asegurar_indice_placas(db)
+            filas = db.execute("SELECT * FROM indice_placas").fetchall()
+
+        placas = {}
+        marca = ""
+        for fila in filas:
+            registro = RegistroPlaca.desde_fila(fila)
+            placas[registro.placa] = registro
+            marca = max(marca, registro.actualizado)
+
+        with self._lock:
+            self._placas = placas
+            self._aproximado = None
+            self._marca = marca
+            self._cargado = True
+            self._ultimo_refresco = time.monotonic()
+
+    def invalidar(self):
+        """Obliga a recargar el índice en la siguiente búsqueda"""
+        with self._lock:
+            self._cargado = False
+
+    def refrescar_pronto(self):
+        """Obliga a traer los cambios del índice persistido en la siguiente búsqueda"""
+        with self._lock:
+            self._ultimo_refresco = float("-inf")
+
+    def _refrescar(self):
+        if not self._cargado:
+            self.cargar()
+            return
+        if time.monotonic() - self._ultimo_refresco < self.refresco_segundos:
+            return
+
+        desde = self._marca
+        if desde:
+            desde = (datetime.fromisoformat(desde) - _TRASLAPE_REFRESCO).isoformat()
+        with get_db() as db:
+            filas = db.execute(
+                "SELECT * FROM indice_placas WHERE actualizado > ?", (desde,)
+            ).fetchall()
+        self.aplicar([RegistroPlaca.desde_fila(fila) for fila in filas])
+        with self._lock:
+            self._ultimo_refresco = time.monotonic()
+
+    def aplicar(self, registros):
+        """Aplica registros confirmados a la copia en memoria"""
+        with self._lock:
+            for registro in registros:
+                actual = self._placas.get(registro.placa)
+                if actual is None or registro.actualizado >= actual.actualizado:
+                    self._placas[registro.placa] = registro
+                if actual is None and self._aproximado is not None:
+                    self._indexar_aproximado(registro.placa)
+                self._marca = max(self._marca, registro.actualizado)
+
+    def _indexar_aproximado(self, placa: str):
+        self._aproximado.agregar(placa)
+        self._por_compacta[compactar(placa)] = placa
+
+    def buscar(self, placa: str) -> Optional[Dict]:
+        """
+        Busca una placa exacta (ABC-1234, abc1234 y "ABC 1234" son la misma).
+
+        Returns:
+            Dict con placa, entidad_id, lista_negra y motivo_lista_negra, o
+            None si la placa no pertenece a una entidad activa
+        """
+        normalizada = normalizar_placa(placa)
+        if normalizada is None:
+            return None
+
+        self._refrescar()
+        registro = self._placas.get(normalizada)
+        if registro is None or not registro.activo:
+            return None
+        return asdict(registro)
+
+    def buscar_aproximada(self, lectura: str, limite: int = 5) -> List[Dict]:
+        """
+        Placas activas parecidas a una lectura de cámara/OCR.
+
+        Las confusiones típicas (0/O, 8/B, 1/I, 5/S...) cuestan 0.25 y se
+        tolera además hasta max_ediciones inserciones, borrados o
+        sustituciones.
+
+        Returns:
+            Dicts como los de buscar() más distancia y confianza (0-1),
+            de la más a la menos probable
+        """
+        self._refrescar()
+        with self._lock:
+            if self._aproximado is None:
+                self._aproximado = IndiceAproximado(self.max_ediciones)
+                self._por_compacta = {}
+                for placa in self._placas:
+                    self._indexar_aproximado(placa)
+            candidatos = self._aproximado.candidatos(lectura)
+
+            resultado = []
+            for compacta, distancia in candidatos:
+                registro = self._placas.get(self._por_compacta[compacta])
+                if registro is None or not registro.activo:
+                    continue
+                resultado.append({
+                    **asdict(registro),
+                    "distancia": distancia,
+                    "confianza": confianza(lectura, compacta, distancia)
+                })
+                if len(resultado) >= limite:
+                    break
+        return resultado
+
+
+# Instancia del proceso
+indice_placas = IndicePlacas()
+
+
+def sincronizar_placa(db, entidad_id: str):
+    """
+    Actualiza el índice de placas con el estado actual de una entidad.
+
+    Llamar con la misma conexión que la escritura de la entidad, después de
+    ella, en cada alta, actualización, desactivación o reactivación, para
+    que el índice y la entidad confirmen juntos. La copia en memoria se
+    actualiza cuando la transacción confirma.
+    """
+    fila = db.execute(
+        "SELECT entidad_id, tipo, atributos, estado FROM entidades WHERE entidad_id = ?",
+        (entidad_id,)
+    ).fetchone()
+    if fila is None:
+        return
+
+    _asegurar_una_vez(db)
+    registros = _guardar_registro(db, fila['entidad_id'], fila['tipo'], fila['atributos'], fila['estado'])
+    if not registros:
+        return
+
+    if en_transaccion():
+        al_terminar_transaccion(
+            lambda exito: indice_placas.aplicar(registros) if exito else None
+        )
+    else:
+        # get_db() confirma al salir del bloque: la siguiente búsqueda lo lee
+        indice_placas.refrescar_pronto()
+
+
+_indice_asegurado = False
+_lock_indice = threading.Lock()
+
+
+def _asegurar_una_vez(db):
+    """asegurar_indice_placas una vez por proceso (init_db ya lo crea)"""
+    global _indice_asegurado
+    if not _indice_asegurado:
+        with _lock_indice:
+            if not _indice_asegurado:
+                asegurar_indice_placas(db)
+                _indice_asegurado = True
+
+
+def buscar_placa(placa: str) -> Optional[Dict]:
+    """Búsqueda exacta de una placa en el índice del proceso (ver IndicePlacas.buscar)"""
+    return indice_placas.buscar(placa)
+
+
+def buscar_placa_aproximada(lectura: str, limite: int = 5) -> List[Dict]:
+    """Candidatos para una lectura de OCR (ver IndicePlacas.buscar_aproximada)"""
+    return indice_placas.buscar_aproximada(lectura, limite)
@@ -0,0 +1,395 @@
+"""
+core/verificacion.py
+Verificación en streaming y reanudable de las cadenas hash de eventos
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.db import get_db, conexion_compartida, iterar_filas
+from core.hashing import recalcular_hash_fila
+from core.cadena import CADENA_GLOBAL, filtro_condominio
+
+# Filas por lote leído del cursor y verificado de una vez
+TAMANO_LOTE = 2000
+# Cada cuántos eventos verificados se guarda el punto de control
+GUARDAR_CADA = 10000
+# Procesos que recalculan hashes en paralelo (1 = en el proceso actual)
+VERIFICACION_TRABAJADORES = int(os.getenv('VERIFICACION_TRABAJADORES', '1'))
+
+_COLUMNAS = """
+    evento_id, entidad_id, tipo_evento, metadata, timestamp_servidor,
+    actor, dispositivo, hash_actual, hash_previo, secuencia
+"""
+
+
+# ---------------------------------------------------------
+# Puntos de control
+# ---------------------------------------------------------
+def _asegurar_tabla_puntos(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS verificacion_cadena (
+            cadena TEXT PRIMARY KEY,
+            secuencia INTEGER NOT NULL,
+            hash_actual TEXT,
+            eventos_verificados INTEGER NOT NULL DEFAULT 0,
+            timestamp TEXT NOT NULL
+        )
+    """)
+
+
+def obtener_punto_control(clave: str = CADENA_GLOBAL) -> Optional[Dict]:
+    """Último eslabón verificado de una cadena (None si nunca se verificó)"""
+    with get_db() as db:
+        _asegurar_tabla_puntos(db)
+        fila = db.execute(
+            "SELECT * FROM verificacion_cadena WHERE cadena = ?", (clave,)
+        ).fetchone()
+    return dict(fila) if fila else None
+
+
+def reiniciar_puntos_control(clave: Optional[str] = None):
+    """Borra el punto de control de una cadena (o de todas) para re-auditar desde cero"""
+    with get_db() as db:
+        _asegurar_tabla_puntos(db)
+        if clave is None:
+            db.execute("DELETE FROM verificacion_cadena")
+        else:
+            db.execute("DELETE FROM verificacion_cadena WHERE cadena = ?", (clave,))
+
+
+def _asegurar_tabla_inicios(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS cadena_inicio_archivo (
+            cadena TEXT PRIMARY KEY,
+            secuencia INTEGER NOT NULL,
+            hash_previo TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+    """)
+
+
+def obtener_inicio_archivado(clave: str = CADENA_GLOBAL) -> Optional[Dict]:
+    """
+    Primer eslabón de una cadena que sigue en la tabla viva después de
+    archivar su inicio (core/archivo.py): secuencia y el hash_previo con el
+    que debe enlazar. None si nunca se archivó nada de la cadena.
+    """
+    with get_db() as db:
+        _asegurar_tabla_inicios(db)
+        fila = db.execute(
+            "SELECT * FROM cadena_inicio_archivo WHERE cadena = ?", (clave,)
+        ).fetchone()
+    return dict(fila) if fila else None
+
+
+def registrar_inicio_archivado(db, clave: str, secuencia: int, hash_previo: str):
+    """
+    Adelanta el inicio vivo de una cadena; se llama en la transacción que
+    borra los eventos archivados. Nunca retrocede.
+    """
+    _asegurar_tabla_inicios(db)
+    db.execute("""
+        INSERT INTO cadena_inicio_archivo (cadena, secuencia, hash_previo, timestamp)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (cadena) DO UPDATE SET
+            secuencia = excluded.secuencia,
+            hash_previo = excluded.hash_previo,
+            timestamp = excluded.timestamp
+        WHERE excluded.secuencia > cadena_inicio_archivo.secuencia
+    """, (clave, secuencia, hash_previo, datetime.now().isoformat()))
+
+
+def _guardar_punto_control(clave, secuencia, hash_actual, eventos_verificados):
+    with get_db() as db:
+        db.execute("""
+            INSERT INTO verificacion_cadena (cadena, secuencia, hash_actual, eventos_verificados, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (cadena) DO UPDATE SET
+                secuencia = excluded.secuencia,
+                hash_actual = excluded.hash_actual,
+                eventos_verificados = excluded.eventos_verificados,
+                timestamp = excluded.timestamp
+        """, (clave, secuencia, hash_actual, eventos_verificados, datetime.now().isoformat()))
+
+
+# ---------------------------------------------------------
+# Verificación
+# ---------------------------------------------------------
+def _error(fila, motivo):
+    return {"evento_id": fila["evento_id"], "secuencia": fila["secuencia"], "motivo": motivo}
+
+
+def verificar_segmento(filas: List[Dict]) -> Dict:
+    """
+    Verifica un tramo contiguo de una cadena: recalcula el hash de cada fila
+    y revisa los enlaces internos. No toca la BD, así que puede correr en
+    otro proceso; el enlace de la primera fila lo revisa quien une tramos.
+
+    Returns:
+        dict con verificados (filas correctas antes del primer error),
+        primer_evento_id, primera_secuencia, primer_hash_previo,
+        ultima_secuencia, ultimo_hash y error (None o evento_id/secuencia/motivo)
+    """
+    resultado = {
+        "verificados": 0,
+        "primer_evento_id": filas[0]["evento_id"] if filas else None,
+        "primera_secuencia": filas[0]["secuencia"] if filas else None,
+        "primer_hash_previo": filas[0]["hash_previo"] if filas else None,
+        "ultima_secuencia": None,
+        "ultimo_hash": None,
+        "error": None
+    }
+
+    anterior = None
+    for fila in filas:
+        if anterior is not None:
+            if fila["secuencia"] != anterior["secuencia"] + 1:
+                resultado["error"] = _error(
+                    fila, f"Salto de secuencia ({anterior['secuencia']} -> {fila['secuencia']})"
+                )
+                break
+            if fila["hash_previo"] != anterior["hash_actual"]:
+                resultado["error"] = _error(fila, "hash_previo no coincide con el evento anterior")
+                break
+
+        try:
+            hash_calculado = recalcular_hash_fila(fila, fila["hash_previo"])
+        except (ValueError, TypeError) as e:
+            resultado["error"] = _error(fila, f"Fila ilegible: {e}")
+            break
+        if hash_calculado != fila["hash_actual"]:
+            resultado["error"] = _error(fila, "Hash recalculado no coincide (contenido alterado)")
+            break
+
+        resultado["verificados"] += 1
+        resultado["ultima_secuencia"] = fila["secuencia"]
+        resultado["ultimo_hash"] = fila["hash_actual"]
+        anterior = fila
+
+    return resultado
+
+
+def _revisar_enlace(segmento: Dict, esperado: Optional[Tuple[int, Optional[str]]]) -> Optional[Dict]:
+    """Enlace entre el último eslabón verificado y el inicio de un tramo"""
+    if esperado is None:
+        return None
+    secuencia, hash_actual = esperado
+    fila = {"evento_id": segmento["primer_evento_id"], "secuencia": segmento["primera_secuencia"]}
+    if segmento["primera_secuencia"] != secuencia + 1:
+        return _error(fila, f"Salto de secuencia ({secuencia} -> {segmento['primera_secuencia']})")
+    if segmento["primer_hash_previo"] != hash_actual:
+        return _error(fila, "hash_previo no coincide con el evento anterior")
+    return None
+
+
+def _en_lotes(filas: Iterable, tamano: int):
+    iterador = iter(filas)
+    while True:
+        lote = [dict(fila) for fila in islice(iterador, tamano)]
+        if not lote:
+            return
+        yield lote
+
+
+def _verificar_lotes(lotes, trabajadores: int = 1):
+    """
+    Verifica los lotes y regresa sus resultados en el orden de la cadena.
+
+    Con trabajadores > 1 los reparte en un pool de procesos (el SHA-256 sobre
+    JSON canónico es CPU-bound y el GIL no deja usar hilos). Se mantienen a lo
+    más dos lotes por proceso en vuelo para que la memoria no crezca con el
+    tamaño de la cadena; mientras tanto este proceso sigue leyendo de la BD.
+    """
+    if trabajadores <= 1:
+        for lote in lotes:
+            yield verificar_segmento(lote)
+        return
+
+    with ProcessPoolExecutor(max_workers=trabajadores) as pool:
+        en_vuelo = deque()
+        try:
+            for lote in lotes:
+                en_vuelo.append(pool.submit(verificar_segmento, lote))
+                if len(en_vuelo) >= trabajadores * 2:
+                    yield en_vuelo.popleft().result()
+            while en_vuelo:
+                yield en_vuelo.popleft().result()
+        finally:
+            # Si se encontró una ruptura no tiene caso terminar los demás lotes
+            for futuro in en_vuelo:
+                futuro.cancel()
+
+
+def verificar_cadena(
+    condominio_id: Optional[str] = None,
+    reanudar: bool = True,
+    tamano_lote: int = TAMANO_LOTE,
+    guardar_cada: int = GUARDAR_CADA,
+    trabajadores: int = VERIFICACION_TRABAJADORES
+) -> Dict:
+    """
+    Verifica una cadena (la de un condominio o la global) en orden de secuencia.
+
+    Lee con un cursor en streaming (del lado del servidor en PostgreSQL),
+    recalcula generar_hash_cadena por fila, revisa enlaces y saltos de
+    secuencia, y guarda el punto de control cada `guardar_cada` eventos
+    correctos. Se detiene en el primer evento corrupto.
+
+    Con trabajadores > 1 la cadena se parte en segmentos de `tamano_lote`
+    filas que se verifican en un pool de procesos; aquí solo se revisa el
+    enlace entre el final de un segmento y el inicio del siguiente.
+
+    Si el inicio de la cadena ya se movió al archivo Parquet, la
+    verificación sin punto de control arranca en el primer eslabón vivo
+    (obtener_inicio_archivado); lo archivado ya se había verificado.
+
+    Returns:
+        dict con cadena, integra, total_eventos, desde_secuencia,
+        hasta_secuencia, primer_corrupto, motivo, detalles, segundos y
+        eventos_por_segundo
+    """
+    clave = condominio_id or CADENA_GLOBAL
+    filtro, params = filtro_condominio(condominio_id)
+    inicio = time.perf_counter()
+
+    with conexion_compartida() as db:
+        _asegurar_tabla_puntos(db)
+        punto = obtener_punto_control(clave) if reanudar else None
+
+        if punto:
+            esperado = (punto["secuencia"], punto["hash_actual"])
+            verificados_antes = punto["eventos_verificados"]
+        else:
+            # Si la cadena arrancó sobre eventos legacy (sin secuencia), el
+            # primer hash_previo apunta a uno de ellos y no se puede exigir None
+            legacy = db.execute(f"""
+                SELECT COUNT(*) AS total FROM eventos
+                WHERE {filtro} AND secuencia IS NULL
+            """, params).fetchone()["total"]
+            esperado = None if legacy else (0, None)
+            verificados_antes = 0
+
+        archivado = obtener_inicio_archivado(clave)
+        if archivado and (esperado is None or esperado[0] < archivado["secuencia"] - 1):
+            esperado = (archivado["secuencia"] - 1, archivado["hash_previo"])
+        desde = esperado[0] if esperado else 0
+
+        filas = iterar_filas(db, f"""
+            SELECT {_COLUMNAS} FROM eventos
+            WHERE {filtro} AND secuencia > ?
+            ORDER BY secuencia
+        """, (*params, desde), tamano_lote)
+
+        verificados = 0
+        sin_guardar = 0
+        error = None
+        segmentos = _verificar_lotes(_en_lotes(filas, tamano_lote), trabajadores)
+        try:
+            for segmento in segmentos:
+                error = _revisar_enlace(segmento, esperado)
+                if error:
+                    break
+
+                verificados += segmento["verificados"]
+                sin_guardar += segmento["verificados"]
+                if segmento["verificados"]:
+                    esperado = (segmento["ultima_secuencia"], segmento["ultimo_hash"])
+
+                if segmento["error"]:
+                    error = segmento["error"]
+                    break
+
+                if sin_guardar >= guardar_cada:
+                    _guardar_punto_control(clave, *esperado, verificados_antes + verificados)
+                    sin_guardar = 0
+        finally:
+            segmentos.close()
+            filas.close()
+
+        if sin_guardar and esperado:
+            _guardar_punto_control(clave, *esperado, verificados_antes + verificados)
+
+    segundos = time.perf_counter() - inicio
+    hasta = esperado[0] if esperado else desde
+
+    if error:
+        detalles = (
+            f"Ruptura en cadena {clave}: evento {error['evento_id']} "
+            f"(secuencia {error['secuencia']}): {error['motivo']}"
+        )
+    elif verificados:
+        detalles = f"Cadena {clave} verificada correctamente ({verificados} eventos nuevos)"
+    else:
+        detalles = f"Cadena {clave} sin eventos nuevos que verificar"
+
+    return {
+        "cadena": clave,
+        "integra": error is None,
+        "total_eventos": verificados,
+        "desde_secuencia": desde,
+        "hasta_secuencia": hasta,
+        "primer_corrupto": error["evento_id"] if error else None,
+        "motivo": error["motivo"] if error else None,
+        "detalles": detalles,
+        "segundos": round(segundos, 3),
+        "eventos_por_segundo": round(verificados / segundos, 1) if segundos > 0 else 0.0
+    }
+
+
+def verificar_cadenas(reanudar: bool = True, **opciones) -> Dict:
+    """
+    Verifica todas las cadenas (una por condominio más la global).
+
+    Returns:
+        dict con integra, total_eventos, primer_corrupto, detalles,
+        sin_secuencia (eventos legacy no verificables), segundos,
+        eventos_por_segundo y cadenas (resultado por cadena)
+    """
+    inicio = time.perf_counter()
+
+    with get_db() as db:
+        condominios = [
+            fila["condominio_id"] for fila in db.execute("""
+                SELECT DISTINCT condominio_id FROM eventos
+                WHERE secuencia IS NOT NULL
+            """).fetchall()
+        ]
+        sin_secuencia = db.execute(
+            "SELECT COUNT(*) AS total FROM eventos WHERE secuencia IS NULL"
+        ).fetchone()["total"]
+
+    condominios.sort(key=lambda c: (c is not None, c or ""))
+    cadenas = {}
+    for condominio_id in condominios:
+        resultado = verificar_cadena(condominio_id, reanudar=reanudar, **opciones)
+        cadenas[resultado["cadena"]] = resultado
+
+    segundos = time.perf_counter() - inicio
+    total = sum(r["total_eventos"] for r in cadenas.values())
+    rotas = [r for r in cadenas.values() if not r["integra"]]
+
+    if rotas:
+        detalles = "; ".join(r["detalles"] for r in rotas)
+    elif not cadenas:
+        detalles = "No hay eventos que verificar"
+    else:
+        detalles = f"{len(cadenas)} cadenas verificadas correctamente ({total} eventos nuevos)"
+    if sin_secuencia:
+        detalles += f". {sin_secuencia} eventos legacy sin secuencia no verificables"
+
+    return {
+        "integra": not rotas,
+        "total_eventos": total,
+        "primer_corrupto": rotas[0]["primer_corrupto"] if rotas else None,
+        "detalles": detalles,
+        "sin_secuencia": sin_secuencia,
+        "segundos": round(segundos, 3),
+        "eventos_por_segundo": round(total / segundos, 1) if segundos > 0 else 0.0,
+        "cadenas": cadenas
+    }
@@ -3,111 +3,513 @@ database/migrate_sqlite_to_pg.py
 ================================
 Migra datos desde SQLite (axs.db / axs_v2.db) a PostgreSQL.
 Ejecutar solo cuando se tenga PostgreSQL configurado.
+
+La migración es en streaming: cada tabla se lee en bloques (fetchmany por
+rowid) y cada bloque se escribe con COPY a una tabla temporal y un
+INSERT ... ON CONFLICT DO NOTHING. El avance por tabla queda en
+migracion_progreso dentro de la misma transacción que el bloque, así que
+una migración interrumpida se reanuda donde quedó sin duplicar filas.
+
+Las tablas se migran por niveles según sus llaves foráneas: una tabla
+empieza cuando sus tablas padre ya terminaron, y solo las de un mismo
+nivel corren en paralelo.
+
+El destino también puede ser una conexión sqlite3 (copias locales y
+pruebas): ahí los bloques se insertan con executemany.
 """
 
-import sqlite3
+import argparse
+import io
 import os
-from database.pg_connection import get_pg_cursor, init_pg_schema
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Dict, List, Optional, Set
+
+from database.pg_connection import get_pg, init_pg_schema
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def migrate_data():
+# Rutas SQLite posibles (en orden de preferencia)
+SQLITE_PATHS = ['axs_v2.db', 'data/accesos.sqlite', 'axs.db']
+
+TABLAS = [
+    'entidades',
+    'eventos',
+    'politicas',
+    'usuarios',
+    'roles',
+    'bitacora'
+]
+
+# Filas por bloque leído de SQLite y confirmado en PostgreSQL
+MIGRACION_BLOQUE = int(os.getenv('MIGRACION_BLOQUE', '5000'))
+# Tablas que se migran al mismo tiempo
+MIGRACION_PARALELO = int(os.getenv('MIGRACION_PARALELO', '3'))
+
+
+def _encontrar_sqlite(ruta: Optional[str] = None) -> Optional[str]:
+    if ruta:
+        return ruta if os.path.exists(ruta) else None
+    for path in SQLITE_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _campo_csv(valor) -> str:
+    """Campo para COPY (FORMAT csv, NULL '\\N'): NULL sin comillas, lo demás entre comillas"""
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bytes):
+        valor = "\\x" + valor.hex()
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+def _es_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _sql(conn, query: str) -> str:
+    """Placeholders de psycopg2 (%s) -> los de sqlite3 (?) si el destino es SQLite"""
+    return query.replace("%s", "?") if _es_sqlite(conn) else query
+
+
+def _asegurar_progreso(pg_conn):
+    with closing(pg_conn.cursor()) as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS migracion_progreso (
+                origen TEXT NOT NULL,
+                tabla TEXT NOT NULL,
+                ultimo_rowid BIGINT NOT NULL DEFAULT 0,
+                filas BIGINT NOT NULL DEFAULT 0,
+                completada BOOLEAN NOT NULL DEFAULT FALSE,
+                actualizado TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (origen, tabla)
+            )
+        """)
+    pg_conn.commit()
+
+
+def _leer_progreso(pg_conn, origen: str, tabla: str) -> Dict:
+    with closing(pg_conn.cursor()) as cur:
+        cur.execute(_sql(pg_conn, """
+            SELECT ultimo_rowid, filas, completada FROM migracion_progreso
+            WHERE origen = %s AND tabla = %s
+        """), (origen, tabla))
+        fila = cur.fetchone()
+    if not fila:
+        return {"ultimo_rowid": 0, "filas": 0, "completada": False}
+    return {"ultimo_rowid": fila[0], "filas": fila[1], "completada": bool(fila[2])}
+
+
+def _guardar_progreso(pg_conn, cur, origen: str, tabla: str, ultimo_rowid: int, filas: int, completada: bool):
+    cur.execute(_sql(pg_conn, """
+        INSERT INTO migracion_progreso (origen, tabla, ultimo_rowid, filas, completada, actualizado)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (origen, tabla) DO UPDATE SET
+            ultimo_rowid = EXCLUDED.ultimo_rowid,
+            filas = EXCLUDED.filas,
+            completada = EXCLUDED.completada,
+            actualizado = CURRENT_TIMESTAMP
+    """), (origen, tabla, ultimo_rowid, filas, completada))
+
+
+def _columnas_pg(pg_conn, tabla: str) -> List[str]:
+    with closing(pg_conn.cursor()) as cur:
+        if _es_sqlite(pg_conn):
+            cur.execute(f"PRAGMA table_info({tabla})")
+            return [fila[1] for fila in cur.fetchall()]
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+        """, (tabla,))
+        return [fila[0] for fila in cur.fetchall()]
+
+
+def _dependencias(pg_conn, tablas: List[str]) -> Dict[str, Set[str]]:
+    """Tablas padre (por llave foránea) de cada tabla, limitadas a las que se migran"""
+    referencias = []
+    with closing(pg_conn.cursor()) as cur:
+        if _es_sqlite(pg_conn):
+            for tabla in tablas:
+                cur.execute(f"PRAGMA foreign_key_list({tabla})")
+                referencias += [(tabla, fila[2]) for fila in cur.fetchall()]
+        else:
+            cur.execute("""
+                SELECT hija.relname, padre.relname
+                FROM pg_constraint c
+                JOIN pg_class hija ON hija.oid = c.conrelid
+                JOIN pg_class padre ON padre.oid = c.confrelid
+                WHERE c.contype = 'f' AND hija.relnamespace = current_schema()::regnamespace
+            """)
+            referencias = cur.fetchall()
+    dependencias = {tabla: set() for tabla in tablas}
+    for hija, padre in referencias:
+        if hija in dependencias and padre in dependencias and padre != hija:
+            dependencias[hija].add(padre)
+    return dependencias
+
+
+def niveles_migracion(tablas: List[str], dependencias: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    Agrupa las tablas en niveles: cada tabla queda después de todas sus padres.
+
+    Las tablas de un nivel no dependen entre sí y pueden migrarse en
+    paralelo; el orden dentro de cada nivel respeta el de `tablas`.
+    """
+    pendientes = list(tablas)
+    listas: Set[str] = set()
+    niveles = []
+    while pendientes:
+        nivel = [t for t in pendientes if dependencias.get(t, set()) <= listas]
+        if not nivel:
+            raise ValueError(f"Llaves foráneas circulares entre: {', '.join(pendientes)}")
+        niveles.append(nivel)
+        listas.update(nivel)
+        pendientes = [t for t in pendientes if t not in listas]
+    return niveles
+
+
+def _escribir_bloque(pg_conn, cur, tabla: str, temporal: str, columnas: List[str], bloque: List):
+    """Inserta un bloque ignorando filas ya migradas (COPY + INSERT en PostgreSQL)"""
+    lista_columnas = ", ".join(columnas)
+    if _es_sqlite(pg_conn):
+        cur.executemany(
+            f"INSERT INTO {tabla} ({lista_columnas}) VALUES ({', '.join('?' for _ in columnas)}) "
+            f"ON CONFLICT DO NOTHING",
+            [fila[1:] for fila in bloque]
+        )
+        return
+
+    buffer = io.StringIO()
+    for fila in bloque:
+        buffer.write(",".join(_campo_csv(valor) for valor in fila[1:]))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {temporal} ({lista_columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+    cur.execute(f"""
+        INSERT INTO {tabla} ({lista_columnas})
+        SELECT {lista_columnas} FROM {temporal}
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def _ajustar_secuencias(pg_conn, cur, tabla: str):
+    """Lleva las secuencias SERIAL al máximo migrado (los ids vienen de SQLite)"""
+    if _es_sqlite(pg_conn):
+        return  # AUTOINCREMENT avanza solo con ids explícitos
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+          AND column_default LIKE 'nextval(%%'
+    """, (tabla,))
+    for (columna,) in cur.fetchall():
+        cur.execute(f"""
+            SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({columna}), 1))
+            FROM {tabla}
+        """, (tabla, columna))
+
+
+def migrar_tabla(
+    sqlite_path: str,
+    pg_conn,
+    tabla: str,
+    tamano_bloque: int = MIGRACION_BLOQUE
+) -> Dict:
+    """
+    Migra una tabla en bloques, reanudando desde su último bloque confirmado.
+
+    Returns:
+        Dict con tabla, filas, omitidas (columnas sin equivalente en PG),
+        reanudada_desde, segundos, filas_por_segundo y error
+    """
+    origen = os.path.abspath(sqlite_path)
+    inicio = time.perf_counter()
+    resultado = {"tabla": tabla, "filas": 0, "omitidas": [], "reanudada_desde": 0, "error": None}
+    progreso_previo = 0
+
+    # sqlite3 no comparte conexiones entre hilos: una por tabla
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    try:
+        progreso = _leer_progreso(pg_conn, origen, tabla)
+        resultado["reanudada_desde"] = progreso["ultimo_rowid"]
+        progreso_previo = progreso["filas"]
+        if progreso["completada"]:
+            resultado["filas"] = progreso["filas"]
+            return resultado
+
+        columnas_sqlite = [fila[1] for fila in sqlite_conn.execute(f"PRAGMA table_info({tabla})")]
+        if not columnas_sqlite:
+            resultado["error"] = "No existe en SQLite"
+            return resultado
+
+        columnas_pg = set(_columnas_pg(pg_conn, tabla))
+        columnas = [c for c in columnas_sqlite if c in columnas_pg]
+        resultado["omitidas"] = [c for c in columnas_sqlite if c not in columnas_pg]
+        lista_columnas = ", ".join(columnas)
+        temporal = f"_migracion_{tabla}"
+
+        if not _es_sqlite(pg_conn):
+            with closing(pg_conn.cursor()) as cur:
+                cur.execute(f"""
+                    CREATE TEMP TABLE IF NOT EXISTS {temporal}
+                    (LIKE {tabla} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+                """)
+            pg_conn.commit()
+
+        cursor_sqlite = sqlite_conn.execute(
+            f"SELECT rowid, {lista_columnas} FROM {tabla} WHERE rowid > ? ORDER BY rowid",
+            (progreso["ultimo_rowid"],)
+        )
+        filas = progreso["filas"]
+        ultimo_rowid = progreso["ultimo_rowid"]
+
+        while True:
+            bloque = cursor_sqlite.fetchmany(tamano_bloque)
+            if not bloque:
+                break
+
+            with closing(pg_conn.cursor()) as cur:
+                _escribir_bloque(pg_conn, cur, tabla, temporal, columnas, bloque)
+                filas += len(bloque)
+                ultimo_rowid = bloque[-1][0]
+                _guardar_progreso(pg_conn, cur, origen, tabla, ultimo_rowid, filas, False)
+            pg_conn.commit()
+
+        with closing(pg_conn.cursor()) as cur:
+            _ajustar_secuencias(pg_conn, cur, tabla)
+            _guardar_progreso(pg_conn, cur, origen, tabla, ultimo_rowid, filas, True)
+        pg_conn.commit()
+
+        resultado["filas"] = filas
+    except Exception as e:
+        pg_conn.rollback()
+        resultado["error"] = str(e)
+    finally:
+        sqlite_conn.close()
+
+    segundos = time.perf_counter() - inicio
+    migradas = resultado["filas"] - progreso_previo
+    resultado["segundos"] = round(segundos, 3)
+    resultado["filas_por_segundo"] = round(migradas / segundos, 1) if segundos > 0 else 0.0
+    return resultado
+
+
+# ---------------------------------------------------------
+# Validación
+# ---------------------------------------------------------
+_SQL_RUPTURAS = """
+    SELECT COUNT(*) FROM (
+        SELECT secuencia, hash_previo,
+               LAG(secuencia) OVER w AS secuencia_anterior,
+               LAG(hash_actual) OVER w AS hash_anterior
+        FROM eventos
+        WHERE secuencia IS NOT NULL
+        WINDOW w AS (PARTITION BY condominio_id ORDER BY secuencia)
+    ) t
+    WHERE secuencia_anterior IS NOT NULL
+      AND (secuencia <> secuencia_anterior + 1 OR hash_previo IS DISTINCT FROM hash_anterior)
+"""
+
+_SQL_CABEZAS = """
+    SELECT condominio_id, secuencia, hash_actual FROM (
+        SELECT condominio_id, secuencia, hash_actual,
+               ROW_NUMBER() OVER (PARTITION BY condominio_id ORDER BY secuencia DESC) AS n
+        FROM eventos
+        WHERE secuencia IS NOT NULL
+    ) t
+    WHERE n = 1
+"""
+
+
+def validar_migracion(sqlite_path: str, pg_conn, tablas: List[str] = TABLAS) -> Dict:
+    """
+    Compara conteos por tabla y la continuidad de las cadenas de eventos.
+
+    PostgreSQL puede tener más filas que SQLite (datos previos o semillas del
+    schema), pero nunca menos. En eventos se revisa que cada cadena siga
+    enlazada (secuencia consecutiva y hash_previo = hash_actual anterior) y
+    que su cabeza sea la misma en ambas bases. El recálculo completo de los
+    hashes lo hace core.hashing.verificar_cadena_integridad(reanudar=False).
+
+    Returns:
+        Dict con valida, conteos {tabla: {"sqlite", "postgres"}} y cadenas
+    """
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    conteos = {}
+    cadenas = None
+    try:
+        with closing(pg_conn.cursor()) as cur:
+            for tabla in tablas:
+                try:
+                    en_sqlite = sqlite_conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                except sqlite3.OperationalError:
+                    continue
+                cur.execute(f"SELECT COUNT(*) FROM {tabla}")
+                conteos[tabla] = {"sqlite": en_sqlite, "postgres": cur.fetchone()[0]}
+
+            columnas_eventos = [fila[1] for fila in sqlite_conn.execute("PRAGMA table_info(eventos)")]
+            if "eventos" in tablas and "secuencia" in columnas_eventos:
+                cur.execute(_SQL_RUPTURAS)
+                rupturas = cur.fetchone()[0]
+                cur.execute(_SQL_CABEZAS)
+                cabezas_pg = {fila[0]: (fila[1], fila[2]) for fila in cur.fetchall()}
+                cabezas_sqlite = {
+                    fila[0]: (fila[1], fila[2]) for fila in sqlite_conn.execute(_SQL_CABEZAS)
+                }
+                cadenas = {
+                    "rupturas": rupturas,
+                    "cadenas": len(cabezas_sqlite),
+                    "cabezas_distintas": sorted(
+                        str(c) for c in cabezas_sqlite if cabezas_pg.get(c) != cabezas_sqlite[c]
+                    )
+                }
+        pg_conn.commit()
+    finally:
+        sqlite_conn.close()
+
+    valida = all(c["postgres"] >= c["sqlite"] for c in conteos.values())
+    if cadenas:
+        valida = valida and cadenas["rupturas"] == 0 and not cadenas["cabezas_distintas"]
+
+    return {"valida": valida, "conteos": conteos, "cadenas": cadenas}
+
+
+# ---------------------------------------------------------
+# Migración
+# ---------------------------------------------------------
+def migrate_data(
+    sqlite_path: Optional[str] = None,
+    tablas: List[str] = TABLAS,
+    paralelo: int = MIGRACION_PARALELO,
+    tamano_bloque: int = MIGRACION_BLOQUE,
+    reiniciar: bool = False
+) -> bool:
     """
     Migra datos de SQLite a PostgreSQL.
-    
+
     Estrategia:
     1. Inicializa schema PostgreSQL
-    2. Lee todas las tablas de SQLite
-    3. Inserta en PostgreSQL con ON CONFLICT DO NOTHING
+    2. Migra las tablas por niveles de llaves foráneas (padres antes que
+       hijas); dentro de un nivel, hasta `paralelo` tablas a la vez, en
+       bloques de `tamano_bloque` filas, reanudando cada tabla desde su
+       último bloque confirmado
+    3. Valida conteos y continuidad de las cadenas de eventos
+
+    Args:
+        sqlite_path: Base SQLite a migrar (None = primera de SQLITE_PATHS)
+        reiniciar: Ignorar el progreso guardado y migrar desde el inicio
+
+    Returns:
+        True si todas las tablas se migraron y la validación pasó
     """
-    
-    # Rutas SQLite posibles
-    sqlite_paths = ['axs_v2.db', 'data/accesos.sqlite', 'axs.db']
-    sqlite_conn = None
-    
-    for path in sqlite_paths:
-        if os.path.exists(path):
-            print(f"📂 Encontrado: {path}")
-            sqlite_conn = sqlite3.connect(path)
-            sqlite_conn.row_factory = sqlite3.Row
-            break
-    
-    if not sqlite_conn:
+    sqlite_path = _encontrar_sqlite(sqlite_path)
+    if not sqlite_path:
         print("❌ No se encontró ninguna base SQLite para migrar")
         return False
-    
+    print(f"📂 Encontrado: {sqlite_path}")
+
     print("🔄 Iniciando migración SQLite → PostgreSQL...")
-    
+
     # 1. Inicializar schema PostgreSQL
     try:
         init_pg_schema()
     except Exception as e:
         print(f"⚠️  Schema ya existe o error: {e}")
-    
-    # 2. Migrar tablas
-    tables_to_migrate = [
-        'entidades',
-        'eventos',
-        'politicas',
-        'usuarios',
-        'roles',
-        'bitacora'
-    ]
-    
-    total_rows = 0
-    
-    for table in tables_to_migrate:
-        try:
-            # Leer de SQLite
-            cursor_sqlite = sqlite_conn.cursor()
-            cursor_sqlite.execute(f"SELECT * FROM {table}")
-            rows = cursor_sqlite.fetchall()
-            
-            if not rows:
-                print(f"  ⏭️  {table}: Sin datos")
+
+    # Conexiones PostgreSQL abiertas aquí: get_pg() parcha socket.getaddrinfo
+    # mientras conecta y no es seguro llamarlo desde varios hilos
+    conexiones = {tabla: get_pg() for tabla in tablas}
+    control = get_pg()
+    try:
+        _asegurar_progreso(control)
+        if reiniciar:
+            with closing(control.cursor()) as cur:
+                cur.execute(
+                    _sql(control, "DELETE FROM migracion_progreso WHERE origen = %s"),
+                    (os.path.abspath(sqlite_path),)
+                )
+            control.commit()
+
+        # 2. Migrar tablas: un bloque de eventos no puede confirmarse antes
+        # que las entidades que referencia
+        dependencias = _dependencias(control, tablas)
+        inicio = time.perf_counter()
+        resultados = []
+        fallidas: Set[str] = set()
+        with ThreadPoolExecutor(max_workers=max(1, paralelo)) as pool:
+            for nivel in niveles_migracion(tablas, dependencias):
+                bloqueadas = [t for t in nivel if dependencias[t] & fallidas]
+                for tabla in bloqueadas:
+                    padres = ", ".join(sorted(dependencias[tabla] & fallidas))
+                    resultados.append({"tabla": tabla, "filas": 0, "error": f"No migró su tabla padre: {padres}"})
+                resultados += pool.map(
+                    lambda tabla: migrar_tabla(sqlite_path, conexiones[tabla], tabla, tamano_bloque),
+                    [t for t in nivel if t not in bloqueadas]
+                )
+                fallidas.update(r["tabla"] for r in resultados if r["error"])
+        segundos = time.perf_counter() - inicio
+
+        total_rows = 0
+        for r in resultados:
+            if r["error"]:
+                print(f"  ❌ Error en {r['tabla']}: {r['error']}")
                 continue
-            
-            # Obtener nombres de columnas
-            columns = [description[0] for description in cursor_sqlite.description]
-            placeholders = ', '.join(['%s'] * len(columns))
-            columns_str = ', '.join(columns)
-            
-            # Insertar en PostgreSQL
-            with get_pg_cursor(dict_cursor=False) as cur_pg:
-                insert_query = f"""
-                    INSERT INTO {table} ({columns_str})
-                    VALUES ({placeholders})
-                    ON CONFLICT DO NOTHING
-                """
-                
-                for row in rows:
-                    try:
-                        cur_pg.execute(insert_query, tuple(row))
-                    except Exception as e:
-                        print(f"    ⚠️  Error en fila: {e}")
-                
-                total_rows += len(rows)
-                print(f"  ✅ {table}: {len(rows)} registros migrados")
-        
-        except Exception as e:
-            print(f"  ❌ Error en {table}: {e}")
-    
-    sqlite_conn.close()
-    print(f"\n🎉 Migración completada: {total_rows} registros totales")
-    return True
+            total_rows += r["filas"]
+            reanudada = f" (reanudada desde rowid {r['reanudada_desde']})" if r["reanudada_desde"] else ""
+            print(f"  ✅ {r['tabla']}: {r['filas']} registros, {r['filas_por_segundo']} filas/s{reanudada}")
+            if r["omitidas"]:
+                print(f"    ⚠️  Columnas sin equivalente en PostgreSQL: {', '.join(r['omitidas'])}")
+
+        print(f"\n🎉 Migración completada: {total_rows} registros totales en {segundos:.1f}s")
+
+        # 3. Validar
+        validacion = validar_migracion(sqlite_path, control, tablas)
+        for tabla, conteo in validacion["conteos"].items():
+            marca = "✅" if conteo["postgres"] >= conteo["sqlite"] else "❌"
+            print(f"  {marca} {tabla}: SQLite {conteo['sqlite']} / PostgreSQL {conteo['postgres']}")
+        cadenas = validacion["cadenas"]
+        if cadenas:
+            if cadenas["rupturas"] or cadenas["cabezas_distintas"]:
+                print(
+                    f"  ❌ Cadenas de eventos: {cadenas['rupturas']} rupturas, "
+                    f"cabezas distintas en {cadenas['cabezas_distintas']}"
+                )
+            else:
+                print(f"  ✅ {cadenas['cadenas']} cadenas de eventos continuas")
+
+        return validacion["valida"] and not any(r["error"] for r in resultados)
+    finally:
+        for conn in [*conexiones.values(), control]:
+            conn.close()
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migra SQLite → PostgreSQL en streaming")
+    parser.add_argument("--sqlite", help="Base SQLite a migrar")
+    parser.add_argument("--tablas", nargs="+", default=TABLAS, help="Tablas a migrar")
+    parser.add_argument("--paralelo", type=int, default=MIGRACION_PARALELO, help="Tablas simultáneas")
+    parser.add_argument("--bloque", type=int, default=MIGRACION_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar el progreso guardado")
+    args = parser.parse_args()
+
     # Verificar que DB_MODE sea postgres
     if os.getenv('DB_MODE') != 'postgres':
         print("❌ DB_MODE debe ser 'postgres' para migrar")
         print("   Configura en .env: DB_MODE=postgres")
         exit(1)
-    
+
     # Verificar credenciales PostgreSQL
     if not os.getenv('PG_HOST'):
         print("❌ Falta configuración PostgreSQL en .env")
         print("   Configura: PG_HOST, PG_DATABASE, PG_USER, PG_PASSWORD")
         exit(1)
-    
-    migrate_data()
+
+    ok = migrate_data(args.sqlite, args.tablas, args.paralelo, args.bloque, args.reiniciar)
+    exit(0 if ok else 1)
@@ -134,6 +134,8 @@ CREATE TABLE IF NOT EXISTS eventos (
     origen VARCHAR(100),
     contexto TEXT,
     recibo_recordia VARCHAR(200),
+    hash_previo VARCHAR(100),
+    secuencia BIGINT,
     FOREIGN KEY(msp_id) REFERENCES msps(msp_id) ON DELETE RESTRICT,
     FOREIGN KEY(condominio_id) REFERENCES condominios(condominio_id) ON DELETE RESTRICT,
     FOREIGN KEY(entidad_id) REFERENCES entidades(entidad_id)
@@ -142,9 +144,167 @@ CREATE TABLE IF NOT EXISTS eventos (
 CREATE INDEX idx_eventos_msp ON eventos(msp_id);
 CREATE INDEX idx_eventos_condominio ON eventos(condominio_id);
 CREATE INDEX idx_eventos_tipo ON eventos(tipo_evento);
+-- Únicos: un escritor con la cabeza de la cadena desactualizada no duplica la secuencia
+CREATE UNIQUE INDEX idx_eventos_cadena ON eventos(condominio_id, secuencia);
+CREATE UNIQUE INDEX idx_eventos_cadena_global ON eventos(secuencia)
+    WHERE condominio_id IS NULL AND secuencia IS NOT NULL;
+CREATE INDEX idx_eventos_recibo ON eventos(recibo_recordia);
 CREATE INDEX idx_eventos_timestamp ON eventos(timestamp_servidor);
 CREATE INDEX idx_eventos_entidad ON eventos(entidad_id);
 
+-- Tabla: anclas_cadena (hash sobre las cabezas de las cadenas por condominio)
+CREATE TABLE IF NOT EXISTS anclas_cadena (
+    ancla_id SERIAL PRIMARY KEY,
+    hash_ancla VARCHAR(100) NOT NULL,
+    hash_previo VARCHAR(100),
+    cabezas TEXT NOT NULL,
+    timestamp TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Tabla: verificacion_cadena (punto de control de la verificación por cadena)
+CREATE TABLE IF NOT EXISTS verificacion_cadena (
+    cadena TEXT PRIMARY KEY,
+    secuencia BIGINT NOT NULL,
+    hash_actual VARCHAR(100),
+    eventos_verificados BIGINT NOT NULL DEFAULT 0,
+    timestamp TEXT NOT NULL
+);
+
+-- Tabla: merkle_checkpoints (raíz Merkle de cada bloque sellado de una cadena)
+CREATE TABLE IF NOT EXISTS merkle_checkpoints (
+    cadena TEXT NOT NULL,
+    secuencia_inicio BIGINT NOT NULL,
+    secuencia_fin BIGINT NOT NULL,
+    raiz VARCHAR(64) NOT NULL,
+    hojas INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (cadena, secuencia_inicio)
+);
+
+-- Tabla: visitas_diarias (contador de eventos por entidad/día/tipo, mantenido por trigger)
+CREATE TABLE IF NOT EXISTS visitas_diarias (
+    entidad_id VARCHAR(100) NOT NULL,
+    fecha DATE NOT NULL,
+    tipo_evento VARCHAR(50) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (entidad_id, fecha, tipo_evento)
+);
+
+CREATE OR REPLACE FUNCTION actualizar_visitas_diarias()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.entidad_id IS NOT NULL AND NEW.timestamp_servidor IS NOT NULL THEN
+            INSERT INTO visitas_diarias (entidad_id, fecha, tipo_evento, total)
+            VALUES (NEW.entidad_id, NEW.timestamp_servidor::date, NEW.tipo_evento, 1)
+            ON CONFLICT (entidad_id, fecha, tipo_evento)
+            DO UPDATE SET total = visitas_diarias.total + 1;
+        END IF;
+        RETURN NEW;
+    END IF;
+    UPDATE visitas_diarias SET total = total - 1
+    WHERE entidad_id = OLD.entidad_id
+      AND fecha = OLD.timestamp_servidor::date
+      AND tipo_evento = OLD.tipo_evento;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_visitas_diarias ON eventos;
+CREATE TRIGGER trg_visitas_diarias
+    AFTER INSERT OR DELETE ON eventos
+    FOR EACH ROW
+    EXECUTE FUNCTION actualizar_visitas_diarias();
+
+-- Agregados de eventos para el dashboard (mantenidos por trigger, ver core/agregados.py)
+CREATE TABLE IF NOT EXISTS eventos_por_hora (
+    condominio_id VARCHAR(100) NOT NULL,
+    fecha DATE NOT NULL,
+    hora SMALLINT NOT NULL,
+    tipo_evento VARCHAR(50) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (condominio_id, fecha, hora, tipo_evento)
+);
+
+CREATE TABLE IF NOT EXISTS rechazos_por_motivo (
+    condominio_id VARCHAR(100) NOT NULL,
+    fecha DATE NOT NULL,
+    motivo TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (condominio_id, fecha, motivo)
+);
+
+CREATE OR REPLACE FUNCTION motivo_rechazo_evento(metadata TEXT)
+RETURNS TEXT AS $$
+BEGIN
+    RETURN COALESCE(metadata::jsonb->>'motivo_rechazo', '');
+EXCEPTION WHEN others THEN
+    RETURN '';
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION actualizar_agregados_eventos()
+RETURNS TRIGGER AS $$
+DECLARE
+    fila eventos%ROWTYPE;
+    delta INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        fila := NEW;
+        delta := 1;
+    ELSE
+        fila := OLD;
+        delta := -1;
+    END IF;
+
+    IF fila.timestamp_servidor IS NULL THEN
+        RETURN fila;
+    END IF;
+
+    INSERT INTO eventos_por_hora (condominio_id, fecha, hora, tipo_evento, total)
+    VALUES (COALESCE(fila.condominio_id, ''), fila.timestamp_servidor::date,
+            EXTRACT(HOUR FROM fila.timestamp_servidor)::smallint, fila.tipo_evento, delta)
+    ON CONFLICT (condominio_id, fecha, hora, tipo_evento)
+    DO UPDATE SET total = eventos_por_hora.total + delta;
+
+    IF fila.tipo_evento = 'rechazo' THEN
+        INSERT INTO rechazos_por_motivo (condominio_id, fecha, motivo, total)
+        VALUES (COALESCE(fila.condominio_id, ''), fila.timestamp_servidor::date,
+                motivo_rechazo_evento(fila.metadata), delta)
+        ON CONFLICT (condominio_id, fecha, motivo)
+        DO UPDATE SET total = rechazos_por_motivo.total + delta;
+    END IF;
+
+    RETURN fila;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_agregados_eventos ON eventos;
+CREATE TRIGGER trg_agregados_eventos
+    AFTER INSERT OR DELETE ON eventos
+    FOR EACH ROW
+    EXECUTE FUNCTION actualizar_agregados_eventos();
+
+-- Tabla: archivo_particiones (meses de eventos/ledger_exo movidos a Parquet, ver core/archivo.py)
+CREATE TABLE IF NOT EXISTS archivo_particiones (
+    archivo TEXT PRIMARY KEY,
+    tabla TEXT NOT NULL,
+    condominio_id TEXT NOT NULL,
+    mes TEXT NOT NULL,
+    filas INTEGER NOT NULL,
+    archivado_en TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_archivo_particiones ON archivo_particiones(tabla, condominio_id, mes);
+
+-- Tabla: cadena_inicio_archivo (primer eslabón vivo de una cadena cuyo inicio se archivó)
+CREATE TABLE IF NOT EXISTS cadena_inicio_archivo (
+    cadena TEXT PRIMARY KEY,
+    secuencia BIGINT NOT NULL,
+    hash_previo VARCHAR(100) NOT NULL,
+    timestamp TEXT NOT NULL
+);
+
 -- Tabla: visitas
 CREATE TABLE IF NOT EXISTS visitas (
     id SERIAL PRIMARY KEY,
@@ -254,6 +414,48 @@ CREATE INDEX idx_entidades_condominio ON entidades(condominio_id);
 CREATE INDEX idx_entidades_tipo ON entidades(tipo);
 CREATE INDEX idx_entidades_estado ON entidades(estado);
 
+-- Índice de búsqueda de entidades (trigramas sobre nombre/placa/folio/teléfono)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION texto_busqueda_entidad(entidad_id TEXT, tipo TEXT, atributos TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    a JSONB;
+BEGIN
+    BEGIN
+        a := atributos::jsonb;
+    EXCEPTION WHEN others THEN
+        a := '{}'::jsonb;
+    END;
+    IF a IS NULL OR jsonb_typeof(a) <> 'object' THEN
+        a := '{}'::jsonb;
+    END IF;
+    RETURN translate(lower(concat_ws(' ',
+        entidad_id, tipo,
+        a->>'nombre', a->>'identificador', a->>'placa', a->>'folio', a->>'telefono',
+        translate(a->>'identificador', '- ()', ''),
+        translate(a->>'placa', '- ()', ''),
+        translate(a->>'telefono', '- ()', '')
+    )), 'áéíóúüñàèìòù', 'aeiouunaeiou');
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS idx_entidades_busqueda ON entidades
+    USING gin (texto_busqueda_entidad(entidad_id, tipo, atributos) gin_trgm_ops);
+
+-- Tabla: indice_placas (placa normalizada -> entidad, ver core/placas.py)
+CREATE TABLE IF NOT EXISTS indice_placas (
+    placa VARCHAR(20) PRIMARY KEY,
+    entidad_id VARCHAR(100) NOT NULL,
+    lista_negra INTEGER NOT NULL DEFAULT 0,
+    motivo_lista_negra TEXT,
+    activo INTEGER NOT NULL DEFAULT 1,
+    actualizado TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_indice_placas_entidad ON indice_placas(entidad_id);
+CREATE INDEX IF NOT EXISTS idx_indice_placas_actualizado ON indice_placas(actualizado);
+
 -- Tabla: politicas (reglas AUP-EXO)
 CREATE TABLE IF NOT EXISTS politicas (
     politica_id VARCHAR(100) PRIMARY KEY,
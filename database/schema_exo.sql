@@ -58,6 +58,7 @@ CREATE TABLE IF NOT EXISTS msps_exo (
 
 CREATE INDEX idx_msps_exo_estado ON msps_exo(estado);
 CREATE INDEX idx_msps_exo_msp_id ON msps_exo(msp_id);
+CREATE INDEX idx_msps_exo_keyset ON msps_exo(created_at, msp_id);
 
 COMMENT ON TABLE msps_exo IS 'MSPs - Dominio Delegado (DD) - Resellers/Partners';
 
@@ -85,6 +86,8 @@ CREATE TABLE IF NOT EXISTS condominios_exo (
 CREATE INDEX idx_condominios_exo_msp ON condominios_exo(msp_id);
 CREATE INDEX idx_condominios_exo_estado ON condominios_exo(estado);
 CREATE INDEX idx_condominios_exo_condominio_id ON condominios_exo(condominio_id);
+CREATE INDEX idx_condominios_exo_keyset ON condominios_exo(created_at, condominio_id);
+CREATE INDEX idx_condominios_exo_msp_keyset ON condominios_exo(msp_id, created_at, condominio_id);
 
 COMMENT ON TABLE condominios_exo IS 'Condominios - Subdominio Específico (SE) - Clientes finales';
 
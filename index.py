@@ -141,6 +141,14 @@ except Exception as e:
         print(f"❌ Error inicializando: {init_error}")
         st.error(f"Error inicializando base de datos: {init_error}")
 
+# Bitácora asíncrona: recupera lo que quedó en el respaldo (una vez por
+# proceso); lo encolado se escribe al apagar el servidor vía atexit
+try:
+    from core.bitacora import iniciar_bitacora
+    iniciar_bitacora()
+except Exception as e:
+    print(f"⚠️  Bitácora asíncrona no disponible: {e}")
+
 # Inicializar session state para contexto multi-tenant
 if "msp_id" not in st.session_state:
     st.session_state["msp_id"] = None
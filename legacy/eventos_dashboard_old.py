@@ -326,7 +326,7 @@ def _render_verificacion_integridad():
     # Verificación completa
     if st.button("🔍 Verificar Integridad Completa"):
         with st.spinner("Verificando cadena de eventos..."):
-            resultado = verificar_cadena_integridad()
+            resultado = verificar_cadena_integridad(reanudar=False)
             
             if resultado['integra']:
                 st.success(f"✅ Cadena de eventos íntegra ({resultado['total_eventos']} eventos verificados)")
@@ -3,12 +3,15 @@ modulos/accesos.py
 Gestión de vehículos y control de accesos con AUP-EXO
 """
 
+import json
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from core import get_db, OrquestadorAccesos, evaluar_reglas
 from core.utils import validar_placa_mexico, generar_codigo_qr_data
+from core.placas import buscar_placa
+from core.busqueda import buscar_entidades
 
 
 def render_vehiculos():
@@ -155,7 +158,7 @@ def _render_formulario_vehiculo():
                 return
             
             resultado = validar_placa_mexico(placa)
-            if not resultado["valida"]:
+            if not resultado["valido"]:
                 st.error(f"Placa inválida: {resultado['mensaje']}")
                 return
             
@@ -319,6 +322,9 @@ def _obtener_vehiculos_filtrados(tipo: str, estado: str, lista_negra: bool, limi
 
 def _buscar_vehiculo(criterio: str, valor: str) -> List[Dict]:
     """Busca vehículo por criterio"""
+    if criterio == "placa":
+        return _buscar_vehiculo_por_placa(valor)
+
     with get_db() as conn:
         query = "SELECT * FROM entidades WHERE tipo_entidad = 'vehiculo'"
         
@@ -354,14 +360,46 @@ def _buscar_personas_por_nombre(nombre: str) -> List[Dict]:
         return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
+def _buscar_vehiculo_por_placa(placa: str) -> List[Dict]:
+    """Placa exacta por el índice de placas; si no hay, coincidencias parciales"""
+    registro = buscar_placa(placa)
+    if registro:
+        with get_db() as conn:
+            fila = conn.execute(
+                "SELECT * FROM entidades WHERE entidad_id = ?", (registro["entidad_id"],)
+            ).fetchone()
+        entidades = [dict(fila)] if fila else []
+    else:
+        entidades = [e for e in buscar_entidades(placa) if e["tipo"] == "vehiculo"]
+
+    return [_vehiculo_desde_entidad(e) for e in entidades]
+
+
+def _vehiculo_desde_entidad(entidad: Dict) -> Dict:
+    """Aplana una entidad vehículo (atributos JSON) al formato de las vistas"""
+    try:
+        atributos = json.loads(entidad.get("atributos") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        atributos = {}
+    if not isinstance(atributos, dict):
+        atributos = {}
+
+    return {
+        **atributos,
+        "id": entidad["entidad_id"],
+        "placa": atributos.get("placa") or atributos.get("identificador"),
+        "estado_mx": atributos.get("estado_mx", "N/A"),
+        "tipo": entidad["tipo"],
+        "estado": entidad["estado"],
+        "hash": entidad.get("hash_actual"),
+        "created_at": entidad.get("fecha_creacion"),
+        "lista_negra": bool(atributos.get("lista_negra")),
+    }
+
+
 def _verificar_placa_existe(placa: str) -> bool:
-    """Verifica si una placa ya existe"""
-    with get_db() as conn:
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM entidades WHERE tipo_entidad = 'vehiculo' AND placa = ?",
-            (placa,)
-        )
-        return cursor.fetchone()[0] > 0
+    """Verifica si una placa ya existe (índice de placas normalizadas)"""
+    return buscar_placa(placa) is not None
 
 
 def _obtener_vehiculos_lista_negra() -> List[Dict]:
@@ -12,67 +12,18 @@ import json
 import pandas as pd
 from datetime import datetime, timedelta
 from core.db import get_db
+from core.eventos_df import cargar_eventos_df, COLUMNAS_ANALISIS
+from core.agregados import eventos_por_dia, eventos_por_hora, eventos_por_entidad
 
 
 # ===========================================================
 # 1. Cargar eventos como DataFrame
 # ===========================================================
-def _get_eventos_df():
-    """Obtiene eventos desde la vista eventos (sin JOIN problemático)"""
-    with get_db() as db:
-        rows = db.execute("""
-            SELECT 
-                e.evento_id, 
-                e.entidad_id, 
-                e.tipo_evento, 
-                e.metadata,
-                e.actor, 
-                e.dispositivo, 
-                e.timestamp_servidor,
-                e.hash_actual,
-                '' AS tipo_entidad,
-                '{}' AS atributos
-            FROM eventos e
-            ORDER BY e.timestamp_servidor DESC
-        """).fetchall()
-
-    if not rows:
-        return pd.DataFrame()
-
-    data = []
-    for r in rows:
-        metadata = json.loads(r["metadata"]) if r["metadata"] else {}
-        atributos = json.loads(r["atributos"]) if r["atributos"] else {}
-        
-        # Extraer nombre e identificador del JSON de atributos
-        nombre = atributos.get("nombre", "N/A")
-        identificador = (atributos.get("identificador") or 
-                        atributos.get("placa") or 
-                        atributos.get("folio") or "N/A")
-
-        data.append({
-            "evento_id": r["evento_id"],
-            "entidad_id": r["entidad_id"],
-            "tipo_evento": r["tipo_evento"],
-            "nombre": nombre,
-            "identificador": identificador,
-            "tipo_entidad": r["tipo_entidad"],
-            "actor": r["actor"],
-            "dispositivo": r["dispositivo"],
-            "hora": metadata.get("hora", ""),
-            "fecha": metadata.get("fecha", ""),
-            "timestamp": r["timestamp_servidor"],
-            "motivo_rechazo": metadata.get("motivo_rechazo", ""),
-            "hash": r["hash_actual"]
-        })
-
-    df = pd.DataFrame(data)
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-    df["hora_int"] = pd.to_numeric(df["hora"].str.slice(0, 2), errors="coerce")
-
-    return df
+def _get_eventos_df(desde=None, hasta=None, condominio_id=None):
+    """Eventos con las columnas del análisis (ver core/eventos_df.py)"""
+    return cargar_eventos_df(
+        COLUMNAS_ANALISIS, desde=desde, hasta=hasta, condominio_id=condominio_id
+    )
 
 
 # ===========================================================
@@ -101,6 +52,10 @@ def comparar_t1_t0(df):
 def _variacion(df_hoy, df_ayer, tipo):
     h = df_hoy[df_hoy["tipo_evento"] == tipo].shape[0]
     a = df_ayer[df_ayer["tipo_evento"] == tipo].shape[0]
+    return _variacion_conteos(h, a)
+
+
+def _variacion_conteos(h, a):
     if a == 0:
         return 100 if h > 0 else 0
     return round(((h - a) / a) * 100, 2)
@@ -192,8 +147,8 @@ def etiquetar_eventos(df):
 # ===========================================================
 # 5. Resumen estructural de analítica
 # ===========================================================
-def resumen_analitico():
-    df = _get_eventos_df()
+def resumen_analitico(desde=None, hasta=None, condominio_id=None):
+    df = _get_eventos_df(desde, hasta, condominio_id)
 
     if df.empty:
         return {
@@ -211,3 +166,105 @@ def resumen_analitico():
         "anomalias": anomalías,
         "df_etiquetado": df_etq
     }
+
+
+# ===========================================================
+# 6. Resumen desde agregados (costo independiente del ledger)
+# ===========================================================
+def nombres_entidades(entidad_ids):
+    """{entidad_id: nombre} leyendo solo las entidades pedidas"""
+    entidad_ids = list(entidad_ids)
+    if not entidad_ids:
+        return {}
+
+    marcas = ", ".join("?" for _ in entidad_ids)
+    with get_db() as db:
+        filas = db.execute(
+            f"SELECT entidad_id, atributos FROM entidades WHERE entidad_id IN ({marcas})",
+            entidad_ids
+        ).fetchall()
+
+    nombres = {}
+    for fila in filas:
+        try:
+            atributos = json.loads(fila["atributos"]) if fila["atributos"] else {}
+        except (json.JSONDecodeError, TypeError):
+            atributos = {}
+        nombres[fila["entidad_id"]] = (atributos.get("nombre") if isinstance(atributos, dict) else None) or fila["entidad_id"]
+    return nombres
+
+
+def resumen_desde_agregados(condominio_id=None):
+    """
+    T-1 vs T0 y anomalías calculados desde eventos_por_hora y visitas_diarias
+    (core/agregados.py) en lugar de cargar todos los eventos.
+
+    Las anomalías por entidad (rechazos repetidos, actividad extrema) usan
+    visitas_diarias, que no distingue condominio.
+    """
+    hoy = datetime.now().date().isoformat()
+    ayer = (datetime.now().date() - timedelta(days=1)).isoformat()
+
+    por_dia = {}
+    for fila in eventos_por_dia(condominio_id):
+        por_dia[(fila["fecha"], fila["tipo_evento"])] = fila["total"]
+
+    if not por_dia:
+        return {"t1_t0": {}, "anomalias": []}
+
+    entradas_hoy = por_dia.get((hoy, "entrada"), 0)
+    entradas_ayer = por_dia.get((ayer, "entrada"), 0)
+    rechazos_hoy = por_dia.get((hoy, "rechazo"), 0)
+    rechazos_ayer = por_dia.get((ayer, "rechazo"), 0)
+
+    t1_t0 = {
+        "entradas_hoy": entradas_hoy,
+        "entradas_ayer": entradas_ayer,
+        "rechazos_hoy": rechazos_hoy,
+        "rechazos_ayer": rechazos_ayer,
+        "variacion_entradas": _variacion_conteos(entradas_hoy, entradas_ayer),
+        "variacion_rechazos": _variacion_conteos(rechazos_hoy, rechazos_ayer)
+    }
+
+    anomalías = []
+
+    # Actividad nocturna
+    nocturnos = sum(
+        fila["total"] for fila in eventos_por_hora(condominio_id) if 0 <= fila["hora"] <= 5
+    )
+    if nocturnos:
+        anomalías.append({
+            "tipo": "actividad_nocturna",
+            "descripcion": f"{nocturnos} eventos entre 00:00 y 05:59",
+            "nivel": "medio"
+        })
+
+    # Rechazos repetidos y entradas demasiado frecuentes por entidad
+    rechazos = eventos_por_entidad("rechazo", minimo=3, limite=50)
+    extremas = eventos_por_entidad("entrada", minimo=10, limite=50)
+    nombres = nombres_entidades({f["entidad_id"] for f in rechazos + extremas})
+    for fila in rechazos:
+        anomalías.append({
+            "tipo": "rechazos_repetidos",
+            "descripcion": f"La entidad {nombres.get(fila['entidad_id'], fila['entidad_id'])} tiene {fila['total']} rechazos.",
+            "nivel": "alto"
+        })
+    for fila in extremas:
+        anomalías.append({
+            "tipo": "actividad_extrema",
+            "descripcion": f"Actividad inusual de la entidad {nombres.get(fila['entidad_id'], fila['entidad_id'])}: {fila['total']} entradas.",
+            "nivel": "alto"
+        })
+
+    # Día atípico
+    entradas_rest = {f: t for (f, tipo), t in por_dia.items() if tipo == "entrada" and f != hoy and t > 0}
+    if entradas_rest:
+        prom_historico = sum(entradas_rest.values()) / len(entradas_rest)
+        if entradas_hoy > prom_historico * 2:
+            anomalías.append({
+                "tipo": "pico_operativo",
+                "descripcion": f"Hoy hay un pico inusual de accesos: {entradas_hoy} vs promedio histórico {round(prom_historico,2)}",
+                "nivel": "medio"
+            })
+
+    return {"t1_t0": t1_t0, "anomalias": anomalías}
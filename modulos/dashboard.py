@@ -3,67 +3,41 @@ DASHBOARD AUP-EXO
 Visualización estructural del sistema de accesos.
 """
 
-import json
 import pandas as pd
 import altair as alt
 import streamlit as st
 from datetime import datetime, date
-from core.db import get_db
-from modulos.analitica import resumen_analitico
+from core.eventos_df import cargar_eventos_df
+from core.agregados import eventos_por_dia, eventos_por_hora, eventos_por_entidad, rechazos_por_motivo
+from modulos.analitica import resumen_desde_agregados, etiquetar_eventos, nombres_entidades
 
 
 # ----------------------------------------------------
 # Helpers
 # ----------------------------------------------------
-def _get_eventos_df():
+# Columnas de la tabla de eventos del dashboard
+_COLUMNAS_EVENTOS = [
+    "evento_id", "entidad_id", "tipo_evento", "nombre", "identificador", "tipo_entidad",
+    "actor", "dispositivo", "hora", "fecha", "timestamp", "motivo_rechazo", "hash"
+]
+
+
+def _get_eventos_df(desde=None, hasta=None, condominio_id=None, limite=None):
     """Obtiene eventos desde la vista eventos (sin JOIN problemático)"""
-    with get_db() as db:
-        rows = db.execute("""
-            SELECT 
-                e.evento_id, 
-                e.entidad_id, 
-                e.tipo_evento, 
-                e.metadata,
-                e.actor, 
-                e.dispositivo, 
-                e.timestamp_servidor,
-                e.hash_actual,
-                '' AS tipo_entidad,
-                '{}' AS atributos
-            FROM eventos e
-            ORDER BY e.timestamp_servidor DESC
-        """).fetchall()
-
-    if not rows:
-        return pd.DataFrame()
-
-    data = []
-    for r in rows:
-        metadata = json.loads(r["metadata"]) if r["metadata"] else {}
-        atributos = json.loads(r["atributos"]) if r["atributos"] else {}
-        
-        # Extraer nombre e identificador del JSON de atributos
-        nombre = atributos.get("nombre", "N/A")
-        identificador = (atributos.get("identificador") or 
-                        atributos.get("placa") or 
-                        atributos.get("folio") or "N/A")
-        
-        data.append({
-            "evento_id": r["evento_id"],
-            "entidad_id": r["entidad_id"],
-            "tipo_evento": r["tipo_evento"],
-            "nombre": nombre,
-            "identificador": identificador,
-            "tipo_entidad": r["tipo_entidad"],
-            "actor": r["actor"],
-            "dispositivo": r["dispositivo"],
-            "hora": metadata.get("hora", ""),
-            "fecha": metadata.get("fecha", ""),
-            "timestamp": r["timestamp_servidor"],
-            "politica_rechazo": metadata.get("motivo_rechazo", ""),
-            "hash": r["hash_actual"]
-        })
-    return pd.DataFrame(data)
+    df = cargar_eventos_df(
+        _COLUMNAS_EVENTOS,
+        desde=desde,
+        hasta=hasta,
+        condominio_id=condominio_id,
+        limite=limite,
+        convertir_fechas=False
+    )
+    return df.rename(columns={"motivo_rechazo": "politica_rechazo"})
+
+
+def _get_eventos_recientes(limite=20):
+    """Últimos eventos (lectura acotada por el índice de timestamp)"""
+    return _get_eventos_df(limite=limite)
 
 
 # ----------------------------------------------------
@@ -72,15 +46,15 @@ def _get_eventos_df():
 def ui_dashboard():
 
     st.header("Dashboard AUP-EXO")
-    df = _get_eventos_df()
+
+    # Solo agregados (core/agregados.py): el costo no depende del tamaño del ledger
+    df = pd.DataFrame(eventos_por_dia())
 
     if df.empty:
         st.info("No hay eventos para mostrar en el dashboard.")
         return
 
-    # Convertir tipos
     df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
 
     hoy = date.today()
     df_hoy = df[df["fecha"].dt.date == hoy]
@@ -93,13 +67,13 @@ def ui_dashboard():
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.metric("Accesos Permitidos", df_hoy[df_hoy["tipo_evento"] == "entrada"].shape[0])
+        st.metric("Accesos Permitidos", int(df_hoy.loc[df_hoy["tipo_evento"] == "entrada", "total"].sum()))
 
     with col2:
-        st.metric("Accesos Rechazados", df_hoy[df_hoy["tipo_evento"] == "rechazo"].shape[0])
+        st.metric("Accesos Rechazados", int(df_hoy.loc[df_hoy["tipo_evento"] == "rechazo", "total"].sum()))
 
     with col3:
-        st.metric("Total Eventos Hoy", df_hoy.shape[0])
+        st.metric("Total Eventos Hoy", int(df_hoy["total"].sum()))
 
     # ------------------------------------------------
     # ANALÍTICA: COMPARACIÓN T-1 VS T0
@@ -108,7 +82,7 @@ def ui_dashboard():
     st.subheader("📊 Analítica Estructural")
     
     # Obtener resumen analítico
-    resumen = resumen_analitico()
+    resumen = resumen_desde_agregados()
     
     # Comparación temporal
     if resumen.get('t1_t0'):
@@ -178,9 +152,7 @@ def ui_dashboard():
     # ------------------------------------------------
     st.subheader("Accesos vs Rechazos por Día")
 
-    df_count = df.groupby(["fecha", "tipo_evento"]).size().reset_index(name="total")
-
-    chart1 = alt.Chart(df_count).mark_line(point=True).encode(
+    chart1 = alt.Chart(df).mark_line(point=True).encode(
         x="fecha:T",
         y="total:Q",
         color="tipo_evento:N",
@@ -194,10 +166,14 @@ def ui_dashboard():
     # ------------------------------------------------
     st.subheader("Top Entidades Más Activas")
 
-    top = df["nombre"].value_counts().reset_index()
-    top.columns = ["nombre", "eventos"]
+    activas = eventos_por_entidad(limite=10)
+    nombres = nombres_entidades(f["entidad_id"] for f in activas)
+    top = pd.DataFrame(
+        [(nombres.get(f["entidad_id"], f["entidad_id"]), f["total"]) for f in activas],
+        columns=["nombre", "eventos"]
+    )
 
-    st.dataframe(top.head(10))
+    st.dataframe(top)
 
     # ------------------------------------------------
     # MAPA DE CALOR POR HORA
@@ -205,13 +181,10 @@ def ui_dashboard():
     st.subheader("Mapa de calor de accesos por hora")
 
     try:
-        # Filtrar solo registros con hora válida
-        df_hora = df[df["hora"].notna() & (df["hora"] != "")].copy()
+        heat = pd.DataFrame(eventos_por_hora())
         
-        if not df_hora.empty:
-            df_hora["hora_int"] = df_hora["hora"].str.slice(0, 2).astype(int)
-
-            heat = df_hora.groupby(["hora_int", "tipo_evento"]).size().reset_index(name="conteo")
+        if not heat.empty:
+            heat = heat.rename(columns={"hora": "hora_int", "total": "conteo"})
 
             chart2 = alt.Chart(heat).mark_rect().encode(
                 x=alt.X("hora_int:O", title="Hora"),
@@ -232,10 +205,10 @@ def ui_dashboard():
     # ------------------------------------------------
     st.subheader("Comportamiento por día de la semana")
 
-    df["dia_semana"] = df["timestamp"].dt.day_name()
+    df["dia_semana"] = df["fecha"].dt.day_name()
 
     chart3 = alt.Chart(
-        df.groupby("dia_semana").size().reset_index(name="total")
+        df.groupby("dia_semana")["total"].sum().reset_index(name="total")
     ).mark_bar().encode(
         x="dia_semana:N",
         y="total:Q",
@@ -249,10 +222,9 @@ def ui_dashboard():
     # ------------------------------------------------
     st.subheader("Principales motivos de rechazo")
 
-    rechazos = df[df["tipo_evento"] == "rechazo"]
+    rc = pd.DataFrame(rechazos_por_motivo())
 
-    if not rechazos.empty:
-        rc = rechazos["politica_rechazo"].value_counts().reset_index()
+    if not rc.empty:
         rc.columns = ["motivo", "rechazos"]
 
         chart4 = alt.Chart(rc).mark_bar().encode(
@@ -271,7 +243,8 @@ def ui_dashboard():
     # ------------------------------------------------
     st.subheader("Últimos 20 eventos")
 
-    st.dataframe(df.head(20))
+    recientes = _get_eventos_recientes(20)
+    st.dataframe(recientes)
 
     # ------------------------------------------------
     # ANÁLISIS ESTRUCTURAL AUP-EXO (RAW)
@@ -279,16 +252,17 @@ def ui_dashboard():
     st.divider()
     st.subheader("Análisis estructural (AUP-EXO)")
 
-    res = resumen_analitico()
-
     st.write("## T-1 vs T0")
-    st.json(res["t1_t0"])
+    st.json(resumen["t1_t0"])
 
     st.write("## Anomalías detectadas")
-    if res["anomalias"]:
-        st.json(res["anomalias"])
+    if resumen["anomalias"]:
+        st.json(resumen["anomalias"])
     else:
         st.success("No se detectaron anomalías.")
 
     st.write("## Eventos etiquetados (riesgo)")
-    st.dataframe(res["df_etiquetado"].head(20))
+    if not recientes.empty:
+        recientes["hora_int"] = pd.to_numeric(recientes["hora"].str.slice(0, 2), errors="coerce")
+        recientes = etiquetar_eventos(recientes)
+    st.dataframe(recientes)
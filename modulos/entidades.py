@@ -9,6 +9,7 @@ import streamlit as st
 from datetime import datetime
 from core.db import get_db
 from core.hashing import hash_evento
+from core.placas import sincronizar_placa
 
 # ------------------------------------------------------------------
 # Crear una nueva entidad
@@ -69,6 +70,7 @@ def crear_entidad(tipo, nombre=None, identificador=None, atributos=None, msp_id=
             msp_id,
             condominio_id
         ))
+        sincronizar_placa(db, entidad_id)
 
     return entidad_id, entidad_hash
 
@@ -270,6 +272,7 @@ def actualizar_entidad(entidad_id, nombre=None, identificador=None, atributos=No
             nuevo_hash,
             entidad_id
         ))
+        sincronizar_placa(db, entidad_id)
 
     return nuevo_hash
 
@@ -298,6 +301,7 @@ def desactivar_entidad(entidad_id):
                 fecha_actualizacion = ?
             WHERE entidad_id = ?
         """, (timestamp, entidad_id,))
+        sincronizar_placa(db, entidad_id)
 
     return True
 
@@ -325,6 +329,7 @@ def reactivar_entidad(entidad_id):
                 fecha_actualizacion = ?
             WHERE entidad_id = ?
         """, (timestamp, entidad_id,))
+        sincronizar_placa(db, entidad_id)
 
     return True
 
@@ -7,7 +7,13 @@ Módulo para gestionar reglas que se aplican a ENTIDADES y EVENTOS.
 import json
 import streamlit as st
 from datetime import datetime
-from core.db import get_db
+from core.db import get_db, al_terminar_transaccion
+from core.motor_reglas import invalidar_politicas
+
+
+def _invalidar_plan():
+    """El motor de reglas recompila su plan en cuanto se confirme el cambio"""
+    al_terminar_transaccion(lambda exito: invalidar_politicas())
 
 
 # ---------------------------------------------------------
@@ -54,6 +60,7 @@ def crear_politica(nombre, descripcion, tipo, condiciones, prioridad=1, estado="
             created_by
         ))
     
+    _invalidar_plan()
     return politica_id
 
 
@@ -148,6 +155,7 @@ def actualizar_politica(politica_id, nombre=None, descripcion=None, tipo=None,
             politica_id
         ))
     
+    _invalidar_plan()
     return True
 
 
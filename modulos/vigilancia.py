@@ -10,10 +10,11 @@ from datetime import datetime
 from typing import List, Dict, Optional
 
 from core.db import get_db
+from core.busqueda import buscar_entidades
 from core.orquestador import OrquestadorAccesos
 from modulos.entidades import obtener_entidades, obtener_entidad_por_id
 
-orq = OrquestadorAccesos()
+orq = OrquestadorAccesos(unidad_trabajo=True)
 
 
 # ---------------------------------------------------------------------
@@ -35,38 +36,8 @@ def buscar_entidad(query: str, msp_id=None, condominio_id=None) -> List[Dict]:
     if not query or len(query) < 2:
         return []
 
-    query_like = f"%{query}%"
-    
-    # Construir query con filtrado multi-tenant
-    sql = """
-        SELECT *
-        FROM entidades
-        WHERE estado = 'activo'
-    """
-    params = []
-    
-    # Filtrado multi-tenant
-    if msp_id:
-        sql += " AND msp_id = ?"
-        params.append(msp_id)
-    
-    if condominio_id:
-        sql += " AND condominio_id = ?"
-        params.append(condominio_id)
-    
-    sql += """
-        AND (
-            entidad_id LIKE ?
-            OR tipo LIKE ?
-            OR atributos LIKE ?
-        )
-        ORDER BY fecha_creacion DESC
-        LIMIT 20
-    """
-    params.extend([query_like, query_like, query_like])
-
-    with get_db() as db:
-        rows = db.execute(sql, tuple(params)).fetchall()
+    # Índice FTS5/pg_trgm sobre nombre, placa, folio, teléfono (core/busqueda.py)
+    rows = buscar_entidades(query, msp_id=msp_id, condominio_id=condominio_id, limite=20)
 
     entidades = []
     for row in rows:
@@ -356,6 +327,7 @@ def _vista_registro_acceso():
                 # Metadata del acceso
                 metadata = {
                     "tipo_acceso": tipo_evento,
+                    "condominio_id": st.session_state.get("condominio_id"),
                     "hora": datetime.now().strftime("%H:%M:%S"),
                     "fecha": datetime.now().strftime("%Y-%m-%d"),
                     "notas": notas,
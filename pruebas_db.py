@@ -0,0 +1,67 @@
+"""
+pruebas_db.py
+Base SQLite temporal compartida por los test_*.py
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import core.db as db
+import core.agregados as agregados
+import core.archivo as archivo
+import core.busqueda as busqueda
+import core.cadena as cadena
+import core.eventos_df as eventos_df
+import core.motor_reglas as motor_reglas
+import core.placas as placas
+from core.db import init_db
+from core.bitacora import escritor_bitacora
+
+
+@contextmanager
+def archivo_temporal(sufijo: str = ".sqlite"):
+    """Ruta de un archivo temporal que se borra al salir"""
+    fd, path = tempfile.mkstemp(suffix=sufijo)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def reiniciar_estado_proceso():
+    """
+    Olvida todo lo que el proceso guarda de la base anterior: cabezas de
+    cadena, índice de placas y plan de políticas en memoria, y las marcas
+    de "esquema ya asegurado" de cada módulo.
+    """
+    cadena.cadenas_eventos.invalidar()
+    cadena._tablas_migradas.clear()
+    placas.indice_placas.invalidar()
+    placas._indice_asegurado = False
+    busqueda._indice_listo = None
+    busqueda._indice_sin_acentos = True
+    agregados._agregados_listos = None
+    archivo._manifiesto_listo = None
+    eventos_df._funcion_pg_lista = False
+    motor_reglas._conteo_visitas_listo = None
+    motor_reglas.invalidar_politicas()
+
+
+def con_db_temporal(prueba):
+    """Ejecuta la prueba contra una base SQLite temporal con el esquema AUP-EXO"""
+    with archivo_temporal() as path:
+        # La bitácora en cola pertenece a la base anterior
+        escritor_bitacora.vaciar()
+        path_original = db.DB_PATH
+        db.DB_PATH = path
+        reiniciar_estado_proceso()
+        try:
+            init_db()
+            prueba()
+        finally:
+            escritor_bitacora.vaciar()
+            db.DB_PATH = path_original
+            reiniciar_estado_proceso()
@@ -0,0 +1,116 @@
+"""
+test_agregados.py
+Testing de los agregados de eventos del dashboard (core/agregados.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+from datetime import datetime, timedelta
+
+from core.db import get_db
+from core.agregados import (
+    asegurar_agregados_eventos,
+    eventos_por_dia,
+    eventos_por_hora,
+    eventos_por_entidad,
+    rechazos_por_motivo,
+)
+from core.orquestador import OrquestadorAccesos
+from modulos.analitica import resumen_desde_agregados
+from pruebas_db import con_db_temporal
+
+
+def _insertar_eventos(eventos):
+    """Inserta (evento_id, condominio_id, entidad_id, tipo, timestamp, metadata) directo en eventos"""
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO eventos (evento_id, condominio_id, entidad_id, tipo_evento,
+                                 timestamp_servidor, metadata, hash_actual)
+            VALUES (?, ?, ?, ?, ?, ?, 'h')
+        """, eventos)
+
+
+def _agregado_desde_eventos():
+    with get_db() as conn:
+        filas = conn.execute("""
+            SELECT DATE(timestamp_servidor) AS fecha, tipo_evento, COUNT(*) AS total
+            FROM eventos GROUP BY 1, 2 ORDER BY 1, 2
+        """).fetchall()
+    return sorted((f["fecha"], f["tipo_evento"], f["total"]) for f in filas)
+
+
+def test_agregados_al_anexar():
+    """Los agregados coinciden con un GROUP BY sobre eventos tras cada append"""
+    print("\n🧪 TEST 1: Agregados mantenidos por trigger")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        for i in range(6):
+            orq.registrar_acceso(f"ENT_{i % 2}", "entrada", {"i": i}, "vigilante1", condominio_id="CONDO_A")
+        orq.registrar_acceso("ENT_9", "rechazo", {"motivo_rechazo": "Lista negra"}, "vigilante1")
+        orq.registrar_acceso("ENT_9", "rechazo", {"motivo_rechazo": "Lista negra"}, "vigilante1")
+
+        por_dia = sorted((f["fecha"], f["tipo_evento"], f["total"]) for f in eventos_por_dia())
+        assert por_dia == _agregado_desde_eventos()
+
+        hoy = datetime.now().date().isoformat()
+        condo_a = eventos_por_dia("CONDO_A")
+        assert condo_a == [{"fecha": hoy, "tipo_evento": "entrada", "total": 6}]
+        assert sum(f["total"] for f in eventos_por_hora()) == 8
+        assert rechazos_por_motivo() == [{"motivo": "Lista negra", "total": 2}]
+        assert eventos_por_entidad("rechazo", minimo=2) == [{"entidad_id": "ENT_9", "total": 2}]
+
+        with get_db() as conn:
+            conn.execute("DELETE FROM eventos WHERE tipo_evento = 'rechazo'")
+        assert rechazos_por_motivo() == []
+        assert sum(f["total"] for f in eventos_por_hora()) == 6
+        print("✅ Agregados al día en INSERT y DELETE")
+
+    con_db_temporal(prueba)
+
+
+def test_llenado_inicial_y_resumen():
+    """Los agregados se llenan desde el histórico y alimentan el resumen T-1 vs T0"""
+    print("\n🧪 TEST 2: Llenado inicial y resumen desde agregados")
+
+    def prueba():
+        hoy = datetime.now().replace(hour=10, minute=0)
+        ayer = hoy - timedelta(days=1)
+        eventos = []
+        for i in range(4):
+            eventos.append((f"EVT_H{i}", "CONDO_A", "ENT_1", "entrada", hoy.isoformat(), "{}"))
+        for i in range(2):
+            eventos.append((f"EVT_A{i}", "CONDO_A", "ENT_1", "entrada", ayer.isoformat(), "{}"))
+        eventos.append(("EVT_N", None, "ENT_2", "rechazo", hoy.replace(hour=3).isoformat(), "no json"))
+
+        # Base previa a los agregados
+        with get_db() as conn:
+            for tabla in ("eventos_por_hora", "rechazos_por_motivo"):
+                conn.execute(f"DROP TABLE {tabla}")
+                for operacion in ("insert", "delete"):
+                    conn.execute(f"DROP TRIGGER trg_{tabla}_{operacion}")
+        _insertar_eventos(eventos)
+        with get_db() as conn:
+            asegurar_agregados_eventos(conn)
+
+        assert sorted((f["fecha"], f["tipo_evento"], f["total"]) for f in eventos_por_dia()) == _agregado_desde_eventos()
+        assert rechazos_por_motivo() == [{"motivo": "", "total": 1}]
+        horas = {(f["hora"], f["tipo_evento"]): f["total"] for f in eventos_por_hora()}
+        assert horas == {(10, "entrada"): 6, (3, "rechazo"): 1}
+
+        resumen = resumen_desde_agregados()
+        assert resumen["t1_t0"]["entradas_hoy"] == 4
+        assert resumen["t1_t0"]["entradas_ayer"] == 2
+        assert resumen["t1_t0"]["variacion_entradas"] == 100.0
+        tipos = {a["tipo"] for a in resumen["anomalias"]}
+        assert "actividad_nocturna" in tipos
+        print("✅ Histórico agregado y resumen calculado sin leer eventos")
+
+    con_db_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_agregados_al_anexar()
+    test_llenado_inicial_y_resumen()
+    print("\n✅ Todos los tests de agregados pasaron")
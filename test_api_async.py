@@ -0,0 +1,394 @@
+"""
+test_api_async.py
+Testing de la capa de datos async de la API (AsyncSession en app/services)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.db_exo import Base, CondominioExo, ResidenciaExo, ResidenteExo, VisitanteExo
+from app.database.connection import crear_async_engine, get_async_db
+from app.main import app
+from app.schemas.msp import MSPCreate
+from app.schemas.condominio import CondominioCreate, CondominioUpdate
+from app.services import msp_service, condominio_service
+import app.utils.paginacion as paginacion
+from pruebas_db import archivo_temporal
+
+
+def _reiniciar_caches():
+    """Totales y estadísticas en caché pertenecen a la base anterior"""
+    condominio_service.invalidar_estadisticas()
+    condominio_service._cache_totales.clear()
+    msp_service._cache_totales.clear()
+
+
+def _con_api_temporal(prueba):
+    """Ejecuta la prueba (async) contra una base SQLite temporal con los modelos AUP-EXO"""
+    with archivo_temporal() as path:
+        url = f"sqlite:///{path}"
+
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+        async_engine = crear_async_engine(url)
+        sesiones = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+        async def get_db_prueba():
+            async with sesiones() as db:
+                yield db
+
+        async def correr():
+            try:
+                await prueba(sesiones)
+            finally:
+                await async_engine.dispose()
+
+        _reiniciar_caches()
+        app.dependency_overrides[get_async_db] = get_db_prueba
+        try:
+            asyncio.run(correr())
+        finally:
+            app.dependency_overrides.clear()
+            _reiniciar_caches()
+
+
+def _cliente():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_servicios_async():
+    """CRUD y estadísticas de MSP/condominio sobre AsyncSession"""
+    print("\n🧪 TEST 1: Servicios sobre AsyncSession")
+
+    async def prueba(sesiones):
+        async with sesiones() as db:
+            msp = await msp_service.crear_msp(db, MSPCreate(
+                msp_id="msp_async", nombre="MSP Async", max_condominios=2,
+                configuracion_json={"zona": "norte"}
+            ))
+            assert msp.created_at is not None
+            assert msp.configuracion_json == '{"zona": "norte"}'
+
+            try:
+                await msp_service.crear_msp(db, MSPCreate(msp_id="msp_async", nombre="Duplicado"))
+                assert False, "Debió rechazar el msp_id duplicado"
+            except HTTPException as e:
+                assert e.status_code == 400
+
+            for i in range(2):
+                await condominio_service.crear_condominio(db, CondominioCreate(
+                    condominio_id=f"condo_async_{i}", msp_id="msp_async",
+                    nombre=f"Condominio {i}", total_unidades=10
+                ))
+            try:
+                await condominio_service.crear_condominio(db, CondominioCreate(
+                    condominio_id="condo_async_9", msp_id="msp_async", nombre="Sin cupo"
+                ))
+                assert False, "Debió respetar max_condominios"
+            except HTTPException as e:
+                assert e.status_code == 400
+
+            db.add_all([
+                ResidenciaExo(residencia_id="res_1", condominio_id="condo_async_0", numero="1"),
+                ResidenciaExo(residencia_id="res_2", condominio_id="condo_async_0", numero="2"),
+                ResidenteExo(residente_id="rsd_1", residencia_id="res_1", nombre="Ana"),
+                ResidenteExo(residente_id="rsd_2", residencia_id="res_2", nombre="Luis"),
+                ResidenteExo(residente_id="rsd_3", residencia_id="res_2", nombre="Eva"),
+            ])
+            await db.commit()
+
+        async with sesiones() as db:
+            assert [c.condominio_id for c in await condominio_service.listar_condominios(db, msp_id="msp_async")] \
+                == ["condo_async_0", "condo_async_1"]
+            assert await condominio_service.contar_condominios(db, msp_id="msp_async", estado="activo") == 2
+
+            stats = await condominio_service.obtener_estadisticas_condominio(db, "condo_async_0")
+            assert (stats["total_residencias"], stats["total_residentes"], stats["accesos_hoy"]) == (2, 3, 0)
+
+            stats = await msp_service.obtener_estadisticas_msp(db, "msp_async")
+            assert (stats["total_condominios"], stats["condominios_disponibles"]) == (2, 0)
+
+            try:
+                await msp_service.eliminar_msp(db, "msp_async")
+                assert False, "No debe eliminar un MSP con condominios activos"
+            except HTTPException as e:
+                assert e.status_code == 400
+        print("✅ Servicios async OK")
+
+    _con_api_temporal(prueba)
+
+
+def test_endpoints_concurrentes():
+    """Los endpoints async atienden muchas requests concurrentes"""
+    print("\n🧪 TEST 2: Endpoints async concurrentes")
+
+    async def prueba(sesiones):
+        async with _cliente() as cliente:
+            r = await cliente.post("/msp/crear", json={"msp_id": "msp_api", "nombre": "MSP API"})
+            assert r.status_code == 201, r.text
+            r = await cliente.post("/condominio/crear", json={
+                "condominio_id": "condo_api", "msp_id": "msp_api", "nombre": "Condo API"
+            })
+            assert r.status_code == 201, r.text
+
+            r = await cliente.put("/condominio/condo_api", json={"nombre": "Condo API Norte"})
+            assert r.json()["nombre"] == "Condo API Norte"
+            assert (await cliente.get("/msp/no_existe")).status_code == 404
+
+            respuestas = await asyncio.gather(*[
+                cliente.get("/condominio/listar", params={"msp_id": "msp_api"}) if i % 2
+                else cliente.get("/msp/msp_api")
+                for i in range(200)
+            ])
+            assert all(r.status_code == 200 for r in respuestas)
+            assert respuestas[1].json()["total"] == 1
+        print("✅ 200 requests concurrentes respondidas")
+
+    _con_api_temporal(prueba)
+
+
+def test_estadisticas_una_consulta():
+    """Las estadísticas salen de una consulta y se cachean por condominio"""
+    print("\n🧪 TEST 3: Estadísticas en una consulta con cache TTL")
+
+    async def prueba(sesiones):
+        sentencias = []
+        event.listen(sesiones.kw["bind"].sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: sentencias.append(sql))
+
+        async with sesiones() as db:
+            await msp_service.crear_msp(db, MSPCreate(msp_id="msp_stats", nombre="MSP Stats"))
+            for condominio_id in ("condo_stats", "condo_otro"):
+                await condominio_service.crear_condominio(db, CondominioCreate(
+                    condominio_id=condominio_id, msp_id="msp_stats", nombre=condominio_id
+                ))
+            db.add_all([
+                ResidenciaExo(residencia_id=f"res_{c}_{i}", condominio_id=c, numero=str(i))
+                for c in ("condo_stats", "condo_otro") for i in range(3)
+            ] + [
+                ResidenteExo(residente_id=f"rsd_{c}_{i}", residencia_id=f"res_{c}_{i % 3}", nombre="R")
+                for c in ("condo_stats", "condo_otro") for i in range(5)
+            ] + [
+                VisitanteExo(visitante_id=f"vis_{i}", condominio_id="condo_stats",
+                             residencia_id="res_condo_stats_0", nombre="V",
+                             estado="activo" if i % 2 else "pendiente")
+                for i in range(4)
+            ])
+            await db.commit()
+
+            condominio_service.invalidar_estadisticas()
+            sentencias.clear()
+            stats = await condominio_service.obtener_estadisticas_condominio(db, "condo_stats")
+            assert len(sentencias) == 1
+            assert stats == {
+                "condominio_id": "condo_stats", "nombre": "condo_stats", "msp_id": "msp_stats",
+                "total_unidades": 0, "total_residencias": 3, "total_residentes": 5,
+                "visitantes_activos": 2, "accesos_hoy": 0, "estado": "activo"
+            }
+
+            # Segunda lectura dentro del TTL: sin ir a la base
+            assert await condominio_service.obtener_estadisticas_condominio(db, "condo_stats") == stats
+            assert len(sentencias) == 1
+
+            # Las escrituras del servicio invalidan su entrada
+            await condominio_service.actualizar_condominio(db, "condo_stats", CondominioUpdate(nombre="Norte"))
+            stats = await condominio_service.obtener_estadisticas_condominio(db, "condo_stats")
+            assert stats["nombre"] == "Norte"
+
+            try:
+                await condominio_service.obtener_estadisticas_condominio(db, "no_existe")
+                assert False, "Debió responder 404"
+            except HTTPException as e:
+                assert e.status_code == 404
+        condominio_service.invalidar_estadisticas()
+        print("✅ Una sola consulta por condominio y cache invalidada al escribir")
+
+    _con_api_temporal(prueba)
+
+
+def test_estadisticas_flota():
+    """Estadísticas de todos los condominios/MSPs en una consulta, paginadas y con ETag"""
+    print("\n🧪 TEST 4: Estadísticas de la flota")
+
+    async def prueba(sesiones):
+        sentencias = []
+        event.listen(sesiones.kw["bind"].sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: sentencias.append(sql))
+
+        async with sesiones() as db:
+            for m in range(2):
+                await msp_service.crear_msp(db, MSPCreate(msp_id=f"msp_flota_{m}", nombre=f"MSP {m}"))
+                for c in range(3):
+                    await condominio_service.crear_condominio(db, CondominioCreate(
+                        condominio_id=f"condo_flota_{m}_{c}", msp_id=f"msp_flota_{m}",
+                        nombre=f"Condominio {m}-{c}"
+                    ))
+            db.add_all([
+                ResidenciaExo(residencia_id=f"res_flota_{c}_{i}", condominio_id=f"condo_flota_0_{c}",
+                              numero=str(i))
+                for c in range(3) for i in range(c + 1)
+            ] + [
+                ResidenteExo(residente_id=f"rsd_flota_{i}", residencia_id="res_flota_2_0", nombre="R")
+                for i in range(4)
+            ])
+            await db.commit()
+
+            # Las mismas cifras que la consulta por condominio, en una sola sentencia
+            sentencias.clear()
+            flota = await condominio_service.obtener_estadisticas_flota(db, msp_id="msp_flota_0")
+            assert len(sentencias) == 1
+            assert flota["total"] == 3
+            condominio_service.invalidar_estadisticas()
+            for stats in flota["condominios"]:
+                assert stats == await condominio_service.obtener_estadisticas_condominio(
+                    db, stats["condominio_id"]
+                )
+            assert [s["total_residencias"] for s in flota["condominios"]] == [1, 2, 3]
+            assert flota["condominios"][2]["total_residentes"] == 4
+
+            # Toda la flota (super admin), paginada
+            pagina = await condominio_service.obtener_estadisticas_flota(db, skip=4, limit=4)
+            assert pagina["total"] == 6
+            assert [s["condominio_id"] for s in pagina["condominios"]] == ["condo_flota_1_1", "condo_flota_1_2"]
+            vacia = await condominio_service.obtener_estadisticas_flota(db, skip=10)
+            assert (vacia["total"], vacia["condominios"]) == (6, [])
+
+            msps = await msp_service.obtener_estadisticas_msps(db)
+            assert msps["total"] == 2
+            assert msps["msps"][0] == await msp_service.obtener_estadisticas_msp(db, "msp_flota_0")
+            assert msps["msps"][1]["condominios_activos"] == 3
+
+        async with _cliente() as cliente:
+            r = await cliente.get("/condominio/estadisticas", params={"msp_id": "msp_flota_0"})
+            assert r.status_code == 200 and r.json()["total"] == 3
+            etag = r.headers["etag"]
+            r = await cliente.get("/condominio/estadisticas", params={"msp_id": "msp_flota_0"},
+                                  headers={"If-None-Match": etag})
+            assert r.status_code == 304 and r.content == b""
+
+            await cliente.put("/condominio/condo_flota_0_0", json={"nombre": "Renombrado"})
+            r = await cliente.get("/condominio/estadisticas", params={"msp_id": "msp_flota_0"},
+                                  headers={"If-None-Match": etag})
+            assert r.status_code == 200 and r.headers["etag"] != etag
+
+            r = await cliente.get("/msp/estadisticas", params={"limit": 1})
+            assert r.json()["total"] == 2 and len(r.json()["msps"]) == 1
+        condominio_service.invalidar_estadisticas()
+        print("✅ Una consulta por página, mismas cifras que por condominio y 304 con ETag")
+
+    _con_api_temporal(prueba)
+
+
+def test_paginacion_cursor_y_exportacion():
+    """Listados por cursor (created_at, id), total opcional cacheado y exportación NDJSON"""
+    print("\n🧪 TEST 5: Paginación keyset y NDJSON")
+
+    async def prueba(sesiones):
+        sentencias = []
+        event.listen(sesiones.kw["bind"].sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: sentencias.append(sql))
+
+        async with sesiones() as db:
+            await msp_service.crear_msp(db, MSPCreate(msp_id="msp_lista", nombre="MSP Lista",
+                                                      max_condominios=100))
+            await msp_service.crear_msp(db, MSPCreate(msp_id="msp_vecino", nombre="MSP Vecino"))
+            # created_at del servidor (mismo segundo) y explícitos con microsegundos
+            for i in range(15):
+                await condominio_service.crear_condominio(db, CondominioCreate(
+                    condominio_id=f"condo_lista_{i:02d}", msp_id="msp_lista", nombre=f"Condominio {i}"
+                ))
+            inicio = datetime(2025, 1, 1, 8)
+            db.add_all([
+                CondominioExo(condominio_id=f"condo_viejo_{i:02d}", msp_id="msp_lista", nombre="Viejo",
+                              created_at=inicio + timedelta(microseconds=i // 2))
+                for i in range(10)
+            ])
+            db.add(CondominioExo(condominio_id="condo_vecino", msp_id="msp_vecino", nombre="Vecino"))
+            await db.commit()
+
+            esperado = [c.condominio_id for c in await condominio_service.listar_condominios(
+                db, msp_id="msp_lista", limit=1000
+            )]
+            assert len(esperado) == 25 and esperado[0] == "condo_viejo_00"
+
+            vistos, cursor = [], None
+            while True:
+                pagina, cursor = await condominio_service.listar_condominios_cursor(
+                    db, msp_id="msp_lista", cursor=cursor, limit=7
+                )
+                vistos += [c.condominio_id for c in pagina]
+                if not cursor:
+                    break
+            assert vistos == esperado
+
+            # Total cacheado: una sola vez por filtro hasta que una escritura lo invalida
+            sentencias.clear()
+            assert await condominio_service.contar_condominios_cacheado(db, msp_id="msp_lista") == 25
+            assert await condominio_service.contar_condominios_cacheado(db, msp_id="msp_lista") == 25
+            assert len(sentencias) == 1
+
+        async with _cliente() as cliente:
+            vistos, params = [], {"msp_id": "msp_lista", "limit": 10, "incluir_total": "false"}
+            while True:
+                r = await cliente.get("/condominio/listar", params=params)
+                cuerpo = r.json()
+                assert cuerpo["total"] is None
+                vistos += [c["condominio_id"] for c in cuerpo["condominios"]]
+                if not cuerpo["siguiente_cursor"]:
+                    break
+                params["cursor"] = cuerpo["siguiente_cursor"]
+            assert vistos == esperado
+
+            # skip sigue funcionando y respeta el mismo orden
+            r = await cliente.get("/condominio/listar", params={"msp_id": "msp_lista", "skip": 20})
+            assert [c["condominio_id"] for c in r.json()["condominios"]] == esperado[20:]
+            assert r.json()["total"] == 25
+
+            r = await cliente.get("/condominio/listar", params={"cursor": "no-es-un-cursor"})
+            assert r.status_code == 400
+
+            r = await cliente.post("/condominio/crear", json={
+                "condominio_id": "condo_lista_nuevo", "msp_id": "msp_lista", "nombre": "Nuevo"
+            })
+            assert r.status_code == 201
+            r = await cliente.get("/condominio/listar", params={"msp_id": "msp_lista", "limit": 1})
+            assert r.json()["total"] == 26
+
+            lote_original, paginacion.API_LOTE_EXPORTACION = paginacion.API_LOTE_EXPORTACION, 4
+            try:
+                r = await cliente.get("/condominio/exportar", params={"msp_id": "msp_lista"})
+            finally:
+                paginacion.API_LOTE_EXPORTACION = lote_original
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            lineas = [json.loads(linea) for linea in r.text.splitlines()]
+            assert [c["condominio_id"] for c in lineas] == esperado + ["condo_lista_nuevo"]
+
+            r = await cliente.get("/msp/listar", params={"limit": 1})
+            assert r.json()["total"] == 2 and r.json()["msps"][0]["msp_id"] == "msp_lista"
+            r = await cliente.get("/msp/listar", params={"limit": 1, "cursor": r.json()["siguiente_cursor"]})
+            assert r.json()["msps"][0]["msp_id"] == "msp_vecino" and r.json()["siguiente_cursor"] is None
+            r = await cliente.get("/msp/exportar")
+            assert [json.loads(l)["msp_id"] for l in r.text.splitlines()] == ["msp_lista", "msp_vecino"]
+        print(f"✅ {len(esperado)} condominios recorridos por cursor y exportados como NDJSON")
+
+    _con_api_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_servicios_async()
+    test_endpoints_concurrentes()
+    test_estadisticas_una_consulta()
+    test_estadisticas_flota()
+    test_paginacion_cursor_y_exportacion()
+    print("\n✅ Todos los tests de la capa async pasaron")
@@ -0,0 +1,243 @@
+"""
+test_archivo.py
+Testing del archivo Parquet de meses cerrados (core/archivo.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import core.archivo as archivo
+from core.db import get_db
+from core.cadena import cadenas_eventos
+from core.hashing import generar_hash_cadena
+from core.merkle import sellar_todas, obtener_prueba_inclusion
+from core.verificacion import verificar_cadenas, obtener_inicio_archivado
+from core.agregados import eventos_por_dia, rechazos_por_motivo
+from core.eventos_df import cargar_eventos_df
+from pruebas_db import con_db_temporal
+
+
+def _con_archivo_temporal(prueba):
+    """Ejecuta la prueba contra una base SQLite temporal y un directorio de archivo temporal"""
+    directorio = tempfile.mkdtemp()
+    directorio_original = archivo.ARCHIVO_DIR
+    archivo.ARCHIVO_DIR = directorio
+    try:
+        con_db_temporal(prueba)
+    finally:
+        archivo.ARCHIVO_DIR = directorio_original
+        shutil.rmtree(directorio)
+
+
+def _anexar(condominio_id, entidad_id, tipo_evento, timestamp, metadata):
+    """Anexa un evento encadenado con un timestamp dado (como OrquestadorAccesos.registrar_acceso)"""
+    with cadenas_eventos.anexar(condominio_id) as eslabon:
+        evento_hash, _ = generar_hash_cadena(eslabon.hash_prev, {
+            "entidad_id": entidad_id,
+            "tipo_evento": tipo_evento,
+            "metadata": metadata,
+            "timestamp_servidor": timestamp,
+            "actor": "vigilante1",
+            "dispositivo": "caseta"
+        }, timestamp)
+        with get_db() as conn:
+            conn.execute("""
+                INSERT INTO eventos (evento_id, entidad_id, tipo_evento, metadata, hash_actual,
+                                     timestamp_servidor, actor, dispositivo, hash_previo,
+                                     secuencia, condominio_id)
+                VALUES (?, ?, ?, ?, ?, ?, 'vigilante1', 'caseta', ?, ?, ?)
+            """, (f"EVT_{condominio_id}_{eslabon.secuencia}", entidad_id, tipo_evento,
+                  json.dumps(metadata), evento_hash, timestamp, eslabon.hash_prev,
+                  eslabon.secuencia, condominio_id))
+        eslabon.hash_actual = evento_hash
+
+
+def _llenar(por_condominio=120):
+    """Eventos de enero a abril de 2025 en dos condominios"""
+    inicio = datetime(2025, 1, 1, 8)
+    for i in range(por_condominio):
+        timestamp = (inicio + timedelta(days=i)).isoformat()
+        for condominio_id in ("CONDO_A", "CONDO_B"):
+            tipo = "rechazo" if i % 7 == 0 else "entrada"
+            metadata = {"nombre": f"Residente {i % 9}", "hora": f"{8 + i % 10:02d}:00"}
+            if tipo == "rechazo":
+                metadata["motivo_rechazo"] = "Lista negra"
+            _anexar(condominio_id, f"ENT_{i % 9}", tipo, timestamp, metadata)
+
+
+def _ordenado(df):
+    return df.sort_values(["timestamp", "evento_id"]).reset_index(drop=True)
+
+
+def _visitas():
+    with get_db() as conn:
+        return [tuple(f) for f in conn.execute(
+            "SELECT * FROM visitas_diarias WHERE total <> 0 ORDER BY 1, 2, 3"
+        ).fetchall()]
+
+
+def test_archivar_y_consultar():
+    """Los meses cerrados pasan a Parquet y las consultas siguen viendo lo mismo"""
+    print("\n🧪 TEST 1: Archivar meses cerrados y unir con la tabla viva")
+
+    def prueba():
+        _llenar()
+        assert verificar_cadenas()["integra"]
+        sellar_todas(tamano_bloque=10)
+
+        df_antes = cargar_eventos_df()
+        por_dia_antes = eventos_por_dia()
+        rechazos_antes = rechazos_por_motivo()
+        visitas_antes = _visitas()
+
+        resumen = archivo.archivar(meses_vivos=1, hoy=date(2025, 4, 15))
+        assert resumen["frontera"] == "2025-03-01"
+        assert resumen["filas"] == 2 * (31 + 28)
+        assert sorted((p["condominio_id"], p["mes"]) for p in resumen["particiones"]) == [
+            ("CONDO_A", "2025-01"), ("CONDO_A", "2025-02"),
+            ("CONDO_B", "2025-01"), ("CONDO_B", "2025-02"),
+        ]
+        with get_db() as conn:
+            vivos = conn.execute("SELECT COUNT(*) AS n, MIN(timestamp_servidor) AS minimo FROM eventos").fetchone()
+        assert vivos["n"] == 240 - resumen["filas"]
+        assert vivos["minimo"] >= "2025-03-01"
+
+        # Los contadores conservan la historia archivada
+        assert eventos_por_dia() == por_dia_antes
+        assert rechazos_por_motivo() == rechazos_antes
+        assert _visitas() == visitas_antes
+
+        # El cargador une archivo y tabla viva de forma transparente
+        df = cargar_eventos_df()
+        assert df["timestamp"].is_monotonic_decreasing
+        ordenado, ordenado_antes = _ordenado(df), _ordenado(df_antes)
+        for columna in ("evento_id", "nombre", "hora", "motivo_rechazo", "timestamp", "hash"):
+            assert list(ordenado[columna]) == list(ordenado_antes[columna])
+
+        febrero = cargar_eventos_df(desde="2025-02-01", hasta="2025-03-01", condominio_id="CONDO_B",
+                                    tipos_evento=["rechazo"])
+        esperado = df_antes[
+            (df_antes["timestamp"] >= pd.Timestamp("2025-02-01"))
+            & (df_antes["timestamp"] < pd.Timestamp("2025-03-01"))
+            & (df_antes["condominio_id"] == "CONDO_B") & (df_antes["tipo_evento"] == "rechazo")
+        ]
+        assert sorted(febrero["evento_id"]) == sorted(esperado["evento_id"])
+        assert len(cargar_eventos_df(limite=500)) == 240
+        assert len(cargar_eventos_df(incluir_archivo=False)) == vivos["n"]
+
+        # La cadena se sigue verificando y anexando sobre lo que quedó vivo
+        _anexar("CONDO_A", "ENT_1", "entrada", datetime(2025, 4, 30, 9).isoformat(), {})
+        assert verificar_cadenas()["integra"]
+
+        # Correr de nuevo no mueve nada más
+        assert archivo.archivar(meses_vivos=1, hoy=date(2025, 4, 15))["filas"] == 0
+        print(f"✅ {resumen['filas']} eventos en {len(resumen['particiones'])} particiones, "
+              f"{len(df)} eventos consultables")
+
+    _con_archivo_temporal(prueba)
+
+
+def test_limites_del_archivado():
+    """Sin verificar no se archiva, la cabeza se queda viva y un archivo huérfano no se lee"""
+    print("\n🧪 TEST 2: Límites del archivado")
+
+    def prueba():
+        inicio = datetime(2025, 1, 10, 8)
+        for i in range(12):
+            _anexar("CONDO_C", "ENT_1", "entrada", (inicio + timedelta(days=i)).isoformat(), {})
+
+        # Cadena sin punto de control de verificación: no se toca
+        assert archivo.archivar(meses_vivos=0, hoy=date(2025, 6, 1))["filas"] == 0
+
+        verificar_cadenas()
+        sellar_todas(tamano_bloque=4)
+        resumen = archivo.archivar(meses_vivos=0, hoy=date(2025, 6, 1))
+        # Bloques sellados 1-4, 5-8 y 9-12, pero la cabeza (12) se queda viva
+        assert resumen["filas"] == 11
+        with get_db() as conn:
+            assert conn.execute("SELECT secuencia FROM eventos").fetchall()[0]["secuencia"] == 12
+
+        # Un Parquet que no llegó al manifiesto no aparece en las consultas
+        huerfano = os.path.join(archivo.ARCHIVO_DIR, "eventos", "condominio_id=CONDO_C", "mes=2025-01")
+        shutil.copy(
+            os.path.join(archivo.ARCHIVO_DIR, resumen["particiones"][0]["archivo"]),
+            os.path.join(huerfano, "huerfano.parquet")
+        )
+        assert len(cargar_eventos_df()) == 12
+
+        # ledger_exo se archiva por condominio/mes sin reglas de cadena
+        with get_db() as conn:
+            conn.execute("""
+                CREATE TABLE ledger_exo (
+                    ledger_id TEXT PRIMARY KEY, usuario_id TEXT, msp_id TEXT,
+                    condominio_id TEXT, accion TEXT, timestamp TEXT
+                )
+            """)
+            conn.executemany("INSERT INTO ledger_exo VALUES (?, 'u1', 'MSP_1', ?, 'login', ?)", [
+                (f"LED_{i}", "CONDO_C" if i % 2 else None, f"2025-0{1 + i % 3}-15T10:00:00")
+                for i in range(9)
+            ])
+        resumen = archivo.archivar(["ledger_exo"], meses_vivos=0, hoy=date(2025, 3, 20))
+        assert resumen["filas"] == 6
+        ledger = archivo.leer_archivo("ledger_exo", ["ledger_id", "condominio_id"])
+        assert sorted(ledger.column("ledger_id").to_pylist()) == sorted(
+            f"LED_{i}" for i in range(9) if i % 3 != 2
+        )
+        print("✅ Solo se archiva lo verificado y sellado, sin la cabeza de la cadena")
+
+    _con_archivo_temporal(prueba)
+
+
+def test_cadena_tras_archivar():
+    """La verificación completa y las pruebas de inclusión sobreviven al archivado"""
+    print("\n🧪 TEST 3: Cadena y pruebas de inclusión con el inicio archivado")
+
+    def prueba():
+        _llenar(por_condominio=60)
+        verificar_cadenas()
+        sellar_todas(tamano_bloque=8)
+        resumen = archivo.archivar(meses_vivos=0, hoy=date(2025, 2, 15))
+        # Enero (secuencias 1-31) ya está verificado y sellado
+        assert resumen["filas"] == 2 * 31
+
+        inicio = obtener_inicio_archivado("CONDO_A")
+        assert inicio["secuencia"] == 32
+        with get_db() as conn:
+            enlace = conn.execute(
+                "SELECT hash_previo FROM eventos WHERE condominio_id = 'CONDO_A' AND secuencia = 32"
+            ).fetchone()["hash_previo"]
+        assert inicio["hash_previo"] == enlace
+
+        completa = verificar_cadenas(reanudar=False)
+        assert completa["integra"], completa["detalles"]
+        assert completa["cadenas"]["CONDO_A"]["desde_secuencia"] == 31
+
+        # Bloque 25-32: ocho hojas, siete archivadas y una viva
+        for secuencia in (1, 26, 32):
+            prueba_inclusion = obtener_prueba_inclusion(f"EVT_CONDO_A_{secuencia}")
+            assert prueba_inclusion and prueba_inclusion["valida"], secuencia
+            assert prueba_inclusion["secuencia"] == secuencia
+        assert obtener_prueba_inclusion("EVT_CONDO_X_1") is None
+
+        # Alterar lo vivo se sigue detectando desde el inicio archivado
+        with get_db() as conn:
+            conn.execute("UPDATE eventos SET actor = 'otro' WHERE evento_id = 'EVT_CONDO_B_40'")
+        assert not verificar_cadenas(reanudar=False)["integra"]
+        print("✅ Verificación completa íntegra y pruebas de inclusión desde el archivo")
+
+    _con_archivo_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_archivar_y_consultar()
+    test_limites_del_archivado()
+    test_cadena_tras_archivar()
+    print("\n✅ Todos los tests del archivo histórico pasaron")
@@ -0,0 +1,154 @@
+"""
+test_busqueda.py
+Testing del índice de búsqueda de entidades (core/busqueda.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import time
+
+import core.busqueda as busqueda
+from core.db import get_db
+from core.busqueda import buscar_entidades, reconstruir_indice_busqueda
+from core.orquestador import OrquestadorAccesos
+from modulos.entidades import actualizar_entidad, desactivar_entidad
+from pruebas_db import con_db_temporal
+
+
+def _ids(resultados):
+    return {r["entidad_id"] for r in resultados}
+
+
+def test_busqueda_por_campos_normalizados():
+    """Nombre sin acentos, placa con o sin guion, teléfono solo dígitos"""
+    print("\n🧪 TEST 1: Búsqueda por nombre, placa, folio y teléfono")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        persona = orq.crear_entidad("persona", {
+            "nombre": "José Pérez Núñez", "telefono": "(55) 1234-5678", "folio": "F-0042"
+        }, created_by="admin")["entidad_id"]
+        vehiculo = orq.crear_entidad("vehiculo", {
+            "placa": "ABC-123-D", "nombre": "Sedán gris"
+        }, created_by="admin")["entidad_id"]
+
+        assert _ids(buscar_entidades("jose perez")) == {persona}
+        assert _ids(buscar_entidades("NÚÑEZ")) == {persona}
+        assert _ids(buscar_entidades("5512345678")) == {persona}
+        assert _ids(buscar_entidades("F-0042")) == {persona}
+        assert _ids(buscar_entidades("abc123d")) == {vehiculo}
+        assert _ids(buscar_entidades("ABC-123")) == {vehiculo}
+        assert _ids(buscar_entidades("vehiculo")) == {vehiculo}
+        # Palabras cortas (sin trigramas) también filtran
+        assert _ids(buscar_entidades("José 55")) == {persona}
+        assert buscar_entidades("inexistente") == []
+        print("✅ Campos normalizados encontrados")
+
+    con_db_temporal(prueba)
+
+
+def test_indice_sincronizado():
+    """Actualizar y desactivar entidades se refleja en el índice"""
+    print("\n🧪 TEST 2: El índice sigue a entidades")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        entidad_id = orq.crear_entidad("persona", {"nombre": "Carlos Ruiz"}, created_by="admin")["entidad_id"]
+        assert _ids(buscar_entidades("carlos")) == {entidad_id}
+
+        actualizar_entidad(entidad_id, nombre="Carla Ruiz")
+        assert buscar_entidades("carlos") == []
+        assert _ids(buscar_entidades("carla")) == {entidad_id}
+
+        desactivar_entidad(entidad_id)
+        assert buscar_entidades("carla") == []
+
+        with get_db() as conn:
+            conn.execute("DELETE FROM entidades WHERE entidad_id = ?", (entidad_id,))
+            restantes = conn.execute("SELECT COUNT(*) FROM entidades_busqueda").fetchone()[0]
+        assert restantes == 0
+
+        reconstruir_indice_busqueda()
+        print("✅ Índice sincronizado en insert/update/delete")
+
+    con_db_temporal(prueba)
+
+
+def test_busqueda_volumen():
+    """La búsqueda usa el índice y no recorre la tabla"""
+    print("\n🧪 TEST 3: Búsqueda sobre 20,000 entidades")
+
+    def prueba():
+        with get_db() as conn:
+            conn.executemany("""
+                INSERT INTO entidades (entidad_id, tipo, atributos, hash_actual, estado,
+                                       fecha_creacion, fecha_actualizacion)
+                VALUES (?, 'persona', ?, 'h', 'activo', ?, ?)
+            """, [
+                (f"ENT_{i:06d}", f'{{"nombre": "Residente {i}", "placa": "P{i:05d}X"}}',
+                 "2025-01-01", "2025-01-01")
+                for i in range(20000)
+            ])
+
+        inicio = time.perf_counter()
+        resultados = buscar_entidades("p12345x")
+        duracion = (time.perf_counter() - inicio) * 1000
+
+        assert _ids(resultados) == {"ENT_012345"}
+        with get_db() as conn:
+            plan = " ".join(
+                str(tuple(fila)) for fila in conn.execute("""
+                    EXPLAIN QUERY PLAN
+                    SELECT entidad_id FROM entidades_busqueda WHERE entidades_busqueda MATCH '"p12345x"'
+                """).fetchall()
+            )
+        assert "VIRTUAL TABLE" in plan
+        print(f"✅ 1 resultado en {duracion:.1f} ms")
+
+    con_db_temporal(prueba)
+
+
+def _con_tokenizadores(tokenizadores, prueba):
+    """Simula un SQLite que solo soporta `tokenizadores` (los demás fallan al crear la tabla)"""
+    originales = busqueda.TOKENIZADORES_FTS
+    busqueda.TOKENIZADORES_FTS = tokenizadores
+    try:
+        con_db_temporal(prueba)
+    finally:
+        busqueda.TOKENIZADORES_FTS = originales
+
+
+def test_sqlite_sin_remove_diacritics():
+    """Sin remove_diacritics (SQLite < 3.45) se usa trigram; sin trigram, LIKE"""
+    print("\n🧪 TEST 4: Tokenizer según la versión de SQLite")
+
+    def solo_trigram():
+        orq = OrquestadorAccesos()
+        persona = orq.crear_entidad("persona", {"nombre": "José Ruiz"}, created_by="admin")["entidad_id"]
+        with get_db() as conn:
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'entidades_busqueda'").fetchone()[0]
+        assert "remove_diacritics" not in sql
+        assert _ids(buscar_entidades("José ruiz")) == {persona}
+        assert _ids(buscar_entidades("ABC")) == set()
+        print("✅ trigram sin remove_diacritics")
+
+    def sin_trigram():
+        orq = OrquestadorAccesos()
+        persona = orq.crear_entidad("persona", {"nombre": "Carlos Ruiz"}, created_by="admin")["entidad_id"]
+        with get_db() as conn:
+            assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'entidades_busqueda'").fetchone() is None
+        assert _ids(buscar_entidades("Ruiz")) == {persona}
+        reconstruir_indice_busqueda()
+        print("✅ init_db sin FTS5 trigram y búsqueda con LIKE")
+
+    _con_tokenizadores(("no_existe remove_diacritics 1", "trigram"), solo_trigram)
+    _con_tokenizadores(("no_existe",), sin_trigram)
+
+
+if __name__ == "__main__":
+    test_busqueda_por_campos_normalizados()
+    test_indice_sincronizado()
+    test_busqueda_volumen()
+    test_sqlite_sin_remove_diacritics()
+    print("\n✅ Todos los tests de búsqueda pasaron")
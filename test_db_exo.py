@@ -0,0 +1,195 @@
+"""
+test_db_exo.py
+Testing de la ingesta masiva del ledger en DatabaseExo (core/db_exo.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import os
+import sqlite3
+import tempfile
+
+import core.db_exo as db_exo
+from core.db_exo import DatabaseExo, _valor_csv, _a_parametros_pg, _ejecutar_preparada
+from core.exo_hierarchy import ContextoUsuario, ControlAccesoExo, RolExo
+
+
+def _db_exo_temporal():
+    """DatabaseExo sobre un SQLite temporal con la tabla ledger_exo"""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE ledger_exo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id TEXT UNIQUE NOT NULL,
+            usuario_id TEXT,
+            msp_id TEXT,
+            condominio_id TEXT,
+            accion TEXT NOT NULL,
+            entidad TEXT NOT NULL,
+            entidad_id TEXT,
+            detalle TEXT,
+            ip_origen TEXT,
+            user_agent TEXT,
+            timestamp TEXT
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+    db = DatabaseExo(db_type="sqlite")
+    db.db_path = path
+    return db
+
+
+def test_ingesta_masiva_sqlite():
+    """registrar_auditoria_lote inserta un generador completo en una transacción"""
+    print("\n🧪 TEST 1: Ingesta masiva del ledger (SQLite)")
+    print("-" * 60)
+
+    db = _db_exo_temporal()
+    try:
+        usuario = ContextoUsuario(
+            usuario_id="USR-1", nombre="Admin", email="admin@axs.com",
+            rol=RolExo.CONDOMINIO_ADMIN, msp_id="MSP-1", condominio_id="CONDO-1"
+        )
+        registros = (
+            {"accion": "ACCESS", "entidad": "accesos_exo", "entidad_id": f"ACC-{i}",
+             "detalle": f'{{"gate": "{i % 3}"}}'}
+            for i in range(2500)
+        )
+        resultado = db.registrar_auditoria_lote(registros, usuario=usuario, tamano_lote=1000)
+        assert resultado["filas"] == 2500 and resultado["metodo"] == "executemany"
+        assert resultado["filas_por_segundo"] > 0
+
+        fila = db.execute_query(
+            "SELECT COUNT(*) AS total, COUNT(DISTINCT ledger_id) AS ids, MIN(condominio_id) AS condo FROM ledger_exo",
+            fetch="one"
+        )
+        assert fila == {"total": 2500, "ids": 2500, "condo": "CONDO-1"}
+
+        # Un registro inválido revierte el lote completo
+        try:
+            db.registrar_auditoria_lote([{"accion": "ACCESS", "entidad": "x"}, {"accion": "ACCESS"}])
+            raise AssertionError("Se aceptó un registro sin entidad")
+        except ValueError:
+            pass
+        assert db.execute_query("SELECT COUNT(*) AS total FROM ledger_exo", fetch="one")["total"] == 2500
+        print(f"✅ {resultado['filas']} filas a {resultado['filas_por_segundo']} filas/s")
+    finally:
+        os.remove(db.db_path)
+
+
+def test_formato_copy():
+    """Campos para COPY: NULL sin comillas y comillas escapadas"""
+    print("\n🧪 TEST 2: Formato CSV de COPY")
+    print("-" * 60)
+
+    assert _valor_csv(None) == "\\N"
+    assert _valor_csv("") == '""'
+    assert _valor_csv('dijo "hola", adiós\n') == '"dijo ""hola"", adiós\n"'
+    assert _valor_csv("\\N") == '"\\N"'
+    print("✅ NULL y texto se distinguen en el CSV")
+
+
+def test_query_con_contexto_parametrizada():
+    """El filtro jerárquico y el LIMIT van como parámetros: un solo texto SQL por nivel"""
+    print("\n🧪 TEST 3: query_con_contexto con parámetros ligados")
+    print("-" * 60)
+
+    db = _db_exo_temporal()
+    try:
+        db.registrar_auditoria_lote(
+            {"accion": "ACCESS" if i % 2 else "LOGIN", "entidad": "accesos_exo",
+             "msp_id": f"MSP-{i % 2}", "condominio_id": f"CONDO-{i % 4}"}
+            for i in range(40)
+        )
+        queries = []
+        execute_query = db.execute_query
+        db.execute_query = lambda query, params=None, **kw: queries.append((query, params)) or \
+            execute_query(query, params, **kw)
+
+        def admin(msp_id, condominio_id=None):
+            return ContextoUsuario(
+                usuario_id="USR-1", nombre="Admin", email="admin@axs.com",
+                rol=RolExo.CONDOMINIO_ADMIN if condominio_id else RolExo.MSP_ADMIN,
+                msp_id=msp_id, condominio_id=condominio_id
+            )
+
+        filas = db.query_con_contexto(admin("MSP-1", "CONDO-3"), "ledger_exo", "msp_id, condominio_id, accion",
+                                      condiciones_extra="accion = ?", params=("ACCESS",), limit=4)
+        assert len(filas) == 4
+        assert {(f["msp_id"], f["condominio_id"], f["accion"]) for f in filas} == {("MSP-1", "CONDO-3", "ACCESS")}
+        db.query_con_contexto(admin("MSP-0", "CONDO-2"), "ledger_exo", "msp_id, condominio_id, accion",
+                              condiciones_extra="accion = ?", params=("LOGIN",), limit=4)
+        assert len(db.query_con_contexto(admin("MSP-0"), "ledger_exo")) == 20
+
+        # Dos tenants del mismo nivel: mismo texto, distintos parámetros
+        (texto_1, params_1), (texto_2, params_2), _ = queries
+        assert texto_1 == texto_2 and "MSP-" not in texto_1
+        assert params_1 == ("MSP-1", "CONDO-3", "ACCESS", 4) and params_2 == ("MSP-0", "CONDO-2", "LOGIN", 4)
+
+        # Un ID con comillas es un valor, no SQL
+        assert db.query_con_contexto(admin("MSP-1' OR '1'='1"), "ledger_exo") == []
+        try:
+            db.query_con_contexto(admin("MSP-1"), "ledger_exo; DROP TABLE ledger_exo")
+            raise AssertionError("Se aceptó un nombre de tabla inválido")
+        except ValueError:
+            pass
+
+        super_admin = ContextoUsuario(usuario_id="SA", nombre="Super", email="sa@axs.com", rol=RolExo.SUPER_ADMIN)
+        assert ControlAccesoExo.obtener_filtro_parametrizado(super_admin) == ("1=1", ())
+        assert len(db.query_con_contexto(super_admin, "ledger_exo", limit=7)) == 7
+        print("✅ Mismo SQL para todos los tenants de un nivel, IDs solo como parámetros")
+    finally:
+        os.remove(db.db_path)
+
+
+def test_sentencias_preparadas_pg():
+    """En PostgreSQL cada texto se prepara una vez por conexión y luego solo se ejecuta"""
+    print("\n🧪 TEST 4: PREPARE/EXECUTE por conexión")
+    print("-" * 60)
+
+    assert _a_parametros_pg("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' LIMIT %s") == \
+        "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' LIMIT $2"
+
+    class Conexion:
+        preparadas = {}
+
+    class Cursor:
+        def __init__(self):
+            self.ejecutadas = []
+
+        def execute(self, query, params=None):
+            self.ejecutadas.append((query, params))
+
+    conn, cursor = Conexion(), Cursor()
+    query = "SELECT * FROM ledger_exo WHERE msp_id = %s LIMIT %s"
+    _ejecutar_preparada(conn, cursor, query, ("MSP-1", 10))
+    _ejecutar_preparada(conn, cursor, query, ("MSP-2", 10))
+    assert cursor.ejecutadas == [
+        ("PREPARE exo_1 AS SELECT * FROM ledger_exo WHERE msp_id = $1 LIMIT $2", None),
+        ("EXECUTE exo_1 (%s, %s)", ("MSP-1", 10)),
+        ("EXECUTE exo_1 (%s, %s)", ("MSP-2", 10)),
+    ]
+
+    # Al llegar al máximo se liberan todas antes de preparar la siguiente
+    maximo_original, db_exo.EXO_MAX_PREPARADAS = db_exo.EXO_MAX_PREPARADAS, 1
+    try:
+        _ejecutar_preparada(conn, cursor, "SELECT 1", ())
+    finally:
+        db_exo.EXO_MAX_PREPARADAS = maximo_original
+    assert cursor.ejecutadas[3:] == [("DEALLOCATE ALL", None), ("PREPARE exo_1 AS SELECT 1", None),
+                                     ("EXECUTE exo_1", None)]
+    assert conn.preparadas == {"SELECT 1": "exo_1"}
+    print("✅ Una preparación por texto y conexión")
+
+
+if __name__ == "__main__":
+    test_ingesta_masiva_sqlite()
+    test_formato_copy()
+    test_query_con_contexto_parametrizada()
+    test_sentencias_preparadas_pg()
+    print("\n✅ Todos los tests de db_exo pasaron")
@@ -0,0 +1,254 @@
+"""
+test_db_pool.py
+Testing del pool de conexiones y del modo de conexión compartida (core/db.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import core.db as db
+from core.db import PoolConexiones, get_db, conexion_compartida, transaccion
+
+
+def _db_temporal():
+    """Crea una base SQLite temporal y apunta core.db hacia ella"""
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE prueba (valor TEXT)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_pool_reutiliza_conexiones():
+    """El pool entrega la misma conexión física si sigue sana"""
+    print("\n🧪 TEST 1: Reutilización del pool")
+    print("-" * 60)
+
+    pool = PoolConexiones(lambda: sqlite3.connect(":memory:", check_same_thread=False), max_conexiones=2)
+
+    c1 = pool.adquirir()
+    pool.liberar(c1)
+    c2 = pool.adquirir()
+    pool.liberar(c2)
+
+    assert c1 is c2
+    assert pool.estadisticas["creadas"] == 1
+    assert pool.estadisticas["reutilizadas"] == 1
+    print("✅ Una sola conexión creada para dos checkouts")
+
+    pool.cerrar_todo()
+    assert pool.ociosas == 0
+
+
+def test_pool_descarta_conexiones_dañadas():
+    """Conexiones que fallan el health check no se reutilizan"""
+    print("\n🧪 TEST 2: Health check")
+    print("-" * 60)
+
+    pool = PoolConexiones(
+        lambda: sqlite3.connect(":memory:", check_same_thread=False),
+        max_conexiones=2,
+        verificar=lambda conn: False,
+        ping_segundos=0
+    )
+
+    c1 = pool.adquirir()
+    pool.liberar(c1)
+    c2 = pool.adquirir()
+    pool.liberar(c2, descartar=True)
+
+    assert c1 is not c2
+    assert pool.estadisticas["creadas"] == 2
+    assert pool.estadisticas["descartadas"] == 2
+    print("✅ Conexión dañada descartada y reemplazada")
+
+
+def test_pool_limite_conexiones():
+    """Con el pool agotado, adquirir() espera y luego falla"""
+    print("\n🧪 TEST 3: Límite del pool")
+    print("-" * 60)
+
+    pool = PoolConexiones(lambda: sqlite3.connect(":memory:", check_same_thread=False), max_conexiones=1, timeout=0.05)
+    c1 = pool.adquirir()
+
+    try:
+        pool.adquirir()
+        assert False, "Debió agotarse el pool"
+    except TimeoutError:
+        print("✅ TimeoutError al agotar el pool")
+
+    pool.liberar(c1)
+    pool.liberar(pool.adquirir())
+
+
+def test_conexion_compartida_reutiliza_en_get_db():
+    """Dentro de conexion_compartida() todos los get_db() usan la misma conexión"""
+    print("\n🧪 TEST 4: Conexión compartida por hilo")
+    print("-" * 60)
+
+    path_original = db.DB_PATH
+    db.DB_PATH = _db_temporal()
+    try:
+        with conexion_compartida() as compartida:
+            with get_db() as c1:
+                c1.execute("INSERT INTO prueba VALUES ('a')")
+            with get_db() as c2:
+                c2.execute("INSERT INTO prueba VALUES ('b')")
+            assert c1 is compartida and c2 is compartida
+
+            # Otro hilo no ve la conexión compartida
+            vistas = []
+            def otro_hilo():
+                with get_db() as c3:
+                    vistas.append(c3)
+            t = threading.Thread(target=otro_hilo)
+            t.start()
+            t.join()
+            assert vistas[0] is not compartida
+
+        with get_db() as c4:
+            total = c4.execute("SELECT COUNT(*) FROM prueba").fetchone()[0]
+        assert total == 2
+        print("✅ Un solo checkout para varios bloques get_db()")
+    finally:
+        os.remove(db.DB_PATH)
+        db.DB_PATH = path_original
+
+
+def test_transaccion_atomica():
+    """transaccion() confirma todo junto o revierte todo junto"""
+    print("\n🧪 TEST 5: Unidad de trabajo")
+    print("-" * 60)
+
+    path_original = db.DB_PATH
+    db.DB_PATH = _db_temporal()
+    try:
+        try:
+            with transaccion():
+                with get_db() as c1:
+                    c1.execute("INSERT INTO prueba VALUES ('x')")
+                with get_db() as c2:
+                    c2.execute("INSERT INTO prueba VALUES ('y')")
+                raise RuntimeError("fallo a mitad del pipeline")
+        except RuntimeError:
+            pass
+
+        with get_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM prueba").fetchone()[0] == 0
+        print("✅ Rollback completo al fallar")
+
+        with transaccion():
+            with get_db() as c1:
+                c1.execute("INSERT INTO prueba VALUES ('x')")
+            with get_db() as c2:
+                c2.execute("INSERT INTO prueba VALUES ('y')")
+
+        with get_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM prueba").fetchone()[0] == 2
+        print("✅ Un solo COMMIT al salir")
+    finally:
+        os.remove(db.DB_PATH)
+        db.DB_PATH = path_original
+
+
+def test_config_resuelta_una_vez():
+    """La configuración se resuelve al importar y no en cada get_db()"""
+    print("\n🧪 TEST 6: Configuración cacheada")
+    print("-" * 60)
+
+    config = db.obtener_config_db()
+    assert config["motor"] in ("sqlite", "postgres")
+    assert db.obtener_config_db() is config
+    print(f"✅ Backend: {config['motor']} ({config['origen']})")
+
+
+def _con_backend_postgres(fabrica, prueba, max_conexiones=1):
+    """Simula un backend PostgreSQL resuelto cuyo pool usa `fabrica`"""
+    estado = db._config_db, db._pool_pg, db._backend_activo
+    db._config_db = {"motor": "postgres", "origen": "prueba"}
+    db._pool_pg = PoolConexiones(fabrica, max_conexiones=max_conexiones, timeout=0.05)
+    db._backend_activo = None
+    try:
+        prueba()
+    finally:
+        db._pool_pg.cerrar_todo()
+        db._config_db, db._pool_pg, db._backend_activo = estado
+
+
+def test_pool_agotado_no_cae_a_sqlite():
+    """Con PostgreSQL en uso, un pool agotado o una caída se propagan"""
+    print("\n🧪 TEST 7: Sin fallback a SQLite con PostgreSQL activo")
+    print("-" * 60)
+
+    caido = []
+
+    def fabrica():
+        if caido:
+            raise ConnectionError("servidor caído")
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    def prueba():
+        conn, liberar = db._abrir_conexion()
+        assert isinstance(conn, db.PostgresConnectionWrapper)
+        try:
+            db._abrir_conexion()
+            assert False, "Debió agotarse el pool"
+        except TimeoutError:
+            print("✅ TimeoutError al agotar el pool")
+        liberar(descartar=True)
+
+        caido.append(True)
+        try:
+            db._abrir_conexion()
+            assert False, "Debió propagarse la caída"
+        except ConnectionError:
+            print("✅ Caída de PostgreSQL propagada tras haber conectado")
+
+    _con_backend_postgres(fabrica, prueba)
+
+
+def test_fallback_sqlite_solo_sin_conexion_inicial():
+    """Si PostgreSQL nunca conectó, el proceso queda en SQLite de forma definitiva"""
+    print("\n🧪 TEST 8: Fallback a SQLite al arrancar")
+    print("-" * 60)
+
+    intentos = []
+
+    def fabrica():
+        intentos.append(1)
+        raise ConnectionError("sin servidor")
+
+    def prueba():
+        path_original = db.DB_PATH
+        db.DB_PATH = _db_temporal()
+        try:
+            for _ in range(2):
+                conn, liberar = db._abrir_conexion()
+                assert isinstance(conn, sqlite3.Connection)
+                liberar()
+            assert len(intentos) == 1
+            print("✅ Un solo intento a PostgreSQL y luego SQLite")
+        finally:
+            os.remove(db.DB_PATH)
+            db.DB_PATH = path_original
+
+    _con_backend_postgres(fabrica, prueba)
+
+
+if __name__ == "__main__":
+    test_pool_reutiliza_conexiones()
+    test_pool_descarta_conexiones_dañadas()
+    test_pool_limite_conexiones()
+    test_conexion_compartida_reutiliza_en_get_db()
+    test_transaccion_atomica()
+    test_config_resuelta_una_vez()
+    test_pool_agotado_no_cae_a_sqlite()
+    test_fallback_sqlite_solo_sin_conexion_inicial()
+    print("\n✅ Todos los tests de core/db.py pasaron")
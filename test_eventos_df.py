@@ -0,0 +1,106 @@
+"""
+test_eventos_df.py
+Testing del cargador de eventos para dashboard y analítica (core/eventos_df.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from core.db import get_db
+from core.eventos_df import cargar_eventos_df
+from modulos import analitica, dashboard
+from pruebas_db import con_db_temporal
+
+
+def _insertar(eventos):
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO eventos (evento_id, condominio_id, entidad_id, tipo_evento,
+                                 timestamp_servidor, metadata, hash_actual, actor)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'vigilante1')
+        """, eventos)
+
+
+def test_columnas_y_filtros():
+    """Proyección, filtros en SQL y extracción de metadata"""
+    print("\n🧪 TEST 1: Columnas, filtros y metadata")
+
+    def prueba():
+        base = datetime(2025, 3, 10, 8, 30)
+        _insertar([
+            ("EVT_1", "CONDO_A", "ENT_1", "entrada", base.isoformat(),
+             json.dumps({"hora": "08:30", "fecha": "2025-03-10", "nombre": "Ana"}), "h1"),
+            ("EVT_2", "CONDO_A", "ENT_2", "rechazo", (base + timedelta(days=1)).isoformat(),
+             json.dumps({"motivo_rechazo": "Lista negra", "hora": 23}), "h2"),
+            ("EVT_3", "CONDO_B", "ENT_3", "entrada", (base + timedelta(days=40)).isoformat(),
+             "no es json", "h3"),
+            ("EVT_4", None, "ENT_4", "salida", (base + timedelta(days=2)).isoformat(), None, "h4"),
+        ])
+
+        df = cargar_eventos_df()
+        assert list(df["evento_id"]) == ["EVT_3", "EVT_4", "EVT_2", "EVT_1"]
+        assert all(isinstance(t, pd.ArrowDtype) for t in df.dtypes)
+        por_id = df.set_index("evento_id")
+        assert por_id.loc["EVT_1", "nombre"] == "Ana"
+        assert por_id.loc["EVT_1", "hora_int"] == 8
+        assert por_id.loc["EVT_2", "motivo_rechazo"] == "Lista negra"
+        assert por_id.loc["EVT_2", "hora"] == "23"
+        assert por_id.loc["EVT_3", "nombre"] == "N/A" and por_id.loc["EVT_3", "hora"] == ""
+        assert pd.isna(por_id.loc["EVT_3", "hora_int"]) and pd.isna(por_id.loc["EVT_3", "fecha"])
+        assert por_id.loc["EVT_1", "fecha"] == pd.Timestamp("2025-03-10")
+
+        # Filtros en SQL y proyección
+        mes = cargar_eventos_df(["evento_id", "tipo_evento"], desde="2025-03-01", hasta="2025-04-01")
+        assert list(mes.columns) == ["evento_id", "tipo_evento"]
+        assert set(mes["evento_id"]) == {"EVT_1", "EVT_2", "EVT_4"}
+        assert list(cargar_eventos_df(["evento_id"], condominio_id="CONDO_A")["evento_id"]) == ["EVT_2", "EVT_1"]
+        assert list(cargar_eventos_df(["evento_id"], tipos_evento=["rechazo"])["evento_id"]) == ["EVT_2"]
+        assert len(cargar_eventos_df(["evento_id"], limite=2)) == 2
+
+        # Los llamadores conservan sus columnas
+        assert "politica_rechazo" in dashboard._get_eventos_df().columns
+        resumen = analitica.resumen_analitico(condominio_id="CONDO_A")
+        assert len(resumen["df_etiquetado"]) == 2
+        assert set(resumen["df_etiquetado"]["etiqueta_riesgo"]) == {"normal", "riesgo_alto"}
+        print("✅ Filtros y extracción en SQL, columnas Arrow")
+
+    con_db_temporal(prueba)
+
+
+def test_mes_de_eventos():
+    """Cargar un mes de un ledger de varios meses"""
+    print("\n🧪 TEST 2: Un mes de eventos sobre 60,000")
+
+    def prueba():
+        inicio = datetime(2025, 1, 1)
+        _insertar([
+            (f"EVT_{i}", f"CONDO_{i % 3}", f"ENT_{i % 500}", "entrada" if i % 5 else "rechazo",
+             (inicio + timedelta(minutes=3 * i)).isoformat(),
+             json.dumps({"hora": f"{(i // 20) % 24:02d}:00", "motivo_rechazo": "x" if i % 5 == 0 else None}),
+             f"h{i}")
+            for i in range(60000)
+        ])
+
+        t0 = time.perf_counter()
+        df = analitica._get_eventos_df(desde="2025-02-01", hasta="2025-03-01")
+        duracion = time.perf_counter() - t0
+
+        assert len(df) == 28 * 24 * 20
+        assert df["timestamp"].min() >= pd.Timestamp("2025-02-01")
+        assert df["hora_int"].notna().all()
+        print(f"✅ {len(df)} eventos en {duracion * 1000:.0f} ms, "
+              f"{df.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+    con_db_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_columnas_y_filtros()
+    test_mes_de_eventos()
+    print("\n✅ Todos los tests del cargador de eventos pasaron")
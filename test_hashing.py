@@ -0,0 +1,121 @@
+"""
+test_hashing.py
+Vectores dorados de la forma canónica de hash_evento/hash_entidad (core/hashing.py)
+
+Los hashes esperados se calcularon con la implementación original
+(json.dumps(sort_keys=True, ensure_ascii=False) + SHA-256): si alguno cambia,
+cambian los hashes de toda la cadena de eventos ya registrada.
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import core.hashing as hashing
+from core.hashing import (
+    hash_evento,
+    hash_entidad,
+    generar_hash_cadena,
+    usar_backend_canonico,
+    backend_canonico,
+)
+
+EVENTO = {
+    "entidad_id": "ENT_PERSONA_0001",
+    "tipo_evento": "entrada",
+    "metadata": {
+        "gate": "GATE_001",
+        "hora": "10:00",
+        "condominio_id": "CONDO_A",
+        "evaluacion": {"resultado": "permitido", "motivo": "Acceso autorizado", "reglas_evaluadas": []}
+    },
+    "timestamp_servidor": "2025-11-19T10:00:00.123456",
+    "actor": "vigilante1",
+    "dispositivo": "tablet_1"
+}
+
+VECTORES = {
+    "unicode": (
+        {"nombre": "José Ñúñez", "nota": "Torre “B” / depto 4 😀",
+         "escapes": "\"\\\n\r\t\b\f\u0001\u001f\u007f "},
+        "189d8403081018f6ed3fb7d95f68bc5f071b97a8d19e9d7c22e79e8f7121b01e"
+    ),
+    "numeros": (
+        {"enteros": [0, -1, 2 ** 63, -2 ** 70],
+         "flotantes": [0.1, 1.5, -0.0, 1e16, 1e-7, 2.5e-5, 1e-10, 123456789.12345679,
+                       5e-324, 1.7976931348623157e308]},
+        "4ae36f9a864dc5b4319bca0821cdc96d4242a14b5be1850d383cf8d50f1dc7bf"
+    ),
+    "no_finitos": (
+        {"x": float("nan"), "y": float("inf"), "z": float("-inf")},
+        "d21cb3edac292840dfc1a7f6aceba91e4c587095c05546389bf27bb2321ab2b2"
+    ),
+    "orden": (
+        {"b": {"d": 1, "c": 2}, "a": [{"z": 1, "y": 2}], "10": 1, "9": 2, "A": 3},
+        "4ce9c86013bf8324f57c9240e156ff962c8d0d5708a94be7beb0757e8372e004"
+    ),
+    "llaves_enteras": (
+        {2: "dos", 1: "uno", 3: None},
+        "8d76e34d45b44966c19d47fc2df0c053a43a0bce2c7aa90bc24bb9153bafae27"
+    ),
+    "vacios": (
+        {"lista": [], "dict": {}, "texto": "", "nulo": None, "tupla": (1, 2)},
+        "eaa1011fb65437addb68387348988e437e19c75d1b8ad0eeec220bdb07c425f5"
+    ),
+}
+
+
+def _comprobar_vectores():
+    hash_genesis, _ = generar_hash_cadena(None, EVENTO, "2025-11-19T10:00:00.123456")
+    assert hash_genesis == "f4a2c3333dd815a4557cd563a538330d6b93f7eacb52867105bda445a3535076"
+    hash_enlazado, _ = generar_hash_cadena("a" * 64, EVENTO, "2025-11-19T10:00:00.123456")
+    assert hash_enlazado == "43cc09c3773a179489c7fdc46b24466fa2cff2c9541b3eb396c474444559a861"
+
+    for nombre, (data, esperado) in VECTORES.items():
+        assert hash_evento(data) == esperado, nombre
+
+    entidad = {
+        "entidad_id": "ENT_1", "tipo": "persona", "atributos": {"nombre": "Ana"},
+        "fecha_actualizacion": "x", "updated_by": "y", "hash_prev": "p", "hash_actual": "q"
+    }
+    assert hash_entidad(entidad) == "fea5923c90625e7d41ce8216b24bd2ebc7a5c4b95e40bb5f809901a4df88a552"
+
+
+def test_vectores_dorados():
+    """Cada backend disponible reproduce los hashes de la implementación original"""
+    print("\n🧪 TEST 1: Vectores dorados por backend")
+    print("-" * 60)
+
+    activo = backend_canonico()
+    try:
+        for backend in hashing._BACKENDS_CANONICOS:
+            usar_backend_canonico(backend)
+            _comprobar_vectores()
+            print(f"✅ Backend {backend}: hashes idénticos")
+    finally:
+        usar_backend_canonico(activo)
+
+
+def test_errores_se_conservan():
+    """Lo que json no sabe serializar sigue fallando igual con cualquier backend"""
+    print("\n🧪 TEST 2: Errores de serialización")
+    print("-" * 60)
+
+    activo = backend_canonico()
+    try:
+        for backend in hashing._BACKENDS_CANONICOS:
+            usar_backend_canonico(backend)
+            for data in ({"fecha": hashing.datetime(2025, 1, 1)}, {"bytes": b"x"}, {1: "a", "b": 2}):
+                try:
+                    hash_evento(data)
+                except TypeError:
+                    continue
+                raise AssertionError(f"{backend} serializó {data!r}")
+        print("✅ Mismos TypeError en todos los backends")
+    finally:
+        usar_backend_canonico(activo)
+
+
+if __name__ == "__main__":
+    test_vectores_dorados()
+    test_errores_se_conservan()
+    print("\n✅ Todos los tests de hashing pasaron")
@@ -0,0 +1,257 @@
+"""
+test_migracion.py
+Testing de la migración por bloques SQLite → PostgreSQL (database/migrate_sqlite_to_pg.py)
+Sin servidor PostgreSQL a mano, el destino es otra base SQLite
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import os
+import sqlite3
+import tempfile
+
+import database.migrate_sqlite_to_pg as migracion
+from database.migrate_sqlite_to_pg import (
+    migrar_tabla, niveles_migracion, validar_migracion, _dependencias, _leer_progreso
+)
+
+ESQUEMA = """
+    CREATE TABLE entidades (
+        entidad_id TEXT PRIMARY KEY,
+        nombre TEXT {nombre}
+    );
+    CREATE TABLE eventos (
+        evento_id TEXT PRIMARY KEY,
+        entidad_id TEXT REFERENCES entidades(entidad_id),
+        condominio_id TEXT,
+        secuencia INTEGER,
+        hash_previo TEXT,
+        hash_actual TEXT
+    );
+    CREATE TABLE politicas (
+        politica_id TEXT PRIMARY KEY,
+        nombre TEXT
+    );
+"""
+
+
+def _base(nombre_destino: bool) -> str:
+    """Base SQLite temporal con el esquema de prueba (el destino exige nombre NOT NULL)"""
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript(ESQUEMA.format(nombre="NOT NULL" if nombre_destino else ""))
+    conn.close()
+    return path
+
+
+def _destino(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def _poblar(origen: str, entidades: int = 10, eventos: int = 10):
+    """Entidades y una cadena de eventos enlazada por hash_previo"""
+    conn = sqlite3.connect(origen)
+    conn.executemany(
+        "INSERT INTO entidades VALUES (?, ?)",
+        [(f"ENT_{i:03d}", f"Entidad {i}") for i in range(entidades)]
+    )
+    hash_previo = "0" * 64
+    for i in range(eventos):
+        hash_actual = f"{i:064x}"
+        conn.execute(
+            "INSERT INTO eventos VALUES (?, ?, 'CONDO_A', ?, ?, ?)",
+            (f"EVT_{i:03d}", f"ENT_{i % entidades:03d}", i, hash_previo, hash_actual)
+        )
+        hash_previo = hash_actual
+    conn.execute("INSERT INTO politicas VALUES ('POL_1', 'Horario')")
+    conn.commit()
+    conn.close()
+
+
+def _con_bases(prueba):
+    """Ejecuta la prueba con una base origen y una destino temporales"""
+    origen, destino = _base(False), _base(True)
+    try:
+        prueba(origen, destino)
+    finally:
+        os.remove(origen)
+        os.remove(destino)
+
+
+def test_niveles_por_llaves_foraneas():
+    """Las tablas padre quedan en un nivel anterior al de sus hijas"""
+    print("\n🧪 TEST 1: Niveles de migración")
+    print("-" * 60)
+
+    def prueba(origen, destino):
+        conn = _destino(destino)
+        dependencias = _dependencias(conn, ["eventos", "entidades", "politicas"])
+        conn.close()
+        assert dependencias == {"eventos": {"entidades"}, "entidades": set(), "politicas": set()}
+
+        niveles = niveles_migracion(["eventos", "entidades", "politicas"], dependencias)
+        assert niveles == [["entidades", "politicas"], ["eventos"]]
+        print(f"✅ Niveles: {niveles}")
+
+        try:
+            niveles_migracion(["a", "b"], {"a": {"b"}, "b": {"a"}})
+            assert False, "Un ciclo debe rechazarse"
+        except ValueError:
+            print("✅ Llaves foráneas circulares rechazadas")
+
+    _con_bases(prueba)
+
+
+def test_reanuda_desde_ultimo_bloque():
+    """Un fallo a media tabla conserva los bloques confirmados y se reanuda sin duplicar"""
+    print("\n🧪 TEST 2: Reanudación por bloques")
+    print("-" * 60)
+
+    def prueba(origen, destino):
+        _poblar(origen, entidades=10, eventos=0)
+        conn = sqlite3.connect(origen)
+        # Fila 7 sin nombre: el destino la rechaza dentro del tercer bloque
+        conn.execute("UPDATE entidades SET nombre = NULL WHERE entidad_id = 'ENT_006'")
+        conn.commit()
+
+        pg = _destino(destino)
+        migracion._asegurar_progreso(pg)
+
+        r = migrar_tabla(origen, pg, "entidades", tamano_bloque=3)
+        assert r["error"], "La fila sin nombre debe fallar"
+        progreso = _leer_progreso(pg, os.path.abspath(origen), "entidades")
+        assert progreso == {"ultimo_rowid": 6, "filas": 6, "completada": False}, progreso
+        assert pg.execute("SELECT COUNT(*) FROM entidades").fetchone()[0] == 6
+        print(f"✅ Fallo en el bloque 3: progreso guardado en rowid {progreso['ultimo_rowid']}")
+
+        conn.execute("UPDATE entidades SET nombre = 'Corregida' WHERE entidad_id = 'ENT_006'")
+        conn.commit()
+        conn.close()
+
+        r = migrar_tabla(origen, pg, "entidades", tamano_bloque=3)
+        assert r["error"] is None, r["error"]
+        assert r["reanudada_desde"] == 6
+        assert r["filas"] == 10
+        assert pg.execute("SELECT COUNT(*), COUNT(DISTINCT entidad_id) FROM entidades").fetchone() == (10, 10)
+        assert _leer_progreso(pg, os.path.abspath(origen), "entidades")["completada"]
+        print("✅ Reanudada desde rowid 6 sin duplicados")
+
+        # Tabla completada: una nueva corrida no vuelve a leerla
+        r = migrar_tabla(origen, pg, "entidades", tamano_bloque=3)
+        assert r["error"] is None and r["filas"] == 10 and r["reanudada_desde"] == 10
+        print("✅ Tabla completada omitida en la siguiente corrida")
+        pg.close()
+
+    _con_bases(prueba)
+
+
+def test_validar_migracion():
+    """Conteos y continuidad de las cadenas contra la base origen"""
+    print("\n🧪 TEST 3: Validación")
+    print("-" * 60)
+
+    def prueba(origen, destino):
+        _poblar(origen)
+        pg = _destino(destino)
+        migracion._asegurar_progreso(pg)
+        for tabla in ["entidades", "eventos"]:
+            assert migrar_tabla(origen, pg, tabla, tamano_bloque=4)["error"] is None
+
+        v = validar_migracion(origen, pg, ["entidades", "eventos"])
+        assert v["valida"], v
+        assert v["conteos"]["eventos"] == {"sqlite": 10, "postgres": 10}
+        assert v["cadenas"] == {"rupturas": 0, "cadenas": 1, "cabezas_distintas": []}
+        print("✅ Migración íntegra validada")
+
+        pg.execute("UPDATE eventos SET hash_previo = 'alterado' WHERE secuencia = 5")
+        pg.commit()
+        v = validar_migracion(origen, pg, ["entidades", "eventos"])
+        assert not v["valida"] and v["cadenas"]["rupturas"] == 1
+        print("✅ Ruptura de cadena detectada")
+
+        pg.execute("DELETE FROM eventos WHERE secuencia >= 8")
+        pg.commit()
+        v = validar_migracion(origen, pg, ["entidades", "eventos"])
+        assert not v["valida"]
+        assert v["conteos"]["eventos"] == {"sqlite": 10, "postgres": 8}
+        assert v["cadenas"]["cabezas_distintas"] == ["CONDO_A"]
+        print("✅ Filas faltantes y cabeza distinta detectadas")
+        pg.close()
+
+    _con_bases(prueba)
+
+
+def test_migrate_data_padres_primero():
+    """Con llaves foráneas activas, eventos no se migra antes que entidades"""
+    print("\n🧪 TEST 4: migrate_data por niveles")
+    print("-" * 60)
+
+    def prueba(origen, destino):
+        _poblar(origen, entidades=50, eventos=200)
+        get_pg, init_pg_schema = migracion.get_pg, migracion.init_pg_schema
+        migracion.get_pg = lambda: _destino(destino)
+        migracion.init_pg_schema = lambda: None
+        try:
+            ok = migracion.migrate_data(
+                origen, ["eventos", "entidades", "politicas"], paralelo=3, tamano_bloque=7
+            )
+        finally:
+            migracion.get_pg, migracion.init_pg_schema = get_pg, init_pg_schema
+        assert ok
+
+        pg = _destino(destino)
+        assert pg.execute("SELECT COUNT(*) FROM eventos").fetchone()[0] == 200
+        assert pg.execute("PRAGMA foreign_key_check").fetchall() == []
+        pg.close()
+        print("✅ 200 eventos migrados después de sus entidades")
+
+    _con_bases(prueba)
+
+
+def test_migrate_data_omite_hijas_de_padre_fallido():
+    """Si una tabla padre falla, sus hijas no se migran"""
+    print("\n🧪 TEST 5: Hijas de una tabla fallida")
+    print("-" * 60)
+
+    def prueba(origen, destino):
+        _poblar(origen, entidades=5, eventos=5)
+        conn = sqlite3.connect(origen)
+        conn.execute("UPDATE entidades SET nombre = NULL WHERE entidad_id = 'ENT_000'")
+        conn.commit()
+        conn.close()
+
+        get_pg, init_pg_schema = migracion.get_pg, migracion.init_pg_schema
+        migracion.get_pg = lambda: _destino(destino)
+        migracion.init_pg_schema = lambda: None
+        try:
+            ok = migracion.migrate_data(origen, ["entidades", "eventos"], paralelo=2)
+        finally:
+            migracion.get_pg, migracion.init_pg_schema = get_pg, init_pg_schema
+        assert not ok
+
+        pg = _destino(destino)
+        assert pg.execute("SELECT COUNT(*) FROM eventos").fetchone()[0] == 0
+        pg.close()
+        print("✅ eventos omitida al fallar entidades")
+
+    _con_bases(prueba)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🔄 TESTS DE MIGRACIÓN SQLITE → POSTGRESQL")
+    print("=" * 60)
+
+    test_niveles_por_llaves_foraneas()
+    test_reanuda_desde_ultimo_bloque()
+    test_validar_migracion()
+    test_migrate_data_padres_primero()
+    test_migrate_data_omite_hijas_de_padre_fallido()
+
+    print("\n" + "=" * 60)
+    print("✅ TODOS LOS TESTS PASARON")
+    print("=" * 60)
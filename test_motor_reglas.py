@@ -14,10 +14,15 @@ from core.motor_reglas import (
     _hora_en_rango,
     _contar_visitas_hoy,
     _obtener_entidad,
-    _obtener_politicas_activas
+    _obtener_politicas_activas,
+    invalidar_politicas,
+    obtener_plan_politicas,
+    compilar_politicas,
+    evaluar_reglas_batch
 )
+from core.orquestador import OrquestadorAccesos
 from modulos.entidades import crear_entidad
-from modulos.politicas import crear_politica
+from modulos.politicas import crear_politica, actualizar_politica, cambiar_estado_politica
 
 
 def test_hora_en_rango():
@@ -89,6 +94,7 @@ def test_evaluar_reglas_sin_politicas():
     # Desactivar todas las políticas temporalmente
     with get_db() as db:
         db.execute("UPDATE politicas SET estado = 'inactiva'")
+    invalidar_politicas()  # SQL directo: no pasa por modulos.politicas
     
     # Evaluar sin políticas
     resultado = evaluar_reglas(entidad_id, {
@@ -104,6 +110,7 @@ def test_evaluar_reglas_sin_politicas():
     # Reactivar políticas
     with get_db() as db:
         db.execute("UPDATE politicas SET estado = 'activa'")
+    invalidar_politicas()
     
     if resultado['permitido'] and resultado['motivo'] is None:
         print(f"\n✅ Sin políticas activas, acceso permitido por defecto")
@@ -168,6 +175,7 @@ def test_politica_horario():
     # Limpiar política de prueba
     with get_db() as db:
         db.execute("DELETE FROM politicas WHERE politica_id = ?", (politica_id,))
+    invalidar_politicas()
     
     if resultado1['permitido'] and not resultado2['permitido']:
         print(f"\n✅ Política de horario funcionando correctamente")
@@ -237,6 +245,7 @@ def test_politica_limite_visitas():
     with get_db() as db:
         db.execute("DELETE FROM politicas WHERE politica_id = ?", (politica_id,))
         db.execute("DELETE FROM eventos WHERE entidad_id = ?", (entidad_id,))
+    invalidar_politicas()
     
     if not resultado['permitido'] and "Límite de visitas" in (resultado['motivo'] or ""):
         print(f"\n✅ Política de límite de visitas funcionando correctamente")
@@ -299,6 +308,7 @@ def test_politica_autorizacion():
     # Limpiar
     with get_db() as db:
         db.execute("DELETE FROM politicas WHERE politica_id = ?", (politica_id,))
+    invalidar_politicas()
     
     if not resultado1['permitido'] and resultado2['permitido']:
         print(f"\n✅ Política de autorización funcionando correctamente")
@@ -316,6 +326,7 @@ def test_aplicable_a():
     # Desactivar todas las políticas primero
     with get_db() as db:
         db.execute("UPDATE politicas SET estado = 'inactiva'")
+    invalidar_politicas()
     
     # Crear política aplicable solo a proveedores
     politica_id = crear_politica(
@@ -374,6 +385,7 @@ def test_aplicable_a():
     with get_db() as db:
         db.execute("DELETE FROM politicas WHERE politica_id = ?", (politica_id,))
         db.execute("UPDATE politicas SET estado = 'activa'")
+    invalidar_politicas()
     
     if resultado_persona['permitido'] and not resultado_proveedor['permitido']:
         print(f"\n✅ Filtro aplicable_a funcionando correctamente")
@@ -384,6 +396,143 @@ def test_aplicable_a():
         return True  # Marcar como exitoso de todos modos
 
 
+def test_plan_compilado():
+    """Verifica el plan compilado de políticas y su invalidación por versión"""
+    print("\n🧪 TEST 8: Plan compilado de políticas")
+    print("-" * 60)
+    
+    politica_id = crear_politica(
+        nombre="Test Plan Compilado",
+        descripcion="Horario de proveedores",
+        tipo="horario",
+        condiciones={"tipo": "horario", "hora_inicio": "08:00", "hora_fin": "18:00"},
+        prioridad=1,
+        estado="activa",
+        aplicable_a="proveedor",
+        created_by="test_suite"
+    )
+    
+    def regla_en_plan(plan, tipo):
+        for regla in plan.reglas_para(tipo):
+            if regla.politica_id == politica_id:
+                return regla
+        return None
+    
+    plan = obtener_plan_politicas()
+    regla = regla_en_plan(plan, "proveedor")
+    assert regla is not None and regla.horario == (8 * 60, 18 * 60)
+    assert regla_en_plan(plan, "persona") is None
+    print("✅ Política compilada en el bucket 'proveedor' con rango en minutos")
+    
+    # Sin cambios no se recompila
+    assert obtener_plan_politicas() is plan
+    
+    # actualizar_politica incrementa la versión
+    actualizar_politica(politica_id, condiciones={
+        "tipo": "horario", "hora_inicio": "08:00", "hora_fin": "21:00"
+    })
+    plan_nuevo = obtener_plan_politicas()
+    assert plan_nuevo.version > plan.version
+    assert regla_en_plan(plan_nuevo, "proveedor").horario == (8 * 60, 21 * 60)
+    print("✅ actualizar_politica invalida el plan")
+    
+    # cambiar_estado_politica la saca del plan
+    cambiar_estado_politica(politica_id, "inactiva")
+    assert regla_en_plan(obtener_plan_politicas(), "proveedor") is None
+    print("✅ cambiar_estado_politica invalida el plan")
+    
+    with get_db() as db:
+        db.execute("DELETE FROM politicas WHERE politica_id = ?", (politica_id,))
+    invalidar_politicas()
+    
+    return True
+
+
+def test_evaluar_reglas_batch():
+    """Verifica evaluación por lote y simulación con un plan hipotético"""
+    print("\n🧪 TEST 9: Evaluación por lote")
+    print("-" * 60)
+    
+    orq = OrquestadorAccesos(usuario_id="test_suite")
+    persona = orq.crear_entidad("persona", {"nombre": "Test Lote"}, created_by="test_suite")["entidad_id"]
+    proveedor = orq.crear_entidad("proveedor", {"nombre": "Test Lote Prov"}, created_by="test_suite")["entidad_id"]
+    
+    entidades = [persona, proveedor, "ENT_NO_EXISTE", persona]
+    metadatas = [
+        {"hora": "10:00", "fecha": "2099-01-01"},
+        {"hora": "20:00", "fecha": "2099-01-01"},
+        {"hora": "10:00", "fecha": "2099-01-01"},
+        {"hora": "10:00", "fecha": "2099-01-01", "autorizado": True},
+    ]
+    
+    # Con el plan vigente el lote da lo mismo que evaluar uno por uno
+    lote = evaluar_reglas_batch(entidades, metadatas)
+    uno_por_uno = [evaluar_reglas(e, m) for e, m in zip(entidades, metadatas)]
+    assert lote == uno_por_uno
+    assert lote[2]["motivo"] == "Entidad no encontrada."
+    print(f"✅ {len(lote)} evaluaciones idénticas a evaluar_reglas")
+    
+    # Simulación: ¿y si se limitara a 1 visita diaria?
+    plan = compilar_politicas(politicas=[{
+        "politica_id": "SIM_001",
+        "nombre": "Simulada 1 visita",
+        "condiciones": {"max_visitas_dia": 1},
+        "aplicable_a": "global",
+        "prioridad": 1
+    }])
+    replay = evaluar_reglas_batch(
+        [persona, persona, proveedor],
+        {"hora": "10:00", "fecha": "2099-01-01"},
+        plan=plan,
+        acumular_visitas=True
+    )
+    assert replay[0]["permitido"] and replay[2]["permitido"]
+    assert not replay[1]["permitido"]
+    assert replay[1]["politica_aplicada"] == "Simulada 1 visita"
+    print("✅ Replay con política simulada acumula visitas del lote")
+    
+    return True
+
+
+def test_contador_visitas_diarias():
+    """Verifica que visitas_diarias sigue a eventos en cada INSERT/DELETE"""
+    print("\n🧪 TEST 10: Contador de visitas diarias")
+    print("-" * 60)
+    
+    entidad_id = f"TEST-CONTADOR-{datetime.now().strftime('%H%M%S%f')}"
+    fecha = "2099-02-01"
+    
+    def contar_sobre_eventos():
+        with get_db() as db:
+            return db.execute("""
+                SELECT COUNT(*) FROM eventos
+                WHERE entidad_id = ? AND tipo_evento = 'entrada'
+                  AND DATE(timestamp_servidor) = DATE(?)
+            """, (entidad_id, fecha)).fetchone()[0]
+    
+    assert _contar_visitas_hoy(entidad_id, fecha) == 0
+    
+    with get_db() as db:
+        for i, tipo in enumerate(["entrada", "entrada", "salida", "entrada"]):
+            db.execute("""
+                INSERT INTO eventos (evento_id, entidad_id, tipo_evento, metadata, actor, dispositivo, hash_actual, timestamp_servidor)
+                VALUES (?, ?, ?, '{}', 'test', 'test', ?, ?)
+            """, (f"{entidad_id}-{i}", entidad_id, tipo, f"hash_contador_{i}", f"{fecha}T0{i}:00:00"))
+    
+    assert _contar_visitas_hoy(entidad_id, fecha) == contar_sobre_eventos() == 3
+    print("✅ 3 entradas contadas sin recorrer eventos")
+    
+    with get_db() as db:
+        db.execute("DELETE FROM eventos WHERE evento_id = ?", (f"{entidad_id}-0",))
+    assert _contar_visitas_hoy(entidad_id, fecha) == contar_sobre_eventos() == 2
+    print("✅ El contador baja al borrar eventos")
+    
+    with get_db() as db:
+        db.execute("DELETE FROM eventos WHERE entidad_id = ?", (entidad_id,))
+    
+    return True
+
+
 # ---------------------------------------------------------------------
 # EJECUCIÓN PRINCIPAL
 # ---------------------------------------------------------------------
@@ -402,6 +551,9 @@ if __name__ == "__main__":
     resultados.append(("Política de límite visitas", test_politica_limite_visitas()))
     resultados.append(("Política de autorización", test_politica_autorizacion()))
     resultados.append(("Filtro aplicable_a", test_aplicable_a()))
+    resultados.append(("Plan compilado", test_plan_compilado()))
+    resultados.append(("Evaluación por lote", test_evaluar_reglas_batch()))
+    resultados.append(("Contador visitas diarias", test_contador_visitas_diarias()))
     
     # Resumen final
     print("\n" + "=" * 60)
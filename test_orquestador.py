@@ -0,0 +1,379 @@
+"""
+test_orquestador.py
+Testing del pipeline de acceso del OrquestadorAccesos (core/orquestador.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import glob
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+import core.db as db
+from core.db import get_db
+from core.bitacora import escritor_bitacora, EscritorBitacora
+from core.cadena import cadenas_eventos, CadenaEventos, CADENA_GLOBAL
+from core.hashing import generar_hash_cadena
+from core.orquestador import OrquestadorAccesos
+from pruebas_db import con_db_temporal
+
+
+def test_unidad_trabajo_registra_y_mide():
+    """procesar_acceso en modo unidad de trabajo registra evento + bitácora"""
+    print("\n🧪 TEST 1: Pipeline en una sola transacción")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin", unidad_trabajo=True)
+        entidad = orq.crear_entidad("persona", {"nombre": "Ana Ruiz"}, created_by="admin")
+
+        evento_hash = orq.procesar_acceso(
+            entidad_id=entidad["entidad_id"],
+            metadata={"hora": "10:00", "gate": "GATE_001"},
+            actor="vigilante1"
+        )
+        assert isinstance(evento_hash, str) and len(evento_hash) == 64
+
+        with get_db() as conn:
+            eventos = conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+            bitacora = conn.execute(
+                "SELECT COUNT(*) FROM bitacora WHERE tabla = 'eventos'"
+            ).fetchone()[0]
+        assert eventos == 1 and bitacora == 1
+
+        for etapa in ("reglas", "hash_previo", "insert_evento", "bitacora", "total"):
+            assert etapa in orq.tiempos_etapas, etapa
+        print(f"✅ Tiempos por etapa: {orq.tiempos_etapas}")
+
+    con_db_temporal(prueba)
+
+
+def test_unidad_trabajo_revierte_si_falla_bitacora():
+    """Si falla la bitácora no queda un evento huérfano"""
+    print("\n🧪 TEST 2: Rollback del pipeline")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin", unidad_trabajo=True)
+        entidad = orq.crear_entidad("persona", {"nombre": "Luis Mora"}, created_by="admin")
+
+        def bitacora_rota(*args, **kwargs):
+            raise RuntimeError("bitácora no disponible")
+        orq._registrar_bitacora = bitacora_rota
+
+        try:
+            orq.procesar_acceso(entidad["entidad_id"], {"hora": "10:00"}, "vigilante1")
+            assert False, "Debió propagarse el error"
+        except RuntimeError:
+            pass
+
+        with get_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0] == 0
+        print("✅ Evento revertido junto con la bitácora")
+
+    con_db_temporal(prueba)
+
+
+def _cadena_en_bd(condominio_id=None):
+    filtro = "condominio_id IS NULL" if condominio_id is None else "condominio_id = ?"
+    params = () if condominio_id is None else (condominio_id,)
+    with get_db() as conn:
+        return conn.execute(f"""
+            SELECT evento_id, entidad_id, tipo_evento, metadata, actor, dispositivo,
+                   timestamp_servidor, hash_actual, hash_previo, secuencia
+            FROM eventos WHERE {filtro} ORDER BY secuencia
+        """, params).fetchall()
+
+
+def _verificar_enlaces(filas):
+    """Cada evento encadena sobre el anterior y su hash se puede recalcular"""
+    hash_prev = None
+    for i, fila in enumerate(filas, start=1):
+        assert fila["secuencia"] == i
+        assert fila["hash_previo"] == hash_prev
+        evento_data = {
+            "entidad_id": fila["entidad_id"],
+            "tipo_evento": fila["tipo_evento"],
+            "metadata": json.loads(fila["metadata"]),
+            "timestamp_servidor": fila["timestamp_servidor"],
+            "actor": fila["actor"],
+            "dispositivo": fila["dispositivo"],
+        }
+        esperado, _ = generar_hash_cadena(hash_prev, evento_data, fila["timestamp_servidor"])
+        assert fila["hash_actual"] == esperado
+        hash_prev = fila["hash_actual"]
+
+
+def test_cadena_en_memoria_y_recuperacion():
+    """La cabeza vive en memoria y se recupera de la BD al reiniciar"""
+    print("\n🧪 TEST 3: Cabeza de la cadena en memoria")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        for i in range(3):
+            orq.registrar_acceso(f"ENT_{i}", "entrada", {"gate": "G1"}, "vigilante1")
+
+        filas = _cadena_en_bd()
+        _verificar_enlaces(filas)
+        assert cadenas_eventos.cadena().cabeza == (filas[-1]["hash_actual"], 3)
+
+        # Simula un reinicio del proceso: la cabeza se relee de la BD
+        cadenas_eventos.invalidar()
+        assert cadenas_eventos.cadena().cabeza == (filas[-1]["hash_actual"], 3)
+
+        orq.registrar_acceso("ENT_9", "salida", {"gate": "G1"}, "vigilante1")
+        _verificar_enlaces(_cadena_en_bd())
+        print("✅ Cadena enlazada y cabeza recuperada")
+
+    con_db_temporal(prueba)
+
+
+def test_cadena_appends_concurrentes():
+    """Hilos concurrentes nunca encadenan sobre el mismo hash previo"""
+    print("\n🧪 TEST 4: Appends concurrentes")
+    print("-" * 60)
+
+    def prueba():
+        errores = []
+
+        def registrar(n):
+            try:
+                orq = OrquestadorAccesos(usuario_id="admin", unidad_trabajo=True)
+                for i in range(5):
+                    orq.registrar_acceso(f"ENT_{n}_{i}", "entrada", {}, f"vigilante{n}")
+            except Exception as e:
+                errores.append(e)
+
+        def en_transaccion(n):
+            with db.transaccion():
+                registrar(n)
+
+        hilos = [threading.Thread(target=registrar, args=(n,)) for n in range(3)]
+        hilos += [threading.Thread(target=en_transaccion, args=(n,)) for n in range(3, 5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert not errores, errores
+        filas = _cadena_en_bd()
+        assert len(filas) == 25
+        _verificar_enlaces(filas)
+        print("✅ 25 eventos en una sola cadena lineal")
+
+    con_db_temporal(prueba)
+
+
+def test_cadena_se_recupera_tras_rollback():
+    """Un evento revertido no deja la cabeza apuntando a un hash inexistente"""
+    print("\n🧪 TEST 5: Cabeza tras rollback")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        primero = orq.registrar_acceso("ENT_1", "entrada", {}, "vigilante1")
+
+        try:
+            with db.transaccion():
+                orq.registrar_acceso("ENT_2", "entrada", {}, "vigilante1")
+                raise RuntimeError("falla después del insert")
+        except RuntimeError:
+            pass
+
+        assert cadenas_eventos.cadena().cabeza == (primero["hash"], 1)
+        orq.registrar_acceso("ENT_3", "entrada", {}, "vigilante1")
+        _verificar_enlaces(_cadena_en_bd())
+        print("✅ La cadena continúa desde el último evento confirmado")
+
+    con_db_temporal(prueba)
+
+
+def test_escritor_con_cabeza_vieja():
+    """Otro proceso con la cabeza desactualizada no duplica la secuencia"""
+    print("\n🧪 TEST 6: Cabeza desactualizada en otro proceso")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        for condominio_id in (None, "CONDO_A"):
+            # Cadena de "otro proceso": lee la cabeza y luego queda vieja
+            otra = CadenaEventos(condominio_id)
+            assert otra.cabeza == (None, 0)
+            orq.registrar_acceso("ENT_1", "entrada", {"condominio_id": condominio_id}, "vigilante1")
+
+            try:
+                with otra.anexar() as eslabon:
+                    with get_db() as conn:
+                        conn.execute("""
+                            INSERT INTO eventos (evento_id, entidad_id, tipo_evento, metadata, hash_actual,
+                                                 timestamp_servidor, hash_previo, secuencia, condominio_id)
+                            VALUES (?, 'ENT_2', 'entrada', '{}', ?, '2025-01-01T00:00:00', ?, ?, ?)
+                        """, (f"EVT_VIEJO_{condominio_id}", "f" * 64, eslabon.hash_prev,
+                              eslabon.secuencia, condominio_id))
+                    eslabon.hash_actual = "f" * 64
+                assert False, "La secuencia repetida debió rechazarse"
+            except Exception as e:
+                assert "UNIQUE" in str(e), e
+
+            # La cabeza se relee y el siguiente append encadena bien
+            assert otra.cabeza[1] == 1
+            cadenas_eventos.invalidar()
+            orq.registrar_acceso("ENT_3", "entrada", {"condominio_id": condominio_id}, "vigilante1")
+            _verificar_enlaces(_cadena_en_bd(condominio_id))
+        print("✅ Secuencia repetida rechazada en la cadena global y por condominio")
+
+    con_db_temporal(prueba)
+
+
+def test_cadenas_por_condominio_y_ancla():
+    """Cada condominio tiene su propia cadena; el ancla une sus cabezas"""
+    print("\n🧪 TEST 7: Cadenas por condominio")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        errores = []
+
+        def registrar(condominio_id):
+            try:
+                for i in range(4):
+                    orq.registrar_acceso(
+                        f"ENT_{i}", "entrada", {"condominio_id": condominio_id}, "vigilante1"
+                    )
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=registrar, args=(c,)) for c in ("CONDO_A", "CONDO_B")]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        orq.registrar_acceso("ENT_X", "entrada", {}, "vigilante1")
+
+        assert not errores, errores
+        for condominio_id in ("CONDO_A", "CONDO_B"):
+            filas = _cadena_en_bd(condominio_id)
+            assert len(filas) == 4
+            _verificar_enlaces(filas)
+        _verificar_enlaces(_cadena_en_bd())
+
+        cabezas = cadenas_eventos.cabezas_en_bd()
+        assert set(cabezas) == {"CONDO_A", "CONDO_B", CADENA_GLOBAL}
+        assert cabezas["CONDO_A"]["secuencia"] == 4
+        assert cabezas[CADENA_GLOBAL]["secuencia"] == 1
+
+        primera = cadenas_eventos.anclar()
+        segunda = cadenas_eventos.anclar()
+        assert primera["hash_previo"] is None
+        assert segunda["hash_previo"] == primera["hash_ancla"]
+        print("✅ Cadenas independientes y ancla encadenada")
+
+    con_db_temporal(prueba)
+
+
+def _total_bitacora():
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM bitacora").fetchone()[0]
+
+
+def _respaldos(respaldo):
+    """Archivos de respaldo con registros (sin los candados de cada proceso)"""
+    return [r for r in glob.glob(respaldo + ".*") if not r.endswith(".lock")]
+
+
+def _proceso_que_muere(respaldo, registros):
+    """Otro proceso encola `registros` en la bitácora y muere sin escribirlos"""
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    codigo = (
+        "import os\n"
+        "from core.bitacora import EscritorBitacora\n"
+        f"escritor = EscritorBitacora(intervalo=60, archivo_respaldo={respaldo!r})\n"
+        f"for i in range({registros}):\n"
+        "    escritor.registrar('eventos', 'INSERT', f'PERDIDO_{i}', None, {}, 'admin')\n"
+        "os._exit(0)\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", codigo], cwd=raiz, check=True, capture_output=True,
+        env={**os.environ, "PYTHONPATH": raiz}
+    )
+
+
+def test_bitacora_asincrona_por_lotes():
+    """La bitácora se encola, se escribe por lotes y sobrevive a una caída"""
+    print("\n🧪 TEST 8: Bitácora asíncrona")
+    print("-" * 60)
+
+    def prueba():
+        directorio = tempfile.mkdtemp()
+        respaldo = os.path.join(directorio, "bitacora.jsonl")
+
+        # Fuera de transacción el orquestador encola
+        orq = OrquestadorAccesos(usuario_id="admin")
+        orq.crear_entidad("persona", {"nombre": "Eva Soto"}, created_by="admin")
+        escritor_bitacora.vaciar()
+        assert _total_bitacora() == 1
+
+        # Se escribe al llenar el lote, no antes
+        escritor = EscritorBitacora(tamano_lote=5, intervalo=60, archivo_respaldo=respaldo)
+        for i in range(3):
+            escritor.registrar("eventos", "INSERT", f"EVT_{i}", None, {"i": i}, "admin")
+        assert escritor.pendientes == 3 and _total_bitacora() == 1
+        with open(escritor._prefijo) as f:
+            assert len(f.readlines()) == 3
+        for i in range(3, 5):
+            escritor.registrar("eventos", "INSERT", f"EVT_{i}", None, {"i": i}, "admin")
+        limite = time.time() + 5
+        while escritor.escritos < 5 and time.time() < limite:
+            time.sleep(0.01)
+        assert escritor.escritos == 5 and escritor.lotes == 1
+        assert _total_bitacora() == 6
+        assert _respaldos(respaldo) == []
+
+        # Un lote que falla vuelve a la cola y conserva su respaldo
+        escritor.registrar("eventos", "INSERT", "EVT_5", None, {}, "admin")
+        with get_db() as conn:
+            conn.execute("ALTER TABLE bitacora RENAME TO bitacora_fuera")
+        assert escritor.vaciar() == 0 and escritor.pendientes == 1
+        assert len(_respaldos(respaldo)) == 1
+        with get_db() as conn:
+            conn.execute("ALTER TABLE bitacora_fuera RENAME TO bitacora")
+        assert escritor.vaciar() == 1
+        assert _respaldos(respaldo) == []
+
+        # Caída de otro proceso: su cola en memoria se pierde, el respaldo no.
+        # El respaldo de un proceso vivo (escritor) no se toca.
+        escritor.registrar("eventos", "INSERT", "VIVO", None, {}, "admin")
+        _proceso_que_muere(respaldo, 4)
+        assert len(_respaldos(respaldo)) == 2
+
+        nuevo = EscritorBitacora(archivo_respaldo=respaldo)
+        recuperados = nuevo.recuperar_respaldo()
+        assert recuperados == 4 and _total_bitacora() == 11
+        assert _respaldos(respaldo) == [escritor._prefijo]
+        assert escritor.vaciar() == 1 and _total_bitacora() == 12
+
+        escritor.cerrar()
+        nuevo.cerrar()
+        assert glob.glob(respaldo + "*") == []
+        os.rmdir(directorio)
+        print("✅ Lotes por tamaño, reintento y recuperación del respaldo")
+
+    con_db_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_unidad_trabajo_registra_y_mide()
+    test_unidad_trabajo_revierte_si_falla_bitacora()
+    test_cadena_en_memoria_y_recuperacion()
+    test_cadena_appends_concurrentes()
+    test_cadena_se_recupera_tras_rollback()
+    test_escritor_con_cabeza_vieja()
+    test_cadenas_por_condominio_y_ancla()
+    test_bitacora_asincrona_por_lotes()
+    print("\n✅ Todos los tests del orquestador pasaron")
@@ -0,0 +1,234 @@
+"""
+test_placas.py
+Testing del índice de placas normalizadas (core/placas.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import time
+
+from core.db import get_db, transaccion
+from core.orquestador import OrquestadorAccesos
+from core.coincidencia_placas import IndiceAproximado, distancia_ocr, levenshtein
+from core.placas import (
+    IndicePlacas,
+    asegurar_indice_placas,
+    buscar_placa,
+    buscar_placa_aproximada,
+    indice_placas,
+    normalizar_placa,
+)
+from modulos.entidades import actualizar_entidad, desactivar_entidad, reactivar_entidad
+from pruebas_db import con_db_temporal
+
+
+def test_busqueda_exacta_normalizada():
+    """ABC-1234, abc1234 y 'ABC 1234' son la misma placa"""
+    print("\n🧪 TEST 1: Búsqueda exacta por placa normalizada")
+
+    def prueba():
+        assert normalizar_placa("abc 1234") == "ABC-1234"
+        assert normalizar_placa("ABC-1234") == "ABC-1234"
+        assert normalizar_placa("??") is None
+
+        orq = OrquestadorAccesos()
+        vehiculo = orq.crear_entidad("vehiculo", {"identificador": "abc 1234", "marca": "Nissan"},
+                                     created_by="admin")["entidad_id"]
+        bloqueado = orq.crear_entidad("vehiculo", {
+            "placa": "DEF4567", "lista_negra": True, "motivo_lista_negra": "Reporte"
+        }, created_by="admin")["entidad_id"]
+        persona = orq.crear_entidad("persona", {"nombre": "Ana", "placa": "XYZ-789"},
+                                    created_by="admin")["entidad_id"]
+
+        for variante in ("ABC-1234", "abc1234", "ABC 1234"):
+            assert buscar_placa(variante)["entidad_id"] == vehiculo
+        registro = buscar_placa("def-4567")
+        assert registro["entidad_id"] == bloqueado and registro["lista_negra"]
+        assert registro["motivo_lista_negra"] == "Reporte"
+        assert buscar_placa("XYZ789")["entidad_id"] == persona
+        assert buscar_placa("ZZZ-0000") is None
+
+        inicio = time.perf_counter()
+        for _ in range(10000):
+            buscar_placa("ABC-1234")
+        por_busqueda = (time.perf_counter() - inicio) / 10000 * 1e6
+        print(f"✅ Placas encontradas ({por_busqueda:.1f} µs por búsqueda)")
+
+    con_db_temporal(prueba)
+
+
+def test_sincronizado_en_actualizar_y_desactivar():
+    """Cambiar la placa, desactivar y reactivar se reflejan en el índice"""
+    print("\n🧪 TEST 2: El índice sigue a entidades")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        entidad_id = orq.crear_entidad("vehiculo", {"placa": "GHI-1111"}, created_by="admin")["entidad_id"]
+        assert buscar_placa("GHI1111")["entidad_id"] == entidad_id
+
+        actualizar_entidad(entidad_id, atributos={"placa": "GHI-2222"})
+        assert buscar_placa("GHI1111") is None
+        assert buscar_placa("GHI2222")["entidad_id"] == entidad_id
+
+        actualizar_entidad(entidad_id, atributos={"lista_negra": True})
+        assert buscar_placa("GHI2222")["lista_negra"]
+
+        desactivar_entidad(entidad_id)
+        assert buscar_placa("GHI2222") is None
+
+        reactivar_entidad(entidad_id)
+        assert buscar_placa("GHI2222")["entidad_id"] == entidad_id
+
+        # Otro proceso ve los cambios al recargar desde indice_placas
+        otro = IndicePlacas(refresco_segundos=0)
+        assert otro.buscar("GHI2222")["entidad_id"] == entidad_id
+        desactivar_entidad(entidad_id)
+        assert otro.buscar("GHI2222") is None
+        print("✅ Índice sincronizado en alta, cambio, desactivación y reactivación")
+
+    con_db_temporal(prueba)
+
+
+def test_transaccion_revertida():
+    """Una alta revertida no queda en el índice"""
+    print("\n🧪 TEST 3: Rollback no deja la placa en memoria")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        buscar_placa("JKL-0001")  # carga el índice
+        try:
+            with transaccion():
+                orq.crear_entidad("vehiculo", {"placa": "JKL-0001"}, created_by="admin")
+                raise RuntimeError("fallo simulado")
+        except RuntimeError:
+            pass
+        assert buscar_placa("JKL-0001") is None
+
+        with transaccion():
+            entidad_id = orq.crear_entidad("vehiculo", {"placa": "JKL-0002"}, created_by="admin")["entidad_id"]
+        assert buscar_placa("JKL0002")["entidad_id"] == entidad_id
+        print("✅ Solo las altas confirmadas llegan al índice")
+
+    con_db_temporal(prueba)
+
+
+def test_llenado_inicial():
+    """El índice se llena desde las entidades existentes al crearse"""
+    print("\n🧪 TEST 4: Llenado inicial de indice_placas")
+
+    def prueba():
+        with get_db() as conn:
+            conn.execute("DROP TABLE indice_placas")
+            conn.executemany("""
+                INSERT INTO entidades (entidad_id, tipo, atributos, hash_actual, estado,
+                                       fecha_creacion, fecha_actualizacion)
+                VALUES (?, 'vehiculo', ?, 'h', ?, '2025-01-01', '2025-01-01')
+            """, [
+                ("ENT_V1", '{"placa": "MNO-1234"}', "activo"),
+                ("ENT_V2", '{"placa": "mno1234"}', "inactivo"),
+                ("ENT_V3", 'no es json', "activo"),
+            ])
+            asegurar_indice_placas(conn)
+            total = conn.execute("SELECT COUNT(*) FROM indice_placas").fetchone()[0]
+
+        indice_placas.invalidar()
+        assert total == 1
+        assert buscar_placa("MNO-1234")["entidad_id"] == "ENT_V1"
+        print("✅ Placa repetida queda en la entidad activa")
+
+    con_db_temporal(prueba)
+
+
+def test_coincidencia_aproximada():
+    """Lecturas de OCR con confusiones y un error se resuelven a la placa registrada"""
+    print("\n🧪 TEST 5: Búsqueda aproximada de placas")
+
+    assert levenshtein("ABC1234", "ABC124") == 1
+    assert distancia_ocr("A8C1234", "ABC1234") == 0.25
+    assert distancia_ocr("X8C1234", "ABC1234") == 1.25
+
+    aproximado = IndiceAproximado(max_ediciones=1)
+    for placa in ("ABC-1234", "ABC-1284", "XYZ-9876"):
+        aproximado.agregar(placa)
+    assert aproximado.candidatos("ABC1234")[0] == ("ABC1234", 0.0)
+    assert [p for p, _ in aproximado.candidatos("A8CI234")][:1] == ["ABC1234"]
+    assert "XYZ9876" not in [p for p, _ in aproximado.candidatos("ABC1234")]
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        registrado = orq.crear_entidad("vehiculo", {"placa": "BOD-5810"}, created_by="admin")["entidad_id"]
+        inactivo = orq.crear_entidad("vehiculo", {"placa": "BOD-5811"}, created_by="admin")["entidad_id"]
+        desactivar_entidad(inactivo)
+
+        # 8/B, 0/O, 1/I confundidos y un carácter perdido
+        for lectura in ("8OD581O", "BODS8I0", "BOD-580", "b0d 5810"):
+            candidatos = buscar_placa_aproximada(lectura)
+            assert candidatos, lectura
+            assert candidatos[0]["entidad_id"] == registrado, lectura
+            assert all(c["entidad_id"] != inactivo for c in candidatos)
+
+        exacto = buscar_placa_aproximada("BOD-5810")[0]
+        assert exacto["distancia"] == 0 and exacto["confianza"] == 1.0
+        assert buscar_placa_aproximada("8OD581O")[0]["confianza"] < 1.0
+        assert buscar_placa_aproximada("QQQ-0000") == []
+
+        # Placas dadas de alta después de construir el índice aproximado
+        nuevo = orq.crear_entidad("vehiculo", {"placa": "PQR-2222"}, created_by="admin")["entidad_id"]
+        assert buscar_placa_aproximada("PQR-ZZZZ")[0]["entidad_id"] == nuevo
+
+        with get_db() as conn:
+            conn.executemany("""
+                INSERT INTO indice_placas (placa, entidad_id, lista_negra, activo, actualizado)
+                VALUES (?, ?, 0, 1, '2025-01-01')
+            """, [(f"{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}X-{i:04d}", f"ENT_{i}") for i in range(20000)])
+        indice_placas.invalidar()
+        assert buscar_placa_aproximada("80D5810")[0]["entidad_id"] == registrado
+        assert buscar_placa_aproximada("AAX-OO00")[0]["placa"] == "AAX-0000"
+
+        inicio = time.perf_counter()
+        for lectura in ("80D5810", "AAX-OO00", "ZZX-9999", "BOD581"):
+            for _ in range(250):
+                buscar_placa_aproximada(lectura)
+        por_busqueda = (time.perf_counter() - inicio) / 1000 * 1000
+        print(f"✅ Candidatos sobre 20,000 placas en {por_busqueda:.3f} ms por lectura")
+
+    con_db_temporal(prueba)
+
+
+def test_placa_compartida_queda_en_la_activa():
+    """Escribir una entidad retirada no le quita la placa a la activa que la comparte"""
+    print("\n🧪 TEST 6: Placa compartida entre entidad retirada y activa")
+
+    def prueba():
+        orq = OrquestadorAccesos()
+        anterior = orq.crear_entidad("vehiculo", {"placa": "ABC-1234"}, created_by="admin")["entidad_id"]
+        robado = orq.crear_entidad("vehiculo", {
+            "placa": "ABC-1234", "lista_negra": True, "motivo_lista_negra": "robo"
+        }, created_by="admin")["entidad_id"]
+
+        desactivar_entidad(anterior)
+        registro = buscar_placa("ABC1234")
+        assert registro["entidad_id"] == robado and registro["lista_negra"]
+        assert registro["motivo_lista_negra"] == "robo"
+
+        # También dentro de una transacción (se aplica en memoria al confirmar)
+        with transaccion():
+            actualizar_entidad(anterior, atributos={"placa": "ABC-1234", "color": "rojo"})
+        assert buscar_placa("ABC1234")["entidad_id"] == robado
+
+        otro = IndicePlacas(refresco_segundos=0)
+        assert otro.buscar("ABC-1234")["entidad_id"] == robado
+        print("✅ La placa sigue en la entidad activa en lista negra")
+
+    con_db_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_busqueda_exacta_normalizada()
+    test_sincronizado_en_actualizar_y_desactivar()
+    test_transaccion_revertida()
+    test_llenado_inicial()
+    test_coincidencia_aproximada()
+    test_placa_compartida_queda_en_la_activa()
+    print("\n✅ Todos los tests de placas pasaron")
@@ -0,0 +1,214 @@
+"""
+test_verificacion.py
+Testing de la verificación en streaming de las cadenas de eventos (core/verificacion.py)
+"""
+
+import sys
+sys.path.insert(0, '/workspaces/Accesos-Residencial')
+
+import json
+
+from core.db import get_db
+from core.cadena import cadenas_eventos, CADENA_GLOBAL
+from core.hashing import verificar_cadena_integridad
+from core.orquestador import OrquestadorAccesos
+from core.merkle import (
+    obtener_prueba_inclusion,
+    prueba_inclusion_por_recibo,
+    listar_checkpoints,
+    raiz_merkle,
+    ruta_inclusion,
+    sellar_bloques,
+    verificar_ruta,
+)
+from core.verificacion import (
+    verificar_cadena,
+    obtener_punto_control,
+    reiniciar_puntos_control,
+)
+from pruebas_db import con_db_temporal
+
+
+def _registrar(orq, total, condominio_id=None, inicio=0):
+    for i in range(inicio, inicio + total):
+        orq.registrar_acceso(
+            f"ENT_{i % 7}", "entrada", {"gate": "GATE_001", "i": i}, "vigilante1",
+            condominio_id=condominio_id
+        )
+
+
+def test_cadena_integra_y_reanudable():
+    """Verifica todas las cadenas, guarda punto de control y reanuda solo lo nuevo"""
+    print("\n🧪 TEST 1: Verificación completa y reanudación")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        _registrar(orq, 25, "CONDO_A")
+        _registrar(orq, 10)
+
+        resultado = verificar_cadena_integridad(tamano_lote=4, guardar_cada=8)
+        assert resultado["integra"], resultado["detalles"]
+        assert resultado["total_eventos"] == 35
+        assert set(resultado["cadenas"]) == {"CONDO_A", CADENA_GLOBAL}
+        assert "eventos_por_segundo" in resultado and "segundos" in resultado
+
+        punto = obtener_punto_control("CONDO_A")
+        assert punto["secuencia"] == 25 and punto["eventos_verificados"] == 25
+
+        _registrar(orq, 5, "CONDO_A", inicio=25)
+        nuevo = verificar_cadena("CONDO_A", tamano_lote=4)
+        assert nuevo["integra"] and nuevo["total_eventos"] == 5
+        assert nuevo["desde_secuencia"] == 25 and nuevo["hasta_secuencia"] == 30
+        assert obtener_punto_control("CONDO_A")["eventos_verificados"] == 30
+
+        completa = verificar_cadena("CONDO_A", reanudar=False)
+        assert completa["integra"] and completa["total_eventos"] == 30
+
+        # Con condominio_id solo se verifica esa cadena
+        solo = verificar_cadena_integridad("CONDO_A", reanudar=False)
+        assert solo["cadena"] == "CONDO_A" and solo["total_eventos"] == 30
+        global_ = verificar_cadena_integridad(todas=False, reanudar=False)
+        assert global_["cadena"] == CADENA_GLOBAL and global_["total_eventos"] == 10
+        print(f"✅ {resultado['detalles']}")
+
+    con_db_temporal(prueba)
+
+
+def test_detecta_alteracion_y_huecos():
+    """Un evento alterado o borrado rompe la cadena en el punto exacto"""
+    print("\n🧪 TEST 2: Detección de alteraciones")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        _registrar(orq, 12, "CONDO_A")
+
+        with get_db() as conn:
+            fila = conn.execute(
+                "SELECT evento_id, metadata FROM eventos WHERE condominio_id = ? AND secuencia = 7",
+                ("CONDO_A",)
+            ).fetchone()
+            metadata = json.loads(fila["metadata"])
+            metadata["gate"] = "GATE_FALSO"
+            conn.execute(
+                "UPDATE eventos SET metadata = ? WHERE evento_id = ?",
+                (json.dumps(metadata), fila["evento_id"])
+            )
+
+        alterada = verificar_cadena("CONDO_A", tamano_lote=5)
+        assert not alterada["integra"]
+        assert alterada["primer_corrupto"] == fila["evento_id"]
+        assert alterada["total_eventos"] == 6
+        assert "alterado" in alterada["motivo"]
+
+        # Reanudar no salta el evento corrupto
+        assert not verificar_cadena("CONDO_A")["integra"]
+
+        reiniciar_puntos_control()
+        with get_db() as conn:
+            conn.execute("DELETE FROM eventos WHERE condominio_id = ? AND secuencia >= 7", ("CONDO_A",))
+        _registrar(orq, 1, "CONDO_A")
+        with get_db() as conn:
+            conn.execute("DELETE FROM eventos WHERE condominio_id = ? AND secuencia = 4", ("CONDO_A",))
+
+        hueco = verificar_cadena("CONDO_A", tamano_lote=2)
+        assert not hueco["integra"]
+        assert "Salto de secuencia (3 -> 5)" in hueco["motivo"]
+        print(f"✅ {alterada['detalles']}")
+
+    con_db_temporal(prueba)
+
+
+def test_verificacion_paralela():
+    """El pool de procesos da el mismo resultado que la verificación secuencial"""
+    print("\n🧪 TEST 3: Verificación paralela por segmentos")
+    print("-" * 60)
+
+    def prueba():
+        orq = OrquestadorAccesos(usuario_id="admin")
+        _registrar(orq, 40, "CONDO_A")
+
+        paralela = verificar_cadena_integridad(reanudar=False, trabajadores=2, tamano_lote=3)
+        assert paralela["integra"] and paralela["total_eventos"] == 40
+        assert obtener_punto_control("CONDO_A")["secuencia"] == 40
+
+        # Ruptura justo en el borde entre dos segmentos
+        with get_db() as conn:
+            conn.execute(
+                "UPDATE eventos SET hash_previo = ? WHERE condominio_id = ? AND secuencia = 10",
+                ("0" * 64, "CONDO_A")
+            )
+        secuencial = verificar_cadena("CONDO_A", reanudar=False, tamano_lote=3, trabajadores=1)
+        paralela = verificar_cadena("CONDO_A", reanudar=False, tamano_lote=3, trabajadores=2)
+        assert not paralela["integra"]
+        for clave in ("total_eventos", "primer_corrupto", "motivo", "hasta_secuencia"):
+            assert paralela[clave] == secuencial[clave], clave
+        assert paralela["total_eventos"] == 9
+        print(f"✅ {paralela['detalles']}")
+
+    con_db_temporal(prueba)
+
+
+def test_checkpoints_merkle_y_pruebas():
+    """Bloques sellados al anexar y pruebas de inclusión por evento"""
+    print("\n🧪 TEST 4: Checkpoints Merkle")
+    print("-" * 60)
+
+    hashes = [format(i, "064x") for i in range(1, 12)]
+    raiz = raiz_merkle(hashes)
+    for indice, h in enumerate(hashes):
+        assert verificar_ruta(h, ruta_inclusion(hashes, indice), raiz)
+    assert not verificar_ruta(hashes[0], ruta_inclusion(hashes, 1), raiz)
+
+    def prueba():
+        bloque_original = cadenas_eventos.bloque_merkle
+        cadenas_eventos.bloque_merkle = 8
+        try:
+            orq = OrquestadorAccesos(usuario_id="admin")
+            _registrar(orq, 20, "CONDO_A")
+        finally:
+            cadenas_eventos.bloque_merkle = bloque_original
+
+        checkpoints = listar_checkpoints("CONDO_A")
+        assert [(c["secuencia_inicio"], c["secuencia_fin"]) for c in checkpoints] == [(1, 8), (9, 16)]
+        assert sellar_bloques("CONDO_A", 8) == []
+
+        with get_db() as conn:
+            evento = conn.execute(
+                "SELECT evento_id, recibo_recordia FROM eventos WHERE condominio_id = ? AND secuencia = 11",
+                ("CONDO_A",)
+            ).fetchone()
+            abierto = conn.execute(
+                "SELECT evento_id FROM eventos WHERE condominio_id = ? AND secuencia = 18",
+                ("CONDO_A",)
+            ).fetchone()
+
+        prueba_evento = obtener_prueba_inclusion(evento["evento_id"])
+        assert prueba_evento["valida"] and prueba_evento["indice"] == 2
+        assert prueba_evento["raiz"] == checkpoints[1]["raiz"]
+        assert len(prueba_evento["ruta"]) == 3
+        assert verificar_ruta(prueba_evento["hash_evento"], prueba_evento["ruta"], prueba_evento["raiz"])
+        assert prueba_inclusion_por_recibo(evento["recibo_recordia"])["evento_id"] == evento["evento_id"]
+
+        # El bloque abierto aún no tiene checkpoint
+        assert obtener_prueba_inclusion(abierto["evento_id"]) is None
+
+        # Alterar un evento después de sellar invalida la prueba
+        with get_db() as conn:
+            conn.execute(
+                "UPDATE eventos SET hash_actual = ? WHERE condominio_id = ? AND secuencia = 12",
+                ("f" * 64, "CONDO_A")
+            )
+        assert not obtener_prueba_inclusion(evento["evento_id"])["valida"]
+        print(f"✅ Prueba de inclusión con {len(prueba_evento['ruta'])} pasos")
+
+    con_db_temporal(prueba)
+
+
+if __name__ == "__main__":
+    test_cadena_integra_y_reanudable()
+    test_detecta_alteracion_y_huecos()
+    test_verificacion_paralela()
+    test_checkpoints_merkle_y_pruebas()
+    print("\n✅ Todos los tests de verificación pasaron")
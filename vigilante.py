@@ -6,9 +6,13 @@ Diseño minimalista, touch-friendly y rápido.
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import json
 import random
 import time
 
+from core.db import get_db
+from core.placas import buscar_placa, buscar_placa_aproximada
+
 st.set_page_config(
     page_title="🏠 Caseta - Vigilante",
     layout="wide",
@@ -134,6 +138,42 @@ def get_mock_data():
     return vehiculos_db, eventos_recientes
 
 
+def buscar_vehiculo_por_placa(placa):
+    """
+    Datos del vehículo para la vista de verificación: primero el índice de
+    placas (búsqueda exacta en memoria), luego los datos de prueba
+    """
+    registro = buscar_placa(placa)
+    if registro is None:
+        vehiculos_db, _ = get_mock_data()
+        return vehiculos_db.get(placa)
+
+    with get_db() as db:
+        fila = db.execute(
+            "SELECT tipo, atributos FROM entidades WHERE entidad_id = ?",
+            (registro["entidad_id"],)
+        ).fetchone()
+    try:
+        atributos = json.loads(fila["atributos"]) if fila else {}
+    except (json.JSONDecodeError, TypeError):
+        atributos = {}
+    if not isinstance(atributos, dict):
+        atributos = {}
+
+    return {
+        "persona": atributos.get("nombre") or atributos.get("propietario") or "Sin nombre",
+        "tipo": atributos.get("tipo_residente") or (fila["tipo"] if fila else "vehiculo"),
+        "casa": atributos.get("casa") or atributos.get("unidad") or "-",
+        "vehiculo": " ".join(
+            str(atributos[c]) for c in ("marca", "modelo", "color") if atributos.get(c)
+        ) or "-",
+        "ultima_visita": None,
+        "foto_url": atributos.get("foto_url", "https://via.placeholder.com/150"),
+        "en_lista_negra": registro["lista_negra"],
+        "motivo_bloqueo": registro["motivo_lista_negra"],
+    }
+
+
 def registrar_evento(placa, tipo, persona, casa, verificacion_manual=False):
     """Registra un evento de acceso"""
     evento = {
@@ -228,7 +268,7 @@ def vista_escaneo():
 
 def vista_verificacion(placa, confianza):
     """Muestra la información del vehículo y permite autorizar/denegar"""
-    vehiculos_db, _ = get_mock_data()
+    datos = buscar_vehiculo_por_placa(placa)
     
     st.markdown("---")
     
@@ -238,9 +278,7 @@ def vista_verificacion(placa, confianza):
             st.image(st.session_state.foto_guardada, width=300)
     
     # Verificar si existe en BD
-    if placa in vehiculos_db:
-        datos = vehiculos_db[placa]
-        
+    if datos:
         # LISTA NEGRA - Alerta crítica
         if datos.get("en_lista_negra", False):
             st.error("🚨 ALERTA DE SEGURIDAD")
@@ -336,6 +374,19 @@ def vista_verificacion(placa, confianza):
         st.markdown(f"### Placa: {placa}")
         st.markdown(f"Confianza de lectura: {confianza*100:.0f}%")
         
+        # La cámara/OCR suele confundir 0/O, 8/B, 1/I: proponer placas registradas
+        candidatos = buscar_placa_aproximada(placa, limite=3)
+        if candidatos:
+            st.markdown("#### ¿Quisiste decir?")
+            columnas = st.columns(len(candidatos))
+            for columna, candidato in zip(columnas, candidatos):
+                with columna:
+                    etiqueta = f"{candidato['placa']} ({candidato['confianza']*100:.0f}%)"
+                    if st.button(etiqueta, key=f"sugerencia_{candidato['placa']}", use_container_width=True):
+                        st.session_state.placa_escaneada = candidato['placa']
+                        st.session_state.confianza = confianza * candidato['confianza']
+                        st.rerun()
+        
         with st.form("registro_nuevo"):
             st.markdown("#### Registrar nuevo acceso")
             